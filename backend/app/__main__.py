@@ -0,0 +1,92 @@
+# backend/app/__main__.py
+"""Backend entry point: ``python -m app``.
+
+    python -m app                      # 同 uvicorn app.main:app
+    python -m app --profile-startup    # 打印各子系统导入/初始化耗时后退出
+    python -m app --profile-startup --json
+
+The profile imports the heavy dependencies and API modules one by one (each
+line is the time spent on modules not already imported by an earlier line),
+then initialises every lazy singleton and reports its construction time, so a
+regression in start-up cost can be pinned to a subsystem.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# 按依赖顺序导入；前面的行已导入的模块不会重复计时
+PROFILE_IMPORTS: Tuple[Tuple[str, str], ...] = (
+    ("fastapi", "fastapi"),
+    ("pydantic", "pydantic"),
+    ("story_loader", "app.core.story.story_loader"),
+    ("story_engine", "app.core.story.story_engine"),
+    ("world_api", "app.api.world_api"),
+    ("trigger", "app.core.world.trigger"),
+    ("minimap_api", "app.api.minimap_api"),
+    ("hint_api", "app.api.hint_api"),
+    ("ai_router", "app.routers.ai_router"),
+    ("app.main", "app.main"),
+)
+
+
+def profile_startup() -> Dict[str, List[Tuple[str, float]]]:
+    imports: List[Tuple[str, float]] = []
+    started = time.perf_counter()
+    for label, module in PROFILE_IMPORTS:
+        t0 = time.perf_counter()
+        importlib.import_module(module)
+        imports.append((label, time.perf_counter() - t0))
+    import_total = time.perf_counter() - started
+
+    from app.core.lazy import warm_up
+
+    t0 = time.perf_counter()
+    timings = warm_up()
+    init_total = time.perf_counter() - t0
+    return {
+        "imports": imports,
+        "init": list(timings.items()),
+        "totals": [("import", import_total), ("init", init_total), ("total", import_total + init_total)],
+    }
+
+
+def _print_report(report: Dict[str, List[Tuple[str, float]]]) -> None:
+    titles = {"imports": "Imports", "init": "Lazy subsystem init", "totals": "Totals"}
+    for section, rows in report.items():
+        print(f"== {titles[section]} ==")
+        for name, seconds in rows:
+            print(f"  {name:<20} {seconds * 1000:8.1f} ms")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app", description="DriftSystem backend")
+    parser.add_argument("--profile-startup", action="store_true", help="report per-subsystem import/init time and exit")
+    parser.add_argument("--json", action="store_true", help="with --profile-startup: print the report as JSON")
+    parser.add_argument("--host", default=os.getenv("DRIFT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DRIFT_PORT", "8000")))
+    parser.add_argument("--reload", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        report = profile_startup()
+        if args.json:
+            print(json.dumps({section: dict(rows) for section, rows in report.items()}, indent=2))
+        else:
+            _print_report(report)
+        return 0
+
+    import uvicorn
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, reload=args.reload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
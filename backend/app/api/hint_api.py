@@ -1,11 +1,20 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from app.core.hint.engine import HintEngine
+from app.core.lazy import LazySingleton
 from app.core.tree.engine import TreeEngine
 
 router = APIRouter()
 tree_engine = TreeEngine()
-engine = HintEngine(tree_engine)
+
+
+def _build_hint_engine():
+    # openai SDK 导入很重，只在第一次请求提示时加载
+    from app.core.hint.engine import HintEngine
+
+    return HintEngine(tree_engine)
+
+
+engine = LazySingleton(_build_hint_engine, "hint_engine")
 
 class HintInput(BaseModel):
     content: str
@@ -52,7 +52,7 @@ async def generate_story_level(payload: GenerateLevelRequest):
     with filepath.open("w", encoding="utf-8") as f:
         json.dump(level_payload, f, ensure_ascii=False, indent=2)
 
-    story_engine.register_generated_level(level_payload.get("id", level_id))
+    story_engine.register_generated_level(level_payload.get("id", level_id), path=str(filepath))
 
     try:
         level = load_level(level_payload.get("id", level_id))
@@ -115,7 +115,7 @@ async def inject_story_level(level_id: str, title: str, text: str):
     with filepath.open("w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
-    story_engine.register_generated_level(target_id)
+    story_engine.register_generated_level(target_id, path=str(filepath))
 
     return {
         "status": "ok",
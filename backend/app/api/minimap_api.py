@@ -1,34 +1,47 @@
 # backend/app/api/minimap_api.py
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Request, Response
 import base64
-from pathlib import Path
+from typing import Optional, Tuple
 
+from app.core.lazy import LazySingleton
 from app.core.story.story_engine import story_engine
 from app.core.world.minimap_renderer import MiniMapRenderer  # 你缺这个文件
 
 router = APIRouter(prefix="/minimap", tags=["MiniMap"])
-renderer = MiniMapRenderer()
+# 背景 PNG 解码与字体探测推迟到第一次出图
+renderer: MiniMapRenderer = LazySingleton(MiniMapRenderer, "minimap_renderer")  # type: ignore[assignment]
+
+
+def _render_for(player_id: str, if_none_match: Optional[str] = None) -> Tuple[Optional[bytes], str]:
+    """``(png, etag)`` of a player's view; ``png`` is ``None`` when ``if_none_match`` already matches."""
 
-@router.get("/png/{player_id}")
-def get_png(player_id: str):
     data = story_engine.minimap.to_dict(player_id)
     nodes = data["nodes"]
     pos = data.get("player_pos")
     current = data.get("current_level")
 
-    png_path = renderer.render(nodes, pos, current)
+    # ETag 只依赖地图数据：解锁集合 / 当前关卡 / 玩家点都没变 → 304，不构造渲染器也不渲染
+    etag = MiniMapRenderer.etag_for(nodes, pos, current)
+    if if_none_match in (f'"{etag}"', etag):
+        return None, etag
+
+    png, _ = renderer.render_bytes(nodes, pos, current, etag)
+    return png, etag
 
-    with open(png_path, "rb") as f:
-        return Response(f.read(), media_type="image/png")
+
+@router.get("/png/{player_id}")
+def get_png(player_id: str, request: Request):
+    png, etag = _render_for(player_id, request.headers.get("if-none-match"))
+    quoted = f'"{etag}"'
+    if png is None:
+        return Response(status_code=304, headers={"ETag": quoted})
+    return Response(png, media_type="image/png", headers={"ETag": quoted})
 
 
 @router.get("/give/{player_id}")
 def give_map(player_id: str):
-    data = story_engine.minimap.to_dict(player_id)
-    png_path = renderer.render(data["nodes"], data.get("player_pos"), data.get("current_level"))
-
-    with open(png_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode()
+    png, _ = _render_for(player_id)
+    b64 = base64.b64encode(png).decode()
 
     return {
         "status": "ok",
@@ -37,4 +50,4 @@ def give_map(player_id: str):
             "give_item": "filled_map",
             "map_image": b64
         }
-    }
\ No newline at end of file
+    }
@@ -1,15 +1,17 @@
 # backend/app/api/story_api.py
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, Union
 import os
 import json
 
 from app.core.story.story_loader import (
     list_levels,
     load_level,
+    get_level_repository,
     DATA_DIR,          # ⭐ 使用 story_loader 的同一个目录
 )
 from app.core.story.story_engine import story_engine
@@ -17,6 +19,9 @@ from app.core.scene.scene_orchestrator_v1 import compose_scene_and_structure
 from app.core.scene.scene_orchestrator_v2 import compose_scene_and_structure_v2
 from app.core.executor.plugin_payload_v1 import build_plugin_payload_v1
 from app.core.executor.plugin_payload_v2 import build_plugin_payload_v2_with_trace, PayloadV2BuildError
+from app.core.generation.artifact_cache import track_lookups
+from app.core.executor.payload_stream_v2 import NDJSON_MEDIA_TYPE, iter_payload_ndjson
+from app.core.executor.plugin_payload_v3 import PAYLOAD_V3_MEDIA_TYPE, accepts_payload_v3, encode_plugin_payload_v3
 
 router = APIRouter(prefix="/story")
 
@@ -92,6 +97,13 @@ def _build_level_document(level_id: str, title: str, text: str, bootstrap_patch:
     }
 
 
+def _write_level_document(file_path: str, level_doc: Dict[str, Any]) -> None:
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(level_doc, f, ensure_ascii=False, indent=2)
+    # 立即登记到索引，未命中重扫受轮询间隔限制
+    get_level_repository(DATA_DIR).upsert(file_path)
+
+
 def _as_bool_env(name: str, default: bool = False) -> bool:
     raw = os.environ.get(name)
     if raw is None:
@@ -122,6 +134,7 @@ def _extract_debug_payload(compose_result: dict) -> dict:
         "engine_version": engine_version,
         "decision_trace": decision_trace,
         "compose_path": compose_result.get("compose_path", "unknown"),
+        "stage_timings_ms": compose_result.get("stage_timings_ms") or {},
     }
 
 
@@ -142,6 +155,7 @@ def _build_payload_v1_for_inject(*, player_id: str, text: str) -> tuple[dict, di
         compose_result,
         player_id=player_id,
         origin=_fixed_anchor_from_env(),
+        fill_regions=_as_bool_env("DRIFT_PAYLOAD_FILL", default=False),
     )
 
     debug_payload: dict = {}
@@ -154,27 +168,30 @@ def _build_payload_v1_for_inject(*, player_id: str, text: str) -> tuple[dict, di
 def _build_payload_v2_for_inject(*, player_id: str, text: str) -> tuple[dict, dict]:
     strict_mode = _as_bool_env("DRIFT_V2_STRICT_MODE", default=False)
 
-    compose_result = compose_scene_and_structure_v2(text, strict_mode=strict_mode)
-    if compose_result.get("status") != "SUCCESS":
-        debug_payload = _extract_debug_payload(compose_result) if _as_bool_env("DRIFT_DEBUG_TRACE", default=False) else {}
-        raise PayloadV2BuildErrorWrapper(compose_result.get("failure_code", "COMPOSE_FAILED"), debug_payload)
+    # compose 与 payload 构建共用一次 artifact cache 统计，写入 payload.stats.artifact_cache
+    with track_lookups():
+        compose_result = compose_scene_and_structure_v2(text, strict_mode=strict_mode)
+        if compose_result.get("status") != "SUCCESS":
+            debug_payload = _extract_debug_payload(compose_result) if _as_bool_env("DRIFT_DEBUG_TRACE", default=False) else {}
+            raise PayloadV2BuildErrorWrapper(compose_result.get("failure_code", "COMPOSE_FAILED"), debug_payload)
 
-    try:
-        payload_v2, payload_trace = build_plugin_payload_v2_with_trace(
-            compose_result,
-            player_id=player_id,
-            origin=_fixed_anchor_from_env(),
-            strict_mode=strict_mode,
-        )
-    except PayloadV2BuildError as exc:
-        debug_payload = {}
-        if _as_bool_env("DRIFT_DEBUG_TRACE", default=False):
-            debug_payload = _extract_debug_payload(compose_result)
-            debug_payload.update({
-                "payload_v2_failure_code": exc.failure_code,
-                "payload_v2_trace": exc.trace or {},
-            })
-        raise PayloadV2BuildErrorWrapper(exc.failure_code, debug_payload) from exc
+        try:
+            payload_v2, payload_trace = build_plugin_payload_v2_with_trace(
+                compose_result,
+                player_id=player_id,
+                origin=_fixed_anchor_from_env(),
+                strict_mode=strict_mode,
+                fill_regions=_as_bool_env("DRIFT_PAYLOAD_FILL", default=False),
+            )
+        except PayloadV2BuildError as exc:
+            debug_payload = {}
+            if _as_bool_env("DRIFT_DEBUG_TRACE", default=False):
+                debug_payload = _extract_debug_payload(compose_result)
+                debug_payload.update({
+                    "payload_v2_failure_code": exc.failure_code,
+                    "payload_v2_trace": exc.trace or {},
+                })
+            raise PayloadV2BuildErrorWrapper(exc.failure_code, debug_payload) from exc
 
     debug_payload: dict = {}
     if _as_bool_env("DRIFT_DEBUG_TRACE", default=False):
@@ -241,11 +258,83 @@ def api_story_state(player_id: str):
     return {"status": "ok", "state": story_engine.get_public_state(player_id)}
 
 
+def _new_level_path(payload: InjectPayload) -> Tuple[str, str]:
+    """Normalised level id and target file for an injected level (400 if it exists)."""
+
+    os.makedirs(DATA_DIR, exist_ok=True)             # ⭐ 与 story_loader 使用相同目录
+    level_id = _normalize_injected_level_id(payload.level_id)
+    file_path = os.path.join(DATA_DIR, f"{level_id}.json")
+    if os.path.exists(file_path):
+        raise HTTPException(status_code=400, detail=f"Level {level_id} already exists")
+    return level_id, file_path
+
+
+async def _inject_payload_v2(
+    payload: InjectPayload, level_id: str, file_path: str
+) -> Union[JSONResponse, Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Build payload_v2 for an injected level and write the level file.
+
+    Returns ``(payload_v2, response_meta)``; a build failure comes back as the
+    ready 422 ``JSONResponse`` (with the debug trace when enabled).
+    """
+
+    player_id = (payload.player_id or "default").strip() or "default"
+    try:
+        payload_v2, debug_payload = await run_in_threadpool(
+            _build_payload_v2_for_inject, player_id=player_id, text=payload.text
+        )
+        level_doc = _build_level_document(
+            level_id=level_id,
+            title=payload.title,
+            text=payload.text,
+            bootstrap_patch=payload_v2,
+        )
+        await run_in_threadpool(_write_level_document, file_path, level_doc)
+    except PayloadV2BuildErrorWrapper as exc:
+        response = {"detail": f"payload_v2_build_failed: {exc.failure_code}"}
+        if _as_bool_env("DRIFT_DEBUG_TRACE", default=False) and exc.debug_payload:
+            response.update(exc.debug_payload)
+        return JSONResponse(status_code=422, content=response)
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=f"payload_v2_build_failed: {exc}") from exc
+
+    response_meta = {
+        "status": "ok",
+        "msg": f"Level {level_id} created with payload_v2",
+        "level_id": level_id,
+        "file": file_path,
+    }
+    if debug_payload:
+        response_meta.update(debug_payload)
+    return payload_v2, response_meta
+
+
+# ============================================================
+# ✔ 创建关卡并按区块流式返回 payload_v2 指令（NDJSON）
+# ============================================================
+@router.post("/inject/stream")
+async def api_story_inject_stream(payload: InjectPayload):
+    """
+    与 /inject 的 payload_v2 路径相同，但指令按 16×16 区块分组逐行返回：
+    header → chunk × N（各带 running_hash）→ trailer（final_commands_hash_v2），
+    插件收到第一组即可开始放置方块。
+    """
+    level_id, file_path = _new_level_path(payload)
+    built = await _inject_payload_v2(payload, level_id, file_path)
+    if isinstance(built, JSONResponse):
+        return built
+    payload_v2, response_meta = built
+
+    stream_payload = dict(payload_v2)
+    stream_payload.update(response_meta)
+    return StreamingResponse(iter_payload_ndjson(stream_payload), media_type=NDJSON_MEDIA_TYPE)
+
+
 # ============================================================
 # ⭐ NEW：创建新的剧情关卡（以 JSON Body 注入）
 # ============================================================
 @router.post("/inject")
-def api_story_inject(payload: InjectPayload):
+async def api_story_inject(payload: InjectPayload, request: Request):
     """
     JSON Body 示例：
     {
@@ -254,61 +343,40 @@ def api_story_inject(payload: InjectPayload):
         "text": "这是自动注入的剧情节点"
     }
     """
-    LEVEL_DIR = DATA_DIR                         # ⭐ 与 story_loader 使用相同目录
-    os.makedirs(LEVEL_DIR, exist_ok=True)
+    return await inject_story_level(payload, accept=request.headers.get("accept"))
 
-    level_id = _normalize_injected_level_id(payload.level_id)
 
-    file_path = os.path.join(LEVEL_DIR, f"{level_id}.json")
+async def inject_story_level(payload: InjectPayload, accept: Optional[str] = None):
+    """Create the injected level; shared by /story/inject and world CREATE_STORY.
 
-    if os.path.exists(file_path):
-        raise HTTPException(
-            status_code=400,
-            detail=f"Level {level_id} already exists"
-        )
+    ``accept`` is the client's Accept header (None for in-process callers).
+    """
+    level_id, file_path = _new_level_path(payload)
 
     use_payload_v1 = _as_bool_env("DRIFT_USE_PAYLOAD_V1", default=False)
     use_payload_v2 = _as_bool_env("DRIFT_USE_PAYLOAD_V2", default=False)
 
     if use_payload_v2:
-        try:
-            player_id = (payload.player_id or "default").strip() or "default"
-            payload_v2, debug_payload = _build_payload_v2_for_inject(player_id=player_id, text=payload.text)
+        built = await _inject_payload_v2(payload, level_id, file_path)
+        if isinstance(built, JSONResponse):
+            return built
+        payload_v2, response_meta = built
 
-            level_doc = _build_level_document(
-                level_id=level_id,
-                title=payload.title,
-                text=payload.text,
-                bootstrap_patch=payload_v2,
-            )
+        # 客户端 Accept 明确要求时返回二进制 plugin_payload_v3（关卡文件仍存 v2 JSON）
+        if accepts_payload_v3(accept):
+            body = await run_in_threadpool(encode_plugin_payload_v3, payload_v2, extra_header=response_meta)
+            return Response(content=body, media_type=PAYLOAD_V3_MEDIA_TYPE, headers={"Vary": "Accept"})
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(level_doc, f, ensure_ascii=False, indent=2)
-
-            result = dict(payload_v2)
-            result.update({
-                "status": "ok",
-                "msg": f"Level {level_id} created with payload_v2",
-                "level_id": level_id,
-                "file": file_path,
-            })
-            if debug_payload:
-                result.update(debug_payload)
-            return result
-        except PayloadV2BuildErrorWrapper as exc:
-            response = {
-                "detail": f"payload_v2_build_failed: {exc.failure_code}",
-            }
-            if _as_bool_env("DRIFT_DEBUG_TRACE", default=False) and exc.debug_payload:
-                response.update(exc.debug_payload)
-            return JSONResponse(status_code=422, content=response)
-        except Exception as exc:
-            raise HTTPException(status_code=422, detail=f"payload_v2_build_failed: {exc}") from exc
+        result = dict(payload_v2)
+        result.update(response_meta)
+        return result
 
     if use_payload_v1:
         try:
             player_id = (payload.player_id or "default").strip() or "default"
-            payload_v1, debug_payload = _build_payload_v1_for_inject(player_id=player_id, text=payload.text)
+            payload_v1, debug_payload = await run_in_threadpool(
+                _build_payload_v1_for_inject, player_id=player_id, text=payload.text
+            )
 
             level_doc = _build_level_document(
                 level_id=level_id,
@@ -317,8 +385,7 @@ def api_story_inject(payload: InjectPayload):
                 bootstrap_patch=payload_v1,
             )
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(level_doc, f, ensure_ascii=False, indent=2)
+            await run_in_threadpool(_write_level_document, file_path, level_doc)
 
             result = dict(payload_v1)
             result.update({
@@ -341,7 +408,7 @@ def api_story_inject(payload: InjectPayload):
             raise HTTPException(status_code=422, detail=f"payload_v1_build_failed: {exc}") from exc
 
     # ⭐ 使用AI生成完整的世界内容（NPC、环境、建筑等）
-    from app.core.ai.deepseek_agent import call_deepseek
+    from app.core.ai.deepseek_agent import call_deepseek_async
     
     ai_prompt = f"""
 基于用户的故事描述生成一个完整的Minecraft世界场景。
@@ -370,7 +437,7 @@ def api_story_inject(payload: InjectPayload):
 """
     
     try:
-        ai_result = call_deepseek(
+        ai_result = await call_deepseek_async(
             context={"type": "world_generation", "story": payload.text},
             messages=[{"role": "user", "content": ai_prompt}],
             temperature=0.8
@@ -431,8 +498,7 @@ def api_story_inject(payload: InjectPayload):
         bootstrap_patch=bootstrap_patch,
     )
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    await run_in_threadpool(_write_level_document, file_path, data)
 
     return {
         "status": "ok",
@@ -4,18 +4,22 @@ from collections import defaultdict
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 import logging
 
-from app.core.world.engine import WorldEngine
+from app.core.world.engine import WorldEngineRegistry
+from app.core.world.move_coalescer import move_coalescer
 from app.core.story.story_engine import story_engine
 from app.core.world.trigger import trigger_engine
-from app.core.ai.intent_engine import parse_intent
+from app.core.ai.intent_engine import resolve_chat_async
 from app.core.quest.runtime import quest_runtime
+from app.core.player_locks import player_locks
 
 router = APIRouter(prefix="/world", tags=["World"])
-world_engine = WorldEngine()
+# 每个玩家独立的世界实例（闲置回收）
+world_engines = WorldEngineRegistry()
 logger = logging.getLogger("uvicorn.error")
 APPLY_REPORTS_LIMIT = 20
 REPORT_STATUS_RANK: Dict[str, int] = {
@@ -36,6 +40,11 @@ def _rank_for_status(status: str) -> int:
 
 
 def _upsert_apply_report(report: "ApplyReportInput") -> Dict[str, Any]:
+    with player_locks.lock(report.player_id):
+        return _upsert_apply_report_locked(report)
+
+
+def _upsert_apply_report_locked(report: "ApplyReportInput") -> Dict[str, Any]:
     player_reports = apply_reports_by_player[report.player_id]
     build_id = report.build_id
     now_ms = _now_ms()
@@ -81,7 +90,8 @@ def _upsert_apply_report(report: "ApplyReportInput") -> Dict[str, Any]:
 
 
 def _recent_reports_for_player(player_id: str) -> list[Dict[str, Any]]:
-    reports = list(apply_reports_by_player.get(player_id, {}).values())
+    with player_locks.lock(player_id):
+        reports = [dict(item) for item in apply_reports_by_player.get(player_id, {}).values()]
     reports.sort(key=lambda item: int(item.get("last_seen_ms", 0)), reverse=True)
     return reports[:APPLY_REPORTS_LIMIT]
 
@@ -112,7 +122,8 @@ class MoveAction(BaseModel):
     y: float
     z: float
     speed: float = 0.0
-    moving: bool = False
+    # 仅显式 false 表示停下（立即评估）；省略时按移动中合并
+    moving: Optional[bool] = None
 
 
 class WorldAction(BaseModel):
@@ -165,22 +176,49 @@ class ApplyReportInput(BaseModel):
 # APPLY API — v3（最终版）
 # ============================================================
 @router.post("/apply", response_model=WorldApplyResponse)
-def apply_action(inp: ApplyInput):
+async def apply_action(inp: ApplyInput):
+    # 同一玩家的请求串行处理（单写者），不同玩家互不阻塞
+    async with player_locks.alock(inp.player_id):
+        return await _apply_action(inp)
 
-    player_id = inp.player_id
-    act = inp.action.dict(exclude_none=True)
+
+def _apply_world_step(player_id: str, act: Dict[str, Any]):
+    """Sync part of ``/world/apply`` before any LLM call: ``(world_engine, new_state, early_response)``."""
+
+    world_engine = world_engines.get(player_id)
 
     # 1) 世界物理更新
     new_state = world_engine.apply(act)
-    vars_ = new_state.get("variables") or {}
-    x = vars_.get("x", 0)
-    y = vars_.get("y", 0)
-    z = vars_.get("z", 0)
+
+    # 纯移动：窗口内只保留最新位置，触发器按窗口评估；说话/交互不受影响
+    if act.get("move") and not act.get("say"):
+        if move_coalescer.offer(player_id, act["move"]) is None:
+            flushed = _idle_hits.pop(player_id, None)
+            if flushed:
+                return world_engine, new_state, WorldApplyResponse(status="ok", **flushed)
+            return world_engine, new_state, WorldApplyResponse(status="ok", world_state=new_state)
+    return world_engine, new_state, None
+
+
+async def _apply_action(inp: ApplyInput):
+    # 世界更新、关卡加载、触发器等同步逻辑都在线程池执行，事件循环只负责等待 LLM
+    player_id = inp.player_id
+    act = inp.action.model_dump(exclude_none=True)
+
+    world_engine, new_state, early = await run_in_threadpool(_apply_world_step, player_id, act)
+    if early is not None:
+        return early
 
     # 2) 文本 → 意图解析
     say_text = act.get("say")
-    intent_result = parse_intent(player_id, say_text, new_state, story_engine) if say_text else None
-    
+    intent_result = None
+    decision = None
+    if say_text:
+        # 合并模式下同一次 LLM 往返同时给出意图与剧情决策
+        chat = await resolve_chat_async(player_id, say_text, new_state, act, story_engine)
+        intent_result = chat["intent_result"]
+        decision = chat["decision"]
+
     # 提取第一个 intent（如果有多个，这里只处理第一个）
     intent = None
     if intent_result and "intents" in intent_result and len(intent_result["intents"]) > 0:
@@ -196,7 +234,7 @@ def apply_action(inp: ApplyInput):
         if t == "CREATE_STORY":
             import hashlib
             import time
-            from app.api.story_api import InjectPayload, api_story_inject
+            from app.api.story_api import InjectPayload, inject_story_level
             
             # 生成唯一level_id
             raw_text = intent.get("raw_text", "story")
@@ -210,7 +248,7 @@ def apply_action(inp: ApplyInput):
                     text=raw_text,
                     player_id=player_id,
                 )
-                inject_result = api_story_inject(payload)
+                inject_result = await inject_story_level(payload)
 
                 if isinstance(inject_result, dict) and inject_result.get("version") == "plugin_payload_v1":
                     _record_fallback_state(
@@ -248,8 +286,7 @@ def apply_action(inp: ApplyInput):
                 )
                 
                 # 立即加载生成的关卡
-                patch = story_engine.load_level_for_player(player_id, level_id)
-                new_state = world_engine.apply_patch(patch)
+                patch, new_state = await run_in_threadpool(_load_level_into_world, player_id, world_engine, level_id)
                 
                 return WorldApplyResponse(
                     status="ok",
@@ -272,84 +309,17 @@ def apply_action(inp: ApplyInput):
                     }
                 )
 
-        # ---------- 跳关 ----------
-        if t == "GOTO_LEVEL":
-            level = intent.get("level_id")
-            canonical = story_engine.graph.canonicalize_level_id(level) if level else None
-            level = canonical or level
-            patch = story_engine.load_level_for_player(player_id, level)
-            new_state = world_engine.apply_patch(patch)
-
-            return WorldApplyResponse(
-                status="ok",
-                world_state=new_state,
-                story_node={"title": "跳转关卡", "text": f"进入 {level}"},
-                world_patch=patch
-            )
-
-        if t == "GOTO_NEXT_LEVEL":
-            next_level = story_engine.get_next_level_id(None, player_id=player_id)
-            patch = story_engine.load_level_for_player(player_id, next_level)
-            new_state = world_engine.apply_patch(patch)
-
-            return WorldApplyResponse(
-                status="ok",
-                world_state=new_state,
-                story_node={"title": "下一关", "text": f"进入 {next_level}"},
-                world_patch=patch
-            )
-
-        # ---------- 小地图 ----------
-        if t == "SHOW_MINIMAP":
-            mm = story_engine.minimap.to_dict(player_id)
-            return WorldApplyResponse(
-                status="ok",
-                world_state=new_state,
-                story_node={"title": "小地图", "text": "显示当前世界地图"},
-                world_patch={"minimap": mm},
-            )
-
-        # ---------- 时间 ----------
-        if t == "SET_DAY":
-            patch = {"mc": {"time": "day"}}
-            new_state = world_engine.apply_patch(patch)
-            return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
-
-        if t == "SET_NIGHT":
-            patch = {"mc": {"time": "night"}}
-            new_state = world_engine.apply_patch(patch)
-            return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
-
-        # ---------- 天气 ----------
-        if t == "SET_WEATHER":
-            w = intent.get("weather", "clear")
-            patch = {"mc": {"weather": w}}
-            new_state = world_engine.apply_patch(patch)
-            return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
-
-        # ---------- 造实体 ----------
-        if t == "SPAWN_ENTITY":
-            patch = {"mc": {
-                "spawn": {
-                    "type": intent.get("entity", "villager"),
-                    "name": "NPC",
-                    "offset": {"dx": 1, "dy": 0, "dz": 1}
-                }
-            }}
-            new_state = world_engine.apply_patch(patch)
-            return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
-
-        # ---------- 建筑 ----------
-        if t == "BUILD_STRUCTURE":
-            patch = {"mc": {"build": intent.get("build")}}
-            new_state = world_engine.apply_patch(patch)
-            return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+        response = await run_in_threadpool(_apply_intent, player_id, world_engine, new_state, intent)
+        if response is not None:
+            return response
 
     # ============================================================
     # ⭐ 剧情推进（只要说话一定触发）
     # ============================================================
     if say_text:
-        option, node, patch = story_engine.advance(player_id, new_state, act)
+        option, node, patch = await story_engine.advance_async(
+            player_id, new_state, act, ai_result=decision
+        )
 
         # 🛡️ 确保 ai_option 始终为字符串，兼容 DeepSeek 返回数组/对象
         option_value = None
@@ -374,19 +344,9 @@ def apply_action(inp: ApplyInput):
     # ============================================================
     # ⭐ 触发器（走路触发 level）
     # ============================================================
-    tp = trigger_engine.check(player_id, x, y, z)
-
-    if tp and tp.action == "load_level":
-        patch = story_engine.load_level_for_player(player_id, tp.level_id)
-        new_state = world_engine.apply_patch(patch)
-
-        return WorldApplyResponse(
-            status="ok",
-            world_state=new_state,
-            story_node={"title": "世界触发点", "text": f"成功加载 {tp.level_id}"},
-            world_patch=patch,
-            trigger={"id": tp.id, "level_id": tp.level_id}
-        )
+    hit = await run_in_threadpool(_evaluate_state, player_id, world_engine, new_state)
+    if hit:
+        return WorldApplyResponse(status="ok", **hit)
 
     # ============================================================
     # 默认（比如走路，没有剧情）
@@ -397,12 +357,194 @@ def apply_action(inp: ApplyInput):
     )
 
 
+def _load_level_into_world(player_id: str, world_engine, level_id: str):
+    patch = story_engine.load_level_for_player(player_id, level_id)
+    return patch, world_engine.apply_patch(patch)
+
+
+def _apply_intent(player_id: str, world_engine, new_state: Dict[str, Any], intent: Dict[str, Any]) -> Optional[WorldApplyResponse]:
+    """Whitelisted world commands other than CREATE_STORY (sync, run in the threadpool)."""
+
+    t = intent["type"]
+
+    # ---------- 跳关 ----------
+    if t == "GOTO_LEVEL":
+        level = intent.get("level_id")
+        canonical = story_engine.graph.canonicalize_level_id(level) if level else None
+        level = canonical or level
+        patch = story_engine.load_level_for_player(player_id, level)
+        new_state = world_engine.apply_patch(patch)
+
+        return WorldApplyResponse(
+            status="ok",
+            world_state=new_state,
+            story_node={"title": "跳转关卡", "text": f"进入 {level}"},
+            world_patch=patch
+        )
+
+    if t == "GOTO_NEXT_LEVEL":
+        next_level = story_engine.get_next_level_id(None, player_id=player_id)
+        patch = story_engine.load_level_for_player(player_id, next_level)
+        new_state = world_engine.apply_patch(patch)
+
+        return WorldApplyResponse(
+            status="ok",
+            world_state=new_state,
+            story_node={"title": "下一关", "text": f"进入 {next_level}"},
+            world_patch=patch
+        )
+
+    # ---------- 小地图 ----------
+    if t == "SHOW_MINIMAP":
+        mm = story_engine.minimap.to_dict(player_id)
+        return WorldApplyResponse(
+            status="ok",
+            world_state=new_state,
+            story_node={"title": "小地图", "text": "显示当前世界地图"},
+            world_patch={"minimap": mm},
+        )
+
+    # ---------- 时间 ----------
+    if t == "SET_DAY":
+        patch = {"mc": {"time": "day"}}
+        new_state = world_engine.apply_patch(patch)
+        return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+
+    if t == "SET_NIGHT":
+        patch = {"mc": {"time": "night"}}
+        new_state = world_engine.apply_patch(patch)
+        return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+
+    # ---------- 天气 ----------
+    if t == "SET_WEATHER":
+        w = intent.get("weather", "clear")
+        patch = {"mc": {"weather": w}}
+        new_state = world_engine.apply_patch(patch)
+        return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+
+    # ---------- 造实体 ----------
+    if t == "SPAWN_ENTITY":
+        patch = {"mc": {
+            "spawn": {
+                "type": intent.get("entity", "villager"),
+                "name": "NPC",
+                "offset": {"dx": 1, "dy": 0, "dz": 1}
+            }
+        }}
+        new_state = world_engine.apply_patch(patch)
+        return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+
+    # ---------- 建筑 ----------
+    if t == "BUILD_STRUCTURE":
+        patch = {"mc": {"build": intent.get("build")}}
+        new_state = world_engine.apply_patch(patch)
+        return WorldApplyResponse(status="ok", world_state=new_state, world_patch=patch)
+
+    return None
+
+
+def _evaluate_state(player_id: str, world_engine, new_state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    vars_ = new_state.get("variables") or {}
+    flushed = _idle_hits.pop(player_id, None)
+    return _evaluate_position(player_id, world_engine, vars_.get("x", 0), vars_.get("y", 0), vars_.get("z", 0)) or flushed
+
+
+def _evaluate_position(player_id: str, world_engine, x: float, y: float, z: float) -> Optional[Dict[str, Any]]:
+    """Run position-driven checks (minimap, world triggers) for one evaluated sample."""
+
+    story_engine.minimap.update_player_pos(player_id, (x, y, z))
+    tp = trigger_engine.check(player_id, x, y, z)
+    if not tp or tp.action != "load_level":
+        return None
+
+    patch = story_engine.load_level_for_player(player_id, tp.level_id)
+    return {
+        "world_state": world_engine.apply_patch(patch),
+        "story_node": {"title": "世界触发点", "text": f"成功加载 {tp.level_id}"},
+        "world_patch": patch,
+        "trigger": {"id": tp.id, "level_id": tp.level_id},
+    }
+
+
+# 空闲刷新评估出的触发结果，随该玩家的下一次响应下发
+_idle_hits: Dict[str, Dict[str, Any]] = {}
+
+
+def _flush_idle_move(player_id: str, move: Dict[str, Any]) -> None:
+    """Evaluate a held sample whose player went quiet before the window elapsed."""
+
+    with player_locks.lock(player_id):
+        hit = _evaluate_position(player_id, world_engines.get(player_id), move["x"], move["y"], move["z"])
+        if hit:
+            _idle_hits[player_id] = hit
+
+
+move_coalescer.set_flush_handler(_flush_idle_move)
+
+
+def _forget_player(player_id: str) -> None:
+    """Drop per-player move state once the player's world instance is evicted."""
+
+    move_coalescer.forget(player_id)
+    _idle_hits.pop(player_id, None)
+
+
+world_engines.on_evict = _forget_player
+
+
+class MoveSample(MoveAction):
+    player_id: str = Field(min_length=1)
+
+
+class BatchMoveInput(BaseModel):
+    samples: List[MoveSample] = Field(default_factory=list)
+
+
+@router.post("/apply/moves")
+def apply_moves(batch: BatchMoveInput):
+    """Batch movement endpoint: many players' positions in one request.
+
+    Samples are folded per player (last one wins), coalesced with the same
+    window as ``/world/apply``, and only triggered players appear in
+    ``results``.
+    """
+
+    latest: Dict[str, MoveSample] = {}
+    for sample in batch.samples:
+        latest[sample.player_id] = sample
+
+    # 只处理本请求里的玩家，且与 /world/apply、空闲刷新一样持有该玩家的锁；
+    # 其他玩家到期的样本留给刷新线程，结果随他们自己的下一次响应下发
+    evaluated_count = 0
+    results = []
+    for player_id, sample in latest.items():
+        move = sample.model_dump(exclude={"player_id"}, exclude_none=True)
+        with player_locks.lock(player_id):
+            world_engine = world_engines.get(player_id)
+            world_engine.apply({"move": move})
+            evaluated = move_coalescer.offer(player_id, move)
+            hit = None
+            if evaluated is not None:
+                evaluated_count += 1
+                hit = _evaluate_position(player_id, world_engine, evaluated["x"], evaluated["y"], evaluated["z"])
+            flushed = _idle_hits.pop(player_id, None)
+        results.extend({"player_id": player_id, **found} for found in (hit, flushed) if found)
+
+    return {
+        "status": "ok",
+        "accepted": len(batch.samples),
+        "players": len(latest),
+        "evaluated": evaluated_count,
+        "results": results,
+    }
+
+
 @router.get("/state/{player_id}")
 def world_state(player_id: str):
     """Return a combined snapshot of the simulated world and story engine."""
 
     story_snapshot = story_engine.get_public_state(player_id)
-    state = world_engine.get_state() or {}
+    state = world_engines.get(player_id).get_state() or {}
     world_snapshot = {
         "variables": dict(state.get("variables", {})),
         "entities": dict(state.get("entities", {})),
@@ -538,14 +680,27 @@ def story_recommendations(player_id: str, current_level: Optional[str] = None, l
     }
 
 
-@router.get("/story/{player_id}/debug/tasks")
-def story_debug_tasks(player_id: str, request: Request, token: Optional[str] = None):
+def _require_debug_token(request: Request, token: Optional[str]) -> None:
     expected_token = os.environ.get("DRIFT_TASK_DEBUG_TOKEN")
     if expected_token:
         provided = token or request.headers.get("X-Debug-Token")
         if provided != expected_token:
             raise HTTPException(status_code=403, detail="Task debug access denied.")
 
+
+@router.get("/story/{player_id}/debug/memory")
+def story_debug_memory(player_id: str, request: Request, token: Optional[str] = None):
+    _require_debug_token(request, token)
+    stats = story_engine.memory_stats(player_id)
+    if not stats:
+        return {"status": "error", "msg": "Unknown player."}
+    return {"status": "ok", "player_id": player_id, "memory": stats}
+
+
+@router.get("/story/{player_id}/debug/tasks")
+def story_debug_tasks(player_id: str, request: Request, token: Optional[str] = None):
+    _require_debug_token(request, token)
+
     recent_reports = _recent_reports_for_player(player_id)
     last_report = recent_reports[0] if recent_reports else None
     fallback_state = fallback_state_by_player.get(player_id, {})
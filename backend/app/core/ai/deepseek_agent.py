@@ -1,40 +1,40 @@
 # backend/app/core/ai/deepseek_agent.py
 from __future__ import annotations
 
-import os
+import copy
 import json
+import os
 import time
 import hashlib
 import threading
-from typing import Any, Dict, List, Optional
-
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import Any, Dict, List, Optional, Tuple
 
-API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("DEEPSEEK_API_KEY", "")
-BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
-MODEL = os.getenv("OPENAI_MODEL", "deepseek-chat")
-
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}" if API_KEY else "",
-    "Content-Type": "application/json",
-}
-
-CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))
-READ_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "30"))
-MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
-RETRY_BACKOFF = float(os.getenv("DEEPSEEK_RETRY_BACKOFF", "1.5"))
+from app.core.ai.llm_client import (
+    API_KEY,
+    MODEL,
+    achat_completion_json,
+    chat_completion_json,
+)
+from app.core.cache import ResponseCache
 
 _lock = threading.Lock()
 _LAST_CALL_TS: Dict[str, float] = {}
-_CACHE: Dict[str, Dict[str, Any]] = {}
 
 # ⭐ 最重要：缩短冷却时间
 MIN_INTERVAL = 0.6
 
-MAX_CACHE_SIZE = 128
+# 决策缓存：LRU + TTL，可选落盘（DEEPSEEK_CACHE_PATH）以便重启后仍然命中
+MAX_CACHE_SIZE = int(os.getenv("DEEPSEEK_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("DEEPSEEK_CACHE_TTL", "900"))
+CACHE_PATH = os.getenv("DEEPSEEK_CACHE_PATH") or None
+CACHE_DISK_ROWS = int(os.getenv("DEEPSEEK_CACHE_DISK_ROWS", "4096"))
+# 语义 key：位置量化粒度（方块）与参与 key 的历史消息条数
+CACHE_POS_QUANTUM = float(os.getenv("DEEPSEEK_CACHE_POS_QUANTUM", "8"))
+CACHE_HISTORY_TAIL = int(os.getenv("DEEPSEEK_CACHE_HISTORY_TAIL", "4"))
+
+_CACHE = ResponseCache(
+    max_size=MAX_CACHE_SIZE, ttl=CACHE_TTL, disk_path=CACHE_PATH, disk_max_rows=CACHE_DISK_ROWS
+)
 
 SYSTEM_PROMPT = """
 你的身份是《昆明湖宇宙》的“造物主（Story + World God）”。
@@ -47,57 +47,76 @@ SYSTEM_PROMPT = """
 - 若出现 NPC/人物/动物 → 必须 spawn
 """
 
-def _make_cache_key(context, messages_tail):
-    key_payload = {"context": context, "messages_tail": messages_tail[-8:]}
+def _quantize(value: Any) -> Optional[int]:
+    try:
+        return int(float(value) // CACHE_POS_QUANTUM)
+    except (TypeError, ValueError):
+        return None
+
+
+def _message_digest(message: Any) -> str:
+    if isinstance(message, dict):
+        raw = f"{message.get('role', '')}:{str(message.get('content', '')).strip()}"
+    else:
+        raw = str(message)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _make_cache_key(context, messages_tail, mode: str = "decide"):
+    """Semantic key: only inputs that actually change the story decision.
+
+    Raw world floats, timestamps and player_id are left out so that replaying
+    the same line in the same place/beat (e.g. tutorial lines) hits the cache.
+    """
+
+    action = context.get("player_action") or {}
+    variables = (context.get("world_state") or {}).get("variables") or {}
+    tree_state = context.get("tree_state") or {}
+    key_payload = {
+        "mode": mode,
+        "level_id": context.get("level_id"),
+        "beat_id": context.get("beat_id"),
+        "say": str(action.get("say") or "").strip(),
+        "pos": [_quantize(variables.get(axis)) for axis in ("x", "y", "z")],
+        "last_option": tree_state.get("last_option") if isinstance(tree_state, dict) else None,
+        "history": [_message_digest(m) for m in (messages_tail or [])[-CACHE_HISTORY_TAIL:]],
+    }
     s = json.dumps(key_payload, ensure_ascii=False, sort_keys=True, default=str)
     return hashlib.sha256(s.encode()).hexdigest()
 
-def _cache_get(key): return _CACHE.get(key)
+def _cache_get(key):
+    cached = _CACHE.get(key)
+    return copy.deepcopy(cached) if cached is not None else None
+
 def _cache_put(key, val):
-    if len(_CACHE) >= MAX_CACHE_SIZE:
-        _CACHE.pop(next(iter(_CACHE)))
-    _CACHE[key] = val
+    if isinstance(val, dict):
+        _CACHE.put(key, copy.deepcopy(val))
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of the decision cache."""
+
+    return _CACHE.stats()
 
 
 def _call_deepseek_api(payload: Dict[str, Any]) -> Dict[str, Any]:
-    last_error: Exception | None = None
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            resp = requests.post(
-                f"{BASE_URL}/chat/completions",
-                headers=HEADERS,
-                json=payload,
-                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
-            )
-            resp.raise_for_status()
-            body = resp.json()
-            content = body["choices"][0]["message"]["content"]
-            return json.loads(content)
-        except requests.Timeout as exc:
-            last_error = exc
-            print(f"[AI WARN] DeepSeek timeout attempt {attempt + 1}: {exc}")
-        except requests.RequestException as exc:
-            last_error = exc
-            status = getattr(exc.response, "status_code", "?")
-            print(
-                f"[AI WARN] DeepSeek HTTP error attempt {attempt + 1}"
-                f" (status={status}): {exc}"
-            )
-        except (KeyError, ValueError, json.JSONDecodeError) as exc:
-            last_error = exc
-            print(f"[AI WARN] DeepSeek parse error attempt {attempt + 1}: {exc}")
-
-        if attempt < MAX_RETRIES:
-            sleep_seconds = RETRY_BACKOFF * (attempt + 1)
-            time.sleep(sleep_seconds)
-
-    if last_error:
-        print("[AI ERROR] DeepSeek failed after retries:", last_error)
-        raise last_error
-    raise RuntimeError("DeepSeek request failed without specific error")
+    return chat_completion_json(payload, endpoint="decide", label="DeepSeek")
 
 
-def deepseek_decide(context, messages_history):
+async def _acall_deepseek_api(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await achat_completion_json(payload, endpoint="decide", label="DeepSeek")
+
+
+def _prepare_decision(
+    context,
+    messages_history,
+    intent_prompt: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], str, Dict[str, Any]]:
+    """Return ``(early_result, cache_key, payload)``; no LLM call is needed when early_result is set.
+
+    With ``intent_prompt`` the request becomes the combined mode: the same
+    completion also returns the ``intents[]`` list described by that prompt.
+    """
 
     player_id = str(context.get("player_id") or "global")
 
@@ -112,14 +131,14 @@ def deepseek_decide(context, messages_history):
                 "text": "微风轻拂，但故事仍在缓缓流动。"
             },
             "world_patch": {"variables": {}, "mc": {}}
-        }
+        }, "", {}
 
     # ⭐ 缓存命中
-    key = _make_cache_key(context, messages_history)
+    key = _make_cache_key(context, messages_history, "combined" if intent_prompt else "decide")
     cached = _cache_get(key)
     if cached:
         _LAST_CALL_TS[player_id] = now
-        return cached
+        return cached, key, {}
 
     # ⭐ 无 API KEY → 本地占位剧情
     if not API_KEY:
@@ -130,10 +149,27 @@ def deepseek_decide(context, messages_history):
                 "text": "（未配置 AI 密钥，使用占位剧情）"
             },
             "world_patch": {"variables": {}, "mc": {}}
-        }
+        }, key, {}
 
     # ⭐ 真正请求 DeepSeek
-    user_prompt = f"""
+    if intent_prompt:
+        user_prompt = f"""
+    先解析玩家最后一句话的意图，再根据玩家输入与历史剧情生成下一步剧情。
+    只输出一个 JSON：
+    {{
+      "intents": [ {{ "type": "...", ... }} ],
+      "option": ...,
+      "node": {{ "title": "...", "text": "..." }},
+      "world_patch": {{
+         "variables": {{}},
+         "mc": {{}}
+      }}
+    }}
+    context = {json.dumps(context, ensure_ascii=False)}
+    """
+        system_prompt = f"{SYSTEM_PROMPT}\n【意图解析规则】\n{intent_prompt}"
+    else:
+        user_prompt = f"""
     根据玩家输入与历史剧情生成下一步剧情。
     只输出 JSON：
     {{
@@ -146,8 +182,9 @@ def deepseek_decide(context, messages_history):
     }}
     context = {json.dumps(context, ensure_ascii=False)}
     """
+        system_prompt = SYSTEM_PROMPT
 
-    msgs = [{"role": "system", "content": SYSTEM_PROMPT}]
+    msgs = [{"role": "system", "content": system_prompt}]
     msgs += messages_history[-12:]
     msgs.append({"role": "user", "content": user_prompt})
 
@@ -157,39 +194,91 @@ def deepseek_decide(context, messages_history):
         "temperature": 0.8,
         "response_format": {"type": "json_object"},
     }
+    return None, key, payload
 
-    try:
-        parsed = _call_deepseek_api(payload)
+
+def _finish_decision(context, key: str, parsed: Any = None, error: Optional[Exception] = None) -> Dict[str, Any]:
+    player_id = str(context.get("player_id") or "global")
+    _LAST_CALL_TS[player_id] = time.time()
+    if error is None:
         _cache_put(key, parsed)
-        _LAST_CALL_TS[player_id] = time.time()
         return parsed
 
+    print("[AI ERROR]", error)
+    return {
+        "option": None,
+        "node": {"title": "昆明湖 · 静默", "text": "AI 一时沉默，但湖水依旧流动。"},
+        "world_patch": {"variables": {}, "mc": {"tell": "AI 出错，使用安全剧情"}},
+    }
+
+
+def deepseek_decide(context, messages_history):
+
+    early, key, payload = _prepare_decision(context, messages_history)
+    if early is not None:
+        return early
+
+    try:
+        parsed = _call_deepseek_api(payload)
     except Exception as e:
-        print("[AI ERROR]", e)
-        _LAST_CALL_TS[player_id] = time.time()
-        return {
-            "option": None,
-            "node": {"title": "昆明湖 · 静默", "text": "AI 一时沉默，但湖水依旧流动。"},
-            "world_patch": {"variables": {}, "mc": {"tell": "AI 出错，使用安全剧情"}},
-        }
+        return _finish_decision(context, key, error=e)
+    return _finish_decision(context, key, parsed)
 
 
-def call_deepseek(
+async def deepseek_decide_async(context, messages_history):
+    """Non-blocking variant of :func:`deepseek_decide` for async handlers."""
+
+    early, key, payload = _prepare_decision(context, messages_history)
+    if early is not None:
+        return early
+
+    try:
+        parsed = await _acall_deepseek_api(payload)
+    except Exception as e:
+        return _finish_decision(context, key, error=e)
+    return _finish_decision(context, key, parsed)
+
+
+def deepseek_decide_combined(context, messages_history, intent_prompt: str) -> Dict[str, Any]:
+    """One LLM round trip returning ``intents`` plus the ``option/node/world_patch`` decision.
+
+    ``intents`` is absent when the call was throttled, served offline, or failed;
+    callers fall back to local intent rules in that case.
+    """
+
+    early, key, payload = _prepare_decision(context, messages_history, intent_prompt)
+    if early is not None:
+        return dict(early)
+
+    try:
+        parsed = _call_deepseek_api(payload)
+    except Exception as e:
+        return _finish_decision(context, key, error=e)
+    result = _finish_decision(context, key, parsed)
+    return dict(result) if isinstance(result, dict) else {}
+
+
+async def deepseek_decide_combined_async(context, messages_history, intent_prompt: str) -> Dict[str, Any]:
+    """Async variant of :func:`deepseek_decide_combined`."""
+
+    early, key, payload = _prepare_decision(context, messages_history, intent_prompt)
+    if early is not None:
+        return dict(early)
+
+    try:
+        parsed = await _acall_deepseek_api(payload)
+    except Exception as e:
+        return _finish_decision(context, key, error=e)
+    result = _finish_decision(context, key, parsed)
+    return dict(result) if isinstance(result, dict) else {}
+
+
+def _build_call_payload(
     context: Optional[Dict[str, Any]],
     messages: List[Dict[str, str]],
-    temperature: float = 0.7,
-    response_format: Optional[Dict[str, Any]] = None,
+    temperature: float,
+    response_format: Optional[Dict[str, Any]],
 ) -> Dict[str, Any]:
-    """Generic DeepSeek API wrapper used by story/world tools."""
-
-    if not API_KEY:
-        return {
-            "response": json.dumps(
-                {"error": "missing_api_key", "context": context or {}},
-                ensure_ascii=False,
-            )
-        }
-
     payload_messages: List[Dict[str, str]] = []
     if context:
         ctx_json = json.dumps(context, ensure_ascii=False)
@@ -205,18 +294,66 @@ def call_deepseek(
         payload["response_format"] = response_format
     else:
         payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def _missing_key_response(context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "response": json.dumps(
+            {"error": "missing_api_key", "context": context or {}},
+            ensure_ascii=False,
+        )
+    }
+
+
+def _wrap_call_result(parsed: Any) -> Dict[str, Any]:
+    if isinstance(parsed, (dict, list)):
+        response_text = json.dumps(parsed, ensure_ascii=False)
+    else:
+        response_text = str(parsed)
+    return {"response": response_text, "parsed": parsed}
 
+
+def _wrap_call_error(context: Optional[Dict[str, Any]], exc: Exception) -> Dict[str, Any]:
+    print("[AI ERROR] call_deepseek failed:", exc)
+    return {
+        "response": json.dumps(
+            {"error": str(exc), "context": context or {}}, ensure_ascii=False
+        )
+    }
+
+
+def call_deepseek(
+    context: Optional[Dict[str, Any]],
+    messages: List[Dict[str, str]],
+    temperature: float = 0.7,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Generic DeepSeek API wrapper used by story/world tools."""
+
+    if not API_KEY:
+        return _missing_key_response(context)
+
+    payload = _build_call_payload(context, messages, temperature, response_format)
     try:
-        parsed = _call_deepseek_api(payload)
-        if isinstance(parsed, (dict, list)):
-            response_text = json.dumps(parsed, ensure_ascii=False)
-        else:
-            response_text = str(parsed)
-        return {"response": response_text, "parsed": parsed}
+        return _wrap_call_result(chat_completion_json(payload, endpoint="call", label="DeepSeek"))
     except Exception as exc:
-        print("[AI ERROR] call_deepseek failed:", exc)
-        return {
-            "response": json.dumps(
-                {"error": str(exc), "context": context or {}}, ensure_ascii=False
-            )
-        }
\ No newline at end of file
+        return _wrap_call_error(context, exc)
+
+
+async def call_deepseek_async(
+    context: Optional[Dict[str, Any]],
+    messages: List[Dict[str, str]],
+    temperature: float = 0.7,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Async variant of :func:`call_deepseek`."""
+
+    if not API_KEY:
+        return _missing_key_response(context)
+
+    payload = _build_call_payload(context, messages, temperature, response_format)
+    try:
+        return _wrap_call_result(await achat_completion_json(payload, endpoint="call", label="DeepSeek"))
+    except Exception as exc:
+        return _wrap_call_error(context, exc)
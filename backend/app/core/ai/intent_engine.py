@@ -1,14 +1,20 @@
 # backend/app/core/ai/intent_engine.py
 from __future__ import annotations
-import json
+import asyncio
 import os
 import re
 from typing import Any, Dict, Optional, List
-import requests
 
-API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("DEEPSEEK_API_KEY", "")
-BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
-MODEL = os.getenv("OPENAI_MODEL", "deepseek-chat")
+from app.core.ai.llm_client import (
+    API_KEY,
+    MODEL,
+    achat_completion_json,
+    chat_completion_json,
+)
+
+INTENT_TIMEOUT = float(os.getenv("INTENT_READ_TIMEOUT", "12"))
+# 聊天消息走"意图+剧情"合并请求（一次 LLM 往返）；设为 0 退回两次调用
+COMBINED_CHAT = os.getenv("DRIFT_COMBINED_CHAT", "1").lower() not in ("0", "false", "no", "off")
 
 # ============================================================
 # Prompt：新版（要求返回 intents[]）
@@ -67,11 +73,8 @@ def normalize_level(text: str) -> Optional[str]:
 # ============================================================
 # AI 多意图解析
 # ============================================================
-def ai_parse_multi(text: str) -> Optional[List[Dict[str, Any]]]:
-    if not API_KEY:
-        return None
-
-    payload = {
+def _intent_payload(text: str) -> Dict[str, Any]:
+    return {
         "model": MODEL,
         "messages": [
             {"role": "system", "content": INTENT_PROMPT},
@@ -81,16 +84,37 @@ def ai_parse_multi(text: str) -> Optional[List[Dict[str, Any]]]:
         "response_format": {"type": "json_object"},
     }
 
+
+def ai_parse_multi(text: str) -> Optional[List[Dict[str, Any]]]:
+    if not API_KEY:
+        return None
+
     try:
-        resp = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers={"Authorization": f"Bearer {API_KEY}",
-                     "Content-Type": "application/json"},
-            json=payload,
-            timeout=12,
-        ).json()
-
-        data = json.loads(resp["choices"][0]["message"]["content"])
+        data = chat_completion_json(
+            _intent_payload(text),
+            endpoint="intent",
+            timeout=INTENT_TIMEOUT,
+            max_retries=0,
+            label="intent_engine",
+        )
+        return data.get("intents", [])
+    except Exception as e:
+        print("[intent_engine] AI multi-intent failed:", e)
+        return None
+
+
+async def ai_parse_multi_async(text: str) -> Optional[List[Dict[str, Any]]]:
+    if not API_KEY:
+        return None
+
+    try:
+        data = await achat_completion_json(
+            _intent_payload(text),
+            endpoint="intent",
+            timeout=INTENT_TIMEOUT,
+            max_retries=0,
+            label="intent_engine",
+        )
         return data.get("intents", [])
     except Exception as e:
         print("[intent_engine] AI multi-intent failed:", e)
@@ -137,12 +161,66 @@ def fallback_intents(text: str) -> List[Dict[str, Any]]:
     return intents
 
 
+# ============================================================
+# 本地预判：白名单内的完整指令短语直接命中，省掉 LLM 往返
+# ============================================================
+# 整句（去掉首尾空白/标点与“请”“帮我”前缀后）必须与短语完全一致；
+# 其余一律交给 LLM —— “你在哪”“雨好大”之类的对话不会被当成指令。
+_PRECLASSIFY_PHRASES: Dict[str, Dict[str, Any]] = {
+    **{w: {"type": "SET_DAY"} for w in ("白天", "变白天", "切换白天", "切换到白天", "天亮", "天亮吧")},
+    **{w: {"type": "SET_NIGHT"} for w in ("晚上", "夜晚", "黑夜", "变晚上", "切换晚上", "切换到晚上", "切换夜晚", "天黑", "天黑吧")},
+    **{w: {"type": "SET_WEATHER", "weather": "rain"} for w in ("下雨", "下雨吧", "来场雨", "切换雨天")},
+    **{
+        w: {"type": "SHOW_MINIMAP"}
+        for w in ("地图", "小地图", "看地图", "看看地图", "打开地图", "显示地图", "查看地图", "打开小地图", "minimap")
+    },
+}
+_PRECLASSIFY_LEVEL = re.compile(r"^(?:去|进入|跳到|跳转到|前往)?第([0-9]{1,2}|[一二三四五六七八九十])关$")
+_PRECLASSIFY_STRIP = " \t\r\n。.！!？?~～，,、"
+
+
+def preclassify_intents(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Return intents when ``text`` is exactly a whitelisted command phrase, else ``None``.
+
+    CREATE_STORY is never preclassified (it generates and writes a level);
+    everything that is not a known command phrase goes to the LLM.
+    """
+
+    raw = (text or "").strip()
+    phrase = raw.strip(_PRECLASSIFY_STRIP)
+    for prefix in ("请", "帮我"):
+        if phrase.startswith(prefix):
+            phrase = phrase[len(prefix):]
+    if not phrase:
+        return None
+
+    intent = _PRECLASSIFY_PHRASES.get(phrase.lower())
+    if intent is not None:
+        return [dict(intent, raw_text=raw)]
+    if _PRECLASSIFY_LEVEL.match(phrase):
+        level_id = normalize_level(phrase)
+        if level_id:
+            return [{"type": "GOTO_LEVEL", "level_id": level_id}]
+    return None
+
+
 # ============================================================
 # parse_intent → 输出 { status, intents: [] }
 # ============================================================
 def parse_intent(player_id, text, world_state, story_engine):
 
     ai_list = ai_parse_multi(text)
+    return _finalize_intents(player_id, text, ai_list, story_engine)
+
+
+async def parse_intent_async(player_id, text, world_state, story_engine):
+    """Async variant of :func:`parse_intent`; the LLM call does not block a worker."""
+
+    ai_list = await ai_parse_multi_async(text)
+    return await asyncio.to_thread(_finalize_intents, player_id, text, ai_list, story_engine)
+
+
+def _finalize_intents(player_id, text, ai_list, story_engine):
     intents = ai_list if ai_list else fallback_intents(text)
 
     # 修正 level 格式
@@ -195,4 +273,45 @@ def parse_intent(player_id, text, world_state, story_engine):
     return {
         "status": "ok",
         "intents": intents
-    }
\ No newline at end of file
+    }
+
+# ============================================================
+# 聊天消息：意图 + 剧情决策合并为一次请求
+# ============================================================
+async def resolve_chat_async(player_id, text, world_state, action, story_engine) -> Dict[str, Any]:
+    """Resolve a chat line into ``{"intent_result", "decision", "source"}``.
+
+    ``decision`` is the story decision produced by the same LLM round trip
+    (pass it to ``story_engine.advance_async(..., ai_result=decision)``), or
+    ``None`` when no decision was requested and ``advance`` must call the LLM.
+    ``source`` is one of ``"local"``, ``"combined"`` or ``"split"``.
+    """
+
+    # 小地图/剧情状态等同步部分放到线程中，事件循环只等待 LLM
+    local = preclassify_intents(text)
+    if local is not None:
+        return {
+            "intent_result": await asyncio.to_thread(_finalize_intents, player_id, text, local, story_engine),
+            "decision": None,
+            "source": "local",
+        }
+
+    if not COMBINED_CHAT:
+        return {
+            "intent_result": await parse_intent_async(player_id, text, world_state, story_engine),
+            "decision": None,
+            "source": "split",
+        }
+
+    from app.core.ai.deepseek_agent import deepseek_decide_combined_async
+
+    ai_input, messages = await asyncio.to_thread(story_engine.build_decision_input, player_id, world_state, action)
+    decision = await deepseek_decide_combined_async(ai_input, messages, INTENT_PROMPT)
+    ai_list = decision.pop("intents", None)
+    if not isinstance(ai_list, list):
+        ai_list = None
+    return {
+        "intent_result": await asyncio.to_thread(_finalize_intents, player_id, text, ai_list, story_engine),
+        "decision": decision or None,
+        "source": "combined",
+    }
@@ -0,0 +1,255 @@
+# backend/app/core/ai/llm_client.py
+"""Shared, pooled HTTP client for chat-completion LLM endpoints.
+
+Every DeepSeek/OpenAI-compatible call in the backend goes through this module
+so that connections are reused instead of opened per request. Two transports
+are exposed:
+
+- ``chat_completion_json``: blocking call for the existing sync code paths
+  (FastAPI threadpool handlers, scripts).
+- ``achat_completion_json``: ``async`` call for handlers that can await, so a
+  slow LLM round trip no longer pins a worker thread.
+
+Both share the same retry policy (timeouts, transport errors, 429/5xx and
+malformed JSON are retried with jittered exponential backoff) and enforce a
+per-endpoint concurrency limit so one hot endpoint cannot starve the pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("DEEPSEEK_API_KEY", "")
+BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
+MODEL = os.getenv("OPENAI_MODEL", "deepseek-chat")
+
+CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("DEEPSEEK_RETRY_BACKOFF", "1.5"))
+RETRY_BACKOFF_MAX = float(os.getenv("DEEPSEEK_RETRY_BACKOFF_MAX", "8"))
+
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "64"))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "16"))
+ENDPOINT_CONCURRENCY = int(os.getenv("LLM_ENDPOINT_CONCURRENCY", "16"))
+
+CHAT_COMPLETIONS_PATH = "/chat/completions"
+
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {API_KEY}" if API_KEY else "",
+        "Content-Type": "application/json",
+    }
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+    )
+
+
+def _timeout(read_timeout: Optional[float]) -> httpx.Timeout:
+    return httpx.Timeout(read_timeout or READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Equal-jitter exponential backoff for retry ``attempt`` (0-based)."""
+
+    ceiling = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def _parse_content(body: Dict[str, Any]) -> Any:
+    content = body["choices"][0]["message"]["content"]
+    return json.loads(content)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in _RETRY_STATUS
+    return True
+
+
+def _describe(exc: Exception) -> Tuple[str, str]:
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout", ""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return "HTTP error", f" (status={exc.response.status_code})"
+    if isinstance(exc, httpx.HTTPError):
+        return "HTTP error", " (status=?)"
+    return "parse error", ""
+
+
+# ---------------------------------------------------------------------------
+# Sync transport
+# ---------------------------------------------------------------------------
+
+_sync_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_sync_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _get_sync_client() -> httpx.Client:
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(base_url=BASE_URL, limits=_limits(), timeout=_timeout(None))
+        return _sync_client
+
+
+def _sync_slot(endpoint: str) -> threading.BoundedSemaphore:
+    with _sync_lock:
+        slot = _sync_limits.get(endpoint)
+        if slot is None:
+            slot = threading.BoundedSemaphore(ENDPOINT_CONCURRENCY)
+            _sync_limits[endpoint] = slot
+        return slot
+
+
+def chat_completion_json(
+    payload: Dict[str, Any],
+    *,
+    endpoint: str = "chat",
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    label: str = "DeepSeek",
+) -> Any:
+    """POST ``payload`` to ``/chat/completions`` and return the parsed JSON content."""
+
+    retries = MAX_RETRIES if max_retries is None else max(0, max_retries)
+    client = _get_sync_client()
+    last_error: Exception | None = None
+
+    for attempt in range(retries + 1):
+        try:
+            with _sync_slot(endpoint):
+                resp = client.post(
+                    CHAT_COMPLETIONS_PATH,
+                    headers=_headers(),
+                    json=payload,
+                    timeout=_timeout(timeout),
+                )
+            resp.raise_for_status()
+            return _parse_content(resp.json())
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as exc:
+            last_error = exc
+            kind, detail = _describe(exc)
+            print(f"[AI WARN] {label} {kind} attempt {attempt + 1}{detail}: {exc}")
+            if not _is_retryable(exc):
+                break
+
+        if attempt < retries:
+            time.sleep(backoff_delay(attempt))
+
+    if last_error:
+        print(f"[AI ERROR] {label} failed after retries:", last_error)
+        raise last_error
+    raise RuntimeError(f"{label} request failed without specific error")
+
+
+# ---------------------------------------------------------------------------
+# Async transport
+# ---------------------------------------------------------------------------
+
+
+class _LoopState:
+    """Async client and per-endpoint semaphores bound to one event loop."""
+
+    def __init__(self) -> None:
+        self.client = httpx.AsyncClient(base_url=BASE_URL, limits=_limits(), timeout=_timeout(None))
+        self.slots: Dict[str, asyncio.Semaphore] = {}
+
+    def slot(self, endpoint: str) -> asyncio.Semaphore:
+        slot = self.slots.get(endpoint)
+        if slot is None:
+            slot = asyncio.Semaphore(ENDPOINT_CONCURRENCY)
+            self.slots[endpoint] = slot
+        return slot
+
+
+_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _get_loop_state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _loop_states.get(loop)
+    if state is None or state.client.is_closed:
+        state = _LoopState()
+        _loop_states[loop] = state
+    return state
+
+
+async def achat_completion_json(
+    payload: Dict[str, Any],
+    *,
+    endpoint: str = "chat",
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    label: str = "DeepSeek",
+) -> Any:
+    """Async counterpart of :func:`chat_completion_json`."""
+
+    retries = MAX_RETRIES if max_retries is None else max(0, max_retries)
+    state = _get_loop_state()
+    last_error: Exception | None = None
+
+    for attempt in range(retries + 1):
+        try:
+            async with state.slot(endpoint):
+                resp = await state.client.post(
+                    CHAT_COMPLETIONS_PATH,
+                    headers=_headers(),
+                    json=payload,
+                    timeout=_timeout(timeout),
+                )
+            resp.raise_for_status()
+            return _parse_content(resp.json())
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as exc:
+            last_error = exc
+            kind, detail = _describe(exc)
+            print(f"[AI WARN] {label} {kind} attempt {attempt + 1}{detail}: {exc}")
+            if not _is_retryable(exc):
+                break
+
+        if attempt < retries:
+            await asyncio.sleep(backoff_delay(attempt))
+
+    if last_error:
+        print(f"[AI ERROR] {label} failed after retries:", last_error)
+        raise last_error
+    raise RuntimeError(f"{label} request failed without specific error")
+
+
+async def aclose() -> None:
+    """Close the async client bound to the running loop (call on shutdown)."""
+
+    loop = asyncio.get_running_loop()
+    state = _loop_states.pop(loop, None)
+    if state is not None:
+        await state.client.aclose()
+
+
+def close() -> None:
+    """Close the shared sync client."""
+
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
@@ -0,0 +1,320 @@
+# backend/app/core/cache.py
+"""Bounded LRU + TTL cache with an optional SQLite tier.
+
+Shared by the LLM decision cache (``app.core.ai.deepseek_agent``) and the
+generation artifact cache (``app.core.generation.artifact_cache``).
+
+Entries are JSON-serialisable values keyed by a short string. The in-memory
+tier evicts least-recently-used entries once ``max_size`` is reached and
+drops entries older than ``ttl`` seconds on read (``ttl <= 0`` never
+expires). An optional SQLite file (``disk_path``) acts as a second tier so a
+warm cache survives restarts: memory misses fall through to disk and are
+promoted back on hit (through ``decode`` when given, e.g. to freeze the
+JSON-loaded value).
+
+The disk tier is write-behind: ``put`` only queues the row and a background
+thread commits batches, so no fsync happens on the request path or under the
+cache lock. Queued rows stay readable until their batch has committed and are
+kept for the next flush if a commit fails. ``disk_max_rows`` caps the file:
+after each flush the least-recently-used rows beyond the cap are deleted
+(recency is the last put or disk hit).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CACHE_FLUSH_INTERVAL = float(os.getenv("DRIFT_CACHE_FLUSH_INTERVAL", "1.0"))
+CACHE_FLUSH_BATCH = int(os.getenv("DRIFT_CACHE_FLUSH_BATCH", "64"))
+
+# 待写盘的一行：(stored_at, json)；None 表示待删除
+_Row = Optional[Tuple[float, str]]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_size: int = 512,
+        ttl: float = 900.0,
+        disk_path: Optional[str] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+        disk_max_rows: int = 0,
+        flush_interval: float = CACHE_FLUSH_INTERVAL,
+        batch_size: int = CACHE_FLUSH_BATCH,
+    ) -> None:
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self.disk_max_rows = max(0, int(disk_max_rows))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.batch_size = max(1, int(batch_size))
+        self._decode = decode
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, _Row] = {}
+        self._touched: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                stored_at, value = item
+                if self._fresh(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        # 磁盘读不占缓存锁
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is not None:
+                self._insert(key, value, now)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        if not key or value is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._insert(key, value, now)
+        self._disk_put(key, value, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._db is None:
+            return
+        with self._db_lock:
+            with self._pending_lock:
+                self._pending.clear()
+                self._touched.clear()
+            with self._db:
+                self._db.execute("DELETE FROM responses")
+
+    def flush(self) -> None:
+        """Commit queued disk writes; rows stay queued (and readable) until the commit succeeds."""
+
+        if self._db is None:
+            return
+        with self._db_lock:
+            with self._pending_lock:
+                if not self._pending and not self._touched:
+                    return
+                batch = dict(self._pending)
+                touched = dict(self._touched)
+            upserts = [(key, row[0], row[0], row[1]) for key, row in batch.items() if row is not None]
+            deletes = [(key,) for key, row in batch.items() if row is None]
+            touches = [(used_at, key) for key, used_at in touched.items() if key not in batch]
+            with self._db:
+                if upserts:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO responses (key, stored_at, used_at, value) VALUES (?, ?, ?, ?)",
+                        upserts,
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM responses WHERE key = ?", deletes)
+                if touches:
+                    self._db.executemany("UPDATE responses SET used_at = ? WHERE key = ?", touches)
+                pruned = self._prune_locked()
+            with self._pending_lock:
+                # 只移除已落盘的值；刷盘期间被覆盖的新值留给下一批
+                for key, row in batch.items():
+                    if key in self._pending and self._pending[key] is row:
+                        del self._pending[key]
+                for key, used_at in touched.items():
+                    if self._touched.get(key) == used_at:
+                        del self._touched[key]
+        if pruned:
+            with self._lock:
+                self.disk_evictions += pruned
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._wake.set()
+            self._writer.join(timeout=5)
+        if self._db is None:
+            return
+        try:
+            self.flush()
+        except sqlite3.Error as exc:
+            print(f"[response_cache] final flush failed: {exc}")
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk": self._db is not None,
+                "disk_hits": self.disk_hits,
+                "disk_pending": pending,
+                "disk_max_rows": self.disk_max_rows,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _fresh(self, stored_at: float, now: float) -> bool:
+        return self.ttl <= 0 or (now - stored_at) < self.ttl
+
+    def _insert(self, key: str, value: Any, now: float) -> None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self._entries[key] = (now, value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(responses)")}
+            if "used_at" not in columns:
+                # 旧文件没有 used_at：以写入时间作为初始访问时间
+                db.execute("ALTER TABLE responses ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                db.execute("UPDATE responses SET used_at = stored_at")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+            if self.ttl > 0:
+                db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,))
+            db.commit()
+            self._db = db
+        except (OSError, sqlite3.Error) as exc:
+            print(f"[response_cache] disk tier disabled ({path}): {exc}")
+            self._db = None
+            return
+        with self._db_lock:
+            self._prune_locked()
+            self._db.commit()
+        self._writer = threading.Thread(target=self._run, name="response-cache-writer", daemon=True)
+        self._writer.start()
+        # 进程退出前把 write-behind 队列刷盘
+        atexit.register(self.close)
+
+    def _prune_locked(self) -> int:
+        # 调用方已持有 self._db_lock
+        if self.disk_max_rows <= 0:
+            return 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.disk_max_rows
+        if excess <= 0:
+            return 0
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at ASC LIMIT ?)",
+            (excess,),
+        )
+        return excess
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        if self._db is None:
+            return None
+        try:
+            with self._pending_lock:
+                queued = key in self._pending
+                row = self._pending.get(key)
+            if not queued:
+                with self._db_lock:
+                    if self._db is None:
+                        return None
+                    row = self._db.execute(
+                        "SELECT stored_at, value FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+            if row is None:
+                return None
+            stored_at, raw = row
+            if not self._fresh(stored_at, now):
+                self._queue(key, None)
+                with self._lock:
+                    self.expirations += 1
+                return None
+            value = json.loads(raw)
+            if not queued:
+                with self._pending_lock:
+                    self._touched[key] = now
+            return self._decode(value) if self._decode is not None else value
+        except (sqlite3.Error, ValueError) as exc:
+            print(f"[response_cache] disk read failed: {exc}")
+            return None
+
+    def _disk_put(self, key: str, value: Any, now: float) -> None:
+        if self._db is None:
+            return
+        try:
+            raw = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as exc:
+            print(f"[response_cache] disk write failed: {exc}")
+            return
+        self._queue(key, (now, raw))
+
+    def _queue(self, key: str, row: _Row) -> None:
+        with self._pending_lock:
+            self._pending[key] = row
+            self._touched.pop(key, None)
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"[response_cache] flush failed: {exc}")
@@ -10,6 +10,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, Iterable, List, Optional
 
+from app.core.events.keyword_matcher import KeywordMatcher
+from app.core.world.spatial_index import UniformGrid
+
 EventCallback = Callable[[Dict[str, Any]], None]
 
 
@@ -18,6 +21,7 @@ class _RegisteredEvent:
     event_type: str
     config: Dict[str, Any]
     callback: Optional[EventCallback]
+    seq: int = 0
 
 
 class EventManager:
@@ -25,8 +29,16 @@ class EventManager:
 
     SUPPORTED_TYPES = {"keyword", "near", "interact", "item_use"}
 
+    NEAR_CELL_SIZE = 16.0
+
     def __init__(self) -> None:
         self._registry: Dict[str, Dict[str, _RegisteredEvent]] = {}
+        self._seq = 0
+        # 固定坐标的 near 事件进入 per-player 网格索引，keyword 事件编译进
+        # per-player 关键词自动机，其余事件逐个判定
+        self._near_grids: Dict[str, UniformGrid] = {}
+        self._keyword_matchers: Dict[str, KeywordMatcher] = {}
+        self._scan_ids: Dict[str, List[str]] = {}
 
     # ------------------------------------------------------------------
     # Registration lifecycle
@@ -50,7 +62,9 @@ class EventManager:
         }
 
         registry = self._registry.setdefault(player_id, {})
-        registry[event_id] = _RegisteredEvent(event_type, normalized, callback)
+        self._seq += 1
+        registry[event_id] = _RegisteredEvent(event_type, normalized, callback, self._seq)
+        self._reindex(player_id)
 
     def unregister(self, player_id: str, event_id: Optional[str] = None) -> None:
         """Remove a specific event or all events for a player."""
@@ -60,6 +74,7 @@ class EventManager:
 
         if event_id is None:
             self._registry.pop(player_id, None)
+            self._reindex(player_id)
             return
 
         events = self._registry.get(player_id)
@@ -69,6 +84,52 @@ class EventManager:
         events.pop(event_id, None)
         if not events:
             self._registry.pop(player_id, None)
+        self._reindex(player_id)
+
+    def _reindex(self, player_id: str) -> None:
+        events = self._registry.get(player_id)
+        if not events:
+            self._near_grids.pop(player_id, None)
+            self._keyword_matchers.pop(player_id, None)
+            self._scan_ids.pop(player_id, None)
+            return
+
+        grid = UniformGrid(self.NEAR_CELL_SIZE)
+        keywords: Dict[str, List[str]] = {}
+        scan: List[str] = []
+        for event_id, entry in events.items():
+            if entry.event_type == "keyword":
+                words = [w for w in self._coerce_list(entry.config.get("words") or entry.config.get("keyword")) if w]
+                if words:
+                    keywords[event_id] = words
+                continue
+            anchor = self._static_near_anchor(entry)
+            if anchor is None:
+                scan.append(event_id)
+            else:
+                grid.insert(event_id, *anchor)
+        self._scan_ids[player_id] = scan
+        if len(grid):
+            self._near_grids[player_id] = grid
+        else:
+            self._near_grids.pop(player_id, None)
+        if keywords:
+            self._keyword_matchers[player_id] = KeywordMatcher(keywords)
+        else:
+            self._keyword_matchers.pop(player_id, None)
+
+    def _static_near_anchor(self, entry: _RegisteredEvent) -> Optional[tuple]:
+        """``(x, z, radius)`` for near events bound to fixed coordinates, else ``None``."""
+
+        if entry.event_type != "near" or isinstance(entry.config.get("entity"), str):
+            return None
+        x = self._coerce_number(entry.config.get("x"))
+        y = self._coerce_number(entry.config.get("y"))
+        z = self._coerce_number(entry.config.get("z"))
+        if x is None or y is None or z is None:
+            return None
+        radius = self._coerce_number(entry.config.get("radius"), default=2.0) or 2.0
+        return (x, z, float(radius))
 
     # ------------------------------------------------------------------
     # Evaluation
@@ -89,7 +150,24 @@ class EventManager:
         action = action or {}
         world_state = world_state or {}
 
-        for event_id, entry in list(events.items()):
+        candidates = list(self._scan_ids.get(player_id, []))
+        grid = self._near_grids.get(player_id)
+        if grid is not None:
+            variables = world_state.get("variables") or {}
+            px = self._coerce_number(variables.get("x"))
+            pz = self._coerce_number(variables.get("z"))
+            if px is not None and pz is not None:
+                candidates.extend(grid.candidates(px, pz))
+        matcher = self._keyword_matchers.get(player_id)
+        if matcher is not None:
+            text = action.get("say") or action.get("text")
+            if isinstance(text, str) and text.strip():
+                candidates.extend(matcher.match(text))
+
+        selected = [(event_id, events[event_id]) for event_id in candidates if event_id in events]
+        selected.sort(key=lambda item: item[1].seq)
+
+        for event_id, entry in selected:
             if self._matches(entry, action, world_state):
                 triggered.append(event_id)
                 if entry.callback:
@@ -0,0 +1,101 @@
+# backend/app/core/events/keyword_matcher.py
+"""Aho-Corasick multi-pattern matcher for keyword triggers.
+
+Beat triggers (``keyword:a|b|c``), EventManager keyword events and tutorial
+``trigger_keywords`` all ask the same question: which of many substrings occur
+in this chat line? Compiling every pattern into one automaton answers it in a
+single pass over the lowered text, independent of how many beats and synonyms
+a level defines.
+
+Matching is case-insensitive substring matching, identical to the previous
+``value.lower() in text.lower()`` checks.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Generic, Hashable, Iterable, List, Mapping, Set, Tuple, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class KeywordMatcher(Generic[T]):
+    """Compiled automaton mapping matched patterns to caller-supplied tags."""
+
+    __slots__ = ("_goto", "_fail", "_out", "_patterns")
+
+    def __init__(self, patterns: Mapping[T, Iterable[str]] | None = None) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[T]] = [set()]
+        self._patterns = 0
+        if patterns:
+            for tag, words in patterns.items():
+                for word in words:
+                    self._add(word, tag)
+        self._build()
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[T, str]]) -> "KeywordMatcher[T]":
+        grouped: Dict[T, List[str]] = {}
+        for tag, word in pairs:
+            grouped.setdefault(tag, []).append(word)
+        return cls(grouped)
+
+    def __len__(self) -> int:
+        return self._patterns
+
+    def __bool__(self) -> bool:
+        return self._patterns > 0
+
+    def _add(self, word: str, tag: T) -> None:
+        token = str(word or "").lower()
+        if not token:
+            return
+        node = 0
+        for ch in token:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            node = nxt
+        self._out[node].add(tag)
+        self._patterns += 1
+
+    def _build(self) -> None:
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                # 合并后缀模式的输出，匹配时无需再沿 fail 链回溯
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def match(self, text: str) -> Set[T]:
+        """Tags of every pattern occurring in ``text`` (case-insensitive)."""
+
+        found: Set[T] = set()
+        if not text or not self._patterns:
+            return found
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
@@ -2,7 +2,11 @@ from __future__ import annotations
 
 import hashlib
 import json
-from typing import Any
+import struct
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.core.executor.fill_regions_v1 import MAX_FILL_VOLUME
+from app.core.patch.block_array import BlockArray
 
 
 def stable_hash_v2(value: Any) -> str:
@@ -10,7 +14,14 @@ def stable_hash_v2(value: Any) -> str:
     return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
-def canonicalize_block_ops(block_ops: list[dict]) -> list[dict]:
+def canonicalize_block_ops(block_ops: list[dict] | BlockArray) -> list[dict]:
+    if isinstance(block_ops, BlockArray):
+        return [
+            {"type": "setblock", "x": x, "y": y, "z": z, "block": block}
+            for x, y, z, block in block_ops.sorted()
+            if block
+        ]
+
     normalized: list[dict] = []
     for entry in block_ops:
         if not isinstance(entry, dict):
@@ -36,6 +47,40 @@ def canonicalize_block_ops(block_ops: list[dict]) -> list[dict]:
     return normalized
 
 
+def canonicalize_fill_ops(fill_ops: list[dict] | None) -> list[dict]:
+    normalized: list[dict] = []
+    for entry in fill_ops or []:
+        if not isinstance(entry, dict):
+            continue
+        coords = [entry.get(key) for key in ("x", "y", "z", "x2", "y2", "z2")]
+        block = entry.get("block")
+        if not all(isinstance(value, int) for value in coords):
+            continue
+        if not isinstance(block, str) or not block:
+            continue
+        x, y, z, x2, y2, z2 = coords
+        # 角点规范化为 (min, max)，与书写顺序无关
+        x, x2 = min(x, x2), max(x, x2)
+        y, y2 = min(y, y2), max(y, y2)
+        z, z2 = min(z, z2), max(z, z2)
+        if (x2 - x + 1) * (y2 - y + 1) * (z2 - z + 1) > MAX_FILL_VOLUME:
+            continue
+        normalized.append(
+            {
+                "type": "fill",
+                "x": x,
+                "y": y,
+                "z": z,
+                "x2": x2,
+                "y2": y2,
+                "z2": z2,
+                "block": block,
+            }
+        )
+    normalized.sort(key=lambda item: (item["x"], item["y"], item["z"], item["x2"], item["y2"], item["z2"], item["block"]))
+    return normalized
+
+
 def canonicalize_entity_ops(entity_ops: list[dict]) -> list[dict]:
     normalized: list[dict] = []
     for entry in entity_ops:
@@ -96,22 +141,231 @@ def canonicalize_entity_ops(entity_ops: list[dict]) -> list[dict]:
     return normalized
 
 
-def canonicalize_final_commands(block_ops: list[dict], entity_ops: list[dict]) -> list[dict]:
+_COMMAND_ORDER = {"setblock": 0, "fill": 1}
+
+
+def command_sort_key(item: dict) -> tuple:
+    """Structural part of the final command order: ``(type rank, x, y, z)``."""
+
+    return (
+        _COMMAND_ORDER.get(item.get("type"), 2),
+        int(item.get("x", 0)),
+        int(item.get("y", 0)),
+        int(item.get("z", 0)),
+    )
+
+
+def _sort_commands(commands: List[dict]) -> None:
+    # 结构键排序不需要序列化；只有 (type, x, y, z) 完全相同的少数命令才按
+    # stable_hash_v2 定序，结果与原先"每条命令都算哈希"的排序完全一致
+    keys = [command_sort_key(item) for item in commands]
+    order = sorted(range(len(commands)), key=keys.__getitem__)
+    ordered = [commands[i] for i in order]
+    start = 0
+    count = len(order)
+    while start < count:
+        key = keys[order[start]]
+        end = start + 1
+        while end < count and keys[order[end]] == key:
+            end += 1
+        if end - start > 1:
+            ordered[start:end] = sorted(ordered[start:end], key=stable_hash_v2)
+        start = end
+    commands[:] = ordered
+
+
+def canonicalize_final_commands(
+    block_ops: list[dict],
+    entity_ops: list[dict],
+    fill_ops: list[dict] | None = None,
+) -> list[dict]:
     canonical_blocks = canonicalize_block_ops(block_ops)
+    canonical_fills = canonicalize_fill_ops(fill_ops)
     canonical_entities = canonicalize_entity_ops(entity_ops)
 
-    merged = [*canonical_blocks, *canonical_entities]
-    merged.sort(
-        key=lambda item: (
-            0 if item.get("type") == "setblock" else 1,
-            int(item.get("x", 0)),
-            int(item.get("y", 0)),
-            int(item.get("z", 0)),
-            stable_hash_v2(item),
-        )
-    )
+    # setblock → fill → summon；不含 fill 的 payload 排序与哈希保持不变
+    merged = [*canonical_blocks, *canonical_fills, *canonical_entities]
+    _sort_commands(merged)
     return merged
 
 
-def final_commands_hash_v2(block_ops: list[dict], entity_ops: list[dict]) -> str:
-    return stable_hash_v2(canonicalize_final_commands(block_ops, entity_ops))
+# ---------------------------------------------------------------- hashing
+#
+# final_commands 哈希有两种编码：
+#   "v2"     与 stable_hash_v2(commands) 逐字节一致的 JSON（兼容模式，payload v2 使用）
+#   "binary" 规范二进制编码：每条命令一个定长头 + 长度前缀 UTF-8 字符串
+# 两者都按命令流式写入 sha256，不构造整份序列化文本。
+
+COMMANDS_HASH_MODES = ("v2", "binary")
+
+_SETBLOCK_KEYS = frozenset({"type", "x", "y", "z", "block"})
+_FILL_KEYS = frozenset({"type", "x", "y", "z", "x2", "y2", "z2", "block"})
+_SUMMON_KEYS = frozenset(
+    {"type", "entity_type", "x", "y", "z", "name", "profession", "no_ai", "silent", "rotation"}
+)
+
+_BINARY_MAGIC = b"DCMD1\n"
+_TAG_SETBLOCK = 1
+_TAG_FILL = 2
+_TAG_SUMMON = 3
+_TAG_OTHER = 0xFF
+_SETBLOCK_STRUCT = struct.Struct(">Bqqq")
+_FILL_STRUCT = struct.Struct(">Bqqqqqq")
+_SUMMON_STRUCT = struct.Struct(">BqqqqBB")
+_STRING_LENGTH = struct.Struct(">I")
+
+
+def _is_int(value: Any) -> bool:
+    return type(value) is int
+
+
+def _json_text(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _binary_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _STRING_LENGTH.pack(len(data)) + data
+
+
+class CommandsHasher:
+    """Incremental sha256 over a final command list.
+
+    ``update`` takes one command at a time, so hashing is a single pass over
+    the list with no per-command ``json.dumps(sort_keys=True)``: the known
+    command shapes (setblock / fill / summon with exactly their canonical
+    keys) are encoded from fixed templates, anything else falls back to the
+    generic encoding. In ``"v2"`` mode ``hexdigest()`` equals
+    ``stable_hash_v2(commands)``.
+    """
+
+    __slots__ = ("mode", "_digest", "_strings", "_chunk", "_count")
+
+    def __init__(self, mode: str = "v2") -> None:
+        if mode not in COMMANDS_HASH_MODES:
+            raise ValueError(f"unknown commands hash mode: {mode!r}")
+        self.mode = mode
+        self._digest = hashlib.sha256(b"[" if mode == "v2" else _BINARY_MAGIC)
+        self._strings: Dict[str, Any] = {}
+        self._chunk: List[Any] = []
+        self._count = 0
+
+    def _string(self, value: str) -> Any:
+        encoded = self._strings.get(value)
+        if encoded is None:
+            encoded = _json_text(value) if self.mode == "v2" else _binary_string(value)
+            self._strings[value] = encoded
+        return encoded
+
+    def _setblock_v2(self, x: int, y: int, z: int, block: str) -> str:
+        return f'{{"block":{self._string(block)},"type":"setblock","x":{x},"y":{y},"z":{z}}}'
+
+    def _setblock_binary(self, x: int, y: int, z: int, block: str) -> bytes:
+        return _SETBLOCK_STRUCT.pack(_TAG_SETBLOCK, x, y, z) + self._string(block)
+
+    def _encode_v2(self, command: Any) -> str:
+        if isinstance(command, dict):
+            kind = command.get("type")
+            keys = command.keys()
+            if kind == "setblock" and keys == _SETBLOCK_KEYS:
+                x, y, z, block = command["x"], command["y"], command["z"], command["block"]
+                if type(x) is int and type(y) is int and type(z) is int and isinstance(block, str):
+                    return self._setblock_v2(x, y, z, block)
+            elif kind == "fill" and keys == _FILL_KEYS:
+                coords = (command["x"], command["x2"], command["y"], command["y2"], command["z"], command["z2"])
+                block = command["block"]
+                if all(map(_is_int, coords)) and isinstance(block, str):
+                    return (
+                        '{"block":%s,"type":"fill","x":%d,"x2":%d,"y":%d,"y2":%d,"z":%d,"z2":%d}'
+                        % ((self._string(block),) + coords)
+                    )
+        return _json_text(command)
+
+    def _encode_binary(self, command: Any) -> bytes:
+        try:
+            encoded = self._encode_binary_fixed(command)
+        except struct.error:
+            # 坐标超出 int64：走通用编码
+            encoded = None
+        if encoded is None:
+            return bytes((_TAG_OTHER,)) + _binary_string(_json_text(command))
+        return encoded
+
+    def _encode_binary_fixed(self, command: Any) -> bytes | None:
+        if isinstance(command, dict):
+            kind = command.get("type")
+            keys = command.keys()
+            if kind == "setblock" and keys == _SETBLOCK_KEYS:
+                x, y, z, block = command["x"], command["y"], command["z"], command["block"]
+                if type(x) is int and type(y) is int and type(z) is int and isinstance(block, str):
+                    return self._setblock_binary(x, y, z, block)
+            elif kind == "fill" and keys == _FILL_KEYS:
+                coords = (command["x"], command["y"], command["z"], command["x2"], command["y2"], command["z2"])
+                block = command["block"]
+                if all(map(_is_int, coords)) and isinstance(block, str):
+                    return _FILL_STRUCT.pack(_TAG_FILL, *coords) + self._string(block)
+            elif kind == "summon" and keys == _SUMMON_KEYS:
+                coords = (command["x"], command["y"], command["z"], command["rotation"])
+                flags = (command["no_ai"], command["silent"])
+                strings = (command["entity_type"], command["name"], command["profession"])
+                if all(map(_is_int, coords)) and all(isinstance(flag, bool) for flag in flags) and all(
+                    isinstance(text, str) for text in strings
+                ):
+                    return _SUMMON_STRUCT.pack(_TAG_SUMMON, *coords, *flags) + b"".join(map(self._string, strings))
+        return None
+
+    def update(self, command: Any) -> None:
+        if self.mode == "v2":
+            self._chunk.append(self._encode_v2(command))
+        else:
+            self._chunk.append(self._encode_binary(command))
+        self._count += 1
+        if len(self._chunk) >= 4096:
+            self._flush()
+
+    def update_setblocks(self, rows: Iterable[Tuple[int, int, int, str]]) -> None:
+        """Hash ``setblock`` commands given as ``(x, y, z, block)`` rows, without building dicts."""
+
+        encode = self._setblock_v2 if self.mode == "v2" else self._setblock_binary
+        for x, y, z, block in rows:
+            self._chunk.append(encode(x, y, z, block))
+            self._count += 1
+            if len(self._chunk) >= 4096:
+                self._flush()
+
+    def update_many(self, commands: Iterable[Any]) -> "CommandsHasher":
+        for command in commands:
+            self.update(command)
+        return self
+
+    def _flush(self) -> None:
+        if not self._chunk:
+            return
+        if self.mode == "v2":
+            # 第一块之前无逗号，之后每块都以逗号与上一块衔接
+            text = ",".join(self._chunk)
+            prefix = "," if self._count > len(self._chunk) else ""
+            self._digest.update((prefix + text).encode("utf-8"))
+        else:
+            self._digest.update(b"".join(self._chunk))
+        self._chunk = []
+
+    def hexdigest(self) -> str:
+        self._flush()
+        digest = self._digest.copy()
+        digest.update(b"]" if self.mode == "v2" else struct.pack(">Q", self._count))
+        return digest.hexdigest()
+
+
+def hash_commands(commands: Iterable[Any], *, mode: str = "v2") -> str:
+    """Hash an already canonical command list (``mode="v2"``: same as ``stable_hash_v2``)."""
+
+    return CommandsHasher(mode).update_many(commands).hexdigest()
+
+
+def final_commands_hash_v2(
+    block_ops: list[dict],
+    entity_ops: list[dict],
+    fill_ops: list[dict] | None = None,
+) -> str:
+    return hash_commands(canonicalize_final_commands(block_ops, entity_ops, fill_ops))
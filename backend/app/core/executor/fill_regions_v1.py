@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+# 与原版 /fill 单次上限一致
+MAX_FILL_VOLUME = 32768
+
+
+def fill_volume(op: dict) -> int:
+    return (op["x2"] - op["x"] + 1) * (op["y2"] - op["y"] + 1) * (op["z2"] - op["z"] + 1)
+
+
+def iter_fill_cells(op: dict) -> Iterator[tuple[int, int, int]]:
+    for x in range(op["x"], op["x2"] + 1):
+        for y in range(op["y"], op["y2"] + 1):
+            for z in range(op["z"], op["z2"] + 1):
+                yield x, y, z
+
+
+def merge_fill_regions(block_ops: Iterable[dict], *, max_volume: int = MAX_FILL_VOLUME) -> tuple[list[dict], list[dict]]:
+    """Greedily cover same-material blocks with axis-aligned boxes.
+
+    Returns ``(setblock_ops, fill_ops)``: every box of two or more blocks
+    becomes ``{"type": "fill", x, y, z, x2, y2, z2, block}`` (inclusive
+    corners, ``x <= x2`` …), single blocks stay ``setblock``. Boxes never
+    overlap, so applying the result in any order yields exactly the input
+    world. When a coordinate appears twice the block that sorts last wins,
+    matching ``replay_payload_v2`` for setblock-only payloads.
+
+    Cells are visited in ``(x, y, z)`` order and each box grows along z, then
+    y, then x, so the output only depends on the set of input blocks.
+    """
+
+    cells: dict[tuple[int, int, int], str] = {}
+    for op in block_ops:
+        key = (op["x"], op["y"], op["z"])
+        block = op["block"]
+        existing = cells.get(key)
+        cells[key] = block if existing is None or block > existing else existing
+
+    covered: set[tuple[int, int, int]] = set()
+
+    def free(x: int, y: int, z: int, block: str) -> bool:
+        key = (x, y, z)
+        return key not in covered and cells.get(key) == block
+
+    setblocks: list[dict] = []
+    fills: list[dict] = []
+    for key in sorted(cells):
+        if key in covered:
+            continue
+        x, y, z = key
+        block = cells[key]
+
+        z2 = z
+        while z2 - z + 2 <= max_volume and free(x, y, z2 + 1, block):
+            z2 += 1
+        depth = z2 - z + 1
+
+        y2 = y
+        while (y2 - y + 2) * depth <= max_volume and all(free(x, y2 + 1, cz, block) for cz in range(z, z2 + 1)):
+            y2 += 1
+        slab = (y2 - y + 1) * depth
+
+        x2 = x
+        while (x2 - x + 2) * slab <= max_volume and all(
+            free(x2 + 1, cy, cz, block) for cy in range(y, y2 + 1) for cz in range(z, z2 + 1)
+        ):
+            x2 += 1
+
+        if x2 == x and y2 == y and z2 == z:
+            covered.add(key)
+            setblocks.append({"type": "setblock", "x": x, "y": y, "z": z, "block": block})
+            continue
+        region = {"type": "fill", "x": x, "y": y, "z": z, "x2": x2, "y2": y2, "z2": z2, "block": block}
+        covered.update(iter_fill_cells(region))
+        fills.append(region)
+
+    return setblocks, fills
@@ -0,0 +1,137 @@
+"""Chunk-ordered NDJSON streaming of a ``plugin_payload_v2``.
+
+The stream is one JSON object per line::
+
+    {"kind": "header", ...payload metadata without "commands", "chunk_count": n}
+    {"kind": "chunk", "seq": 0, "cx": .., "cz": .., "commands": [...],
+     "chunk_hash": .., "running_hash": ..}
+    ...
+    {"kind": "trailer", "chunk_count": n, "command_count": m,
+     "running_hash": .., "final_commands_hash_v2": ..}
+
+Commands are grouped by the 16×16 chunk of their ``(x, z)`` (a fill by its
+minimum corner) and chunks are ordered by ring distance from the origin
+chunk, then ``(cx, cz)``, so the blocks around the player arrive first.
+Inside a group the commands keep their canonical payload order.
+
+``chunk_hash`` is ``hash_commands(group commands)``;
+``running_hash = sha256(previous running_hash bytes + chunk_hash bytes)``
+starting from 32 zero bytes, so a client can acknowledge every prefix of
+the stream. The trailer repeats the payload's ``final_commands_hash_v2``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from app.core.executor.canonical_v2 import canonicalize_final_commands, hash_commands
+from app.core.executor.replay_v2 import _split_commands
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+_ZERO_HASH = "0" * 64
+
+
+def chain_hash(running_hash: str, chunk_hash: str) -> str:
+    return hashlib.sha256(bytes.fromhex(running_hash) + bytes.fromhex(chunk_hash)).hexdigest()
+
+
+def group_commands_by_chunk(commands: Iterable[dict], origin: Dict[str, Any] | None = None) -> List[Tuple[int, int, List[dict]]]:
+    """``[(cx, cz, commands), ...]`` in streaming order."""
+
+    groups: Dict[Tuple[int, int], List[dict]] = {}
+    for command in commands:
+        key = (int(command.get("x", 0)) >> 4, int(command.get("z", 0)) >> 4)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+        group.append(command)
+
+    origin = origin or {}
+    home_x = int(origin.get("base_x", 0)) >> 4
+    home_z = int(origin.get("base_z", 0)) >> 4
+    order = sorted(groups, key=lambda key: (max(abs(key[0] - home_x), abs(key[1] - home_z)), key[0], key[1]))
+    return [(cx, cz, groups[(cx, cz)]) for cx, cz in order]
+
+
+def iter_payload_stream(payload: dict) -> Iterator[dict]:
+    commands = payload.get("commands") or []
+    groups = group_commands_by_chunk(commands, payload.get("origin"))
+
+    header = {key: value for key, value in payload.items() if key != "commands"}
+    header.update({"kind": "header", "chunk_count": len(groups), "command_count": len(commands)})
+    yield header
+
+    running_hash = _ZERO_HASH
+    for seq, (cx, cz, group) in enumerate(groups):
+        chunk_hash = hash_commands(group)
+        running_hash = chain_hash(running_hash, chunk_hash)
+        yield {
+            "kind": "chunk",
+            "seq": seq,
+            "cx": cx,
+            "cz": cz,
+            "commands": group,
+            "chunk_hash": chunk_hash,
+            "running_hash": running_hash,
+        }
+
+    hash_data = payload.get("hash") or {}
+    yield {
+        "kind": "trailer",
+        "chunk_count": len(groups),
+        "command_count": len(commands),
+        "running_hash": running_hash,
+        "final_commands_hash_v2": hash_data.get("final_commands") or payload.get("final_commands_hash_v2", ""),
+    }
+
+
+def iter_payload_ndjson(payload: dict) -> Iterator[bytes]:
+    for item in iter_payload_stream(payload):
+        yield (json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def verify_payload_stream(items: Iterable[Any]) -> dict:
+    """Check a received stream (dicts or NDJSON lines) the way a client would.
+
+    Verifies every ``chunk_hash`` / ``running_hash`` in order and that the
+    reassembled commands hash to the trailer's ``final_commands_hash_v2``.
+    """
+
+    running_hash = _ZERO_HASH
+    commands: List[dict] = []
+    header: dict | None = None
+    chunks = 0
+    for item in items:
+        if isinstance(item, (bytes, str)):
+            if not item.strip():
+                continue
+            item = json.loads(item)
+        kind = item.get("kind")
+        if kind == "header":
+            header = item
+        elif kind == "chunk":
+            if item.get("seq") != chunks or hash_commands(item.get("commands") or []) != item.get("chunk_hash"):
+                return {"status": "REJECTED", "failure_code": "CHUNK_HASH_MISMATCH", "seq": chunks}
+            running_hash = chain_hash(running_hash, item["chunk_hash"])
+            if running_hash != item.get("running_hash"):
+                return {"status": "REJECTED", "failure_code": "RUNNING_HASH_MISMATCH", "seq": chunks}
+            commands.extend(item.get("commands") or [])
+            chunks += 1
+        elif kind == "trailer":
+            if header is None:
+                return {"status": "REJECTED", "failure_code": "MISSING_HEADER"}
+            if item.get("running_hash") != running_hash or item.get("chunk_count") != chunks:
+                return {"status": "REJECTED", "failure_code": "RUNNING_HASH_MISMATCH", "seq": chunks}
+            actual_hash = hash_commands(canonicalize_final_commands(*_split_commands(commands)))
+            if actual_hash != item.get("final_commands_hash_v2"):
+                return {"status": "REJECTED", "failure_code": "FINAL_COMMANDS_HASH_MISMATCH"}
+            return {
+                "status": "SUCCESS",
+                "failure_code": "NONE",
+                "chunk_count": chunks,
+                "command_count": len(commands),
+                "final_commands_hash_v2": actual_hash,
+            }
+    return {"status": "REJECTED", "failure_code": "MISSING_TRAILER"}
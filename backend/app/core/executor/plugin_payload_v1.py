@@ -4,6 +4,7 @@ import hashlib
 import json
 from typing import Any, Dict, List
 
+from app.core.executor.fill_regions_v1 import merge_fill_regions
 from app.core.patch.patch_validate_v1 import validate_blocks
 
 
@@ -68,7 +69,54 @@ def _sorted_blocks(blocks: list[dict]) -> List[Dict[str, Any]]:
     return normalized
 
 
-def build_plugin_payload_v1(result: dict, *, player_id: str, origin: dict | None = None) -> dict:
+def _offset_commands(blocks: list[dict], origin: dict, fill_regions: bool) -> List[Dict[str, Any]]:
+    base_x, base_y, base_z = origin["base_x"], origin["base_y"], origin["base_z"]
+    if not fill_regions:
+        return [
+            {
+                "op": "setblock",
+                "x": block["x"] + base_x,
+                "y": block["y"] + base_y,
+                "z": block["z"] + base_z,
+                "block": block["block"],
+            }
+            for block in blocks
+        ]
+
+    setblocks, fills = merge_fill_regions(blocks)
+    commands: List[Dict[str, Any]] = [
+        {
+            "op": "setblock",
+            "x": block["x"] + base_x,
+            "y": block["y"] + base_y,
+            "z": block["z"] + base_z,
+            "block": block["block"],
+        }
+        for block in setblocks
+    ]
+    commands.extend(
+        {
+            "op": "fill",
+            "x": region["x"] + base_x,
+            "y": region["y"] + base_y,
+            "z": region["z"] + base_z,
+            "x2": region["x2"] + base_x,
+            "y2": region["y2"] + base_y,
+            "z2": region["z2"] + base_z,
+            "block": region["block"],
+        }
+        for region in fills
+    )
+    return commands
+
+
+def build_plugin_payload_v1(
+    result: dict,
+    *,
+    player_id: str,
+    origin: dict | None = None,
+    fill_regions: bool = False,
+) -> dict:
     if not isinstance(result, dict):
         raise ValueError("result must be dict")
     if result.get("status") != "SUCCESS":
@@ -86,16 +134,7 @@ def build_plugin_payload_v1(result: dict, *, player_id: str, origin: dict | None
     if validation.get("status") != "VALID":
         raise ValueError(f"merged blocks invalid: {validation.get('failure_code', 'INVALID_BLOCKS')}")
 
-    commands = [
-        {
-            "op": "setblock",
-            "x": block["x"] + normalized_origin["base_x"],
-            "y": block["y"] + normalized_origin["base_y"],
-            "z": block["z"] + normalized_origin["base_z"],
-            "block": block["block"],
-        }
-        for block in merged_blocks_sorted
-    ]
+    commands = _offset_commands(merged_blocks_sorted, normalized_origin, fill_regions)
 
     scene_spec = result.get("scene_spec") or {}
     structure_patch = result.get("structure_patch") or {}
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
 
 from app.core.executor.canonical_v2 import (
     canonicalize_block_ops,
     canonicalize_entity_ops,
     canonicalize_final_commands,
-    final_commands_hash_v2,
+    hash_commands,
     stable_hash_v2,
 )
+from app.core.executor.fill_regions_v1 import merge_fill_regions
+from app.core.generation.artifact_cache import artifact_cache, artifact_key, current_lookup_stats
 from app.core.mapping.projection_rule_registry import DEFAULT_RULE_VERSION, get_projection_rule
+from app.core.patch.block_array import BlockArray
 from app.core.patch.patch_validate_v1 import validate_blocks
+from app.core.patch.world_patch import merge, thaw
 
 
 ENGINE_VERSION = "engine_v2_1"
@@ -164,22 +167,16 @@ def _extract_entity_ops_from_merged(
     return block_only, canonicalize_entity_ops(entity_ops), trace
 
 
-def build_plugin_payload_v2_with_trace(
-    result: dict,
+def _build_commands(
+    merged: dict,
     *,
-    player_id: str,
-    origin: dict | None = None,
-    strict_mode: bool = True,
-) -> tuple[dict, dict]:
-    if not isinstance(result, dict):
-        raise ValueError("result must be dict")
-    if result.get("status") != "SUCCESS":
-        raise ValueError("compose result must be SUCCESS")
-    if not isinstance(player_id, str) or not player_id.strip():
-        raise ValueError("player_id must be non-empty string")
+    rule_version: str,
+    normalized_origin: dict,
+    strict_mode: bool,
+    fill_regions: bool,
+) -> dict:
+    """Player-independent part of the payload: final commands, their hash and counts."""
 
-    normalized_origin = _normalize_origin(origin)
-    merged = result.get("merged") or {}
     merged_blocks = merged.get("blocks") or []
 
     validation = validate_blocks(merged_blocks)
@@ -193,40 +190,53 @@ def build_plugin_payload_v2_with_trace(
             },
         )
 
-    rule_version = _resolve_rule_version(result)
     merged_block_only, entity_ops, trace = _extract_entity_ops_from_merged(
         merged_blocks,
         normalized_origin=normalized_origin,
-        strict_mode=bool(strict_mode),
+        strict_mode=strict_mode,
         rule_version=rule_version,
     )
     if trace.status == "REJECTED":
         raise PayloadV2BuildError(trace.failure_code, trace.to_dict())
 
-    block_ops_input = [
-        {
-            "x": int(block["x"]) + normalized_origin["base_x"],
-            "y": int(block["y"]) + normalized_origin["base_y"],
-            "z": int(block["z"]) + normalized_origin["base_z"],
-            "block": block["block"],
-        }
-        for block in merged_block_only
-        if isinstance(block, dict)
-    ]
+    # validate_blocks 已保证坐标为 int、block 为白名单字符串，可直接转为列式数组整体平移
+    block_ops_input = BlockArray.from_dicts(block for block in merged_block_only if isinstance(block, dict)).translate(
+        normalized_origin["base_x"],
+        normalized_origin["base_y"],
+        normalized_origin["base_z"],
+    )
     block_ops = canonicalize_block_ops(block_ops_input)
+    merged_block_count = len(block_ops)
+    fill_ops: list[dict] = []
+    if fill_regions:
+        # 同材质相邻方块合并为 fill 区域：墙面/地面/水面的指令数大幅下降
+        block_ops, fill_ops = merge_fill_regions(block_ops)
+
+    commands = canonicalize_final_commands(block_ops, entity_ops, fill_ops)
+    return {
+        "commands": commands,
+        "final_commands_hash_v2": hash_commands(commands),
+        "merged_block_count": merged_block_count,
+        "entity_command_count": len(entity_ops),
+        "fill_command_count": len(fill_ops),
+        "trace": trace.to_dict(),
+    }
 
-    commands = canonicalize_final_commands(block_ops, entity_ops)
-    final_hash = final_commands_hash_v2(block_ops, entity_ops)
 
+def _assemble_payload(result: dict, built: dict, *, player_id: str, rule_version: str, normalized_origin: dict) -> dict:
+    """Stamp the per-request header (player, build id, source paths) onto ``built``."""
+
+    merged = result.get("merged") or {}
     scene_spec = result.get("scene_spec") or {}
     structure_patch = result.get("structure_patch") or {}
     scene_patch = result.get("scene_patch") or {}
+    final_hash = built["final_commands_hash_v2"]
 
-    payload = {
+    return {
         "version": "plugin_payload_v2",
         "payload_version": "v2",
-        "build_id": _build_id(final_hash, player_id.strip(), normalized_origin),
-        "player_id": player_id.strip(),
+        "build_id": _build_id(final_hash, player_id, normalized_origin),
+        "player_id": player_id,
         "build_path": structure_patch.get("build_path", "spec_engine_v1"),
         "patch_source": structure_patch.get("patch_source", "deterministic_engine"),
         "scene_path": scene_patch.get("scene_path", "scene_engine_v1"),
@@ -241,15 +251,77 @@ def build_plugin_payload_v2_with_trace(
         "stats": {
             "scene_block_count": result.get("scene_block_count", len(scene_patch.get("blocks") or [])),
             "spec_block_count": result.get("spec_block_count", len(structure_patch.get("blocks") or [])),
-            "merged_block_count": len(block_ops),
-            "entity_command_count": len(entity_ops),
+            "merged_block_count": built["merged_block_count"],
+            "entity_command_count": built["entity_command_count"],
+            "fill_command_count": built["fill_command_count"],
             "conflicts_total": merged.get("conflicts_total", 0),
             "spec_dropped_total": merged.get("spec_dropped_total", 0),
         },
         "origin": normalized_origin,
-        "commands": commands,
+        "commands": built["commands"],
     }
-    return payload, trace.to_dict()
+
+
+def _commands_cache_key(merged: dict, *, rule_version: str, normalized_origin: dict, strict_mode: bool, fill_regions: bool) -> str | None:
+    merge_hash = merged.get("hash")
+    if not isinstance(merge_hash, str) or not merge_hash:
+        return None
+
+    # merged.hash 是合并后方块的内容哈希；指令只取决于它、规则/引擎版本、原点与开关，与玩家无关
+    return artifact_key(
+        "payload",
+        merge_hash=merge_hash,
+        rule_version=rule_version,
+        engine_version=ENGINE_VERSION,
+        origin=normalized_origin,
+        strict_mode=strict_mode,
+        fill_regions=fill_regions,
+    )
+
+
+def build_plugin_payload_v2_with_trace(
+    result: dict,
+    *,
+    player_id: str,
+    origin: dict | None = None,
+    strict_mode: bool = True,
+    fill_regions: bool = False,
+) -> tuple[dict, dict]:
+    if not isinstance(result, dict):
+        raise ValueError("result must be dict")
+    if result.get("status") != "SUCCESS":
+        raise ValueError("compose result must be SUCCESS")
+    if not isinstance(player_id, str) or not player_id.strip():
+        raise ValueError("player_id must be non-empty string")
+
+    merged = result.get("merged") or {}
+    rule_version = _resolve_rule_version(result)
+    options = {
+        "rule_version": rule_version,
+        "normalized_origin": _normalize_origin(origin),
+        "strict_mode": bool(strict_mode),
+        "fill_regions": bool(fill_regions),
+    }
+    key = _commands_cache_key(merged, **options)
+    if key is None:
+        built = _build_commands(merged, **options)
+    else:
+        # 构建失败抛 PayloadV2BuildError，不会写入缓存
+        built = artifact_cache.get_or_compute("payload", key, lambda: _build_commands(merged, **options))
+
+    payload = _assemble_payload(
+        result,
+        built,
+        player_id=player_id.strip(),
+        rule_version=rule_version,
+        normalized_origin=options["normalized_origin"],
+    )
+    trace = thaw(built["trace"])
+
+    cache_stats = current_lookup_stats()
+    if cache_stats is not None:
+        payload = merge(payload, {"stats": {"artifact_cache": cache_stats}})
+    return payload, trace
 
 
 def build_plugin_payload_v2(
@@ -258,11 +330,13 @@ def build_plugin_payload_v2(
     player_id: str,
     origin: dict | None = None,
     strict_mode: bool = True,
+    fill_regions: bool = False,
 ) -> dict:
     payload, _trace = build_plugin_payload_v2_with_trace(
         result,
         player_id=player_id,
         origin=origin,
         strict_mode=strict_mode,
+        fill_regions=fill_regions,
     )
     return payload
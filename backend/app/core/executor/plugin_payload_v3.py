@@ -0,0 +1,354 @@
+"""Compact binary encoding of ``plugin_payload_v2`` (``plugin_payload_v3``).
+
+Layout (unsigned varints are LEB128, signed ones zigzag-encoded first)::
+
+    b"DPV3"
+    varint len, header JSON (v2 payload minus "commands"; same hash/stats)
+    palette      varint count, count × (varint len, UTF-8)
+    chunks       varint count, count × (svarint cx, svarint cz, varint blocks)
+    cells        blocks × uint32 LE: (ry + 0x8000) << 8 | lz << 4 | lx
+    ids          u8 width (1 or 2), blocks × uint8/uint16 LE palette index
+    fills        varint count, count × (varint id, svarint rx ry rz, varint dx dy dz)
+    entities     varint count, count × (svarint rx ry rz rotation, u8 flags,
+                 3 × string: entity_type, name, profession)
+
+Coordinates are relative to ``header["origin"]``; setblocks are grouped by
+16×16 chunk (``cx = rx >> 4``) and sorted by chunk, then y/z/x inside it.
+``cells`` / ``ids`` decode straight into ``array`` columns, so reading a
+payload never builds a dict per block.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Tuple
+
+from app.core.executor.canonical_v2 import canonicalize_final_commands
+from app.core.executor.plugin_payload_v2 import build_plugin_payload_v2_with_trace
+from app.core.patch.block_array import BlockArray
+
+
+PAYLOAD_V3_VERSION = "plugin_payload_v3"
+PAYLOAD_V3_MEDIA_TYPE = "application/vnd.drift.plugin-payload-v3"
+MAGIC = b"DPV3"
+
+_Y_BIAS = 0x8000
+_FLAG_NO_AI = 1
+_FLAG_SILENT = 2
+
+
+# ------------------------------------------------------------------ varints
+def _write_varint(out: bytearray, value: int) -> None:
+    if value < 0:
+        raise ValueError("varint must be non-negative")
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_svarint(out: bytearray, value: int) -> None:
+    _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _write_string(out: bytearray, value: str) -> None:
+    data = value.encode("utf-8")
+    _write_varint(out, len(data))
+    out += data
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        end = self.pos + size
+        if size < 0 or end > len(self.data):
+            raise ValueError("truncated plugin_payload_v3")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def byte(self) -> int:
+        return self.take(1)[0]
+
+    def varint(self) -> int:
+        shift = 0
+        value = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+            if shift > 63:
+                raise ValueError("varint too long")
+
+    def svarint(self) -> int:
+        value = self.varint()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def string(self) -> str:
+        return bytes(self.take(self.varint())).decode("utf-8")
+
+
+def _column(typecode: str, raw: memoryview) -> array:
+    column = array(typecode)
+    column.frombytes(raw)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+def _column_bytes(column: array) -> bytes:
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+# ----------------------------------------------------------------- payload
+@dataclass
+class PluginPayloadV3:
+    """Decoded ``plugin_payload_v3``: JSON header plus columnar commands.
+
+    ``blocks`` holds the setblock commands (absolute coordinates, chunk
+    order); ``fills`` are ``(x, y, z, x2, y2, z2, block)`` tuples and
+    ``entities`` canonical summon dicts, both in payload order.
+    """
+
+    header: dict
+    blocks: BlockArray
+    fills: List[Tuple[int, int, int, int, int, int, str]] = field(default_factory=list)
+    entities: List[dict] = field(default_factory=list)
+
+    @property
+    def origin(self) -> dict:
+        return self.header.get("origin") or {}
+
+    def iter_commands(self) -> Iterator[dict]:
+        for x, y, z, block in self.blocks:
+            yield {"type": "setblock", "x": x, "y": y, "z": z, "block": block}
+        for x, y, z, x2, y2, z2, block in self.fills:
+            yield {"type": "fill", "x": x, "y": y, "z": z, "x2": x2, "y2": y2, "z2": z2, "block": block}
+        yield from self.entities
+
+    def to_payload_v2(self) -> dict:
+        """The equivalent JSON ``plugin_payload_v2`` (commands in canonical order)."""
+
+        payload = {key: value for key, value in self.header.items() if key != "command_counts"}
+        payload["version"] = "plugin_payload_v2"
+        payload["payload_version"] = "v2"
+        payload["commands"] = canonicalize_final_commands(
+            [{"x": x, "y": y, "z": z, "block": block} for x, y, z, block in self.blocks],
+            self.entities,
+            [
+                {"x": x, "y": y, "z": z, "x2": x2, "y2": y2, "z2": z2, "block": block}
+                for x, y, z, x2, y2, z2, block in self.fills
+            ],
+        )
+        return payload
+
+
+def encode_plugin_payload_v3(payload: dict, *, extra_header: dict | None = None) -> bytes:
+    """Encode a built ``plugin_payload_v2`` dict as ``plugin_payload_v3`` bytes."""
+
+    if not isinstance(payload, dict) or payload.get("version") != "plugin_payload_v2":
+        raise ValueError("payload must be a plugin_payload_v2 dict")
+    origin = payload.get("origin") or {}
+    base_x, base_y, base_z = int(origin.get("base_x", 0)), int(origin.get("base_y", 0)), int(origin.get("base_z", 0))
+
+    palette = BlockArray()
+    cells: List[Tuple[int, int, int, int]] = []
+    fills: List[dict] = []
+    entities: List[dict] = []
+    for command in payload.get("commands") or []:
+        kind = command.get("type")
+        if kind == "setblock":
+            rx, ry, rz = command["x"] - base_x, command["y"] - base_y, command["z"] - base_z
+            if not -_Y_BIAS <= ry < _Y_BIAS:
+                raise ValueError("setblock y is too far from origin for plugin_payload_v3")
+            packed = ((ry + _Y_BIAS) << 8) | ((rz & 15) << 4) | (rx & 15)
+            cells.append((rx >> 4, rz >> 4, packed, palette.intern(command["block"])))
+        elif kind == "fill":
+            palette.intern(command["block"])
+            fills.append(command)
+        elif kind == "summon":
+            entities.append(command)
+        else:
+            raise ValueError(f"unsupported command type for plugin_payload_v3: {kind!r}")
+    cells.sort()
+
+    header = {key: value for key, value in payload.items() if key != "commands"}
+    header["version"] = PAYLOAD_V3_VERSION
+    header["payload_version"] = "v3"
+    header["command_counts"] = {"setblock": len(cells), "fill": len(fills), "summon": len(entities)}
+    if extra_header:
+        header.update(extra_header)
+
+    out = bytearray(MAGIC)
+    header_bytes = json.dumps(header, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    _write_varint(out, len(header_bytes))
+    out += header_bytes
+
+    _write_varint(out, len(palette.palette))
+    for token in palette.palette:
+        _write_string(out, token)
+
+    chunk_counts: List[Tuple[int, int, int]] = []
+    for cx, cz, _, _ in cells:
+        if chunk_counts and chunk_counts[-1][:2] == (cx, cz):
+            chunk_counts[-1] = (cx, cz, chunk_counts[-1][2] + 1)
+        else:
+            chunk_counts.append((cx, cz, 1))
+    _write_varint(out, len(chunk_counts))
+    for cx, cz, count in chunk_counts:
+        _write_svarint(out, cx)
+        _write_svarint(out, cz)
+        _write_varint(out, count)
+
+    out += _column_bytes(array("I", [cell[2] for cell in cells]))
+    id_code = "B" if len(palette.palette) <= 0x100 else "H"
+    out.append(array(id_code).itemsize)
+    out += _column_bytes(array(id_code, [cell[3] for cell in cells]))
+
+    _write_varint(out, len(fills))
+    for fill in fills:
+        _write_varint(out, palette.intern(fill["block"]))
+        _write_svarint(out, fill["x"] - base_x)
+        _write_svarint(out, fill["y"] - base_y)
+        _write_svarint(out, fill["z"] - base_z)
+        _write_varint(out, fill["x2"] - fill["x"])
+        _write_varint(out, fill["y2"] - fill["y"])
+        _write_varint(out, fill["z2"] - fill["z"])
+
+    _write_varint(out, len(entities))
+    for entity in entities:
+        _write_svarint(out, entity["x"] - base_x)
+        _write_svarint(out, entity["y"] - base_y)
+        _write_svarint(out, entity["z"] - base_z)
+        _write_svarint(out, entity["rotation"])
+        out.append((_FLAG_NO_AI if entity["no_ai"] else 0) | (_FLAG_SILENT if entity["silent"] else 0))
+        _write_string(out, entity["entity_type"])
+        _write_string(out, entity["name"])
+        _write_string(out, entity["profession"])
+    return bytes(out)
+
+
+def decode_plugin_payload_v3(data: bytes) -> PluginPayloadV3:
+    """Parse ``plugin_payload_v3`` bytes; ``ValueError`` on malformed input."""
+
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise ValueError("plugin_payload_v3 must be bytes")
+    reader = _Reader(data)
+    if bytes(reader.take(len(MAGIC))) != MAGIC:
+        raise ValueError("not a plugin_payload_v3 document")
+    try:
+        header = json.loads(bytes(reader.take(reader.varint())).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("invalid plugin_payload_v3 header") from exc
+    if not isinstance(header, dict):
+        raise ValueError("invalid plugin_payload_v3 header")
+    origin = header.get("origin") or {}
+    base_x, base_y, base_z = int(origin.get("base_x", 0)), int(origin.get("base_y", 0)), int(origin.get("base_z", 0))
+
+    palette = [reader.string() for _ in range(reader.varint())]
+    chunks = [(reader.svarint(), reader.svarint(), reader.varint()) for _ in range(reader.varint())]
+    total = sum(count for _, _, count in chunks)
+    cells = _column("I", reader.take(total * 4))
+    width = reader.byte()
+    if width not in (1, 2):
+        raise ValueError("invalid palette id width")
+    ids = _column("B" if width == 1 else "H", reader.take(total * width))
+    if ids and max(ids) >= len(palette):
+        raise ValueError("palette id out of range")
+
+    blocks = BlockArray()
+    blocks.palette = palette
+    blocks._index = {token: index for index, token in enumerate(palette)}
+    blocks.ids = ids if width == 2 else array("H", ids)
+    start = 0
+    for cx, cz, count in chunks:
+        chunk = cells[start:start + count]
+        left, front = base_x + (cx << 4), base_z + (cz << 4)
+        blocks.xs.extend(array("i", [left + (cell & 15) for cell in chunk]))
+        blocks.zs.extend(array("i", [front + ((cell >> 4) & 15) for cell in chunk]))
+        blocks.ys.extend(array("i", [base_y - _Y_BIAS + (cell >> 8) for cell in chunk]))
+        start += count
+
+    fills = []
+    for _ in range(reader.varint()):
+        index = reader.varint()
+        if index >= len(palette):
+            raise ValueError("palette id out of range")
+        x, y, z = base_x + reader.svarint(), base_y + reader.svarint(), base_z + reader.svarint()
+        fills.append((x, y, z, x + reader.varint(), y + reader.varint(), z + reader.varint(), palette[index]))
+
+    entities = []
+    for _ in range(reader.varint()):
+        x, y, z, rotation = base_x + reader.svarint(), base_y + reader.svarint(), base_z + reader.svarint(), reader.svarint()
+        flags = reader.byte()
+        entity_type, name, profession = reader.string(), reader.string(), reader.string()
+        entities.append(
+            {
+                "type": "summon",
+                "entity_type": entity_type,
+                "x": x,
+                "y": y,
+                "z": z,
+                "name": name,
+                "profession": profession,
+                "no_ai": bool(flags & _FLAG_NO_AI),
+                "silent": bool(flags & _FLAG_SILENT),
+                "rotation": rotation,
+            }
+        )
+
+    if reader.pos != len(reader.data):
+        raise ValueError("trailing bytes after plugin_payload_v3")
+    return PluginPayloadV3(header=header, blocks=blocks, fills=fills, entities=entities)
+
+
+def build_plugin_payload_v3(
+    result: dict,
+    *,
+    player_id: str,
+    origin: dict | None = None,
+    strict_mode: bool = True,
+    fill_regions: bool = False,
+) -> bytes:
+    payload, _trace = build_plugin_payload_v2_with_trace(
+        result,
+        player_id=player_id,
+        origin=origin,
+        strict_mode=strict_mode,
+        fill_regions=fill_regions,
+    )
+    return encode_plugin_payload_v3(payload)
+
+
+def accepts_payload_v3(accept_header: Any) -> bool:
+    """True when an HTTP ``Accept`` header explicitly asks for ``plugin_payload_v3``."""
+
+    if not isinstance(accept_header, str):
+        return False
+    for item in accept_header.split(","):
+        media_type, _, params = item.strip().partition(";")
+        if media_type.strip().lower() != PAYLOAD_V3_MEDIA_TYPE:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
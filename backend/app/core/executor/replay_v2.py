@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from app.core.executor.canonical_v2 import canonicalize_final_commands, stable_hash_v2
+from app.core.executor.canonical_v2 import canonicalize_final_commands, hash_commands, stable_hash_v2
+from app.core.executor.fill_regions_v1 import iter_fill_cells
 
 
-def _split_commands(commands: list[dict]) -> tuple[list[dict], list[dict]]:
+def _split_commands(commands: list[dict]) -> tuple[list[dict], list[dict], list[dict]]:
     block_ops: list[dict] = []
     entity_ops: list[dict] = []
+    fill_ops: list[dict] = []
 
     for command in commands:
         if not isinstance(command, dict):
@@ -20,6 +22,8 @@ def _split_commands(commands: list[dict]) -> tuple[list[dict], list[dict]]:
                     "block": command.get("block"),
                 }
             )
+        elif command_type == "fill":
+            fill_ops.append({key: command.get(key) for key in ("x", "y", "z", "x2", "y2", "z2", "block")})
         elif command_type == "summon":
             entity_ops.append(
                 {
@@ -36,7 +40,7 @@ def _split_commands(commands: list[dict]) -> tuple[list[dict], list[dict]]:
                 }
             )
 
-    return block_ops, entity_ops
+    return block_ops, entity_ops, fill_ops
 
 
 def replay_payload_v2(payload: dict) -> dict:
@@ -50,9 +54,9 @@ def replay_payload_v2(payload: dict) -> dict:
     if not isinstance(commands, list):
         return {"status": "REJECTED", "failure_code": "INVALID_COMMANDS"}
 
-    block_ops, entity_ops = _split_commands(commands)
-    canonical_commands = canonicalize_final_commands(block_ops, entity_ops)
-    actual_hash = stable_hash_v2(canonical_commands)
+    block_ops, entity_ops, fill_ops = _split_commands(commands)
+    canonical_commands = canonicalize_final_commands(block_ops, entity_ops, fill_ops)
+    actual_hash = hash_commands(canonical_commands)
 
     expected_hash = ""
     hash_data = payload.get("hash")
@@ -79,6 +83,12 @@ def replay_payload_v2(payload: dict) -> dict:
             world_blocks[key] = str(command["block"])
             continue
 
+        if command_type == "fill":
+            block = str(command["block"])
+            for key in iter_fill_cells(command):
+                world_blocks[key] = block
+            continue
+
         if command_type == "summon":
             world_entities.append(
                 {
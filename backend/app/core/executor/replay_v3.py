@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from app.core.executor.canonical_v2 import CommandsHasher, canonicalize_final_commands
+from app.core.executor.plugin_payload_v3 import PAYLOAD_V3_VERSION, PluginPayloadV3, decode_plugin_payload_v3
+from app.core.executor.replay_v2 import replay_payload_v2
+
+_BIAS = 1 << 31
+
+
+def _world_state_hash(keys: list[int], cells: dict[int, int], palette: list[str], entities: list[dict]) -> str:
+    # 与 stable_hash_v2({"blocks": [...], "entities": [...]}) 逐字节一致，但不构造方块 dict
+    names = [json.dumps(token, ensure_ascii=False) for token in palette]
+    digest = hashlib.sha256(b'{"blocks":[')
+    for start in range(0, len(keys), 4096):
+        text = ",".join(
+            [
+                f'{{"block":{names[cells[key]]},"x":{(key >> 64) - _BIAS},'
+                f'"y":{((key >> 32) & 0xFFFFFFFF) - _BIAS},"z":{(key & 0xFFFFFFFF) - _BIAS}}}'
+                for key in keys[start:start + 4096]
+            ]
+        )
+        digest.update((b"," if start else b"") + text.encode("utf-8"))
+    digest.update(b'],"entities":')
+    digest.update(json.dumps(entities, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    digest.update(b"}")
+    return digest.hexdigest()
+
+
+def _pack(x: int, y: int, z: int) -> int:
+    return ((x + _BIAS) << 64) | ((y + _BIAS) << 32) | (z + _BIAS)
+
+
+def replay_payload_v3(data: bytes | PluginPayloadV3) -> dict:
+    """``replay_payload_v2`` on ``plugin_payload_v3`` bytes, working on the columns directly.
+
+    Returns the same result fields (``final_commands_hash_v2`` is the v2
+    hash of the equivalent JSON payload, so the header hash is checked
+    as is).
+    """
+
+    try:
+        payload = data if isinstance(data, PluginPayloadV3) else decode_plugin_payload_v3(data)
+    except ValueError:
+        return {"status": "REJECTED", "failure_code": "INVALID_PAYLOAD"}
+
+    if str(payload.header.get("version", "")).strip() != PAYLOAD_V3_VERSION:
+        return {"status": "REJECTED", "failure_code": "INVALID_PAYLOAD_VERSION"}
+
+    blocks = payload.blocks
+    if blocks.has_duplicate_positions() or any(not token for token in blocks.palette):
+        # 重复坐标/空方块需要 canonicalize 的完整规则，退回 JSON 路径
+        return replay_payload_v2(payload.to_payload_v2())
+
+    ordered = blocks.sorted()
+    others = canonicalize_final_commands(
+        [],
+        payload.entities,
+        [
+            {"x": x, "y": y, "z": z, "x2": x2, "y2": y2, "z2": z2, "block": block}
+            for x, y, z, x2, y2, z2, block in payload.fills
+        ],
+    )
+    hasher = CommandsHasher("v2")
+    hasher.update_setblocks(ordered)
+    hasher.update_many(others)
+    actual_hash = hasher.hexdigest()
+
+    hash_data = payload.header.get("hash")
+    expected_hash = str(hash_data.get("final_commands") or "") if isinstance(hash_data, dict) else ""
+    if not expected_hash:
+        expected_hash = str(payload.header.get("final_commands_hash_v2") or "")
+
+    if expected_hash and expected_hash != actual_hash:
+        return {
+            "status": "REJECTED",
+            "failure_code": "FINAL_COMMANDS_HASH_MISMATCH",
+            "expected_final_commands_hash": expected_hash,
+            "actual_final_commands_hash": actual_hash,
+        }
+
+    palette = list(ordered.palette)
+    palette_index = {token: index for index, token in enumerate(palette)}
+    cells = dict(zip(ordered.positions(), ordered.ids))
+    entities = []
+    for command in others:
+        if command["type"] == "fill":
+            index = palette_index.get(command["block"])
+            if index is None:
+                index = palette_index[command["block"]] = len(palette)
+                palette.append(command["block"])
+            for x in range(command["x"], command["x2"] + 1):
+                for y in range(command["y"], command["y2"] + 1):
+                    for z in range(command["z"], command["z2"] + 1):
+                        cells[_pack(x, y, z)] = index
+        else:
+            entities.append(
+                {
+                    "type": "summon",
+                    "entity_type": str(command.get("entity_type")),
+                    "x": int(command.get("x")),
+                    "y": int(command.get("y")),
+                    "z": int(command.get("z")),
+                    "name": str(command.get("name")),
+                    "profession": str(command.get("profession")),
+                    "no_ai": bool(command.get("no_ai")),
+                    "silent": bool(command.get("silent")),
+                    "rotation": int(command.get("rotation")),
+                }
+            )
+
+    keys = sorted(cells)
+    entities.sort(key=lambda item: (item["entity_type"], item["x"], item["y"], item["z"], item["name"], item["rotation"]))
+    preview_blocks = [
+        {
+            "x": (key >> 64) - _BIAS,
+            "y": ((key >> 32) & 0xFFFFFFFF) - _BIAS,
+            "z": (key & 0xFFFFFFFF) - _BIAS,
+            "block": palette[cells[key]],
+        }
+        for key in keys[:5]
+    ]
+
+    return {
+        "status": "SUCCESS",
+        "failure_code": "NONE",
+        "final_commands_hash_v2": actual_hash,
+        "world_state_hash": _world_state_hash(keys, cells, palette, entities),
+        "world_block_count": len(keys),
+        "world_entity_count": len(entities),
+        "world_state_preview": {
+            "blocks": preview_blocks,
+            "entities": entities[:3],
+        },
+    }
+
@@ -0,0 +1,124 @@
+# backend/app/core/generation/artifact_cache.py
+"""Content-addressed cache for the deterministic generation pipeline.
+
+Structure patches (spec → blocks), scene patches (scene_spec → blocks) and
+plugin payloads are pure functions of their normalised inputs, so they are
+stored under ``"<kind>:" + stable_hash_v2(inputs)``. The inputs always carry
+an engine version (and the payload key the rule version), so changing the
+generators only requires bumping ``ARTIFACT_ENGINE_VERSION`` /
+``ENGINE_VERSION``.
+
+Storage is a ``ResponseCache`` without TTL: an in-memory LRU tier plus an
+optional write-behind SQLite tier (``DRIFT_ARTIFACT_CACHE_PATH``) capped at
+``DRIFT_ARTIFACT_CACHE_DISK_ROWS`` rows, least recently used first. Cached values are
+``freeze``-d world-patch style, so every caller shares one read-only copy
+instead of deep-copying it.
+
+``track_lookups()`` records per-stage ``"hit"`` / ``"miss"`` for the current
+context; ``build_plugin_payload_v2`` reports them in ``stats.artifact_cache``.
+"""
+
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.core.cache import ResponseCache
+from app.core.executor.canonical_v2 import stable_hash_v2
+from app.core.patch.world_patch import freeze
+
+# 结构/场景生成逻辑变化时递增，旧缓存条目自然失效
+ARTIFACT_ENGINE_VERSION = "artifact_v1"
+
+ARTIFACT_CACHE_ENABLED = os.getenv("DRIFT_ARTIFACT_CACHE", "1").lower() not in ("0", "false", "no", "off")
+ARTIFACT_CACHE_SIZE = int(os.getenv("DRIFT_ARTIFACT_CACHE_SIZE", "256"))
+ARTIFACT_CACHE_PATH = os.getenv("DRIFT_ARTIFACT_CACHE_PATH") or None
+# 磁盘层行数上限（0 = 不限）；没有 TTL，不设上限文件会一直增长
+ARTIFACT_CACHE_DISK_ROWS = int(os.getenv("DRIFT_ARTIFACT_CACHE_DISK_ROWS", "4096"))
+
+_LOOKUPS: ContextVar[Optional[Dict[str, str]]] = ContextVar("drift_artifact_lookups", default=None)
+
+
+def artifact_key(kind: str, **inputs: Any) -> str:
+    return f"{kind}:{stable_hash_v2(inputs)}"
+
+
+class ArtifactCache:
+    def __init__(
+        self,
+        max_size: int = 256,
+        disk_path: Optional[str] = None,
+        enabled: bool = True,
+        disk_max_rows: int = ARTIFACT_CACHE_DISK_ROWS,
+    ) -> None:
+        self.enabled = enabled
+        self._store = ResponseCache(
+            max_size=max_size, ttl=0, disk_path=disk_path, decode=freeze, disk_max_rows=disk_max_rows
+        )
+
+    def get_or_compute(self, kind: str, key: str, compute: Callable[[], Any]) -> Any:
+        """Cached value for ``key``; otherwise ``compute()`` (frozen and stored unless ``None``)."""
+
+        lookups = _LOOKUPS.get()
+        if not self.enabled:
+            if lookups is not None:
+                lookups[kind] = "disabled"
+            return compute()
+
+        value = self._store.get(key)
+        if lookups is not None:
+            lookups[kind] = "miss" if value is None else "hit"
+        if value is None:
+            value = compute()
+            if value is not None:
+                value = freeze(value)
+                self._store.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def flush(self) -> None:
+        self._store.flush()
+
+    def close(self) -> None:
+        self._store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._store.stats()
+        stats["enabled"] = self.enabled
+        return stats
+
+
+@contextmanager
+def track_lookups() -> Iterator[Dict[str, str]]:
+    """Collect ``{kind: "hit" | "miss" | "disabled"}`` for lookups in this context (nests)."""
+
+    current = _LOOKUPS.get()
+    if current is not None:
+        yield current
+        return
+    token = _LOOKUPS.set({})
+    try:
+        yield _LOOKUPS.get()
+    finally:
+        _LOOKUPS.reset(token)
+
+
+def current_lookup_stats() -> Optional[Dict[str, Any]]:
+    """``{"hits", "misses", "stages"}`` of the active ``track_lookups()``, or ``None`` outside one."""
+
+    lookups = _LOOKUPS.get()
+    if lookups is None:
+        return None
+    outcomes = list(lookups.values())
+    return {"hits": outcomes.count("hit"), "misses": outcomes.count("miss"), "stages": dict(lookups)}
+
+
+artifact_cache = ArtifactCache(
+    max_size=ARTIFACT_CACHE_SIZE,
+    disk_path=ARTIFACT_CACHE_PATH,
+    enabled=ARTIFACT_CACHE_ENABLED,
+)
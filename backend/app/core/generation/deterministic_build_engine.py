@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 from app.core.generation.spec_validator import validate_spec
+from app.core.patch.block_array import BlockArray
 
 
 def _reject(failure_code: str) -> Dict[str, Any]:
@@ -13,7 +14,20 @@ def _reject(failure_code: str) -> Dict[str, Any]:
     }
 
 
-def _build_house(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
+def _add_shell(blocks: BlockArray, width: int, depth: int, heights: range, role: str) -> None:
+    """Perimeter ring of a ``width × depth`` footprint for each y in ``heights``."""
+
+    edge_z = [0] if depth <= 1 else [0, depth - 1]
+    for y in heights:
+        for x in range(width):
+            if x == 0 or x == width - 1:
+                blocks.add_box(range(x, x + 1), range(y, y + 1), range(depth), role)
+            else:
+                for z in edge_z:
+                    blocks.append(x, y, z, role)
+
+
+def _build_house(spec: Dict[str, Any]) -> BlockArray | None:
     width = spec["width"]
     depth = spec["depth"]
     height = spec["height"]
@@ -23,22 +37,12 @@ def _build_house(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
     door_cfg = features.get("door") or {"enabled": False, "side": "front"}
     windows_cfg = features.get("windows") or {"enabled": False, "count": 0}
 
-    blocks: List[Dict[str, int | str]] = []
-
-    for x in range(width):
-        for z in range(depth):
-            blocks.append({"x": x, "y": 0, "z": z, "role": "FLOOR"})
-
-    for y in range(1, height):
-        for x in range(width):
-            for z in range(depth):
-                if x == 0 or x == width - 1 or z == 0 or z == depth - 1:
-                    blocks.append({"x": x, "y": y, "z": z, "role": "WALL"})
+    blocks = BlockArray()
+    blocks.add_box(range(width), range(0, 1), range(depth), "FLOOR")
+    _add_shell(blocks, width, depth, range(1, height), "WALL")
 
     if roof_type == "flat":
-        for x in range(width):
-            for z in range(depth):
-                blocks.append({"x": x, "y": height, "z": z, "role": "ROOF"})
+        blocks.add_box(range(width), range(height, height + 1), range(depth), "ROOF")
     elif roof_type == "gable":
         layers = (depth + 1) // 2
         for ridge in range(layers):
@@ -53,39 +57,25 @@ def _build_house(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
                 end_x = width
 
             for x in range(start_x, end_x):
-                blocks.append({"x": x, "y": y, "z": z_front, "role": "ROOF"})
+                blocks.append(x, y, z_front, "ROOF")
                 if z_back != z_front:
-                    blocks.append({"x": x, "y": y, "z": z_back, "role": "ROOF"})
+                    blocks.append(x, y, z_back, "ROOF")
 
     if door_cfg.get("enabled"):
         door_slots = _door_positions(width, depth, orientation)
-        blocks = [
-            entry
-            for entry in blocks
-            if not (
-                entry.get("role") == "WALL"
-                and (entry["x"], entry["y"], entry["z"]) in door_slots
-            )
-        ]
+        blocks = blocks.without(door_slots, "WALL")
         for x, y, z in sorted(door_slots, key=lambda p: (p[1], p[0], p[2])):
-            blocks.append({"x": x, "y": y, "z": z, "role": "DOOR_AIR"})
+            blocks.append(x, y, z, "DOOR_AIR")
 
     windows_count = windows_cfg.get("count", 0) if windows_cfg.get("enabled") else 0
     if windows_count:
         side_slots = _window_positions(width, depth, orientation, int(windows_count))
         if side_slots is None:
-            return []
-
-        blocks = [
-            entry
-            for entry in blocks
-            if not (
-                entry.get("role") == "WALL"
-                and (entry["x"], entry["y"], entry["z"]) in side_slots
-            )
-        ]
+            return None
+
+        blocks = blocks.without(side_slots, "WALL")
         for x, y, z in sorted(side_slots, key=lambda p: (p[1], p[0], p[2])):
-            blocks.append({"x": x, "y": y, "z": z, "role": "WINDOW"})
+            blocks.append(x, y, z, "WINDOW")
 
     return blocks
 
@@ -128,79 +118,68 @@ def _window_positions(
     return set(ordered[:count])
 
 
-def _build_wall(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
+def _build_wall(spec: Dict[str, Any]) -> BlockArray:
     width = spec["width"]
     height = spec["height"]
 
-    blocks: List[Dict[str, int | str]] = []
+    blocks = BlockArray()
     for y in range(height):
-        for x in range(width):
-            blocks.append({"x": x, "y": y, "z": 0, "role": "WALL"})
+        blocks.add_box(range(width), range(y, y + 1), range(0, 1), "WALL")
     return blocks
 
 
-def _build_tower(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
+def _build_tower(spec: Dict[str, Any]) -> BlockArray:
     width = spec["width"]
     depth = spec["depth"]
     height = spec["height"]
 
-    blocks: List[Dict[str, int | str]] = []
-
-    for x in range(width):
-        for z in range(depth):
-            blocks.append({"x": x, "y": 0, "z": z, "role": "FLOOR"})
-
-    for y in range(1, height):
-        for x in range(width):
-            for z in range(depth):
-                if x == 0 or x == width - 1 or z == 0 or z == depth - 1:
-                    blocks.append({"x": x, "y": y, "z": z, "role": "WALL"})
-
+    blocks = BlockArray()
+    blocks.add_box(range(width), range(0, 1), range(depth), "FLOOR")
+    _add_shell(blocks, width, depth, range(1, height), "WALL")
     return blocks
 
 
-def _build_bridge(spec: Dict[str, Any]) -> List[Dict[str, int | str]]:
+def _build_bridge(spec: Dict[str, Any]) -> BlockArray:
     width = spec["width"]
     depth = spec["depth"]
     height = spec["height"]
 
-    blocks: List[Dict[str, int | str]] = []
-
-    for x in range(width):
-        for z in range(depth):
-            blocks.append({"x": x, "y": 0, "z": z, "role": "BRIDGE_DECK"})
+    blocks = BlockArray()
+    blocks.add_box(range(width), range(0, 1), range(depth), "BRIDGE_DECK")
 
     for y in range(1, height):
-        blocks.append({"x": 0, "y": y, "z": 0, "role": "SUPPORT"})
-        blocks.append({"x": 0, "y": y, "z": depth - 1, "role": "SUPPORT"})
-        blocks.append({"x": width - 1, "y": y, "z": 0, "role": "SUPPORT"})
-        blocks.append({"x": width - 1, "y": y, "z": depth - 1, "role": "SUPPORT"})
+        blocks.append(0, y, 0, "SUPPORT")
+        blocks.append(0, y, depth - 1, "SUPPORT")
+        blocks.append(width - 1, y, 0, "SUPPORT")
+        blocks.append(width - 1, y, depth - 1, "SUPPORT")
 
     return blocks
 
 
-def build_from_spec(spec: dict) -> dict:
+def build_block_array(spec: dict) -> tuple[str, BlockArray | None]:
+    """Build ``spec`` as a role-token ``BlockArray``; returns ``(failure_code, blocks)``."""
+
     if isinstance(spec, dict):
         raw_structure = spec.get("structure_type")
         if isinstance(raw_structure, str):
             structure_token = raw_structure.strip().lower()
             if structure_token and structure_token not in {"house", "wall", "tower", "bridge"}:
-                return _reject("UNSUPPORTED_STRUCTURE")
+                return "UNSUPPORTED_STRUCTURE", None
 
     validation = validate_spec(spec)
     if validation.get("status") != "VALID":
-        return _reject("INVALID_SPEC")
+        return "INVALID_SPEC", None
 
     normalized = validation.get("spec")
     if not isinstance(normalized, dict):
-        return _reject("INVALID_SPEC")
+        return "INVALID_SPEC", None
 
     structure_type = normalized["structure_type"]
 
     if structure_type == "house":
         blocks = _build_house(normalized)
         if not blocks:
-            return _reject("INVALID_FEATURE_CONFIG")
+            return "INVALID_FEATURE_CONFIG", None
     elif structure_type == "wall":
         blocks = _build_wall(normalized)
     elif structure_type == "tower":
@@ -208,10 +187,18 @@ def build_from_spec(spec: dict) -> dict:
     elif structure_type == "bridge":
         blocks = _build_bridge(normalized)
     else:
-        return _reject("UNSUPPORTED_STRUCTURE")
+        return "UNSUPPORTED_STRUCTURE", None
+
+    return "NONE", blocks
+
+
+def build_from_spec(spec: dict) -> dict:
+    failure_code, blocks = build_block_array(spec)
+    if blocks is None:
+        return _reject(failure_code)
 
     return {
         "build_status": "SUCCESS",
         "failure_code": "NONE",
-        "blocks": blocks,
+        "blocks": blocks.to_dicts("role"),
     }
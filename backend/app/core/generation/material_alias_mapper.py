@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
+from app.core.patch.block_array import BlockArray
+
 
 MATERIAL_ROLE_MAP: Dict[str, Dict[str, str]] = {
     "wood": {
@@ -55,15 +57,45 @@ def _reject(failure_code: str) -> Dict[str, Any]:
     }
 
 
-def map_roles_to_blocks(role_blocks: list[dict], material_preference: str) -> dict:
+def _role_mapping(material_preference: Any) -> Dict[str, str] | None:
+    if not isinstance(material_preference, str):
+        return None
+    return MATERIAL_ROLE_MAP.get(material_preference.strip().lower())
+
+
+def map_role_array(role_blocks: BlockArray, material_preference: str) -> tuple[str, BlockArray | None]:
+    """Map a role-token ``BlockArray`` to block ids by rewriting its palette only."""
+
+    if len(role_blocks) == 0:
+        return "EMPTY_BLOCKS", None
+    if not isinstance(material_preference, str):
+        return "INVALID_MATERIAL_PREFERENCE", None
+    role_mapping = _role_mapping(material_preference)
+    if role_mapping is None:
+        return "INVALID_MATERIAL_PREFERENCE", None
+
+    roles = role_blocks.used_tokens()
+    if any(role not in role_mapping for role in roles):
+        return "UNKNOWN_ROLE", None
+    if any(role_mapping[role] not in BLOCK_ID_WHITELIST for role in roles):
+        return "INVALID_MAPPING", None
+    return "NONE", role_blocks.remap(role_mapping)
+
+
+def map_roles_to_blocks(role_blocks: list[dict] | BlockArray, material_preference: str) -> dict:
+    if isinstance(role_blocks, BlockArray):
+        failure_code, mapped = map_role_array(role_blocks, material_preference)
+        if mapped is None:
+            return _reject(failure_code)
+        return {"status": "SUCCESS", "failure_code": "NONE", "blocks": mapped.to_dicts()}
+
     if not isinstance(role_blocks, list) or len(role_blocks) == 0:
         return _reject("EMPTY_BLOCKS")
 
     if not isinstance(material_preference, str):
         return _reject("INVALID_MATERIAL_PREFERENCE")
 
-    material_key = material_preference.strip().lower()
-    role_mapping = MATERIAL_ROLE_MAP.get(material_key)
+    role_mapping = _role_mapping(material_preference)
     if role_mapping is None:
         return _reject("INVALID_MATERIAL_PREFERENCE")
 
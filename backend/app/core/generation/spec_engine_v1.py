@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
-from app.core.generation.deterministic_build_engine import build_from_spec
-from app.core.generation.material_alias_mapper import BLOCK_ID_WHITELIST, map_roles_to_blocks
+from app.core.generation.artifact_cache import ARTIFACT_ENGINE_VERSION, artifact_cache, artifact_key
+from app.core.generation.deterministic_build_engine import build_block_array
+from app.core.generation.material_alias_mapper import BLOCK_ID_WHITELIST, map_role_array
 from app.core.generation.spec_llm_v1 import generate_spec_from_text_v1
+from app.core.patch.block_array import BlockArray
 
 
 def _result(build_status: str, failure_code: str, blocks: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
@@ -17,29 +19,39 @@ def _result(build_status: str, failure_code: str, blocks: List[Dict[str, Any]] |
     }
 
 
-def _validate_execution_blocks(blocks: Any) -> str:
-    if not isinstance(blocks, list) or not blocks:
+def _validate_execution_blocks(blocks: BlockArray) -> str:
+    if len(blocks) == 0:
         return "EMPTY_BLOCKS"
+    if any(block_id not in BLOCK_ID_WHITELIST for block_id in blocks.used_tokens()):
+        return "INVALID_BLOCK_ID"
+    return "NONE"
 
-    for entry in blocks:
-        if not isinstance(entry, dict):
-            return "INVALID_BLOCK_ENTRY"
 
-        x = entry.get("x")
-        y = entry.get("y")
-        z = entry.get("z")
-        block_id = entry.get("block")
+def _build_structure_patch(normalized_spec: Dict[str, Any]) -> Dict[str, Any]:
+    # build → 材质映射 → 白名单校验都在列式 BlockArray 上完成，最后只物化一次 dict
+    build_failure, role_blocks = build_block_array(normalized_spec)
+    if role_blocks is None:
+        return _result("REJECTED", build_failure or "INVALID_SPEC")
 
-        if not isinstance(x, int) or not isinstance(y, int) or not isinstance(z, int):
-            return "INVALID_BLOCK_ENTRY"
-        if not isinstance(block_id, str) or block_id not in BLOCK_ID_WHITELIST:
-            return "INVALID_BLOCK_ID"
+    material_preference = normalized_spec.get("material_preference")
+    mapping_failure, execution_blocks = map_role_array(role_blocks, material_preference)
+    if execution_blocks is None:
+        return _result("REJECTED", mapping_failure or "INVALID_MAPPING")
 
-    return "NONE"
+    execution_failure = _validate_execution_blocks(execution_blocks)
+    if execution_failure != "NONE":
+        return _result("REJECTED", execution_failure)
+
+    return _result("SUCCESS", "NONE", execution_blocks.to_dicts())
 
 
 def generate_patch_from_text_v1(text: str) -> dict:
-    spec_result = generate_spec_from_text_v1(text)
+    return generate_patch_from_spec_result_v1(generate_spec_from_text_v1(text))
+
+
+def generate_patch_from_spec_result_v1(spec_result: dict) -> dict:
+    """Build stage of ``generate_patch_from_text_v1`` for an already extracted ``spec_result``."""
+
     if spec_result.get("status") != "VALID":
         return _result("REJECTED", spec_result.get("failure_code", "INVALID_SPEC"))
 
@@ -47,19 +59,5 @@ def generate_patch_from_text_v1(text: str) -> dict:
     if not isinstance(normalized_spec, dict):
         return _result("REJECTED", "INVALID_SPEC")
 
-    build_result = build_from_spec(normalized_spec)
-    if build_result.get("build_status") != "SUCCESS":
-        return _result("REJECTED", build_result.get("failure_code", "INVALID_SPEC"))
-
-    role_blocks = build_result.get("blocks")
-    material_preference = normalized_spec.get("material_preference")
-    mapped = map_roles_to_blocks(role_blocks, material_preference)
-    if mapped.get("status") != "SUCCESS":
-        return _result("REJECTED", mapped.get("failure_code", "INVALID_MAPPING"))
-
-    execution_blocks = mapped.get("blocks")
-    execution_failure = _validate_execution_blocks(execution_blocks)
-    if execution_failure != "NONE":
-        return _result("REJECTED", execution_failure)
-
-    return _result("SUCCESS", "NONE", execution_blocks)
+    key = artifact_key("structure", spec=normalized_spec, engine_version=ARTIFACT_ENGINE_VERSION)
+    return artifact_cache.get_or_compute("structure", key, lambda: _build_structure_patch(normalized_spec))
@@ -0,0 +1,88 @@
+# backend/app/core/lazy.py
+"""Lazily constructed module singletons.
+
+``story_engine``, ``trigger_engine``, the minimap renderer and the hint engine
+used to be built while ``app.main`` was being imported, which made every
+worker start pay for the full level load, PNG decode and OpenAI client import
+before it could accept a connection. They are now ``LazySingleton`` proxies:
+the module attribute keeps its name and is used exactly like the real object
+(attribute reads, writes and calls are forwarded), but the factory only runs
+on first use.
+
+Every construction is timed in ``init_timings`` so ``python -m app
+--profile-startup`` (see ``app/__main__.py``) can report where start-up time
+goes.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+# name -> 构造耗时（秒），按首次初始化顺序
+init_timings: Dict[str, float] = {}
+_registry: List["LazySingleton[Any]"] = []
+
+
+class LazySingleton(Generic[T]):
+    """Proxy that builds ``factory()`` on first attribute access."""
+
+    __slots__ = ("_lazy_factory", "_lazy_name", "_lazy_lock", "_lazy_instance")
+
+    def __init__(self, factory: Callable[[], T], name: str) -> None:
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_lock", threading.RLock())
+        object.__setattr__(self, "_lazy_instance", None)
+        _registry.append(self)
+
+    def _lazy_get(self) -> T:
+        instance = self._lazy_instance
+        if instance is not None:
+            return instance
+        # RLock：工厂内部可能间接访问其它懒加载单例
+        with self._lazy_lock:
+            instance = self._lazy_instance
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._lazy_factory()
+                init_timings[self._lazy_name] = time.perf_counter() - started
+                object.__setattr__(self, "_lazy_instance", instance)
+        return instance
+
+    @property
+    def lazy_initialized(self) -> bool:
+        return self._lazy_instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._lazy_get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._lazy_get(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._lazy_get(), name)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._lazy_get()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        state = "ready" if self.lazy_initialized else "pending"
+        return f"<LazySingleton {self._lazy_name} ({state})>"
+
+
+def lazy_singletons() -> List["LazySingleton[Any]"]:
+    return list(_registry)
+
+
+def warm_up(names: Any = None) -> Dict[str, float]:
+    """Initialise registered singletons (all, or those in ``names``); returns their timings."""
+
+    wanted = set(names) if names else None
+    for singleton in list(_registry):
+        if wanted is None or singleton._lazy_name in wanted:
+            singleton._lazy_get()
+    return dict(init_timings)
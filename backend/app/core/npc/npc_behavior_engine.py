@@ -5,6 +5,7 @@ NPC行为引擎：处理NPC的AI驱动行为
 from typing import Dict, Any, Iterable, List, Optional, Set
 from dataclasses import dataclass
 
+from app.core.patch.world_patch import merge as merge_world_patch
 from app.core.story.level_schema import RuleListener
 
 
@@ -360,19 +361,7 @@ class NPCBehaviorEngine:
         return node
 
     def _merge_world_patch(self, base: Optional[Dict[str, Any]], addition: Dict[str, Any]) -> Dict[str, Any]:
-        if not addition:
-            return dict(base or {})
-        merged = dict(base or {})
-        for key, value in addition.items():
-            if key == "mc" and isinstance(value, dict):
-                existing = merged.get("mc")
-                if isinstance(existing, dict):
-                    merged["mc"] = {**existing, **value}
-                else:
-                    merged["mc"] = dict(value)
-            else:
-                merged[key] = value
-        return merged
+        return merge_world_patch(base, addition)
 
 
 # 全局实例
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Set, Tuple
+
+# 坐标打包：每轴偏移 2^31 后占 32 位，(x, y, z) 合成一个可排序的整数键
+_BIAS = 1 << 31
+
+
+class BlockArray:
+    """Columnar block list: int32 ``xs``/``ys``/``zs`` plus uint16 palette ids.
+
+    The generation pipeline (build → role mapping → merge → validate →
+    canonical hash) works on this instead of lists of ``{"x", "y", "z",
+    "role"/"block"}`` dicts: role→block mapping and whitelist checks touch
+    the palette rather than every block, sorting uses one packed integer key
+    per block, and dicts are only materialised by ``to_dicts`` where a result
+    leaves the pipeline. Tokens in ``palette`` are roles or block ids
+    depending on the stage.
+
+    Columns are append-only while building; the transforming methods return
+    new arrays and may share columns with their source, so a finished array
+    should be treated as immutable.
+    """
+
+    __slots__ = ("xs", "ys", "zs", "ids", "palette", "_index", "_canonical")
+
+    def __init__(self, palette: Iterable[str] = ()) -> None:
+        self.xs = array("i")
+        self.ys = array("i")
+        self.zs = array("i")
+        self.ids = array("H")
+        self.palette: List[str] = []
+        self._index: Dict[str, int] = {}
+        # 已按 (x, y, z, token) 排好序时为 True，canonical_order 可直接返回
+        self._canonical = False
+        for token in palette:
+            self.intern(token)
+
+    # ------------------------------------------------------------ building
+    @classmethod
+    def from_dicts(cls, entries: Iterable[Mapping[str, Any]], key: str = "block") -> "BlockArray":
+        """Build from ``{"x", "y", "z", key}`` dicts; ``ValueError`` on a malformed entry."""
+
+        blocks = cls()
+        for entry in entries:
+            if not isinstance(entry, Mapping):
+                raise ValueError("block entry must be an object")
+            x, y, z, token = entry.get("x"), entry.get("y"), entry.get("z"), entry.get(key)
+            if not isinstance(x, int) or not isinstance(y, int) or not isinstance(z, int):
+                raise ValueError("block coordinates must be integers")
+            if not isinstance(token, str):
+                raise ValueError(f"block {key} must be a string")
+            try:
+                blocks.append(x, y, z, token)
+            except OverflowError as exc:
+                raise ValueError("block coordinates out of range") from exc
+        return blocks
+
+    def intern(self, token: str) -> int:
+        index = self._index.get(token)
+        if index is None:
+            index = len(self.palette)
+            if index > 0xFFFF:
+                raise OverflowError("BlockArray palette is limited to 65536 entries")
+            self.palette.append(token)
+            self._index[token] = index
+        return index
+
+    def append(self, x: int, y: int, z: int, token: str) -> None:
+        self.xs.append(x)
+        self.ys.append(y)
+        self.zs.append(z)
+        self.ids.append(self.intern(token))
+
+    def add_box(self, xs: range, ys: range, zs: range, token: str) -> None:
+        """Append every cell of ``xs × ys × zs`` in x, y, z nesting order."""
+
+        index = self.intern(token)
+        count = len(ys) * len(zs)
+        for x in xs:
+            self.xs.extend(array("i", [x]) * count)
+            for y in ys:
+                self.ys.extend(array("i", [y]) * len(zs))
+                self.zs.extend(array("i", zs))
+        self.ids.extend(array("H", [index]) * (len(xs) * count))
+
+    def extend(self, other: "BlockArray") -> None:
+        self.xs.extend(other.xs)
+        self.ys.extend(other.ys)
+        self.zs.extend(other.zs)
+        if other.palette == self.palette[: len(other.palette)]:
+            self.ids.extend(other.ids)
+            return
+        table = array("H", (self.intern(token) for token in other.palette))
+        self.ids.extend(array("H", map(table.__getitem__, other.ids)))
+
+    # ------------------------------------------------------------- queries
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, str]]:
+        palette = self.palette
+        for x, y, z, index in zip(self.xs, self.ys, self.zs, self.ids):
+            yield x, y, z, palette[index]
+
+    def used_tokens(self) -> Set[str]:
+        return {self.palette[index] for index in set(self.ids)}
+
+    def first_index(self, tokens: Set[str]) -> int:
+        """Position of the first block whose token is in ``tokens`` (-1 if none)."""
+
+        wanted = {index for index, token in enumerate(self.palette) if token in tokens}
+        if wanted:
+            for position, index in enumerate(self.ids):
+                if index in wanted:
+                    return position
+        return -1
+
+    def first_y_outside(self, low: int, high: int) -> int:
+        if not self.ys or (low <= min(self.ys) and max(self.ys) <= high):
+            return -1
+        for position, y in enumerate(self.ys):
+            if y < low or y > high:
+                return position
+        return -1
+
+    def positions(self) -> List[int]:
+        bias = _BIAS
+        return [((x + bias) << 64) | ((y + bias) << 32) | (z + bias) for x, y, z in zip(self.xs, self.ys, self.zs)]
+
+    def has_duplicate_positions(self) -> bool:
+        return len(set(zip(self.xs, self.ys, self.zs))) != len(self)
+
+    def to_dicts(self, key: str = "block") -> List[Dict[str, Any]]:
+        palette = self.palette
+        return [
+            {"x": x, "y": y, "z": z, key: palette[index]}
+            for x, y, z, index in zip(self.xs, self.ys, self.zs, self.ids)
+        ]
+
+    # ---------------------------------------------------------- transforms
+    def _with_ids(self, palette: List[str], ids: array) -> "BlockArray":
+        result = BlockArray()
+        result.xs, result.ys, result.zs = self.xs, self.ys, self.zs
+        result.ids = ids
+        result.palette = palette
+        result._index = {token: index for index, token in enumerate(palette)}
+        return result
+
+    def remap(self, mapping: Mapping[str, str]) -> "BlockArray":
+        """Replace every token through ``mapping`` (``KeyError`` for an unmapped token in use)."""
+
+        used = set(self.ids)
+        palette: List[str] = []
+        seen: Dict[str, int] = {}
+        table = array("H", [0]) * len(self.palette)
+        for index, token in enumerate(self.palette):
+            if index not in used:
+                continue
+            target = mapping[token]
+            slot = seen.get(target)
+            if slot is None:
+                slot = seen[target] = len(palette)
+                palette.append(target)
+            table[index] = slot
+        if palette == self.palette:
+            return self._with_ids(palette, self.ids)
+        return self._with_ids(palette, array("H", map(table.__getitem__, self.ids)))
+
+    def translate(self, dx: int, dy: int, dz: int) -> "BlockArray":
+        result = self._with_ids(list(self.palette), self.ids)
+        result.xs = array("i", [x + dx for x in self.xs]) if dx else self.xs
+        result.ys = array("i", [y + dy for y in self.ys]) if dy else self.ys
+        result.zs = array("i", [z + dz for z in self.zs]) if dz else self.zs
+        return result
+
+    def select(self, keep: Sequence[int]) -> "BlockArray":
+        """New array with the blocks at positions ``keep`` (in that order)."""
+
+        result = BlockArray()
+        xs, ys, zs, ids = self.xs, self.ys, self.zs, self.ids
+        result.xs = array("i", [xs[i] for i in keep])
+        result.ys = array("i", [ys[i] for i in keep])
+        result.zs = array("i", [zs[i] for i in keep])
+        result.ids = array("H", [ids[i] for i in keep])
+        result.palette = list(self.palette)
+        result._index = dict(self._index)
+        return result
+
+    def without(self, cells: Set[Tuple[int, int, int]], token: str) -> "BlockArray":
+        """Drop blocks with ``token`` whose position is in ``cells``."""
+
+        index = self._index.get(token)
+        if index is None or not cells:
+            return self
+        keep = [
+            i
+            for i, (x, y, z, block) in enumerate(zip(self.xs, self.ys, self.zs, self.ids))
+            if block != index or (x, y, z) not in cells
+        ]
+        return self if len(keep) == len(self) else self.select(keep)
+
+    def canonical_order(self) -> List[int]:
+        """Positions sorted by ``(x, y, z, token)``."""
+
+        if self._canonical:
+            return list(range(len(self)))
+        ranks = array("H", [0]) * len(self.palette)
+        for rank, index in enumerate(sorted(range(len(self.palette)), key=self.palette.__getitem__)):
+            ranks[index] = rank
+        keys = [(position << 16) | ranks[index] for position, index in zip(self.positions(), self.ids)]
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    def sorted(self) -> "BlockArray":
+        if self._canonical:
+            return self
+        result = self.select(self.canonical_order())
+        result._canonical = True
+        return result
+
+    # ------------------------------------------------------------- hashing
+    def canonical_hash(self) -> str:
+        """sha256 of ``json.dumps(sorted to_dicts(), ensure_ascii=False, sort_keys=True)``.
+
+        Identical to the hash ``merge_blocks`` has always reported, but the
+        JSON text is formatted straight from the columns instead of building
+        and encoding the dict list first.
+        """
+
+        blocks = self.sorted()
+        prefixes = ['{"block": ' + json.dumps(token, ensure_ascii=False) + ', "x": ' for token in blocks.palette]
+        body = ", ".join(
+            [
+                f'{prefixes[index]}{x}, "y": {y}, "z": {z}}}'
+                for x, y, z, index in zip(blocks.xs, blocks.ys, blocks.zs, blocks.ids)
+            ]
+        )
+        return hashlib.sha256(f"[{body}]".encode("utf-8")).hexdigest()
+
+
+def _canonical_tokens(blocks: BlockArray) -> Tuple[List[Tuple[int, int, int]], List[str]]:
+    """``(positions, tokens)`` in an order where, per position, the token sorting last comes last."""
+
+    order = blocks.canonical_order() if blocks.has_duplicate_positions() else range(len(blocks))
+    xs, ys, zs, ids, palette = blocks.xs, blocks.ys, blocks.zs, blocks.ids, blocks.palette
+    return [(xs[i], ys[i], zs[i]) for i in order], [palette[ids[i]] for i in order]
+
+
+def merge_block_arrays(scene: BlockArray, spec: BlockArray) -> Tuple[BlockArray, int, int]:
+    """Overlay ``scene`` on ``spec`` with the ``merge_blocks`` conflict rules.
+
+    Both inputs are applied in canonical order (so for duplicate positions the
+    token sorting last wins); a scene block replaces a spec block unless the
+    scene block is ``air`` and the spec block is not. Returns the merged array
+    in canonical order plus ``(conflicts_total, spec_dropped_total)``.
+    """
+
+    scene = scene.remap({token: token.strip() for token in scene.palette})
+    spec = spec.remap({token: token.strip() for token in spec.palette})
+
+    spec_keys, spec_tokens = _canonical_tokens(spec)
+    merged: Dict[Tuple[int, int, int], str] = dict(zip(spec_keys, spec_tokens))
+
+    conflicts_total = 0
+    spec_dropped_total = 0
+    if scene.has_duplicate_positions():
+        scene_keys, scene_tokens = _canonical_tokens(scene)
+        for key, token in zip(scene_keys, scene_tokens):
+            existing = merged.get(key)
+            if existing is not None:
+                conflicts_total += 1
+                if token == "air" and existing != "air":
+                    continue
+                spec_dropped_total += 1
+            merged[key] = token
+    else:
+        # 场景内坐标唯一：只有与 spec 重叠的格子需要逐个判断
+        scene_keys = list(zip(scene.xs, scene.ys, scene.zs))
+        scene_tokens = [scene.palette[index] for index in scene.ids]
+        overlap = merged.keys() & set(scene_keys)
+        kept: Dict[Tuple[int, int, int], str] = {}
+        if overlap:
+            conflicts_total = len(overlap)
+            if "air" in scene.palette:
+                for key, token in zip(scene_keys, scene_tokens):
+                    if token == "air" and key in overlap and merged[key] != "air":
+                        kept[key] = merged[key]
+            spec_dropped_total = conflicts_total - len(kept)
+        merged.update(zip(scene_keys, scene_tokens))
+        merged.update(kept)
+
+    keys = sorted(merged)
+    tokens = [merged[key] for key in keys]
+    result = BlockArray(sorted(set(tokens)))
+    if keys:
+        xs, ys, zs = zip(*keys)
+        result.xs, result.ys, result.zs = array("i", xs), array("i", ys), array("i", zs)
+        result.ids = array("H", map(result._index.__getitem__, tokens))
+    result._canonical = True
+    return result, conflicts_total, spec_dropped_total
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any
 
 from app.core.generation.material_alias_mapper import BLOCK_ID_WHITELIST
+from app.core.patch.block_array import BlockArray
 
 
 MIN_WORLD_Y = 0
@@ -17,7 +18,34 @@ SCENE_BLOCK_ID_WHITELIST = {
 ALLOWED_BLOCK_IDS = set(BLOCK_ID_WHITELIST) | SCENE_BLOCK_ID_WHITELIST
 
 
-def validate_blocks(blocks: list[dict], *, max_blocks: int = 5000) -> dict:
+def validate_block_array(blocks: BlockArray, *, max_blocks: int = 5000) -> dict:
+    """``validate_blocks`` for a ``BlockArray``: block ids are checked per palette entry.
+
+    Coordinates are integers by construction; the first offending block
+    decides the failure code exactly as in the per-dict loop.
+    """
+
+    if len(blocks) == 0:
+        return {"status": "REJECTED", "failure_code": "EMPTY_BLOCKS"}
+
+    if len(blocks) > max_blocks:
+        return {"status": "REJECTED", "failure_code": "TOO_MANY_BLOCKS"}
+
+    invalid_ids = {token for token in blocks.used_tokens() if not token.strip() or token not in ALLOWED_BLOCK_IDS}
+    bad_coord = blocks.first_y_outside(MIN_WORLD_Y, MAX_WORLD_Y)
+    bad_block = blocks.first_index(invalid_ids) if invalid_ids else -1
+    if bad_coord >= 0 and (bad_block < 0 or bad_coord <= bad_block):
+        return {"status": "REJECTED", "failure_code": "INVALID_COORD"}
+    if bad_block >= 0:
+        return {"status": "REJECTED", "failure_code": "INVALID_BLOCK_ID"}
+
+    return {"status": "VALID", "failure_code": "NONE"}
+
+
+def validate_blocks(blocks: list[dict] | BlockArray, *, max_blocks: int = 5000) -> dict:
+    if isinstance(blocks, BlockArray):
+        return validate_block_array(blocks, max_blocks=max_blocks)
+
     if not isinstance(blocks, list) or len(blocks) == 0:
         return {"status": "REJECTED", "failure_code": "EMPTY_BLOCKS"}
 
@@ -0,0 +1,192 @@
+# backend/app/core/patch/world_patch.py
+"""World patch algebra shared by the story, quest, NPC and scene code.
+
+A world patch is ``{"mc": {command: payload, ...}, other_key: value, ...}``.
+Every merge of such patches goes through ``merge`` / ``merge_into`` /
+``compose`` with one conflict policy:
+
+1. ``None`` on the right-hand side means "no change" and is skipped.
+2. Mappings are merged key by key down to ``depth`` levels (default
+   ``WORLD_PATCH_DEPTH`` = the patch root and its ``mc`` block). Below that a
+   command payload is atomic: the right-hand payload replaces the left one
+   as a whole (a later ``teleport`` never inherits fields of an earlier one).
+3. Keys listed in ``append_keys`` accumulate instead of replacing: both sides
+   are concatenated into one list (``MC_QUEUE_KEYS``: build/spawn/tell queues).
+4. Otherwise the right-hand side wins.
+
+Merges never modify their inputs and never deep-copy: only the mappings on
+the paths ``addition`` touches are copied (shallowly), everything else is
+shared by reference. Patches that are stored and handed out repeatedly
+(emotional profiles) are ``freeze``-d so that sharing is safe —
+``FrozenPatch`` / ``FrozenList`` are read-only ``dict`` / ``list`` subclasses,
+so they still serialise to JSON, and ``copy``/``deepcopy`` return them as is.
+
+Patches handed out by StoryEngine (level entry, advance) follow the same
+rule at the API boundary: the caller owns the top-level dict and the ``mc``
+block, so adding or replacing commands is fine, but nested command payloads
+may be frozen and shared. Use ``merge`` to override a payload, or ``thaw`` a
+payload before editing it in place; writing into a frozen one raises
+``TypeError``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+# patch 根 + mc 块；更深层的指令 payload 整体替换
+WORLD_PATCH_DEPTH = 2
+
+# 这些 mc 指令是队列：多个来源的条目依次累加
+MC_QUEUE_KEYS = frozenset({"build", "build_multi", "spawn", "spawn_multi", "tell"})
+
+
+def _read_only(self: Any, *args: Any, **kwargs: Any) -> None:
+    raise TypeError(f"{type(self).__name__} is read-only; merge() or thaw() it first")
+
+
+class FrozenPatch(dict):
+    """Read-only ``dict`` that can be shared between patches without copying."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> "FrozenPatch":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "FrozenPatch":
+        return self
+
+    def __reduce__(self):
+        return (FrozenPatch, (dict(self),))
+
+
+class FrozenList(list):
+    """Read-only ``list`` counterpart of ``FrozenPatch``."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+
+    def __copy__(self) -> "FrozenList":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "FrozenList":
+        return self
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert mappings/lists into ``FrozenPatch``/``FrozenList``."""
+
+    if isinstance(value, (FrozenPatch, FrozenList)):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenPatch({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Plain mutable ``dict``/``list`` copy of a (possibly frozen) patch."""
+
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def merge(
+    base: Optional[Mapping[str, Any]],
+    addition: Optional[Mapping[str, Any]],
+    *,
+    depth: int = WORLD_PATCH_DEPTH,
+    append_keys: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Return ``base`` updated with ``addition`` (``addition`` wins conflicts)."""
+
+    result = dict(base) if isinstance(base, Mapping) else {}
+    if isinstance(addition, Mapping) and addition:
+        _merge_node(result, addition, depth, frozenset(append_keys), {id(result): result})
+    return result
+
+
+def merge_into(
+    target: Dict[str, Any],
+    addition: Optional[Mapping[str, Any]],
+    *,
+    depth: int = WORLD_PATCH_DEPTH,
+    append_keys: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Merge ``addition`` into the caller-owned ``target`` and return it.
+
+    ``target`` itself is updated in place; nested mappings and lists it shares
+    with other patches are still copied before being changed.
+    """
+
+    if isinstance(addition, Mapping) and addition:
+        _merge_node(target, addition, depth, frozenset(append_keys), {id(target): target})
+    return target
+
+
+def compose(
+    *patches: Optional[Mapping[str, Any]],
+    depth: int = WORLD_PATCH_DEPTH,
+    append_keys: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Fold ``patches`` left to right (later patches win).
+
+    Equivalent to chaining ``merge``, but a node copied by an earlier step is
+    updated in place by later ones instead of being copied again.
+    """
+
+    result: Dict[str, Any] = {}
+    owned: Dict[int, Any] = {id(result): result}
+    keys = frozenset(append_keys)
+    for patch in patches:
+        if isinstance(patch, Mapping) and patch:
+            _merge_node(result, patch, depth, keys, owned)
+    return result
+
+
+def _merge_node(
+    target: Dict[str, Any],
+    addition: Mapping[str, Any],
+    depth: int,
+    append_keys: frozenset,
+    owned: Dict[int, Any],
+) -> None:
+    # owned：本次合并新建的节点（id -> 对象，持有引用保证 id 不被复用），可原地修改
+    for key, value in addition.items():
+        if value is None:
+            continue
+        existing = target.get(key)
+        if key in append_keys:
+            items = value if isinstance(value, (list, tuple)) else (value,)
+            if isinstance(existing, list) and id(existing) in owned:
+                existing.extend(items)
+                continue
+            if existing is None:
+                merged = list(items)
+            elif isinstance(existing, (list, tuple)):
+                merged = [*existing, *items]
+            else:
+                merged = [existing, *items]
+            owned[id(merged)] = merged
+            target[key] = merged
+        elif depth > 1 and isinstance(value, Mapping):
+            if isinstance(existing, dict) and id(existing) in owned:
+                node = existing
+            else:
+                node = dict(existing) if isinstance(existing, Mapping) else {}
+                owned[id(node)] = node
+                target[key] = node
+            _merge_node(node, value, depth - 1, append_keys, owned)
+        else:
+            target[key] = value
@@ -0,0 +1,82 @@
+# backend/app/core/player_locks.py
+"""Per-player locks shared by the in-memory runtime singletons.
+
+StoryEngine, QuestRuntime, MiniMap, TriggerEngine and the world API all keep
+per-player dicts that are mutated from FastAPI's threadpool and event loop.
+They share one registry so that a single player's state is only touched by
+one writer at a time, while different players proceed in parallel.
+
+- ``player_locks.lock(player_id)``: re-entrant ``threading.RLock`` guarding the
+  sync critical sections (re-entrant because the singletons call each other).
+- ``player_locks.alock(player_id)``: ``asyncio.Lock`` serialising whole async
+  requests of one player (single writer per player on the event loop).
+- ``@player_locked``: method decorator taking ``player_id`` from the first
+  positional argument or the ``player_id`` keyword.
+
+Always lock one player at a time; code holding a player's lock must not take
+another player's lock.
+
+Both maps hold their locks weakly: a lock lives while someone holds or waits
+on it (the ``with`` statement keeps a reference), so concurrent callers for
+the same player always share it, and idle players' entries disappear instead
+of accumulating one lock per player id ever seen.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Any, Callable, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class PlayerLockRegistry:
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: "weakref.WeakValueDictionary[str, threading.RLock]" = weakref.WeakValueDictionary()
+        self._async_locks: (
+            "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary[str, asyncio.Lock]]"
+        ) = weakref.WeakKeyDictionary()
+
+    def lock(self, player_id: Any) -> threading.RLock:
+        key = str(player_id or "default")
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.get(key)
+                if lock is None:
+                    lock = threading.RLock()
+                    self._locks[key] = lock
+        return lock
+
+    def alock(self, player_id: Any) -> asyncio.Lock:
+        key = str(player_id or "default")
+        loop = asyncio.get_running_loop()
+        with self._guard:
+            per_loop = self._async_locks.get(loop)
+            if per_loop is None:
+                per_loop = weakref.WeakValueDictionary()
+                self._async_locks[loop] = per_loop
+            lock = per_loop.get(key)
+            if lock is None:
+                lock = asyncio.Lock()
+                per_loop[key] = lock
+        return lock
+
+
+player_locks = PlayerLockRegistry()
+
+
+def player_locked(method: F) -> F:
+    """Run ``method(self, player_id, ...)`` while holding that player's lock."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        player_id = args[0] if args else kwargs.get("player_id")
+        with player_locks.lock(player_id):
+            return method(self, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
@@ -5,13 +5,15 @@ from __future__ import annotations
 import copy
 import logging
 import time
-from dataclasses import dataclass, field, is_dataclass
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
 from enum import Enum
 from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from app.core.story.story_loader import Level, TUTORIAL_CANONICAL_ID
 from app.core.story.level_schema import RuleListener
 from app.core.npc import npc_engine
+from app.core.patch.world_patch import merge as merge_world_patch
+from app.core.player_locks import player_locked, player_locks
 
 
 logger = logging.getLogger(__name__)
@@ -281,6 +283,7 @@ class QuestRuntime:
 
         self._orphan_callback = callback
 
+    @player_locked
     def handle_rule_trigger(self, player_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Handle an incoming rule trigger and advance relevant tasks."""
 
@@ -470,6 +473,7 @@ class QuestRuntime:
 
         return suggestion
 
+    @player_locked
     def get_exit_readiness(self, player_id: str) -> Optional[Dict[str, Any]]:
         """Return exit readiness snapshot for the player (stub)."""
 
@@ -487,6 +491,10 @@ class QuestRuntime:
     # Lifecycle
     # ------------------------------------------------------------------
     def load_level_tasks(self, level: Level, player_id: str) -> None:
+        with player_locks.lock(player_id):
+            self._load_level_tasks(level, player_id)
+
+    def _load_level_tasks(self, level: Level, player_id: str) -> None:
         tasks = [self._create_session(raw, index) for index, raw in enumerate(level.tasks or [])]
         state = {
             "player_id": player_id,
@@ -517,12 +525,14 @@ class QuestRuntime:
 
         self._players[player_id] = state
 
+    @player_locked
     def exit_level(self, player_id: str) -> None:
         self._players.pop(player_id, None)
 
     # ------------------------------------------------------------------
     # Event ingestion and beat coordination
     # ------------------------------------------------------------------
+    @player_locked
     def record_event(self, player_id: str, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         state = self._players.get(player_id)
         if not state:
@@ -652,6 +662,7 @@ class QuestRuntime:
     # ------------------------------------------------------------------
     # Task coordination helpers
     # ------------------------------------------------------------------
+    @player_locked
     def assign_dynamic_task(self, player_id: str, task_def: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         state = self._players.get(player_id)
         if not state:
@@ -665,6 +676,7 @@ class QuestRuntime:
             "count": session.count,
         }
 
+    @player_locked
     def get_runtime_snapshot(self, player_id: str) -> Dict[str, Any]:
         state = self._players.get(player_id, {})
         return {
@@ -684,6 +696,68 @@ class QuestRuntime:
             "active_rule_refs": sorted(list(state.get("active_rule_refs", []))),
         }
 
+    # ------------------------------------------------------------------
+    # Session persistence
+    # ------------------------------------------------------------------
+    _SESSION_SCALARS = (
+        "issued_index",
+        "completed_count",
+        "summary_emitted",
+        "last_completed_type",
+        "last_rule_event",
+        "recent_rule_events",
+        "rule_events",
+        "tutorial_tracker",
+    )
+
+    @player_locked
+    def export_session(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """JSON-safe snapshot of the player's task sessions (``None`` if no level)."""
+
+        state = self._players.get(player_id)
+        if not state:
+            return None
+        data: Dict[str, Any] = {
+            "level_id": state.get("level_id"),
+            "tasks": [asdict(session) for session in state.get("tasks", [])],
+            "active_rule_refs": sorted(state.get("active_rule_refs", set())),
+        }
+        for key in self._SESSION_SCALARS:
+            if key in state:
+                data[key] = copy.deepcopy(state[key])
+        return data
+
+    @player_locked
+    def restore_session(self, player_id: str, data: Dict[str, Any]) -> bool:
+        """Overlay a snapshot from :meth:`export_session` onto the loaded level state."""
+
+        state = self._players.get(player_id)
+        if not state or state.get("level_id") != data.get("level_id"):
+            return False
+
+        state["tasks"] = [
+            self._session_from_dict(raw)
+            for raw in data.get("tasks") or []
+            if isinstance(raw, dict) and raw.get("id")
+        ]
+        state["active_rule_refs"] = set(data.get("active_rule_refs") or [])
+        for key in self._SESSION_SCALARS:
+            if key in data:
+                state[key] = copy.deepcopy(data[key])
+        return True
+
+    @staticmethod
+    def _session_from_dict(raw: Dict[str, Any]) -> TaskSession:
+        allowed = {f.name for f in fields(TaskSession)}
+        milestone_fields = {f.name for f in fields(TaskMilestone)}
+        payload = {k: v for k, v in raw.items() if k in allowed}
+        payload["milestones"] = [
+            TaskMilestone(**{k: v for k, v in item.items() if k in milestone_fields})
+            for item in raw.get("milestones") or []
+            if isinstance(item, dict) and item.get("id")
+        ]
+        return TaskSession(**payload)
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
@@ -1196,6 +1270,7 @@ class QuestRuntime:
 
         return snapshot
 
+    @player_locked
     def get_active_tasks_snapshot(self, player_id: str) -> Optional[Dict[str, Any]]:
         state = self._players.get(player_id)
         if not state:
@@ -1207,6 +1282,7 @@ class QuestRuntime:
         result["player_id"] = player_id
         return result
 
+    @player_locked
     def get_debug_snapshot(self, player_id: str) -> Optional[Dict[str, Any]]:
         state = self._players.get(player_id)
         if not state:
@@ -1704,19 +1780,7 @@ class QuestRuntime:
 
     @staticmethod
     def _merge_patch(base: Optional[Dict[str, Any]], addition: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        if not addition:
-            return dict(base or {})
-        merged = dict(base or {})
-        for key, value in addition.items():
-            if key == "mc" and isinstance(value, dict):
-                existing = merged.get("mc")
-                if isinstance(existing, dict):
-                    merged["mc"] = {**existing, **value}
-                else:
-                    merged["mc"] = dict(value)
-            else:
-                merged[key] = value
-        return merged
+        return merge_world_patch(base, addition)
 
 
 quest_runtime = QuestRuntime()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
+from app.core.generation.artifact_cache import ARTIFACT_ENGINE_VERSION, artifact_cache, artifact_key
 from app.core.generation.deterministic_build_engine import build_from_spec
 from app.core.generation.material_alias_mapper import map_roles_to_blocks
 from app.core.scene.scene_spec_validator import validate_scene_spec
@@ -50,20 +51,18 @@ def _village_blocks() -> List[Dict[str, Any]] | None:
         },
     }
 
-    first = build_from_spec(house_spec)
-    second = build_from_spec(house_spec)
-    if first.get("build_status") != "SUCCESS" or second.get("build_status") != "SUCCESS":
+    # 两座房子完全相同：只构建/映射一次，第二座按 x+20 平移复用
+    house = build_from_spec(house_spec)
+    if house.get("build_status") != "SUCCESS":
         return None
 
-    first_mapped = map_roles_to_blocks(first.get("blocks") or [], "wood")
-    second_mapped = map_roles_to_blocks(second.get("blocks") or [], "wood")
-    if first_mapped.get("status") != "SUCCESS" or second_mapped.get("status") != "SUCCESS":
+    mapped = map_roles_to_blocks(house.get("blocks") or [], "wood")
+    if mapped.get("status") != "SUCCESS":
         return None
 
-    blocks: List[Dict[str, Any]] = []
-    for b in first_mapped.get("blocks") or []:
-        blocks.append(dict(b))
-    for b in second_mapped.get("blocks") or []:
+    house_blocks = mapped.get("blocks") or []
+    blocks: List[Dict[str, Any]] = [dict(b) for b in house_blocks]
+    for b in house_blocks:
         blocks.append({"x": b["x"] + 20, "y": b["y"], "z": b["z"], "block": b["block"]})
 
     blocks.append({"x": 10, "y": 1, "z": 8, "block": "npc_placeholder"})
@@ -91,15 +90,7 @@ def _forest_blocks() -> List[Dict[str, Any]]:
     return blocks
 
 
-def generate_scene_patch(scene_spec: dict) -> dict:
-    validation = validate_scene_spec(scene_spec)
-    if validation.get("status") != "VALID":
-        return _reject(validation.get("failure_code", "INVALID_SCENE_SPEC"))
-
-    normalized = validation.get("scene_spec")
-    if not isinstance(normalized, dict):
-        return _reject("INVALID_SCENE_SPEC")
-
+def _build_scene_patch(normalized: Dict[str, Any]) -> Dict[str, Any]:
     scene_type = normalized["scene_type"]
     if scene_type == "lake":
         blocks = _lake_blocks()
@@ -123,3 +114,16 @@ def generate_scene_patch(scene_spec: dict) -> dict:
         "scene_path": "scene_engine_v1",
         "scene_spec": normalized,
     }
+
+
+def generate_scene_patch(scene_spec: dict) -> dict:
+    validation = validate_scene_spec(scene_spec)
+    if validation.get("status") != "VALID":
+        return _reject(validation.get("failure_code", "INVALID_SCENE_SPEC"))
+
+    normalized = validation.get("scene_spec")
+    if not isinstance(normalized, dict):
+        return _reject("INVALID_SCENE_SPEC")
+
+    key = artifact_key("scene", scene_spec=normalized, engine_version=ARTIFACT_ENGINE_VERSION)
+    return artifact_cache.get_or_compute("scene", key, lambda: _build_scene_patch(normalized))
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import Any, Dict
 
 from app.core.generation.spec_engine_v1 import generate_patch_from_text_v1
-from app.core.patch.patch_merge_v1 import merge_blocks
+from app.core.patch.patch_merge_v1 import merge_block_arrays_v1, merge_result_blocks
 from app.core.patch.patch_validate_v1 import validate_blocks
 from app.core.scene.scene_engine_v1 import generate_scene_patch
 from app.core.scene.scene_llm_v1 import generate_scene_spec_from_text_v1
@@ -68,7 +68,8 @@ def compose_scene_and_structure(prompt: str) -> dict:
     scene_blocks = scene_patch.get("blocks") or []
     spec_blocks = structure_patch.get("blocks") or []
 
-    merged = merge_blocks(scene_blocks, spec_blocks)
+    merged_array = merge_block_arrays_v1(scene_blocks, spec_blocks)
+    merged = merge_result_blocks(merged_array)
     if merged.get("status") != "SUCCESS":
         return _reject(
             merged.get("failure_code", "MERGE_FAILED"),
@@ -80,7 +81,7 @@ def compose_scene_and_structure(prompt: str) -> dict:
             },
         )
 
-    validation = validate_blocks(merged.get("blocks") or [])
+    validation = validate_blocks(merged_array["array"])
     if validation.get("status") != "VALID":
         return _reject(
             validation.get("failure_code", "INVALID_BLOCKS"),
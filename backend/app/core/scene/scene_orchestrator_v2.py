@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
 
-from app.core.generation.spec_engine_v1 import generate_patch_from_text_v1
+from app.core.generation.spec_engine_v1 import generate_patch_from_spec_result_v1
 from app.core.generation.spec_llm_v1 import generate_spec_from_text_v1
 from app.core.mapping.projection_rule_registry import (
     DEFAULT_RULE_VERSION,
@@ -11,7 +15,7 @@ from app.core.mapping.projection_rule_registry import (
     projection_supported,
 )
 from app.core.mapping.v2_mapper import map_scene_v2
-from app.core.patch.patch_merge_v1 import merge_blocks
+from app.core.patch.patch_merge_v1 import merge_block_arrays_v1, merge_result_blocks
 from app.core.patch.patch_validate_v1 import validate_blocks
 from app.core.scene.scene_llm_v1 import generate_scene_spec_from_text_v1
 
@@ -20,6 +24,15 @@ PROJECTION_ATMOSPHERE_FOG_EFFECT = "atmosphere.fog"
 PROJECTION_NPC_LAKE_GUARD_EFFECT = "npc_behavior.lake_guard"
 ENGINE_VERSION = "engine_v2_1"
 
+# 场景 spec 与结构 spec 是同一 prompt 上两次独立的 LLM 调用：结构 spec 提交到线程池，
+# 场景 spec 在当前线程执行，注入延迟从两次调用之和降到较慢的一次。<=0 时顺序执行
+SPEC_EXTRACT_WORKERS = int(os.getenv("DRIFT_SPEC_EXTRACT_WORKERS", "4"))
+_SPEC_POOL = (
+    ThreadPoolExecutor(max_workers=SPEC_EXTRACT_WORKERS, thread_name_prefix="spec-extract")
+    if SPEC_EXTRACT_WORKERS > 0
+    else None
+)
+
 
 def _reject(failure_code: str, metadata: Dict[str, Any] | None = None) -> Dict[str, Any]:
     payload = {
@@ -47,9 +60,8 @@ def _reject(failure_code: str, metadata: Dict[str, Any] | None = None) -> Dict[s
     return payload
 
 
-def _build_mapper_context(prompt: str, scene_spec: dict, *, strict_mode: bool) -> dict:
+def _build_mapper_context(prompt: str, scene_spec: dict, *, strict_mode: bool, spec_result: dict) -> dict:
     projected_structure_spec: dict = {}
-    spec_result = generate_spec_from_text_v1(prompt)
     if spec_result.get("status") == "VALID" and isinstance(spec_result.get("spec"), dict):
         projected_structure_spec = spec_result.get("spec") or {}
 
@@ -218,8 +230,45 @@ def _project_npc_lake_guard_blocks(spec_blocks: list[dict], projection_rule: dic
     ], 0
 
 
+@contextmanager
+def _timed_stage(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 3)
+
+
+def _timed_call(timings: Dict[str, float], stage: str, func: Callable[[str], dict], prompt: str) -> dict:
+    with _timed_stage(timings, stage):
+        return func(prompt)
+
+
+def _extract_specs(prompt: str, timings: Dict[str, float]) -> Tuple[dict, dict]:
+    """``(scene_spec_result, spec_result)`` for ``prompt``, both LLM stages running concurrently."""
+
+    with _timed_stage(timings, "spec_extraction"):
+        if _SPEC_POOL is None:
+            scene_spec_result = _timed_call(timings, "scene_spec", generate_scene_spec_from_text_v1, prompt)
+            spec_result = _timed_call(timings, "structure_spec", generate_spec_from_text_v1, prompt)
+        else:
+            future = _SPEC_POOL.submit(_timed_call, timings, "structure_spec", generate_spec_from_text_v1, prompt)
+            scene_spec_result = _timed_call(timings, "scene_spec", generate_scene_spec_from_text_v1, prompt)
+            spec_result = future.result()
+    return scene_spec_result, spec_result
+
+
 def compose_scene_and_structure_v2(prompt: str, *, strict_mode: bool = False) -> dict:
-    scene_spec_result = generate_scene_spec_from_text_v1(prompt)
+    timings: Dict[str, float] = {}
+    result = _compose_v2(prompt, strict_mode=strict_mode, timings=timings)
+    # 各阶段耗时（毫秒），由 story_api 写入 debug trace
+    result["stage_timings_ms"] = timings
+    return result
+
+
+def _compose_v2(prompt: str, *, strict_mode: bool, timings: Dict[str, float]) -> dict:
+    # 结构 spec 的 LLM 调用与场景 spec 并发，即使场景阶段随后被拒绝也已提前发出
+    scene_spec_result, spec_result = _extract_specs(prompt, timings)
     if scene_spec_result.get("status") != "VALID":
         return _reject(scene_spec_result.get("failure_code", "INVALID_SCENE_SPEC"))
 
@@ -227,8 +276,9 @@ def compose_scene_and_structure_v2(prompt: str, *, strict_mode: bool = False) ->
     if not isinstance(scene_spec, dict):
         return _reject("INVALID_SCENE_SPEC")
 
-    mapper_context = _build_mapper_context(prompt, scene_spec, strict_mode=strict_mode)
-    mapping_result = map_scene_v2(scene_spec, mapper_context)
+    with _timed_stage(timings, "mapping"):
+        mapper_context = _build_mapper_context(prompt, scene_spec, strict_mode=strict_mode, spec_result=spec_result)
+        mapping_result = map_scene_v2(scene_spec, mapper_context)
 
     if mapping_result.get("status") == "REJECTED":
         return _reject(
@@ -240,7 +290,8 @@ def compose_scene_and_structure_v2(prompt: str, *, strict_mode: bool = False) ->
             },
         )
 
-    structure_patch = generate_patch_from_text_v1(prompt)
+    with _timed_stage(timings, "structure_build"):
+        structure_patch = generate_patch_from_spec_result_v1(spec_result)
     if structure_patch.get("build_status") != "SUCCESS":
         return _reject(
             structure_patch.get("failure_code", "STRUCTURE_PATCH_FAILED"),
@@ -319,7 +370,9 @@ def compose_scene_and_structure_v2(prompt: str, *, strict_mode: bool = False) ->
                 )
                 decisions.sort(key=lambda item: (str(item.get("rule_id", "")), str(item.get("semantic", "")), str(item.get("decision", ""))))
 
-    merged = merge_blocks(scene_blocks, spec_blocks)
+    with _timed_stage(timings, "merge"):
+        merged_array = merge_block_arrays_v1(scene_blocks, spec_blocks)
+        merged = merge_result_blocks(merged_array)
     if merged.get("status") != "SUCCESS":
         return _reject(
             merged.get("failure_code", "MERGE_FAILED"),
@@ -332,7 +385,8 @@ def compose_scene_and_structure_v2(prompt: str, *, strict_mode: bool = False) ->
             },
         )
 
-    validation = validate_blocks(merged.get("blocks") or [])
+    with _timed_stage(timings, "validate"):
+        validation = validate_blocks(merged_array["array"])
     if validation.get("status") != "VALID":
         return _reject(
             validation.get("failure_code", "INVALID_BLOCKS"),
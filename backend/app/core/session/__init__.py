@@ -0,0 +1,17 @@
+"""Externalized player session persistence."""
+
+from .store import (
+    InMemorySessionStore,
+    SQLiteSessionStore,
+    SessionStore,
+    get_session_store,
+    set_session_store,
+)
+
+__all__ = [
+    "SessionStore",
+    "InMemorySessionStore",
+    "SQLiteSessionStore",
+    "get_session_store",
+    "set_session_store",
+]
@@ -0,0 +1,226 @@
+# backend/app/core/session/store.py
+"""Pluggable persistence for per-player runtime sessions.
+
+Runtime singletons (StoryEngine, QuestRuntime, MiniMap, StoryGraph) keep the
+hot state in memory; a ``SessionStore`` holds a JSON snapshot per
+``(player_id, namespace)`` so that progress survives restarts and a player can
+be picked up by another worker process (route players sticky by player_id;
+the store is the hand-off point, not a shared live cache).
+
+Backends:
+
+- ``InMemorySessionStore``: process-local; useful for tests and tooling.
+- ``SQLiteSessionStore``: WAL-mode SQLite file with write-behind batching;
+  ``put`` only records the snapshot in a dirty map and a background thread
+  flushes batches, so the request path stays memory-speed. Entries leave the
+  dirty map only once their batch has committed (reads keep seeing them, and
+  a failed commit leaves them queued for the next flush).
+
+Selected with ``DRIFT_SESSION_STORE=memory|sqlite`` and ``DRIFT_SESSION_DB``;
+unset (or ``off``) disables persistence, which keeps the original behaviour.
+"""
+
+from __future__ import annotations
+
+import abc
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+SESSION_BACKEND = os.getenv("DRIFT_SESSION_STORE", "off").lower()
+SESSION_DB_PATH = os.getenv(
+    "DRIFT_SESSION_DB",
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "runtime", "sessions.sqlite3"),
+)
+SESSION_FLUSH_INTERVAL = float(os.getenv("DRIFT_SESSION_FLUSH_INTERVAL", "0.5"))
+SESSION_FLUSH_BATCH = int(os.getenv("DRIFT_SESSION_FLUSH_BATCH", "64"))
+
+_Key = Tuple[str, str]
+
+
+class SessionStore(abc.ABC):
+    """Interface: JSON-serialisable snapshots keyed by ``(player_id, namespace)``."""
+
+    @abc.abstractmethod
+    def get(self, player_id: str, namespace: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def put(self, player_id: str, namespace: str, data: Dict[str, Any]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, player_id: str, namespace: Optional[str] = None) -> None:
+        ...
+
+    def flush(self) -> None:
+        """Persist pending writes (no-op for synchronous backends)."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[_Key, str] = {}
+
+    def get(self, player_id: str, namespace: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            raw = self._data.get((player_id, namespace))
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, player_id: str, namespace: str, data: Dict[str, Any]) -> None:
+        # 存序列化后的副本：与 SQLite 后端语义一致，调用方后续修改不会串进存储
+        raw = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._data[(player_id, namespace)] = raw
+
+    def delete(self, player_id: str, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k[0] == player_id and namespace in (None, k[1])]:
+                del self._data[key]
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        batch_size: int = SESSION_FLUSH_BATCH,
+    ) -> None:
+        self.path = os.path.abspath(path)
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.batch_size = max(1, int(batch_size))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "player_id TEXT NOT NULL, namespace TEXT NOT NULL, data TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (player_id, namespace))"
+        )
+        self._db.commit()
+
+        self._db_lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        # None 表示待删除
+        self._dirty: Dict[_Key, Optional[str]] = {}
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="session-store-writer", daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    def get(self, player_id: str, namespace: str) -> Optional[Dict[str, Any]]:
+        key = (player_id, namespace)
+        with self._dirty_lock:
+            if key in self._dirty:
+                raw = self._dirty[key]
+                return json.loads(raw) if raw is not None else None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE player_id = ? AND namespace = ?", key
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, player_id: str, namespace: str, data: Dict[str, Any]) -> None:
+        raw = json.dumps(data, ensure_ascii=False)
+        with self._dirty_lock:
+            self._dirty[(player_id, namespace)] = raw
+            pending = len(self._dirty)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def delete(self, player_id: str, namespace: Optional[str] = None) -> None:
+        if namespace is not None:
+            with self._dirty_lock:
+                self._dirty[(player_id, namespace)] = None
+            return
+        # 先拿 _db_lock：等正在刷的批次落盘后再删，避免刚删的行被它写回
+        with self._db_lock:
+            with self._dirty_lock:
+                for key in [k for k in self._dirty if k[0] == player_id]:
+                    del self._dirty[key]
+            with self._db:
+                self._db.execute("DELETE FROM sessions WHERE player_id = ?", (player_id,))
+
+    def flush(self) -> None:
+        # 锁顺序：_db_lock → _dirty_lock（与 delete 一致）
+        with self._db_lock:
+            with self._dirty_lock:
+                if not self._dirty:
+                    return
+                batch = dict(self._dirty)
+            now = time.time()
+            upserts = [(pid, ns, raw, now) for (pid, ns), raw in batch.items() if raw is not None]
+            deletes = [key for key, raw in batch.items() if raw is None]
+            with self._db:
+                if upserts:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO sessions (player_id, namespace, data, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        upserts,
+                    )
+                if deletes:
+                    self._db.executemany(
+                        "DELETE FROM sessions WHERE player_id = ? AND namespace = ?", deletes
+                    )
+            with self._dirty_lock:
+                # 提交成功后才移出脏表；刷盘期间写入的新值留给下一批
+                for key, raw in batch.items():
+                    if key in self._dirty and self._dirty[key] is raw:
+                        del self._dirty[key]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"[session_store] flush failed: {exc}")
+
+
+_store_lock = threading.Lock()
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """Process-wide store selected by ``DRIFT_SESSION_STORE`` (``None`` when off)."""
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SESSION_BACKEND == "sqlite":
+                _store = SQLiteSessionStore(SESSION_DB_PATH)
+                # 进程退出前把 write-behind 队列刷盘
+                atexit.register(_store.close)
+            elif SESSION_BACKEND == "memory":
+                _store = InMemorySessionStore()
+        return _store
+
+
+def set_session_store(store: Optional[SessionStore]) -> None:
+    """Swap the process-wide store (tests, custom backends)."""
+
+    global _store
+    with _store_lock:
+        _store = store
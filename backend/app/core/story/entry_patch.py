@@ -0,0 +1,80 @@
+# backend/app/core/story/entry_patch.py
+"""Memoised level entry patches.
+
+The entry patch built by ``StoryEngine.load_level_for_player`` (stage patch +
+SceneGenerator + level world_patch + safe teleport + scene metadata) depends
+only on the level file version, not on the player. It is composed once per
+``(requested level id, file version)`` and kept as a ``world_patch.freeze``-d
+structure. Every entry gets a new top-level dict and a shallow copy of its
+``mc`` block, which callers may extend; the command payloads below stay shared
+``FrozenPatch``/``FrozenList`` objects and raise ``TypeError`` if written to.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional
+
+from app.core.patch.world_patch import FrozenPatch, freeze
+
+ENTRY_PATCH_CACHE_SIZE = int(os.getenv("DRIFT_ENTRY_PATCH_CACHE_SIZE", "64"))
+
+
+def _hand_out(frozen: FrozenPatch) -> Dict[str, Any]:
+    """Top level and ``mc`` block are private to the caller, payloads are shared."""
+
+    patch = dict(frozen)
+    mc = frozen.get("mc")
+    if isinstance(mc, Mapping):
+        patch["mc"] = dict(mc)
+    return patch
+
+
+class EntryPatchCache:
+    """Bounded LRU of frozen entry patches keyed by level version."""
+
+    def __init__(self, max_size: int = ENTRY_PATCH_CACHE_SIZE) -> None:
+        self.max_size = max(0, int(max_size))
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, FrozenPatch]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: Optional[Hashable], build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the patch for ``key`` with a caller-owned top level and ``mc``.
+
+        ``key`` of ``None`` (level without a known file version) bypasses the cache.
+        """
+
+        if key is None or self.max_size == 0:
+            return build()
+        with self._lock:
+            frozen = self._items.get(key)
+            if frozen is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return _hand_out(frozen)
+            self.misses += 1
+        # 构建放在锁外：同一版本并发首次进入时最多重复构建一次
+        frozen = freeze(build())
+        with self._lock:
+            self._items[key] = frozen
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return _hand_out(frozen)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,147 @@
+# backend/app/core/story/history.py
+"""Bounded per-player histories for StoryEngine.
+
+``messages`` (LLM chat transcript), ``nodes`` (story nodes shown to the player)
+and ``pending_nodes`` used to grow for the whole session. They are now
+``BoundedHistory`` lists: ordinary ``list`` objects (slicing, ``list(...)`` and
+JSON export keep working) that drop their oldest entries beyond a cap.
+Leading ``system`` messages (the level prompt) are pinned and never evicted.
+
+Evicted chat turns are folded into a ``RollingSummary``: a compact digest of
+one short line per turn, itself capped in characters, which StoryEngine puts
+back into the prompt as a system message so long sessions keep some context
+at constant cost.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+HISTORY_MAX_MESSAGES = int(os.getenv("DRIFT_HISTORY_MAX_MESSAGES", "40"))
+HISTORY_MAX_NODES = int(os.getenv("DRIFT_HISTORY_MAX_NODES", "50"))
+HISTORY_MAX_PENDING_NODES = int(os.getenv("DRIFT_HISTORY_MAX_PENDING_NODES", "20"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("DRIFT_HISTORY_SUMMARY_MAX_CHARS", "1200"))
+HISTORY_SUMMARY_SNIPPET_CHARS = int(os.getenv("DRIFT_HISTORY_SUMMARY_SNIPPET_CHARS", "80"))
+
+
+def _is_pinned(item: Any) -> bool:
+    return isinstance(item, dict) and item.get("role") == "system"
+
+
+class BoundedHistory(list):
+    """``list`` capped at ``maxlen`` items; the oldest unpinned items are evicted."""
+
+    # 类级默认值：copy/pickle 重建实例时不经过 __init__
+    maxlen: Optional[int] = None
+    on_evict: Optional[Callable[[Any], None]] = None
+    evicted = 0
+
+    def __init__(
+        self,
+        items: Iterable[Any] = (),
+        maxlen: Optional[int] = None,
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        super().__init__()
+        self.maxlen = maxlen if maxlen and maxlen > 0 else None
+        self.on_evict = on_evict
+        self.evicted = 0
+        self.extend(items)
+
+    def _enforce(self) -> None:
+        if self.maxlen is None:
+            return
+        while len(self) > self.maxlen:
+            index = 0
+            while index < len(self) and _is_pinned(self[index]):
+                index += 1
+            if index >= len(self):
+                return
+            item = super().pop(index)
+            self.evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(item)
+
+    def append(self, item: Any) -> None:
+        super().append(item)
+        self._enforce()
+
+    def extend(self, items: Iterable[Any]) -> None:
+        super().extend(items)
+        self._enforce()
+
+    def insert(self, index: int, item: Any) -> None:
+        super().insert(index, item)
+        self._enforce()
+
+    def __iadd__(self, items: Iterable[Any]) -> "BoundedHistory":
+        self.extend(items)
+        return self
+
+
+class RollingSummary:
+    """Incremental digest of evicted chat turns, capped at ``max_chars``."""
+
+    def __init__(
+        self,
+        max_chars: int = HISTORY_SUMMARY_MAX_CHARS,
+        snippet_chars: int = HISTORY_SUMMARY_SNIPPET_CHARS,
+    ) -> None:
+        self.max_chars = max(0, int(max_chars))
+        self.snippet_chars = max(8, int(snippet_chars))
+        self.turns = 0
+        self._lines: Deque[str] = deque()
+        self._chars = 0
+
+    def __bool__(self) -> bool:
+        return self.turns > 0
+
+    def fold(self, message: Any) -> None:
+        if not isinstance(message, dict):
+            return
+        content = " ".join(str(message.get("content") or "").split())
+        if not content:
+            return
+        role = message.get("role")
+        prefix = "玩家" if role == "user" else "剧情"
+        if len(content) > self.snippet_chars:
+            content = content[: self.snippet_chars - 1] + "…"
+        line = f"{prefix}: {content}"
+        self.turns += 1
+        self._lines.append(line)
+        self._chars += len(line) + 1
+        # 超出预算时丢弃最旧的摘要行，只保留计数
+        while self._lines and self._chars > self.max_chars:
+            self._chars -= len(self._lines.popleft()) + 1
+
+    def text(self) -> str:
+        if not self.turns:
+            return ""
+        header = f"[较早的 {self.turns} 条对话摘要]"
+        return "\n".join([header, *self._lines])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "lines": list(self._lines)}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "RollingSummary":
+        summary = cls()
+        if isinstance(data, dict):
+            summary.turns = int(data.get("turns") or 0)
+            for line in data.get("lines") or []:
+                if isinstance(line, str):
+                    summary._lines.append(line)
+                    summary._chars += len(line) + 1
+        return summary
+
+
+def approx_size(value: Any) -> int:
+    """Approximate footprint in bytes (UTF-8 JSON length) for memory metrics."""
+
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
@@ -10,7 +10,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from typing import Any, Dict, Iterable, List, Optional
-from copy import deepcopy
+
+from app.core.patch import world_patch
+from app.core.story.memory_index import MemoryIndex
 
 
 # ---------------------------------------------------------------------------
@@ -432,9 +434,9 @@ class EmotionalWorldPatchProfile:
 
         raw_patch = data.get("patch")
         if isinstance(raw_patch, dict):
-            patch = deepcopy(raw_patch)
+            patch = world_patch.freeze(raw_patch)
         else:
-            patch = {
+            patch = world_patch.freeze({
                 key: value
                 for key, value in data.items()
                 if key not in {
@@ -452,7 +454,7 @@ class EmotionalWorldPatchProfile:
                     "label",
                     "patch",
                 }
-            }
+            })
 
         return EmotionalWorldPatchProfile(
             profile_id=profile_id,
@@ -473,22 +475,58 @@ class EmotionalWorldPatchConfig:
     default_label: Optional[str] = None
     default_tone: Optional[str] = None
     profiles: List[EmotionalWorldPatchProfile] = field(default_factory=list)
+    # 按优先级排好序并编译成位掩码的 profile（连同合成好的冻结 patch），profiles 变化时重建
+    _compiled: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def is_empty(self) -> bool:
         return not self.default_patch and not self.profiles
 
+    def _compiled_profiles(self) -> tuple:
+        compiled = self._compiled
+        signature = (id(self.default_patch),) + tuple((id(profile), id(profile.patch)) for profile in self.profiles)
+        if compiled is None or compiled[0] != signature:
+            ordered = sorted(self.profiles, key=lambda item: item.priority, reverse=True)
+            index = MemoryIndex()
+            slots = []
+            for slot, profile in enumerate(ordered):
+                # 无任何条件的 profile 永不匹配（与 matches 一致）
+                if profile.requires_all or profile.requires_any:
+                    index.add(slot, profile.requires_all, profile.requires_any)
+                    slots.append((slot, profile))
+            compiled = (signature, index, slots, {}, {})
+            self._compiled = compiled
+        return compiled
+
     def select_profile(self, flags: Iterable[str]) -> Optional[EmotionalWorldPatchProfile]:
-        ordered = sorted(self.profiles, key=lambda item: item.priority, reverse=True)
-        for profile in ordered:
-            if profile.matches(flags):
-                return profile
-        return None
+        _, index, slots, memo, _ = self._compiled_profiles()
+        mask = index.mask_of(flag for flag in flags if isinstance(flag, str))
+        if mask in memo:
+            return memo[mask]
+        selected = None
+        for slot, profile in slots:
+            if index.is_satisfied(slot, mask):
+                selected = profile
+                break
+        if len(memo) >= 256:
+            memo.clear()
+        memo[mask] = selected
+        return selected
 
     def compose_patch(self, flags: Iterable[str]) -> Dict[str, Any]:
-        patch = deepcopy(self.default_patch)
+        """Default patch overlaid with the selected profile's patch.
+
+        The result is a shared ``FrozenPatch`` (composed once per profile);
+        merge or ``thaw`` it before modifying.
+        """
+
         profile = self.select_profile(flags)
-        if profile and profile.patch:
-            patch = _deep_merge(patch, profile.patch)
+        composed = self._compiled_profiles()[4]
+        key = id(profile) if profile is not None else None
+        patch = composed.get(key)
+        if patch is None:
+            default = self.default_patch if isinstance(self.default_patch, dict) else {}
+            patch = world_patch.freeze(world_patch.merge(default, profile.patch if profile else None))
+            composed[key] = patch
         return patch
 
     def describe(self, flags: Iterable[str]) -> Dict[str, Optional[str]]:
@@ -519,15 +557,15 @@ class EmotionalWorldPatchConfig:
             default_tone = _coerce_str(default_payload.get("tone"))
             raw_default_patch = default_payload.get("patch")
             if isinstance(raw_default_patch, dict):
-                default_patch = deepcopy(raw_default_patch)
+                default_patch = world_patch.freeze(raw_default_patch)
             else:
-                default_patch = {
+                default_patch = world_patch.freeze({
                     key: value
                     for key, value in default_payload.items()
                     if key not in {"label", "tone"}
-                }
+                })
         elif default_payload is not None:
-            default_patch = deepcopy(default_payload)
+            default_patch = world_patch.freeze(default_payload)
 
         raw_profiles = (
             data.get("profiles")
@@ -623,10 +661,17 @@ def ensure_level_extensions(level: Any, payload: Optional[Dict[str, Any]] = None
 
     This helper is safe to call repeatedly. It uses ``setattr`` so the legacy
     ``Level`` dataclass from ``story_loader`` gains the new attributes without
-    altering its constructor.
+    altering its constructor. Extensions pre-parsed by the level repository
+    are reused when ``payload`` is the level's own raw payload.
     """
 
-    existing = LevelExtensions.from_payload(payload)
+    cached = getattr(level, "_level_extensions", None)
+    if isinstance(cached, LevelExtensions) and (
+        payload is None or payload is getattr(level, "_raw_payload", None)
+    ):
+        existing = cached
+    else:
+        existing = LevelExtensions.from_payload(payload)
 
     for attr, value in (
         ("beats", existing.beats),
@@ -685,15 +730,3 @@ def _coerce_int(value: Any) -> Optional[int]:
         return int(value)
     except (TypeError, ValueError):
         return None
-
-
-def _deep_merge(base: Optional[Dict[str, Any]], override: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    result = deepcopy(base) if isinstance(base, dict) else {}
-    if not isinstance(override, dict):
-        return result
-    for key, value in override.items():
-        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-            result[key] = _deep_merge(result[key], value)
-        else:
-            result[key] = deepcopy(value)
-    return result
@@ -0,0 +1,146 @@
+# backend/app/core/story/memory_index.py
+"""Bitset evaluation of memory conditions with a flag → dependents index.
+
+Memory flags stay a ``Set[str]`` on the player (that is what sessions, the
+story graph and the API expose). For evaluation a level interns every flag its
+conditions mention into a bit position, compiles each condition into an
+``all`` / ``any`` mask and keeps a reverse index from flag bit to the keys
+(beat ids, profile slots) whose condition reads it:
+
+- checking a condition is two ``&`` on Python ints instead of a set scan;
+- after a mutation only the keys depending on the changed flags are re-checked.
+
+Flags a level never mentions get no bit; they cannot affect any condition.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+def _tokens(values: Iterable[Any]) -> List[str]:
+    out: List[str] = []
+    for value in values or []:
+        if value is None:
+            continue
+        token = str(value).strip()
+        if token:
+            out.append(token)
+    return out
+
+
+def condition_parts(requirement: Any) -> Tuple[List[str], List[str]]:
+    """Split a beat ``memory_required`` value into ``(require_all, require_any)``.
+
+    Accepts the same shapes as ``StoryEngine._is_memory_satisfied``: a
+    ``MemoryCondition`` (duck-typed), a list of flags, a single flag or ``None``.
+    """
+
+    if requirement is None:
+        return [], []
+    if hasattr(requirement, "require_all") or hasattr(requirement, "require_any"):
+        return (
+            [flag for flag in getattr(requirement, "require_all", None) or [] if isinstance(flag, str)],
+            [flag for flag in getattr(requirement, "require_any", None) or [] if isinstance(flag, str)],
+        )
+    if isinstance(requirement, (list, tuple, set)):
+        return _tokens(requirement), []
+    return _tokens([requirement]), []
+
+
+class CompiledCondition(NamedTuple):
+    all_mask: int
+    any_mask: int
+
+    @property
+    def deps(self) -> int:
+        return self.all_mask | self.any_mask
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.all_mask and not self.any_mask
+
+    def satisfied(self, mask: int) -> bool:
+        if mask & self.all_mask != self.all_mask:
+            return False
+        if self.any_mask:
+            return bool(mask & self.any_mask)
+        return True
+
+
+class MemoryIndex:
+    """Interned flags, compiled conditions and the reverse dependency index."""
+
+    __slots__ = ("_bits", "_conditions", "_dependents")
+
+    def __init__(self) -> None:
+        self._bits: Dict[str, int] = {}
+        self._conditions: Dict[Hashable, CompiledCondition] = {}
+        self._dependents: Dict[int, Set[Hashable]] = {}
+
+    @classmethod
+    def for_requirements(cls, items: Iterable[Tuple[Hashable, Any]]) -> "MemoryIndex":
+        index = cls()
+        for key, requirement in items:
+            require_all, require_any = condition_parts(requirement)
+            index.add(key, require_all, require_any)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._conditions)
+
+    def _bit(self, flag: str) -> int:
+        bit = self._bits.get(flag)
+        if bit is None:
+            bit = 1 << len(self._bits)
+            self._bits[flag] = bit
+        return bit
+
+    def add(self, key: Hashable, require_all: Iterable[str] = (), require_any: Iterable[str] = ()) -> CompiledCondition:
+        all_mask = 0
+        for flag in require_all:
+            all_mask |= self._bit(flag)
+        any_mask = 0
+        for flag in require_any:
+            any_mask |= self._bit(flag)
+        compiled = CompiledCondition(all_mask, any_mask)
+        self._conditions[key] = compiled
+        deps = compiled.deps
+        while deps:
+            low = deps & -deps
+            self._dependents.setdefault(low, set()).add(key)
+            deps ^= low
+        return compiled
+
+    def condition(self, key: Hashable) -> Optional[CompiledCondition]:
+        return self._conditions.get(key)
+
+    def mask_of(self, flags: Iterable[str]) -> int:
+        """Bitset of the known flags in ``flags`` (unknown flags are ignored)."""
+
+        bits = self._bits
+        mask = 0
+        for flag in flags:
+            bit = bits.get(flag)
+            if bit is not None:
+                mask |= bit
+        return mask
+
+    def flags_of(self, mask: int) -> List[str]:
+        return [flag for flag, bit in self._bits.items() if mask & bit]
+
+    def is_satisfied(self, key: Hashable, mask: int) -> bool:
+        """Keys without a registered condition are unconditionally satisfied."""
+
+        compiled = self._conditions.get(key)
+        return compiled is None or compiled.satisfied(mask)
+
+    def dependents(self, flags: Iterable[str]) -> Set[Hashable]:
+        """Keys whose condition mentions any of ``flags``."""
+
+        found: Set[Hashable] = set()
+        for flag in flags:
+            bit = self._bits.get(flag)
+            if bit is not None:
+                found |= self._dependents.get(bit, set())
+        return found
@@ -6,6 +6,7 @@ import time
 from copy import deepcopy
 from typing import Any, Dict, Optional, List, Tuple
 
+from app.core.patch.world_patch import MC_QUEUE_KEYS, merge_into
 from app.core.story.story_loader import Level
 
 
@@ -552,30 +553,8 @@ class SceneOrchestrator:
 
     @staticmethod
     def _merge_mc(target: Dict[str, Any], addition: Optional[Dict[str, Any]]) -> None:
-        if not addition:
-            return
-
-        list_keys = {"build", "build_multi", "spawn", "spawn_multi", "tell"}
-
-        for key, value in addition.items():
-            if value is None:
-                continue
-
-            if key in list_keys:
-                existing = target.get(key)
-                if isinstance(existing, list):
-                    if isinstance(value, list):
-                        existing.extend(value)
-                    else:
-                        existing.append(value)
-                elif existing is not None:
-                    target[key] = [existing] + (value if isinstance(value, list) else [value])
-                else:
-                    target[key] = list(value) if isinstance(value, list) else [value]
-            elif isinstance(value, dict) and isinstance(target.get(key), dict):
-                target[key] = {**target[key], **value}
-            else:
-                target[key] = value
+        # target 是 mc 块本身：指令 payload 整体替换，build/spawn/tell 队列累加
+        merge_into(target, addition, depth=1, append_keys=MC_QUEUE_KEYS)
 
     @staticmethod
     def _convert_world_reaction(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -1,6 +1,7 @@
 # backend/app/core/story/story_engine.py
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
 from copy import deepcopy
@@ -8,7 +9,7 @@ from difflib import SequenceMatcher
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from app.core.ai.deepseek_agent import deepseek_decide
+from app.core.ai.deepseek_agent import deepseek_decide, deepseek_decide_async
 from app.core.story.story_loader import (
     DATA_DIR,
     load_level,
@@ -21,6 +22,10 @@ from app.core.world.scene_generator import SceneGenerator
 from app.core.world.trigger import trigger_engine
 from app.core.world.trigger import TriggerPoint
 from app.core.npc import npc_engine
+from app.core.lazy import LazySingleton
+from app.core.patch import world_patch
+from app.core.player_locks import player_locked
+from app.core.session import SessionStore, get_session_store
 from app.core.quest.runtime import quest_runtime
 from app.core.story.level_schema import (
     ensure_level_extensions,
@@ -29,6 +34,17 @@ from app.core.story.level_schema import (
     EmotionalWorldPatchConfig,
 )
 from app.core.events.event_manager import EventManager
+from app.core.events.keyword_matcher import KeywordMatcher
+from app.core.story.memory_index import MemoryIndex
+from app.core.story.entry_patch import EntryPatchCache
+from app.core.story.history import (
+    HISTORY_MAX_MESSAGES,
+    HISTORY_MAX_NODES,
+    HISTORY_MAX_PENDING_NODES,
+    BoundedHistory,
+    RollingSummary,
+    approx_size,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -293,10 +309,14 @@ class StoryEngine:
     }
     DEFAULT_ENTRY_LEVEL = "flagship_tutorial"
 
-    def __init__(self):
+    def __init__(self, session_store: Optional[SessionStore] = None):
         # 每个玩家的剧情状态
         self.players: Dict[str, Dict[str, Any]] = {}
 
+        # 外部会话存储（None = 仅内存，原行为）
+        self.session_store = session_store
+        self._restoring: Set[str] = set()
+
         # 这些冷却参数保留字段，但 v2 不再用于“是否推进”判断
         self.move_cooldown = 3.0
         self.say_cooldown = 0.8
@@ -311,6 +331,7 @@ class StoryEngine:
         self.graph = StoryGraph(str(primary_dir))
         self.minimap = MiniMap(self.graph)
         self.scene_gen = SceneGenerator()
+        self.entry_patches = EntryPatchCache()
 
         # 触发器（v2：暂时禁用螺旋触发，避免乱飞）
         self._inject_spiral_triggers()
@@ -324,17 +345,26 @@ class StoryEngine:
 
         print(f"[StoryEngine] loading levels from {primary_dir}")
 
-    def register_generated_level(self, level_id: Optional[str] = None) -> None:
-        """Refresh story graph and minimap after new level assets are written."""
+    def register_generated_level(self, level_id: Optional[str] = None, path: Optional[str] = None) -> None:
+        """Refresh story graph and minimap after new level assets are written.
+
+        With ``path`` only that file is parsed and patched into the graph and
+        minimap; otherwise (or if the patch is not possible) everything reloads.
+        """
 
-        self.graph.reload_levels()
-        self.minimap.refresh()
+        key = self.graph.add_or_update_level(path) if path else None
+        if key:
+            self.minimap.add_level(key)
+        else:
+            self.graph.reload_levels()
+            self.minimap.refresh()
         if level_id:
             print(f"[StoryEngine] registered new level: {level_id}")
 
     # ============================================================
     # Phase 1.5 scaffolding hooks (stubs)
     # ============================================================
+    @player_locked
     def enter_level_with_scene(self, player_id: str, level: Level) -> None:
         """Apply deterministic scene metadata when available.
 
@@ -353,6 +383,7 @@ class StoryEngine:
             "applied": False,
         }
 
+    @player_locked
     def advance_with_beat(self, player_id: str, beat_id: str) -> None:
         """Move the active beat pointer forward.
 
@@ -376,6 +407,7 @@ class StoryEngine:
         for listener in rule_cfg.listeners:
             quest_runtime.register_rule_listener(level.level_id, listener)
 
+    @player_locked
     def inject_tasks(self, player_id: str, level: Level) -> None:
         """Inject Phase 1.5 task definitions into QuestRuntime."""
 
@@ -388,10 +420,12 @@ class StoryEngine:
         player_state = self.players.setdefault(player_id, {})
         player_state["pending_tasks"] = tasks
 
+    @player_locked
     def exit_level_with_cleanup(self, player_id: str, level: Level) -> Dict[str, Any]:
         """Compose a cleanup patch when a player exits the level."""
 
         player_state = self.players.setdefault(player_id, {})
+        self._bump_level_epoch(player_state)
         exit_profile = player_state.pop("exit_profile", None)
         player_state.pop("scene_handle", None)
         player_state.pop("current_beat", None)
@@ -466,6 +500,7 @@ class StoryEngine:
     # ============================================================
     # 状态查询
     # ============================================================
+    @player_locked
     def get_public_state(self, player_id: Optional[str] = None):
         return {
             "total_levels": len(self.graph.all_levels()),
@@ -479,6 +514,7 @@ class StoryEngine:
             "exit_profile": self.get_exit_profile(player_id) if player_id else None,
         }
 
+    @player_locked
     def get_exit_profile(self, player_id: str) -> Optional[Dict[str, Any]]:
         profile = self.players.get(player_id, {}).get("exit_profile")
         if isinstance(profile, dict):
@@ -488,8 +524,6 @@ class StoryEngine:
     def _ensure_player(self, player_id: str):
         if player_id not in self.players:
             self.players[player_id] = {
-                "messages": [],
-                "nodes": [],
                 "level": None,
                 "level_loaded": False,
                 "tree_state": None,
@@ -499,6 +533,203 @@ class StoryEngine:
                 "memory_flags": set(),
                 "emotional_profile": None,
             }
+            self._reset_histories(self.players[player_id])
+            if self.session_store is not None:
+                self._restore_session(player_id)
+
+    # ============================================================
+    # Bounded histories（messages / nodes / pending_nodes）
+    # ============================================================
+    @staticmethod
+    def _bump_level_epoch(p: Dict[str, Any]) -> None:
+        # 关卡加载/退出时递增，_advance_complete 据此识别过期的 AI 决策
+        p["level_epoch"] = p.get("level_epoch", 0) + 1
+
+    def _reset_histories(
+        self,
+        p: Dict[str, Any],
+        messages: Iterable[Any] = (),
+        nodes: Iterable[Any] = (),
+        summary: Optional[RollingSummary] = None,
+    ) -> None:
+        summary = summary if summary is not None else RollingSummary()
+        p["history_summary"] = summary
+        p["messages"] = BoundedHistory(messages, HISTORY_MAX_MESSAGES, on_evict=summary.fold)
+        p["nodes"] = BoundedHistory(nodes, HISTORY_MAX_NODES)
+
+    def _pending_nodes(self, p: Dict[str, Any]) -> BoundedHistory:
+        pending = p.get("pending_nodes")
+        if not isinstance(pending, BoundedHistory):
+            pending = BoundedHistory(
+                pending or [],
+                HISTORY_MAX_PENDING_NODES,
+                on_evict=lambda node: self._fold_undelivered_node(p, node),
+            )
+            p["pending_nodes"] = pending
+        return pending
+
+    @staticmethod
+    def _fold_undelivered_node(p: Dict[str, Any], node: Any) -> None:
+        # 待下发队列溢出：最旧的节点不再单独下发，但记入对话摘要，AI 仍知道这段剧情发生过
+        title = node.get("title") if isinstance(node, dict) else None
+        text = node.get("text") if isinstance(node, dict) else node
+        logger.warning("pending story node dropped before delivery: %s", title or text)
+        summary = p.get("history_summary")
+        if summary is not None:
+            summary.fold({"role": "assistant", "content": " ".join(str(part) for part in (title, text) if part)})
+
+    def _prompt_messages(self, player_id: str) -> List[Dict[str, Any]]:
+        """Chat transcript for the LLM, with the rolling summary of evicted turns."""
+
+        p = self.players[player_id]
+        messages = list(p["messages"])
+        summary = p.get("history_summary")
+        if summary:
+            index = 0
+            while index < len(messages) and messages[index].get("role") == "system":
+                index += 1
+            messages.insert(index, {"role": "system", "content": summary.text()})
+        return messages
+
+    def memory_stats(self, player_id: str) -> Dict[str, Any]:
+        """Per-player history sizes (entries and approximate bytes)."""
+
+        p = self.players.get(player_id)
+        if not p:
+            return {}
+        summary = p.get("history_summary")
+        stats: Dict[str, Any] = {}
+        for key in ("messages", "nodes", "pending_nodes"):
+            items = p.get(key) or []
+            stats[key] = {
+                "count": len(items),
+                "max": getattr(items, "maxlen", None),
+                "evicted": getattr(items, "evicted", 0),
+                "bytes": approx_size(list(items)),
+            }
+        trajectory = self.graph.trajectory.get(player_id) or ()
+        stats["trajectory"] = {
+            "count": len(trajectory),
+            "max": getattr(trajectory, "maxlen", None),
+            "bytes": approx_size(list(trajectory)),
+        }
+        stats["summary"] = {
+            "turns": summary.turns if summary else 0,
+            "bytes": len(summary.text().encode("utf-8")) if summary else 0,
+        }
+        stats["total_bytes"] = sum(item["bytes"] for item in stats.values())
+        return stats
+
+    # ============================================================
+    # Session persistence（SessionStore）
+    # ============================================================
+    @player_locked
+    def save_session(self, player_id: str) -> None:
+        """Write the player's story/quest/minimap/graph snapshot to the session store."""
+
+        store = self.session_store
+        if store is None or player_id not in self.players or player_id in self._restoring:
+            return
+        snapshots = (
+            ("story", self._export_story_state(player_id)),
+            ("quest", quest_runtime.export_session(player_id)),
+            ("minimap", self.minimap.export_session(player_id)),
+            ("graph", self.graph.export_session(player_id)),
+        )
+        for namespace, data in snapshots:
+            if data is None:
+                continue
+            try:
+                store.put(player_id, namespace, data)
+            except (TypeError, ValueError) as exc:
+                logger.warning("session save failed player=%s ns=%s: %s", player_id, namespace, exc)
+
+    def _export_story_state(self, player_id: str) -> Dict[str, Any]:
+        p = self.players[player_id]
+        level = p.get("level")
+        beat_state = p.get("beat_state") or {}
+        return {
+            "level_id": level.level_id if level else None,
+            "level_loaded": bool(p.get("level_loaded")),
+            "messages": list(p.get("messages") or []),
+            "nodes": list(p.get("nodes") or []),
+            "pending_nodes": list(p.get("pending_nodes") or []),
+            "history_summary": p["history_summary"].to_dict() if p.get("history_summary") else None,
+            "tree_state": p.get("tree_state"),
+            "ended": bool(p.get("ended")),
+            "memory_flags": sorted(self._get_memory_set(player_id)),
+            "emotional_profile": p.get("emotional_profile"),
+            "current_beat": p.get("current_beat"),
+            "beats": {
+                "index": beat_state.get("index", 0),
+                "completed": sorted(beat_state.get("completed") or []),
+                "memory_locked": sorted(beat_state.get("memory_locked") or []),
+                "memory_locked_sources": dict(beat_state.get("memory_locked_sources") or {}),
+            },
+        }
+
+    def _restore_session(self, player_id: str) -> None:
+        """Rebuild a player missing from memory: reload the level, then overlay the snapshot."""
+
+        store = self.session_store
+        try:
+            story = store.get(player_id, "story") if store is not None else None
+        except Exception as exc:
+            logger.warning("session load failed player=%s: %s", player_id, exc)
+            return
+        if not story:
+            return
+
+        self._restoring.add(player_id)
+        try:
+            level_id = story.get("level_id")
+            if level_id:
+                try:
+                    self.load_level_for_player(player_id, level_id)
+                except Exception as exc:
+                    logger.warning("session level reload failed player=%s level=%s: %s", player_id, level_id, exc)
+                    return
+
+            p = self.players[player_id]
+            self._reset_histories(
+                p,
+                story.get("messages") or [],
+                story.get("nodes") or [],
+                RollingSummary.from_dict(story.get("history_summary")),
+            )
+            if story.get("pending_nodes"):
+                p.pop("pending_nodes", None)
+                self._pending_nodes(p).extend(story["pending_nodes"])
+            p["tree_state"] = story.get("tree_state")
+            p["ended"] = bool(story.get("ended"))
+            p["level_loaded"] = bool(story.get("level_loaded"))
+            p["memory_flags"] = set(story.get("memory_flags") or [])
+            if story.get("emotional_profile"):
+                p["emotional_profile"] = story["emotional_profile"]
+            if story.get("current_beat"):
+                p["current_beat"] = story["current_beat"]
+
+            beat_state = p.get("beat_state")
+            saved_beats = story.get("beats") or {}
+            if beat_state and saved_beats:
+                order = set(beat_state.get("order") or [])
+                beat_state["index"] = saved_beats.get("index", 0)
+                beat_state["completed"] = set(saved_beats.get("completed") or []) & order
+                beat_state["memory_locked"] = set(saved_beats.get("memory_locked") or []) & order
+                beat_state["memory_locked_sources"] = dict(saved_beats.get("memory_locked_sources") or {})
+
+            quest = store.get(player_id, "quest")
+            if quest:
+                quest_runtime.restore_session(player_id, quest)
+            minimap = store.get(player_id, "minimap")
+            if minimap:
+                self.minimap.restore_session(player_id, minimap)
+            graph = store.get(player_id, "graph")
+            if graph:
+                self.graph.restore_session(player_id, graph)
+            logger.info("session restored player=%s level=%s", player_id, level_id)
+        finally:
+            self._restoring.discard(player_id)
 
     # ============================================================
     # Memory helpers
@@ -675,7 +906,7 @@ class StoryEngine:
             return False
 
         memory = self._get_memory_set(player_id)
-        changed = False
+        changed_flags: Set[str] = set()
 
         for flag in mutation.set_flags:
             token = self._normalize_flag(flag)
@@ -683,7 +914,7 @@ class StoryEngine:
                 continue
             if token not in memory:
                 memory.add(token)
-                changed = True
+                changed_flags.add(token)
 
         for flag in mutation.clear_flags:
             token = self._normalize_flag(flag)
@@ -691,8 +922,9 @@ class StoryEngine:
                 continue
             if token in memory:
                 memory.remove(token)
-                changed = True
+                changed_flags.add(token)
 
+        changed = bool(changed_flags)
         if changed:
             level_id = None
             if level and getattr(level, "level_id", None):
@@ -708,11 +940,17 @@ class StoryEngine:
                 source=source,
                 ref=ref,
             )
-            self._retry_memory_locked_beats(player_id)
+            self._retry_memory_locked_beats(player_id, changed_flags)
 
         return changed
 
-    def _retry_memory_locked_beats(self, player_id: str) -> None:
+    def _retry_memory_locked_beats(self, player_id: str, changed_flags: Optional[Iterable[str]] = None) -> None:
+        """Activate locked beats whose memory condition now holds.
+
+        With ``changed_flags`` only the locked beats depending on those flags are
+        re-checked; ``None`` re-checks every locked beat.
+        """
+
         player_state = self.players.get(player_id)
         if not player_state:
             return
@@ -724,15 +962,23 @@ class StoryEngine:
         if not level:
             return
         locked_sources = beat_state.get("memory_locked_sources") or {}
-        pending = list(locked)
+        index = self._beat_memory_index(beat_state)
+        if changed_flags is None:
+            pending = list(locked)
+        else:
+            affected = index.dependents(changed_flags)
+            pending = [beat_id for beat_id in beat_state.get("order") or [] if beat_id in locked and beat_id in affected]
+        memory = self._get_memory_set(player_id)
         for beat_id in pending:
+            # 嵌套的记忆变更可能已经解锁了它
+            if beat_id not in locked:
+                continue
             beat = (beat_state.get("by_id") or {}).get(beat_id)
             if not beat:
                 locked.discard(beat_id)
                 locked_sources.pop(beat_id, None)
                 continue
-            requirement = getattr(beat, "memory_required", None)
-            if not self._is_memory_satisfied(player_id, requirement):
+            if not index.is_satisfied(beat_id, index.mask_of(memory)):
                 continue
             trigger_info = self._parse_trigger(getattr(beat, "trigger", None))
             source = locked_sources.get(beat_id) or "memory_refresh"
@@ -749,6 +995,7 @@ class StoryEngine:
             locked.discard(beat_id)
             locked_sources.pop(beat_id, None)
 
+    @player_locked
     def apply_quest_updates(self, player_id: str, updates: Optional[Dict[str, Any]]) -> None:
         if not updates or not isinstance(updates, dict):
             return
@@ -795,7 +1042,9 @@ class StoryEngine:
 
         if changed:
             updates.setdefault("memory_flags", sorted(self._get_memory_set(player_id)))
+        self.save_session(player_id)
 
+    @player_locked
     def get_player_memory(self, player_id: str) -> List[str]:
         self._ensure_player(player_id)
         return sorted(self._get_memory_set(player_id))
@@ -821,6 +1070,7 @@ class StoryEngine:
 
         return self.graph.bfs_next(canonical_current)
 
+    @player_locked
     def load_next_level_for_player(self, player_id: str) -> Dict[str, Any]:
         self._ensure_player(player_id)
         p = self.players[player_id]
@@ -831,6 +1081,7 @@ class StoryEngine:
             return {"mc": {"tell": "🎉 已经是最后一关了。"}}
         return self.load_level_for_player(player_id, next_id)
 
+    @player_locked
     def get_level_recommendations(self, player_id: str, current_level_id: Optional[str] = None, limit: int = 3):
         """Expose StoryGraph recommendations to API callers."""
 
@@ -1017,6 +1268,7 @@ class StoryEngine:
     # ============================================================
     # 加载指定关卡（带剧情舞台 + 安全传送）
     # ============================================================
+    @player_locked
     def load_level_for_player(self, player_id: str, level_id: str) -> Dict[str, Any]:
         """
         加载指定关卡：
@@ -1031,12 +1283,12 @@ class StoryEngine:
         p = self.players[player_id]
 
         # 绑定关卡状态
+        self._bump_level_epoch(p)
         p["level"] = level
         p["level_loaded"] = False
         p["tree_state"] = level.tree
         p["ended"] = False
-        p["messages"].clear()
-        p["nodes"].clear()
+        self._reset_histories(p)
         p.pop("emotional_profile", None)
 
         exit_profile = self._build_exit_profile(level)
@@ -1056,6 +1308,42 @@ class StoryEngine:
         self.minimap.enter_level(player_id, level.level_id)
         self.minimap.mark_unlocked(player_id, level.level_id)
 
+        base_patch = self.entry_patches.get_or_build(
+            self._entry_patch_key(level_id, level),
+            lambda: self._build_entry_patch(level_id, level),
+        )
+        base_mc = base_patch["mc"]
+
+        # ---------------------------------------------
+        # 🤖 注册NPC行为到引擎
+        # ---------------------------------------------
+        spawn_data = base_mc.get("spawn")
+        if spawn_data and "behaviors" in spawn_data:
+            npc_engine.register_npc(level_id, spawn_data)
+
+        # ============================================================
+        # Phase 1.5 stubs
+        # ============================================================
+        if getattr(level, "scene", None):
+            self.enter_level_with_scene(player_id, level)
+
+        self.register_rule_listeners(level)
+        self.inject_tasks(player_id, level)
+
+        beats = getattr(level, "beats", [])
+        if beats:
+            first = beats[0]
+            beat_id = getattr(first, "id", None) or "beat_0"
+            self.advance_with_beat(player_id, beat_id)
+
+        self._prepare_phase2_state(player_id, level)
+        self.save_session(player_id)
+
+        return base_patch
+
+    def _build_entry_patch(self, level_id: str, level: Level) -> Dict[str, Any]:
+        """关卡入场 patch：只依赖关卡文件版本，由 entry_patches 按版本缓存。"""
+
         # ---------------------------------------------
         # 🎭 剧情舞台渲染器
         # ---------------------------------------------
@@ -1079,25 +1367,7 @@ class StoryEngine:
 
         # 合并：场景 → 舞台 → world_patch
         # world_patch优先级最高（最后合并，覆盖前面的配置）
-        def merge_mc(dst: Dict[str, Any], src: Dict[str, Any]):
-            for k, v in (src or {}).items():
-                if k in dst and isinstance(dst[k], dict) and isinstance(v, dict):
-                    # 深度合并字典
-                    dst[k] = {**dst[k], **v}
-                else:
-                    dst[k] = v
-
-        # 临时存储world_patch的配置
-        world_patch_mc = dict(base_mc)
-        temp_mc = {}
-
-        # 先合并场景和舞台
-        merge_mc(temp_mc, scene_mc)
-        merge_mc(temp_mc, stage_patch.get("mc", {}))
-
-        # 最后用world_patch覆盖（保留world_patch中的所有配置）
-        merge_mc(temp_mc, world_patch_mc)
-        base_mc = temp_mc
+        base_mc = world_patch.compose(scene_mc, stage_patch.get("mc"), base_mc, depth=1)
 
         # ---------------------------------------------
         # 🌈 全局安全传送（固定出生点 + 平台）
@@ -1116,37 +1386,18 @@ class StoryEngine:
             },
             "tell": f"进入剧情：《{level.title}》",
         }
-        merge_mc(base_mc, safe_tp_mc)
+        world_patch.merge_into(base_mc, safe_tp_mc, depth=1)
         self._attach_scene_metadata(base_mc, level)
 
         base_patch["mc"] = base_mc
-
-        # ---------------------------------------------
-        # 🤖 注册NPC行为到引擎
-        # ---------------------------------------------
-        spawn_data = base_mc.get("spawn")
-        if spawn_data and "behaviors" in spawn_data:
-            npc_engine.register_npc(level_id, spawn_data)
-
-        # ============================================================
-        # Phase 1.5 stubs
-        # ============================================================
-        if getattr(level, "scene", None):
-            self.enter_level_with_scene(player_id, level)
-
-        self.register_rule_listeners(level)
-        self.inject_tasks(player_id, level)
-
-        beats = getattr(level, "beats", [])
-        if beats:
-            first = beats[0]
-            beat_id = getattr(first, "id", None) or "beat_0"
-            self.advance_with_beat(player_id, beat_id)
-
-        self._prepare_phase2_state(player_id, level)
-
         return base_patch
 
+    def _entry_patch_key(self, level_id: str, level: Level) -> Optional[Tuple[str, Any]]:
+        version = getattr(level, "_source_version", None)
+        if version is None:
+            return None
+        return (level_id, version)
+
     # ============================================================
     # prompt 注入（第一次进入关卡时插入 system 提示词）
     # ============================================================
@@ -1253,8 +1504,8 @@ class StoryEngine:
     # 触发区（v2：暂时禁用螺旋触发器，避免随机传送）
     # ============================================================
     def _inject_spiral_triggers(self):
-        trigger_engine.triggers.clear()
-        # 如果将来想重新启用，可以在这里重新 append TriggerPoint
+        trigger_engine.clear()
+        # 如果将来想重新启用，可以在这里重新 add_trigger(TriggerPoint)
         print("[Trigger] spiral triggers disabled (StoryEngine v2.stage)")
 
     # ============================================================
@@ -1285,9 +1536,91 @@ class StoryEngine:
     # ============================================================
     # 主推进逻辑
     # ============================================================
+    @player_locked
     def advance(
-        self, player_id: str, world_state: Dict[str, Any], action: Dict[str, Any]
+        self,
+        player_id: str,
+        world_state: Dict[str, Any],
+        action: Dict[str, Any],
+        ai_result: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Any, Dict[str, Any], Dict[str, Any]]:
+        """Advance the story; ``ai_result`` skips the LLM when the decision is already known.
+
+        The returned patch follows the ``world_patch`` contract: its top level
+        and ``mc`` block belong to the caller, while command payloads may be
+        shared ``FrozenPatch`` objects (e.g. from the emotional profile) and
+        must be ``thaw``-ed before being edited in place.
+        """
+
+        early, ctx = self._advance_begin(player_id, world_state, action)
+        if early is not None:
+            return early
+        if ai_result is None:
+            ai_result = deepseek_decide(ctx["ai_input"], ctx["messages"])
+        return self._advance_complete(player_id, ctx, ai_result)
+
+    async def advance_async(
+        self,
+        player_id: str,
+        world_state: Dict[str, Any],
+        action: Dict[str, Any],
+        ai_result: Optional[Dict[str, Any]] = None,
     ) -> Tuple[Any, Dict[str, Any], Dict[str, Any]]:
+        """Same as :meth:`advance` but awaits the LLM instead of blocking a thread.
+
+        The sync halves (state, quests, session save) run in a worker thread
+        so the event loop only waits on the LLM.
+        """
+
+        early, ctx = await asyncio.to_thread(self._advance_begin, player_id, world_state, action)
+        if early is not None:
+            return early
+        if ai_result is None:
+            ai_result = await deepseek_decide_async(ctx["ai_input"], ctx["messages"])
+        return await asyncio.to_thread(self._advance_complete, player_id, ctx, ai_result)
+
+    @player_locked
+    def build_decision_input(
+        self, player_id: str, world_state: Dict[str, Any], action: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Return ``(ai_input, messages)`` exactly as :meth:`advance` would send them.
+
+        Used by the combined intent+story mode to issue the decision request
+        before knowing whether the line is a command; player state is not
+        mutated beyond the usual free-mode/prompt bootstrap.
+        """
+
+        self._ensure_player(player_id)
+        self._ensure_free_mode_level(player_id)
+        self._inject_level_prompt_if_needed(player_id)
+        p = self.players[player_id]
+
+        messages = self._prompt_messages(player_id)
+        say = action.get("say")
+        if isinstance(say, str) and say.strip():
+            messages.append({"role": "user", "content": say})
+        return self._decision_context(player_id, world_state, action), messages
+
+    def _decision_context(
+        self, player_id: str, world_state: Dict[str, Any], action: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        p = self.players[player_id]
+        return {
+            "player_id": player_id,
+            "player_action": action,
+            "world_state": world_state,
+            "recent_nodes": p["nodes"][-5:],
+            "tree_state": p["tree_state"],
+            "level_id": p["level"].level_id,
+            "beat_id": p.get("current_beat"),
+        }
+
+    @player_locked
+    def _advance_begin(
+        self, player_id: str, world_state: Dict[str, Any], action: Dict[str, Any]
+    ) -> Tuple[Optional[Tuple[Any, Dict[str, Any], Dict[str, Any]]], Dict[str, Any]]:
+        """Run everything before the AI decision; returns ``(early_result, ctx)``."""
+
         self._ensure_player(player_id)
         p = self.players[player_id]
 
@@ -1296,7 +1629,7 @@ class StoryEngine:
         self._inject_level_prompt_if_needed(player_id)
 
         if p["ended"]:
-            return None, None, {"mc": {"tell": "本关已结束。"}}
+            return (None, None, {"mc": {"tell": "本关已结束。"}}), {}
 
         beat_result = self._process_beat_progress(player_id, world_state, action)
 
@@ -1318,19 +1651,33 @@ class StoryEngine:
                 "title": "世界触发点",
                 "text": f"你抵达了关键地点，关卡 {trg.level_id} 被唤醒。",
             }
-            return None, node, patch
+            return (None, node, patch), {}
 
         # AI 决策
-        ai_input = {
-            "player_id": player_id,
-            "player_action": action,
-            "world_state": world_state,
-            "recent_nodes": p["nodes"][-5:],
-            "tree_state": p["tree_state"],
-            "level_id": p["level"].level_id,
+        ai_input = self._decision_context(player_id, world_state, action)
+        return None, {
+            "player_state": p,
+            "level_epoch": p.get("level_epoch", 0),
+            "ai_input": ai_input,
+            "messages": self._prompt_messages(player_id),
+            "beat_result": beat_result,
+            "say": say,
         }
 
-        ai_result = deepseek_decide(ai_input, p["messages"])
+    @player_locked
+    def _advance_complete(
+        self, player_id: str, ctx: Dict[str, Any], ai_result: Dict[str, Any]
+    ) -> Tuple[Any, Dict[str, Any], Dict[str, Any]]:
+        """Fold the AI decision, queued beats, quests and emotion into the reply."""
+
+        p = self.players.get(player_id)
+        if p is not ctx["player_state"] or p.get("level_epoch", 0) != ctx["level_epoch"]:
+            # advance_async 在等待 LLM 期间释放了玩家锁；若期间关卡被加载/退出，
+            # 这轮决策基于旧状态，丢弃而不是覆盖新关卡的状态
+            logger.info("advance superseded by a level change; player_id=%s", player_id)
+            return None, None, {}
+        beat_result = ctx["beat_result"]
+        say = ctx["say"]
 
         option = ai_result.get("option")
         node = ai_result.get("node")
@@ -1342,7 +1689,7 @@ class StoryEngine:
             p["tree_state"] = {"last_option": option, "ts": time.time()}
 
         # 记录 AI 节点
-        pending_nodes = p.setdefault("pending_nodes", [])
+        pending_nodes = self._pending_nodes(p)
 
         primary_node = beat_result.get("node")
 
@@ -1378,9 +1725,8 @@ class StoryEngine:
             cur_level = p["level"].level_id
             self.minimap.mark_unlocked(player_id, cur_level)
 
-        patch = self._merge_patch(beat_result.get("world_patch"), patch)
-        for pending in p.get("pending_patches", []):
-            patch = self._merge_patch(pending, patch)
+        # 后者优先：beat patch 覆盖本轮 patch，排队的 pending patch 依次覆盖前者
+        patch = world_patch.compose(patch, beat_result.get("world_patch"), *(p.get("pending_patches") or []))
         p["pending_patches"] = []
 
         # 结束标记
@@ -1400,10 +1746,10 @@ class StoryEngine:
             patch = self._merge_patch(quest_updates.get("world_patch"), patch)
             additional_nodes = quest_updates.get("nodes") or []
             if additional_nodes:
-                p.setdefault("pending_nodes", []).extend(additional_nodes)
+                self._pending_nodes(p).extend(additional_nodes)
             completed = quest_updates.get("summary")
             if completed:
-                p.setdefault("pending_nodes", []).append(completed)
+                self._pending_nodes(p).append(completed)
 
         emotional_patch, emotional_summary = self._compose_emotional_patch(player_id)
         if emotional_summary:
@@ -1414,13 +1760,15 @@ class StoryEngine:
             )
             if changed and emotional_patch:
                 patch = self._merge_patch(emotional_patch, patch)
-                emotional_summary["last_patch"] = deepcopy(emotional_patch)
+                # compose_patch 返回冻结的共享 patch，无需复制
+                emotional_summary["last_patch"] = emotional_patch
             elif previous.get("last_patch"):
-                emotional_summary["last_patch"] = deepcopy(previous["last_patch"])
+                emotional_summary["last_patch"] = world_patch.freeze(previous["last_patch"])
             p["emotional_profile"] = emotional_summary
         else:
             p.pop("emotional_profile", None)
 
+        self.save_session(player_id)
         return option, node, patch
 
     # ============================================================
@@ -1447,6 +1795,8 @@ class StoryEngine:
             "memory_locked": set(),
             "memory_locked_sources": {},
         }
+        self._beat_keyword_matcher(player_state["beat_state"])
+        self._beat_memory_index(player_state["beat_state"])
 
         self.event_manager.unregister(player_id)
 
@@ -1560,13 +1910,14 @@ class StoryEngine:
         completed = beat_state.get("completed") or set()
         locked = beat_state.setdefault("memory_locked", set())
         locked_sources = beat_state.setdefault("memory_locked_sources", {})
+        index = self._beat_memory_index(beat_state)
+        mask = index.mask_of(self._get_memory_set(player_id)) if player_state else 0
         for beat_id in order:
             if beat_id not in completed:
                 beat = beat_state.get("by_id", {}).get(beat_id)
                 if not beat:
                     continue
-                requirement = getattr(beat, "memory_required", None)
-                if not self._is_memory_satisfied(player_id, requirement):
+                if not index.is_satisfied(beat_id, mask):
                     locked.add(beat_id)
                     locked_sources.setdefault(
                         beat_id,
@@ -1626,24 +1977,54 @@ class StoryEngine:
         if not beat_state:
             return []
 
-        lowered = say_text.lower()
+        matched = self._beat_keyword_matcher(beat_state).match(say_text)
+        if not matched:
+            return []
+
         updates: List[Dict[str, Any]] = []
         for beat_id in beat_state.get("order", []):
-            if beat_id in beat_state.get("completed", set()):
+            if beat_id not in matched or beat_id in beat_state.get("completed", set()):
                 continue
-            beat = beat_state.get("by_id", {}).get(beat_id)
-            if not beat:
+            if not beat_state.get("by_id", {}).get(beat_id):
                 continue
-            parsed = self._parse_trigger(getattr(beat, "trigger", None))
-            if parsed["kind"] in {"keyword", "say", "command"}:
-                values = [value.strip() for value in (parsed["value"].split("|") if parsed["value"] else []) if value.strip()]
-                if not values:
-                    continue
-                if any(value.lower() in lowered for value in values):
-                    updates.append(self._activate_beat(player_id, beat_id, self.players[player_id]["level"], source="keyword"))
+            updates.append(self._activate_beat(player_id, beat_id, self.players[player_id]["level"], source="keyword"))
 
         return updates
 
+    def _beat_keyword_matcher(self, beat_state: Dict[str, Any]) -> KeywordMatcher:
+        """Keyword/say/command beat triggers compiled once per level load."""
+
+        matcher = beat_state.get("keyword_matcher")
+        if matcher is None:
+            patterns: Dict[str, List[str]] = {}
+            by_id = beat_state.get("by_id", {})
+            for beat_id in beat_state.get("order", []):
+                beat = by_id.get(beat_id)
+                if not beat:
+                    continue
+                parsed = self._parse_trigger(getattr(beat, "trigger", None))
+                if parsed["kind"] in {"keyword", "say", "command"} and parsed["value"]:
+                    values = [value.strip() for value in parsed["value"].split("|") if value.strip()]
+                    if values:
+                        patterns[beat_id] = values
+            matcher = KeywordMatcher(patterns)
+            beat_state["keyword_matcher"] = matcher
+        return matcher
+
+    def _beat_memory_index(self, beat_state: Dict[str, Any]) -> MemoryIndex:
+        """Beat memory conditions compiled to bitsets once per level load."""
+
+        index = beat_state.get("memory_index")
+        if index is None:
+            by_id = beat_state.get("by_id", {})
+            index = MemoryIndex.for_requirements(
+                (beat_id, getattr(by_id[beat_id], "memory_required", None))
+                for beat_id in beat_state.get("order", [])
+                if by_id.get(beat_id)
+            )
+            beat_state["memory_index"] = index
+        return index
+
     def _activate_beat(
         self,
         player_id: str,
@@ -1868,7 +2249,7 @@ class StoryEngine:
         nodes_to_store.extend(update.get("extra_nodes", []) or [])
 
         if nodes_to_store:
-            player_state.setdefault("pending_nodes", []).extend(nodes_to_store)
+            self._pending_nodes(player_state).extend(nodes_to_store)
 
     def _record_story_choice(self, player_id: str, event_type: str, payload: Dict[str, Any]) -> None:
         player_state = self.players.get(player_id)
@@ -1950,24 +2331,8 @@ class StoryEngine:
 
     @staticmethod
     def _merge_patch(primary: Optional[Dict[str, Any]], secondary: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        if not primary and not secondary:
-            return {}
-        if not secondary:
-            return dict(primary or {})
-        if not primary:
-            return dict(secondary or {})
-
-        merged = dict(secondary or {})
-        for key, value in (primary or {}).items():
-            if key == "mc" and isinstance(value, dict):
-                existing = merged.get("mc")
-                if isinstance(existing, dict):
-                    merged["mc"] = {**existing, **value}
-                else:
-                    merged["mc"] = dict(value)
-            else:
-                merged[key] = value
-        return merged
+        # primary 优先：即把 primary 叠加到 secondary 之上
+        return world_patch.merge(secondary, primary)
 
     def _compose_emotional_patch(self, player_id: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
         player_state = self.players[player_id]
@@ -2002,6 +2367,7 @@ class StoryEngine:
 
         return patch, summary
 
+    @player_locked
     def get_emotional_profile(self, player_id: str) -> Dict[str, Any]:
         self._ensure_player(player_id)
         profile = self.players[player_id].get("emotional_profile")
@@ -2009,7 +2375,7 @@ class StoryEngine:
             patch, summary = self._compose_emotional_patch(player_id)
             if summary:
                 if patch:
-                    summary["last_patch"] = deepcopy(patch)
+                    summary["last_patch"] = patch
                 self.players[player_id]["emotional_profile"] = summary
                 profile = summary
         if not profile:
@@ -2088,4 +2454,7 @@ class StoryEngine:
             p["level_loaded"] = True
 
 
-story_engine = StoryEngine()
\ No newline at end of file
+# 首次使用时才构建（加载全部关卡、StoryGraph、MiniMap）
+story_engine: StoryEngine = LazySingleton(  # type: ignore[assignment]
+    lambda: StoryEngine(session_store=get_session_store()), "story_engine"
+)
\ No newline at end of file
@@ -1,10 +1,191 @@
 # backend/app/core/story/story_graph.py
 
+from bisect import insort
 from collections import Counter, deque
 import json
 import os
+import threading
 import time
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.story.story_loader import get_level_repository
+from app.core.story.trajectory_stats import EMPTY_FEATURES, LevelFeatures, TrajectoryAggregate
+
+# 每个玩家保留的轨迹条数上限（环形缓冲，最旧的先丢）
+TRAJECTORY_MAX = int(os.getenv("DRIFT_TRAJECTORY_MAX", "500"))
+
+_TUTORIAL_ALIASES = (
+    "tutorial",
+    "tutorial_level",
+    "level_tutorial",
+    "level_01",
+    "level_1",
+    "level01",
+    "level1",
+)
+
+
+def _chapter_order(payload: Dict[str, Any]) -> int:
+    meta = payload.get("meta") or {}
+    chapter = meta.get("chapter")
+    return int(chapter) if isinstance(chapter, int) else 10_000
+
+
+class _GraphSnapshot:
+    """Immutable-after-publish view of the level graph.
+
+    ``StoryGraph`` builds a new snapshot (full reload or single-level patch)
+    and publishes it with one attribute assignment, so concurrent readers see
+    either the old or the new graph, never a half-built one.
+    """
+
+    def __init__(self, version: int = 0) -> None:
+        self.version = version
+        self.levels: Dict[str, dict] = {}
+        self.edges: Dict[str, List[str]] = {}   # 邻接表
+        self.level_sources: Dict[str, str] = {}
+        self.level_paths: Dict[str, str] = {}
+        self.alias_map: Dict[str, str] = {}
+        # (chapter, key) 升序：线性兜底边的顺序
+        self.order: List[Tuple[int, str]] = []
+        self.features: Dict[str, LevelFeatures] = {}
+        self.sorted_level_ids: List[str] = []
+
+    def derive(self) -> "_GraphSnapshot":
+        """Copy-on-write clone: containers are copied, level payloads shared."""
+
+        clone = _GraphSnapshot(self.version + 1)
+        clone.levels = dict(self.levels)
+        clone.edges = dict(self.edges)
+        clone.level_sources = dict(self.level_sources)
+        clone.level_paths = dict(self.level_paths)
+        clone.alias_map = dict(self.alias_map)
+        clone.order = list(self.order)
+        clone.features = dict(self.features)
+        clone.sorted_level_ids = list(self.sorted_level_ids)
+        return clone
+
+    # ----------------------------------------------------------- levels
+    def add_level(self, key: str, data: dict, source: str, path: Optional[str]) -> None:
+        self.levels[key] = data
+        self.level_sources[key] = source
+        if path:
+            self.level_paths[key] = path
+        self.register_alias(key, key)
+
+        level_id = data.get("id")
+        if isinstance(level_id, str):
+            self.register_alias(level_id, key)
+
+        self.register_numeric_aliases(key)
+
+        if key == "flagship_tutorial":
+            for alias in _TUTORIAL_ALIASES:
+                self.register_alias(alias, key)
+
+    def register_alias(self, alias: Optional[str], canonical: str) -> None:
+        if not alias or not canonical:
+            return
+        key = alias.replace(".json", "").lower()
+        if not key:
+            return
+        self.alias_map.setdefault(key, canonical)
+
+    def register_numeric_aliases(self, canonical: str) -> None:
+        if "_" not in canonical:
+            return
+        prefix, suffix = canonical.split("_", 1)
+        if not suffix:
+            return
+        numeric = None
+        if suffix.isdigit():
+            numeric = int(suffix)
+        else:
+            try:
+                numeric = int(suffix.rstrip("abcdefghijklmnopqrstuvwxyz"))
+            except ValueError:
+                numeric = None
+        if numeric is None:
+            return
+
+        padded = f"{numeric:02d}"
+        variants = {
+            f"{prefix}_{suffix}",
+            f"{prefix}_{padded}",
+            f"flagship_{suffix}",
+            f"flagship_{padded}",
+            f"flagship_{numeric}",
+            f"level_{suffix}",
+            f"level_{padded}",
+            f"level_{numeric}",
+        }
+        for variant in variants:
+            self.register_alias(variant, canonical)
+
+    def canonical(self, level_id: Optional[str]) -> Optional[str]:
+        if not level_id:
+            return None
+
+        if level_id in self.levels:
+            return level_id
+
+        if not isinstance(level_id, str):
+            return None
+
+        normalized = level_id.replace(".json", "")
+        if normalized in self.levels:
+            return normalized
+
+        lookup_key = normalized.lower()
+        if lookup_key in self.alias_map:
+            return self.alias_map[lookup_key]
+
+        if lookup_key.startswith("level_"):
+            suffix = lookup_key.split("_", 1)[1]
+            if suffix.isdigit():
+                padded = f"{int(suffix):02d}"
+                flag = f"flagship_{padded}"
+                if flag in self.levels:
+                    return flag
+
+        return normalized if normalized in self.levels else None
+
+    # ------------------------------------------------------------ edges
+    def continuity_targets(self, key: str) -> Set[str]:
+        targets: Set[str] = set()
+        continuity = self.levels[key].get("continuity") or {}
+        if isinstance(continuity, dict):
+            for field in ("next", "next_major_level"):
+                target = continuity.get(field)
+                if not target:
+                    continue
+                canonical = self.canonical(target)
+                if canonical and canonical in self.levels:
+                    targets.add(canonical)
+        return targets
+
+    def edges_for(self, key: str, position: int) -> List[str]:
+        """Continuity edges first (authored sequencing), then the chapter-order successor."""
+
+        edges = sorted(self.continuity_targets(key))
+        if position + 1 < len(self.order):
+            next_key = self.order[position + 1][1]
+            if next_key != key and next_key not in edges:
+                edges.append(next_key)
+        return edges
+
+    def build_edges(self) -> None:
+        self.order = sorted((_chapter_order(payload), key) for key, payload in self.levels.items())
+        self.edges = {key: [] for key in self.levels.keys()}
+        for position, (_, key) in enumerate(self.order):
+            self.edges[key] = self.edges_for(key, position)
+
+    def finalize(self, collect_memory_list) -> None:
+        self.features = {
+            key: LevelFeatures.from_payload(payload, self.level_sources.get(key), collect_memory_list)
+            for key, payload in self.levels.items()
+        }
+        self.sorted_level_ids = sorted(self.levels.keys())
 
 
 class StoryGraph:
@@ -22,126 +203,145 @@ class StoryGraph:
         level_dir: like backend/data/flagship_levels
         """
         self.level_dir = level_dir
-        self.levels: Dict[str, dict] = {}
-        self.edges: Dict[str, List[str]] = {}   # 邻接表
-        self.trajectory: Dict[str, List[Dict[str, Any]]] = {}
-        self.level_sources: Dict[str, str] = {}
-        self.alias_map: Dict[str, str] = {}
+        self._snapshot = _GraphSnapshot()
+        # 写者互斥（全量重载 / 单关卡增量）；读者无锁，只读已发布的快照
+        self._write_lock = threading.Lock()
+        self.trajectory: Dict[str, Deque[Dict[str, Any]]] = {}
+        # 通关 / 到访记录独立于轨迹环形缓冲：旧条目被淘汰后仍然算“已通关”
+        self.completed_levels: Dict[str, Counter] = {}
+        self.seen_levels: Dict[str, Set[str]] = {}
         self.memory_snapshots: Dict[str, List[str]] = {}
+        # 推荐用：每个玩家的增量轨迹统计；快照版本变化时重建
+        self._aggregates: Dict[str, TrajectoryAggregate] = {}
         self.reload_levels()
 
-    def reload_levels(self) -> None:
-        """Reload flagship and generated levels from disk, preserving runtime state."""
+    # 只读视图：始终指向当前已发布的快照
+    @property
+    def levels(self) -> Dict[str, dict]:
+        return self._snapshot.levels
 
-        self.levels.clear()
-        self.level_sources.clear()
-        self.alias_map.clear()
-        self.edges.clear()
-        self._load_levels()
-        self._build_linear_graph()
+    @property
+    def edges(self) -> Dict[str, List[str]]:
+        return self._snapshot.edges
 
-    # ================= 加载所有 level_X.json =================
-    def _load_levels(self):
-        if not self.level_dir or not os.path.isdir(self.level_dir):
-            print(f"[StoryGraph] level_dir not found: {self.level_dir}")
-            return
+    @property
+    def level_sources(self) -> Dict[str, str]:
+        return self._snapshot.level_sources
 
-        entries: List[Tuple[str, str, str]] = []
+    @property
+    def alias_map(self) -> Dict[str, str]:
+        return self._snapshot.alias_map
 
-        for dirpath, _, filenames in os.walk(self.level_dir):
-            rel_dir = os.path.relpath(dirpath, self.level_dir)
-            head = rel_dir.split(os.sep)[0] if rel_dir != "." else ""
-            source = "generated" if head == "generated" else "flagship"
+    @property
+    def _features(self) -> Dict[str, LevelFeatures]:
+        return self._snapshot.features
 
-            for fname in filenames:
-                if not fname.endswith(".json"):
-                    continue
-                entries.append((dirpath, fname, source))
-
-        entries.sort(key=lambda item: (0 if os.path.relpath(item[0], self.level_dir) == "." else 1, item[0], item[1]))
-
-        for directory, fname, source in entries:
-            path = os.path.join(directory, fname)
-
-            try:
-                with open(path, "r", encoding="utf8") as f:
-                    data = json.load(f)
-            except Exception as exc:
-                print(f"[StoryGraph] Failed to load {fname}: {exc}")
-                continue
+    @property
+    def _sorted_level_ids(self) -> List[str]:
+        return self._snapshot.sorted_level_ids
 
-            key = fname.replace(".json", "")
-            if key in self.levels:
-                continue
-
-            self.levels[key] = data
-            self.level_sources[key] = source
-            self._register_alias(key, key)
+    @property
+    def _levels_version(self) -> int:
+        return self._snapshot.version
 
-            level_id = data.get("id")
-            if isinstance(level_id, str):
-                self._register_alias(level_id, key)
-
-            self._register_numeric_aliases(key)
-
-            if key == "flagship_tutorial":
-                for alias in (
-                    "tutorial",
-                    "tutorial_level",
-                    "level_tutorial",
-                    "level_01",
-                    "level_1",
-                    "level01",
-                    "level1",
-                ):
-                    self._register_alias(alias, key)
+    def reload_levels(self) -> None:
+        """Reload flagship and generated levels from disk, preserving runtime state."""
 
-        print(f"[StoryGraph] Loaded {len(self.levels)} levels from {self.level_dir}")
+        with self._write_lock:
+            snapshot = _GraphSnapshot(self._snapshot.version + 1)
+            self._load_levels(snapshot)
+            snapshot.build_edges()
+            print(f"[StoryGraph] Graph edges = {snapshot.edges}")
+            snapshot.finalize(self._collect_memory_list)
+            self._snapshot = snapshot
+
+    def add_or_update_level(self, path: str) -> Optional[str]:
+        """Parse one level file and publish a patched graph snapshot.
+
+        Aliases, the level's own edges and the chapter-order neighbours around
+        it are patched; other levels are untouched. Returns the level key, or
+        ``None`` when the file could not be indexed (caller may fall back to
+        :meth:`reload_levels`).
+        """
 
-    def _build_linear_graph(self) -> None:
-        """Populate ``self.edges`` using continuity metadata and sensible fallbacks."""
+        repository = get_level_repository(self.level_dir)
+        entry = repository.upsert(path)
+        if entry is None or entry.error is not None or entry.data is None:
+            return None
+        key = entry.filename.replace(".json", "")
+
+        with self._write_lock:
+            current = self._snapshot
+            previous = current.levels.get(key)
+            if previous is not None and current.level_paths.get(key) != entry.path:
+                winner = repository.find(entry.filename)
+                if winner is not None and winner.path != entry.path:
+                    # 被同名的高优先级文件遮蔽：图不变
+                    return key
+                return None
+            if previous is not None and previous.get("id") != entry.data.get("id"):
+                # id 变化会留下旧别名，交给全量重载
+                return None
+
+            snapshot = current.derive()
+            affected: Set[str] = {key}
+            if previous is not None:
+                old_item = (_chapter_order(previous), key)
+                old_position = snapshot.order.index(old_item)
+                if old_position > 0:
+                    affected.add(snapshot.order[old_position - 1][1])
+                snapshot.order.pop(old_position)
+            snapshot.add_level(key, entry.data, entry.source, entry.path)
+            insort(snapshot.order, (_chapter_order(entry.data), key))
+            position = snapshot.order.index((_chapter_order(entry.data), key))
+            if position > 0:
+                affected.add(snapshot.order[position - 1][1])
+            # 之前指向该关卡但尚未能解析的 continuity 链接
+            if previous is None:
+                for other, payload in snapshot.levels.items():
+                    continuity = payload.get("continuity") or {}
+                    if isinstance(continuity, dict) and any(
+                        snapshot.canonical(continuity.get(field)) == key
+                        for field in ("next", "next_major_level")
+                    ):
+                        affected.add(other)
+
+            positions = {item_key: idx for idx, (_, item_key) in enumerate(snapshot.order)}
+            for item_key in affected:
+                snapshot.edges[item_key] = snapshot.edges_for(item_key, positions[item_key])
+            snapshot.features[key] = LevelFeatures.from_payload(
+                entry.data, entry.source, self._collect_memory_list
+            )
+            if previous is None:
+                insort(snapshot.sorted_level_ids, key)
+            self._snapshot = snapshot
+        print(f"[StoryGraph] {'updated' if previous is not None else 'added'} level {key}")
+        return key
 
-        self.edges = {key: [] for key in self.levels.keys()}
+    # ================= 加载所有 level_X.json =================
+    def _load_levels(self, snapshot: _GraphSnapshot):
+        if not self.level_dir or not os.path.isdir(self.level_dir):
+            print(f"[StoryGraph] level_dir not found: {self.level_dir}")
+            return
 
-        continuity_links: Dict[str, Set[str]] = {key: set() for key in self.levels.keys()}
+        repository = get_level_repository(self.level_dir)
+        repository.refresh(force=True)
 
-        for key, payload in self.levels.items():
-            continuity = payload.get("continuity") or {}
-            if isinstance(continuity, dict):
-                for field in ("next", "next_major_level"):
-                    target = continuity.get(field)
-                    if not target:
-                        continue
-                    canonical = self._canonical_level_id(target)
-                    if canonical and canonical in self.levels:
-                        continuity_links[key].add(canonical)
-
-        # Apply continuity edges first to preserve authored sequencing.
-        for key, targets in continuity_links.items():
-            if not targets:
+        for entry in repository.entries():
+            fname = entry.filename
+            source = entry.source
+            if entry.error is not None or entry.data is None:
+                print(f"[StoryGraph] Failed to load {fname}: {entry.error}")
                 continue
-            self.edges[key].extend(sorted(targets))
+            data = entry.data
 
-        # Fallback: ensure a linear traversal ordered by chapter/index.
-        ordering: List[Tuple[int, str]] = []
-        for key, payload in self.levels.items():
-            meta = payload.get("meta") or {}
-            chapter = meta.get("chapter")
-            order = int(chapter) if isinstance(chapter, int) else 10_000
-            ordering.append((order, key))
-
-        sorted_order = sorted(ordering)
-        for idx, (_, key) in enumerate(sorted_order):
-            if idx + 1 >= len(sorted_order):
-                continue
-            next_key = sorted_order[idx + 1][1]
-            if next_key == key:
+            key = fname.replace(".json", "")
+            if key in snapshot.levels:
                 continue
-            if next_key not in self.edges[key]:
-                self.edges[key].append(next_key)
 
-        # Final fallback: if a node has no outgoing edges, leave list empty.
-        print(f"[StoryGraph] Graph edges = {self.edges}")
+            snapshot.add_level(key, data, source, entry.path)
+
+        print(f"[StoryGraph] Loaded {len(snapshot.levels)} levels from {self.level_dir}")
 
     # ================= 主线推进：下一关（bfs next） ===============
     def bfs_next(self, current_level: str) -> Optional[str]:
@@ -217,7 +417,32 @@ class StoryGraph:
             "meta": meta or {},
             "ts": time.time(),
         }
-        self.trajectory.setdefault(player_id, []).append(entry)
+        history = self._trajectory_for(player_id)
+        aggregate = self._aggregates.get(player_id)
+        if aggregate is not None and len(aggregate) != len(history):
+            aggregate = None
+            self._aggregates.pop(player_id, None)
+        if aggregate is not None and history.maxlen is not None and len(history) == history.maxlen:
+            aggregate.evict(*self._aggregate_args(history[0]))
+        history.append(entry)
+        if aggregate is not None:
+            aggregate.push(*self._aggregate_args(entry))
+        self._record_progress(player_id, entry)
+
+    def _record_progress(self, player_id: str, entry: Dict[str, Any]) -> None:
+        canonical = self._canonical_level_id(entry.get("level"))
+        if not canonical:
+            return
+        self.seen_levels.setdefault(player_id, set()).add(canonical)
+        if entry.get("action") == "exit":
+            self.completed_levels.setdefault(player_id, Counter())[canonical] += 1
+
+    def _trajectory_for(self, player_id: str) -> Deque[Dict[str, Any]]:
+        history = self.trajectory.get(player_id)
+        if history is None:
+            history = deque(maxlen=TRAJECTORY_MAX if TRAJECTORY_MAX > 0 else None)
+            self.trajectory[player_id] = history
+        return history
 
     def update_memory_flags(
         self,
@@ -247,33 +472,86 @@ class StoryGraph:
 
         self.update_trajectory(player_id, level_id, "memory", meta)
 
+    # ================= Session 持久化 =================
+    def export_session(self, player_id: str) -> Optional[Dict[str, Any]]:
+        trajectory = self.trajectory.get(player_id)
+        snapshot = self.memory_snapshots.get(player_id)
+        if trajectory is None and snapshot is None:
+            return None
+        return {
+            "trajectory": list(trajectory or []),
+            "memory_snapshot": list(snapshot) if snapshot is not None else None,
+            "completed_levels": dict(self.completed_levels.get(player_id) or {}),
+            "seen_levels": sorted(self.seen_levels.get(player_id) or ()),
+        }
+
+    def restore_session(self, player_id: str, data: Dict[str, Any]) -> None:
+        trajectory = data.get("trajectory")
+        if isinstance(trajectory, list):
+            self.trajectory.pop(player_id, None)
+            self._aggregates.pop(player_id, None)
+            self._trajectory_for(player_id).extend(trajectory)
+        completed = data.get("completed_levels")
+        seen = data.get("seen_levels")
+        if isinstance(completed, dict) and isinstance(seen, list):
+            self.completed_levels[player_id] = Counter(
+                {str(level): int(count) for level, count in completed.items() if isinstance(count, int) and count > 0}
+            )
+            self.seen_levels[player_id] = {str(level) for level in seen if level}
+        elif isinstance(trajectory, list):
+            # 旧存档没有独立记录：从存下来的轨迹重建
+            self.completed_levels.pop(player_id, None)
+            self.seen_levels.pop(player_id, None)
+            for entry in trajectory:
+                if isinstance(entry, dict):
+                    self._record_progress(player_id, entry)
+        snapshot = data.get("memory_snapshot")
+        if isinstance(snapshot, list):
+            self.memory_snapshots[player_id] = list(snapshot)
+
     # ================= Phase 10: 智能推荐下一关 =================
+    def _aggregate_for(self, player_id: str) -> TrajectoryAggregate:
+        """Incremental trajectory totals; rebuilt only after reloads or stale evictions."""
+
+        history = self.trajectory.get(player_id) or ()
+        aggregate = self._aggregates.get(player_id)
+        if (
+            aggregate is None
+            or aggregate.dirty
+            or aggregate.version != self._levels_version
+            or len(aggregate) != len(history)
+        ):
+            aggregate = TrajectoryAggregate(self._levels_version)
+            for entry in history:
+                aggregate.push(*self._aggregate_args(entry))
+            self._aggregates[player_id] = aggregate
+        return aggregate
+
+    def _aggregate_args(self, entry: Dict[str, Any]):
+        canonical = self._canonical_level_id(entry.get("level"))
+        features = self._features.get(canonical) if canonical else None
+        return canonical, entry, features, self._canonical_level_id
+
     def recommend_next_levels(
         self,
         player_id: str,
         current_level: Optional[str],
         limit: int = 3,
     ) -> List[Dict[str, Any]]:
-        """Recommend next levels with light-weight heuristics."""
+        """Recommend next levels with light-weight heuristics.
+
+        Player history is read from the incrementally maintained
+        ``TrajectoryAggregate`` and level fields from ``LevelFeatures``, so a
+        call costs O(candidates) regardless of how long the player has played.
+        """
 
         limit = max(0, limit or 0)
         if limit == 0:
             return []
 
         canonical_current = self._canonical_level_id(current_level)
-        history = self.trajectory.get(player_id, []) or []
-
-        normalized_history: List[Dict[str, Any]] = []
-        for entry in history:
-            raw_level = entry.get("level")
-            normalized = self._canonical_level_id(raw_level)
-            normalized_history.append({
-                "raw": raw_level,
-                "canonical": normalized,
-                "action": entry.get("action"),
-                "meta": entry.get("meta", {}),
-                "ts": entry.get("ts"),
-            })
+        history = self.trajectory.get(player_id) or ()
+        stats = self._aggregate_for(player_id)
 
         memory_flags: List[str] = []
         if player_id in self.memory_snapshots:
@@ -293,77 +571,30 @@ class StoryGraph:
                 break
             if memory_flags:
                 self.memory_snapshots[player_id] = list(memory_flags)
-
-        recent_choices = [item for item in normalized_history if item.get("action") == "choice"]
-        preferred_levels: List[str] = []
-        choice_level_weights: Dict[str, int] = {}
-        choice_tag_counter: Counter[str] = Counter()
-
-        for choice in recent_choices:
-            meta = choice.get("meta") or {}
-            preferred = meta.get("next_level")
-            canonical_pref = self._canonical_level_id(preferred) if preferred else None
-            if canonical_pref:
-                preferred_levels.append(canonical_pref)
-                choice_level_weights[canonical_pref] = choice_level_weights.get(canonical_pref, 0) + 1
-            tags = meta.get("tags") or []
-            if isinstance(tags, str):
-                tags = [token.strip() for token in tags.split(",") if token.strip()]
-            for tag in tags:
-                if isinstance(tag, str) and tag.strip():
-                    choice_tag_counter[tag.strip().lower()] += 1
-
-        completed_levels = {
-            item["canonical"]
-            for item in normalized_history
-            if item["canonical"] and item["action"] == "exit"
-        }
-        seen_levels = [item["canonical"] for item in normalized_history if item["canonical"]]
-
-        last_exit_level = None
-        for item in reversed(normalized_history):
-            if item["canonical"] and item["action"] == "exit":
-                last_exit_level = item["canonical"]
-                break
-
-        tag_counter: Counter[str] = Counter()
-        theme_counter: Counter[str] = Counter()
-        chapter_values: List[int] = []
-        generated_interest: Counter[str] = Counter()
-        last_exit_theme: Optional[str] = None
-        last_generated_level: Optional[str] = None
-        for item in normalized_history:
-            canonical = item["canonical"]
-            if not canonical or item["action"] != "exit":
-                continue
-            level_data = self.get_level(canonical) or {}
-            level_source = self.level_sources.get(canonical)
-            for tag in level_data.get("tags", []) or []:
-                if isinstance(tag, str):
-                    tag_counter[tag] += 1
-                    if level_source == "generated":
-                        generated_interest[tag.lower()] += 1
-            meta = level_data.get("meta") or {}
-            chapter = meta.get("chapter")
-            if isinstance(chapter, int):
-                chapter_values.append(chapter)
-            theme = level_data.get("storyline_theme")
-            if isinstance(theme, str) and theme:
-                theme_counter[theme] += 1
-                last_exit_theme = theme
-            if level_source == "generated":
-                last_generated_level = canonical
-
-        avg_chapter = sum(chapter_values) / len(chapter_values) if chapter_values else None
+        memory_set = set(memory_flags)
+
+        choice_level_weights = stats.choice_levels
+        choice_tag_counter = stats.choice_tags
+        completed_levels = self.completed_levels.get(player_id) or Counter()
+        seen_levels = self.seen_levels.get(player_id) or set()
+        last_exit_level = stats.last_exit[1] if stats.last_exit else None
+        tag_counter = stats.tag_counter
+        theme_counter = stats.theme_counter
+        generated_interest = stats.generated_interest
+        last_exit_theme = stats.last_exit_theme[1] if stats.last_exit_theme else None
+        last_generated_level = stats.last_generated[1] if stats.last_generated else None
+        avg_chapter = stats.avg_chapter
 
         candidate_ids: List[str] = []
 
-        for preferred in preferred_levels:
+        for preferred in choice_level_weights:
             if preferred and preferred not in candidate_ids:
                 candidate_ids.append(preferred)
 
         # 1) 当前关卡的邻居优先
+        current_neighbors: Set[str] = set()
         if canonical_current:
+            current_neighbors = set(self.neighbors(canonical_current))
             candidate_ids.extend(self.neighbors(canonical_current))
             if canonical_current not in completed_levels:
                 candidate_ids.append(canonical_current)
@@ -376,15 +607,15 @@ class StoryGraph:
                 candidate_ids.append(next_mainline)
 
         # 3) 补充未体验过的关卡，直到数量够用
-        unvisited = [lv for lv in sorted(self.levels.keys()) if lv not in seen_levels]
-        for lv in unvisited:
+        for lv in self._sorted_level_ids:
             if len(candidate_ids) >= max(limit * 2, limit + 1):
                 break
-            candidate_ids.append(lv)
+            if lv not in seen_levels:
+                candidate_ids.append(lv)
 
         # 4) 最后兜底：全部关卡（保持顺序）
         if not candidate_ids:
-            candidate_ids.extend(sorted(self.levels.keys()))
+            candidate_ids.extend(self._sorted_level_ids)
 
         if (
             "flagship_12" in completed_levels
@@ -398,7 +629,8 @@ class StoryGraph:
         if reference_level:
             primary_mainline = self.bfs_next(reference_level)
 
-        tag_total = sum(tag_counter.values())
+        tag_total = stats.tag_total
+        total_theme = stats.theme_total
 
         for candidate in candidate_ids:
             canonical = self._canonical_level_id(candidate)
@@ -423,12 +655,12 @@ class StoryGraph:
                 entry["score"] += 25.0
                 reasons.append("尚未通关")
             else:
-                exit_count = sum(1 for item in normalized_history if item["canonical"] == canonical and item["action"] == "exit")
+                exit_count = completed_levels[canonical]
                 entry["score"] -= 10.0 * exit_count
                 if exit_count > 0:
                     reasons.append("曾经通关")
 
-            if canonical_current and canonical in self.neighbors(canonical_current):
+            if canonical in current_neighbors:
                 entry["score"] += 15.0
                 reasons.append("连接当前剧情")
 
@@ -436,16 +668,12 @@ class StoryGraph:
                 entry["score"] += 20.0
                 reasons.append("继续当前关卡")
 
-            level_data = self.get_level(canonical) or {}
-            tags = [t for t in (level_data.get("tags") or []) if isinstance(t, str)]
+            features = self._features.get(canonical, EMPTY_FEATURES)
+            tags = features.tags
             if tags and "tags" not in entry:
                 entry["tags"] = list(tags)
 
-            title = level_data.get("title") if isinstance(level_data, dict) else None
-            if isinstance(title, str) and title:
-                entry.setdefault("title", title)
-            else:
-                entry.setdefault("title", canonical)
+            entry.setdefault("title", features.title or canonical)
             for tag in tags:
                 if tag_total:
                     weight = tag_counter.get(tag, 0) / tag_total
@@ -454,35 +682,29 @@ class StoryGraph:
                         if f"偏好：{tag}" not in reasons:
                             reasons.append(f"偏好：{tag}")
 
-            theme = level_data.get("storyline_theme")
-            if isinstance(theme, str) and theme:
+            theme = features.theme
+            if theme:
                 entry.setdefault("storyline_theme", theme)
                 if last_exit_theme and theme == last_exit_theme:
                     entry["score"] += 18.0
                     if "延续旗舰叙事主题" not in reasons:
                         reasons.append("延续旗舰叙事主题")
-                else:
-                    total_theme = sum(theme_counter.values())
-                    if total_theme:
-                        affinity = theme_counter.get(theme, 0) / total_theme
-                        if affinity > 0:
-                            entry["score"] += 6.0 * affinity
-                            if "契合常见主题" not in reasons:
-                                reasons.append("契合常见主题")
-
-            level_source = self.level_sources.get(canonical)
+                elif total_theme:
+                    affinity = theme_counter.get(theme, 0) / total_theme
+                    if affinity > 0:
+                        entry["score"] += 6.0 * affinity
+                        if "契合常见主题" not in reasons:
+                            reasons.append("契合常见主题")
+
+            level_source = features.source
             if generated_interest and tags:
-                overlap = sum(generated_interest.get(tag.lower(), 0) for tag in tags)
+                overlap = sum(generated_interest.get(tag, 0) for tag in features.tags_lower)
                 if overlap > 0:
                     entry["score"] += 10.0 * overlap
                     cue = "契合玩家自创主题" if level_source == "generated" else "呼应玩家兴趣标签"
                     if cue not in reasons:
                         reasons.append(cue)
 
-            tasks = []
-            if isinstance(level_data, dict):
-                tasks = [task for task in level_data.get("tasks", []) if isinstance(task, dict)]
-
             if level_source == "generated":
                 entry.setdefault("origin", "generated")
                 if canonical not in completed_levels:
@@ -493,16 +715,13 @@ class StoryGraph:
                     entry["score"] += 12.0
                     if "延续近期玩家创作" not in reasons:
                         reasons.append("延续近期玩家创作")
-                if tasks:
-                    has_conditions = any(task.get("conditions") for task in tasks)
-                    if has_conditions:
-                        entry["score"] += 9.0
-                        if "玩家创作任务已准备" not in reasons:
-                            reasons.append("玩家创作任务已准备")
+                if features.has_task_conditions:
+                    entry["score"] += 9.0
+                    if "玩家创作任务已准备" not in reasons:
+                        reasons.append("玩家创作任务已准备")
 
-            if memory_flags:
-                affinity_flags = self._collect_memory_list(level_data.get("memory_affinity"))
-                overlap = sorted(set(memory_flags).intersection(affinity_flags))
+            if memory_set:
+                overlap = sorted(memory_set.intersection(features.memory_affinity))
                 if overlap:
                     entry["score"] += 12.0 * len(overlap)
                     entry.setdefault("memory_match", [])
@@ -513,17 +732,13 @@ class StoryGraph:
                     reason = f"记忆共鸣：{summary}" if summary else "记忆共鸣"
                     reasons.append(reason)
 
-                recovery_flags = self._collect_memory_list(
-                    level_data.get("memory_recovery") or level_data.get("memory_healing")
-                )
-                if recovery_flags and set(memory_flags).intersection(recovery_flags):
+                if features.memory_recovery and memory_set.intersection(features.memory_recovery):
                     entry["score"] += 6.0
                     if "疗愈记忆" not in reasons:
                         reasons.append("疗愈记忆")
 
-            meta = level_data.get("meta") or {}
-            chapter = meta.get("chapter")
-            if isinstance(chapter, int) and avg_chapter is not None:
+            chapter = features.chapter
+            if chapter is not None and avg_chapter is not None:
                 diff = abs(chapter - avg_chapter)
                 if diff < 1:
                     entry["score"] += 8.0
@@ -532,7 +747,7 @@ class StoryGraph:
                     entry["score"] += 2.0
                 else:
                     entry["score"] -= 2.5
-            if isinstance(chapter, int):
+            if chapter is not None:
                 entry.setdefault("chapter", chapter)
 
             if canonical in seen_levels and canonical not in completed_levels:
@@ -555,8 +770,7 @@ class StoryGraph:
 
             if choice_tag_counter and tags:
                 overlap = 0
-                for tag in tags:
-                    key = tag.lower()
+                for key in features.tags_lower:
                     overlap += choice_tag_counter.get(key, 0)
                 if overlap > 0:
                     entry["score"] += 8.0 * overlap
@@ -607,72 +821,7 @@ class StoryGraph:
         return [token] if token else []
 
     def _canonical_level_id(self, level_id: Optional[str]) -> Optional[str]:
-        if not level_id:
-            return None
-
-        if level_id in self.levels:
-            return level_id
-
-        if not isinstance(level_id, str):
-            return None
-
-        normalized = level_id.replace(".json", "")
-        if normalized in self.levels:
-            return normalized
-
-        lookup_key = normalized.lower()
-        if lookup_key in self.alias_map:
-            return self.alias_map[lookup_key]
-
-        if lookup_key.startswith("level_"):
-            suffix = lookup_key.split("_", 1)[1]
-            if suffix.isdigit():
-                padded = f"{int(suffix):02d}"
-                flag = f"flagship_{padded}"
-                if flag in self.levels:
-                    return flag
-
-        return normalized if normalized in self.levels else None
-
-    # ================= Helpers =================
-    def _register_alias(self, alias: Optional[str], canonical: str) -> None:
-        if not alias or not canonical:
-            return
-        key = alias.replace(".json", "").lower()
-        if not key:
-            return
-        self.alias_map.setdefault(key, canonical)
-
-    def _register_numeric_aliases(self, canonical: str) -> None:
-        if "_" not in canonical:
-            return
-        prefix, suffix = canonical.split("_", 1)
-        if not suffix:
-            return
-        numeric = None
-        if suffix.isdigit():
-            numeric = int(suffix)
-        else:
-            try:
-                numeric = int(suffix.rstrip("abcdefghijklmnopqrstuvwxyz"))
-            except ValueError:
-                numeric = None
-        if numeric is None:
-            return
-
-        padded = f"{numeric:02d}"
-        variants = {
-            f"{prefix}_{suffix}",
-            f"{prefix}_{padded}",
-            f"flagship_{suffix}",
-            f"flagship_{padded}",
-            f"flagship_{numeric}",
-            f"level_{suffix}",
-            f"level_{padded}",
-            f"level_{numeric}",
-        }
-        for variant in variants:
-            self._register_alias(variant, canonical)
+        return self._snapshot.canonical(level_id)
 
     def _sorted_flagship_levels(self) -> List[str]:
         flagship_ids = [key for key, src in self.level_sources.items() if src == "flagship"]
@@ -1,5 +1,9 @@
 # backend/app/core/story/story_loader.py
+import copy
 import os, json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, Any, Optional, List, Set, Tuple
 
@@ -46,51 +50,351 @@ class Level:
     tree: Optional[Dict[str, Any]] = None
 
 
-def _iter_level_files(include_legacy: bool = True):
-    """Yield ``(directory, filename, source)`` tuples in priority order."""
+_SKIP_PREFIX = "_"
 
-    _ = include_legacy  # legacy paths removed but retained for signature compatibility
+# 目录轮询间隔（秒）：在此间隔内重复访问只做单文件 stat，不再遍历目录。
+LEVEL_POLL_INTERVAL = float(os.getenv("DRIFT_LEVEL_POLL_INTERVAL", "1.0"))
+# 冷扫描时并行读取关卡文件；少于 LEVEL_PARALLEL_MIN 个变更文件时不开线程池
+LEVEL_LOAD_WORKERS = int(os.getenv("DRIFT_LEVEL_LOAD_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+LEVEL_PARALLEL_MIN = int(os.getenv("DRIFT_LEVEL_PARALLEL_MIN", "16"))
 
-    if not DATA_DIR or not os.path.exists(DATA_DIR):
-        return
 
-    entries: List[Tuple[str, str, str]] = []
+@dataclass
+class LevelEntry:
+    """One indexed level file and its parsed forms."""
+
+    key: str
+    path: str
+    filename: str
+    source: str
+    mtime_ns: int
+    size: int
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[Exception] = None
+    level: Optional[Level] = None
+    extensions: Any = None
+
+    @property
+    def private(self) -> bool:
+        return self.filename.startswith(_SKIP_PREFIX)
+
+    def summary(self) -> Dict[str, Any]:
+        if self.error is not None or self.data is None:
+            return {
+                "id": self.key,
+                "title": f"[BROKEN] {self.filename}",
+                "file": self.filename,
+                "source": self.source,
+                "deprecated": False,
+                "error": str(self.error),
+            }
+        data = self.data
+        meta = data.get("meta") or {}
+        return {
+            "id": data.get("id", self.key),
+            "title": data.get("title", ""),
+            "file": self.filename,
+            "tags": data.get("tags", []),
+            "chapter": meta.get("chapter"),
+            "word_count": meta.get("word_count"),
+            "source": self.source,
+            "deprecated": False,
+        }
+
+
+class LevelRepository:
+    """In-memory index over a level directory.
+
+    The directory is walked once; afterwards each entry is revalidated by
+    ``mtime``/size and the directory tree is only re-walked when a directory
+    mtime changes (files added/removed) or a lookup misses; miss re-walks are
+    limited to one per ``poll_interval`` so unknown ids stay cheap (writers
+    call ``upsert`` to make new files visible at once). JSON payloads,
+    ``Level`` objects and ``LevelExtensions`` are parsed at most once per file
+    version and shared by ``load_level``, ``list_levels`` and ``StoryGraph``.
+    """
 
-    for dirpath, _, filenames in os.walk(DATA_DIR):
-        rel_dir = os.path.relpath(dirpath, DATA_DIR)
+    def __init__(self, root: str, poll_interval: float = LEVEL_POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._lock = threading.RLock()
+        self._entries: List[LevelEntry] = []
+        self._by_path: Dict[str, LevelEntry] = {}
+        self._by_filename: Dict[str, LevelEntry] = {}
+        self._dir_mtimes: Dict[str, int] = {}
+        self._scanned = False
+        self._last_poll = 0.0
+        self._last_miss_scan = float("-inf")
+
+    # ----------------------------------------------------------------- index
+    def refresh(self, force: bool = False) -> None:
+        """Re-validate the index; ``force`` always re-walks the directory."""
+
+        with self._lock:
+            now = time.monotonic()
+            if force or not self._scanned:
+                self._scan()
+                return
+            if now - self._last_poll < self.poll_interval:
+                return
+            self._last_poll = now
+            if self._dirs_changed():
+                self._scan()
+                return
+            changed = False
+            for entry in list(self._entries):
+                changed = self._revalidate(entry) or changed
+            if changed:
+                self._rebuild_lookup()
+
+    def invalidate(self) -> None:
+        """Drop the directory snapshot so the next access re-walks it."""
+
+        with self._lock:
+            self._scanned = False
+
+    def upsert(self, path: str) -> Optional[LevelEntry]:
+        """Index (or re-read) one level file without re-walking the directory.
+
+        Returns ``None`` when ``path`` is outside ``root`` or not a JSON file.
+        """
+
+        path = os.path.abspath(path)
+        directory, filename = os.path.split(path)
+        if not filename.endswith(".json") or os.path.commonpath([self.root, path]) != self.root:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        rel_dir = os.path.relpath(directory, self.root)
         primary_segment = rel_dir.split(os.sep)[0] if rel_dir != "." else ""
-        if primary_segment == "generated":
-            source = "generated"
-        else:
-            source = "flagship"
-
-        for filename in filenames:
-            if not filename.endswith(".json") or filename.startswith("_"):
+        source = "generated" if primary_segment == "generated" else "flagship"
+
+        with self._lock:
+            if not self._scanned:
+                self._scan()
+                return self._by_path.get(path)
+            entry = _read_entry(path, filename, source, stat)
+            previous = self._by_path.get(path)
+            if previous is not None:
+                self._entries = [entry if item is previous else item for item in self._entries]
+            else:
+                self._entries.append(entry)
+                self._entries.sort(key=_entry_sort_key(self.root))
+            self._by_path[path] = entry
+            self.version += 1
+            self._rebuild_lookup()
+            # 目录 mtime 已因本次写入变化；记下新值，避免下次轮询整棵重扫
+            if directory in self._dir_mtimes:
+                try:
+                    self._dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    pass
+            return entry
+
+    def entries(self, include_private: bool = True) -> List[LevelEntry]:
+        self.refresh()
+        with self._lock:
+            if include_private:
+                return list(self._entries)
+            return [entry for entry in self._entries if not entry.private]
+
+    def find(self, filename: str) -> Optional[LevelEntry]:
+        """Return the highest-priority entry for ``filename`` (``xxx.json``)."""
+
+        return self._lookup("_by_filename", filename)
+
+    def get_level(self, entry: LevelEntry) -> Level:
+        """Return a per-caller copy of the parsed ``Level`` for ``entry``.
+
+        The copy is deep (``text``, ``meta``, ``bootstrap_patch``,
+        ``_raw_payload`` ...), so callers may mutate it without touching the
+        cached parse; only ``_level_extensions`` is shared.
+        """
+
+        with self._lock:
+            if entry.error is not None:
+                raise entry.error
+            if entry.level is None:
+                entry.level = _build_level(entry.data or {}, entry.key)
+            if entry.extensions is None:
+                from app.core.story.level_schema import LevelExtensions
+
+                entry.extensions = LevelExtensions.from_payload(entry.data)
+            # 深拷贝：解析结果只做一次，但调用方对 text/meta/patch 的修改不能串回缓存
+            level = copy.deepcopy(entry.level)
+        setattr(level, "_level_extensions", entry.extensions)
+        # 文件版本标识：派生缓存（如入场 patch）以它为键
+        setattr(level, "_source_version", (entry.path, entry.mtime_ns, entry.size))
+        return level
+
+    # -------------------------------------------------------------- internals
+    def _lookup(self, table: str, key: str) -> Optional[LevelEntry]:
+        self.refresh()
+        with self._lock:
+            entry = getattr(self, table).get(key)
+            if entry is not None and self._revalidate(entry):
+                self._rebuild_lookup()
+                entry = getattr(self, table).get(key)
+            if entry is None:
+                # 可能是刚写入的新关卡：重新遍历一次再判定缺失；
+                # 每个轮询间隔最多一次，未知 id 的多个候选名不会各触发一次全量扫描
+                now = time.monotonic()
+                if now - self._last_miss_scan >= self.poll_interval:
+                    self._last_miss_scan = now
+                    self._scan()
+                    entry = getattr(self, table).get(key)
+            return entry
+
+    def _walk(self) -> List[Tuple[str, str, str]]:
+        entries: List[Tuple[str, str, str]] = []
+        self._dir_mtimes = {}
+        if not self.root or not os.path.isdir(self.root):
+            return entries
+
+        for dirpath, _, filenames in os.walk(self.root):
+            try:
+                self._dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            rel_dir = os.path.relpath(dirpath, self.root)
+            primary_segment = rel_dir.split(os.sep)[0] if rel_dir != "." else ""
+            source = "generated" if primary_segment == "generated" else "flagship"
+            for filename in filenames:
+                if filename.endswith(".json"):
+                    entries.append((dirpath, filename, source))
+
+        entries.sort(key=lambda item: (0 if item[0] == self.root else 1, item[0], item[1]))
+        return entries
+
+    def _dirs_changed(self) -> bool:
+        if not self._dir_mtimes:
+            return os.path.isdir(self.root) if self.root else False
+        for dirpath, mtime_ns in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _scan(self) -> None:
+        previous = self._by_path
+        slots: List[Optional[LevelEntry]] = []
+        stale: List[Tuple[int, str, str, str, os.stat_result]] = []
+        for directory, filename, source in self._walk():
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
                 continue
-            entries.append((dirpath, filename, source))
+            entry = previous.get(path)
+            if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+                stale.append((len(slots), path, filename, source, stat))
+                slots.append(None)
+            else:
+                slots.append(entry)
 
-    seen: Set[str] = set()
-    for directory, filename, source in sorted(entries, key=lambda item: (0 if os.path.relpath(item[0], DATA_DIR) == "." else 1, item[0], item[1])):
-        key = f"{directory}:{filename}"
-        if key in seen:
-            continue
-        seen.add(key)
-        yield directory, filename, source
+        # 冷启动时文件很多：JSON 读取/解析并行做，结果按原顺序落位
+        for index, entry in _read_entries(stale):
+            slots[index] = entry
+            self.version += 1
+
+        entries: List[LevelEntry] = [entry for entry in slots if entry is not None]
+        by_path: Dict[str, LevelEntry] = {entry.path: entry for entry in entries}
+
+        if set(previous) - set(by_path):
+            self.version += 1
+
+        self._entries = entries
+        self._by_path = by_path
+        self._rebuild_lookup()
+        self._scanned = True
+        self._last_poll = time.monotonic()
+
+    def _revalidate(self, entry: LevelEntry) -> bool:
+        """Re-read ``entry`` in place if its file changed. Returns True on change."""
+
+        try:
+            stat = os.stat(entry.path)
+        except OSError:
+            self._scanned = False
+            self._scan()
+            return True
+        if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == entry.size:
+            return False
+        fresh = _read_entry(entry.path, entry.filename, entry.source, stat)
+        self._entries = [fresh if item is entry else item for item in self._entries]
+        self._by_path[entry.path] = fresh
+        self.version += 1
+        return True
+
+    def _rebuild_lookup(self) -> None:
+        by_filename: Dict[str, LevelEntry] = {}
+        for entry in self._entries:
+            by_filename.setdefault(entry.filename, entry)
+        self._by_filename = by_filename
+
+
+def _entry_sort_key(root: str):
+    """Same ordering as ``LevelRepository._walk``: root files first, then by directory."""
+
+    def key(entry: LevelEntry) -> Tuple[int, str, str]:
+        directory = os.path.dirname(entry.path)
+        return (0 if directory == root else 1, directory, entry.filename)
+
+    return key
+
+
+def _read_entry(path: str, filename: str, source: str, stat: os.stat_result) -> LevelEntry:
+    entry = LevelEntry(
+        key=os.path.splitext(filename)[0],
+        path=path,
+        filename=filename,
+        source=source,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+    )
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"level payload must be an object: {filename}")
+        entry.data = data
+    except Exception as exc:  # noqa: BLE001 - broken files are surfaced via list_levels
+        entry.error = exc
+    return entry
+
+
+def _read_entries(
+    pending: List[Tuple[int, str, str, str, os.stat_result]],
+) -> List[Tuple[int, LevelEntry]]:
+    """Read ``pending`` files, on a thread pool when there are enough of them."""
+
+    if len(pending) < LEVEL_PARALLEL_MIN or LEVEL_LOAD_WORKERS <= 1:
+        return [(index, _read_entry(path, name, source, stat)) for index, path, name, source, stat in pending]
+    workers = min(LEVEL_LOAD_WORKERS, len(pending))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="level-load") as pool:
+        loaded = pool.map(lambda item: _read_entry(*item[1:]), pending)
+        return [(item[0], entry) for item, entry in zip(pending, loaded)]
 
 
-def _find_level_path(filename: str) -> Optional[str]:
-    if not DATA_DIR or not os.path.exists(DATA_DIR):
-        return None
+_REPOSITORIES: Dict[str, LevelRepository] = {}
+_REPOSITORIES_LOCK = threading.Lock()
 
-    direct_path = os.path.join(DATA_DIR, filename)
-    if os.path.exists(direct_path):
-        return direct_path
 
-    for dirpath, _, _ in os.walk(DATA_DIR):
-        candidate = os.path.join(dirpath, filename)
-        if os.path.exists(candidate):
-            return candidate
-    return None
+def get_level_repository(root: Optional[str] = None) -> LevelRepository:
+    """Return the shared repository for ``root`` (defaults to ``DATA_DIR``)."""
+
+    key = os.path.abspath(root or DATA_DIR)
+    with _REPOSITORIES_LOCK:
+        repository = _REPOSITORIES.get(key)
+        if repository is None:
+            repository = LevelRepository(key)
+            _REPOSITORIES[key] = repository
+        return repository
 
 
 def _canonical_filename(level_id: str) -> str:
@@ -141,52 +445,25 @@ def _candidate_filenames(level_id: str) -> List[str]:
 
 def list_levels() -> List[Dict[str, Any]]:
     """返回剧情关卡元数据列表。"""
-    levels = []
-    for directory, fn, source in _iter_level_files(include_legacy=True):
-        path = os.path.join(directory, fn)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            levels.append({
-                "id": data.get("id", fn.replace(".json", "")),
-                "title": data.get("title", ""),
-                "file": fn,
-                "tags": data.get("tags", []),
-                "chapter": (data.get("meta") or {}).get("chapter"),
-                "word_count": (data.get("meta") or {}).get("word_count"),
-                "source": source,
-                "deprecated": False,
-            })
-        except Exception as e:
-            levels.append({
-                "id": fn.replace(".json", ""),
-                "title": f"[BROKEN] {fn}",
-                "file": fn,
-                "source": source,
-                "deprecated": False,
-                "error": str(e)
-            })
-    return levels
+    repository = get_level_repository(DATA_DIR)
+    return [entry.summary() for entry in repository.entries(include_private=False)]
 
 
 def load_level(level_id: str) -> Level:
     """读取单个关卡定义，优先选择旗舰剧情集合。"""
 
+    repository = get_level_repository(DATA_DIR)
     for candidate in _candidate_filenames(level_id):
-        path = _find_level_path(candidate)
-        if path:
-            file_id = os.path.splitext(os.path.basename(path))[0]
-            return _load_level_file(path, file_id, level_id)
+        entry = repository.find(candidate)
+        if entry is not None:
+            return repository.get_level(entry)
 
     raise FileNotFoundError(
         f"Level file not found for id '{level_id}' in {DATA_DIR}"
     )
 
 
-def _load_level_file(path: str, file_id: str, requested_id: str) -> Level:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
+def _build_level(data: Dict[str, Any], file_id: str) -> Level:
     # 兼容 text 是 list / 或 string
     raw_text = data.get("text", [])
     if isinstance(raw_text, str):
@@ -203,7 +480,7 @@ def _load_level_file(path: str, file_id: str, requested_id: str) -> Level:
     })
     tree = data.get("tree")
 
-    level_identifier = data.get("id") or file_id or requested_id
+    level_identifier = data.get("id") or file_id
 
     level = Level(
         level_id=level_identifier,
@@ -0,0 +1,166 @@
+# backend/app/core/story/trajectory_stats.py
+"""Precomputed inputs for ``StoryGraph.recommend_next_levels``.
+
+- ``LevelFeatures``: the per-level fields the recommender reads (tags, theme,
+  chapter, source, memory affinity …), extracted once per graph load instead
+  of re-parsing level payloads for every candidate on every call.
+- ``TrajectoryAggregate``: per-player counters (tag/theme preferences,
+  chapter average, branch choices) maintained incrementally as trajectory
+  entries are appended or evicted from the ring buffer, so recommending no
+  longer re-normalises the whole history. Completed / seen levels are not
+  windowed: ``StoryGraph`` keeps them outside the ring buffer.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+# (seq, value)：记录最近一次取值来自哪条轨迹，便于判断淘汰是否影响它
+_Last = Optional[Tuple[int, str]]
+
+
+@dataclass
+class LevelFeatures:
+    title: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    tags_lower: List[str] = field(default_factory=list)
+    theme: Optional[str] = None
+    chapter: Optional[int] = None
+    source: Optional[str] = None
+    has_task_conditions: bool = False
+    memory_affinity: frozenset = frozenset()
+    memory_recovery: frozenset = frozenset()
+
+    @staticmethod
+    def from_payload(
+        data: Mapping[str, Any],
+        source: Optional[str],
+        collect_memory_list: Callable[[Any], List[str]],
+    ) -> "LevelFeatures":
+        tags = [tag for tag in (data.get("tags") or []) if isinstance(tag, str)]
+        theme = data.get("storyline_theme")
+        meta = data.get("meta") or {}
+        chapter = meta.get("chapter") if isinstance(meta, dict) else None
+        title = data.get("title")
+        tasks = [task for task in data.get("tasks", []) or [] if isinstance(task, dict)]
+        return LevelFeatures(
+            title=title if isinstance(title, str) and title else None,
+            tags=tags,
+            tags_lower=[tag.lower() for tag in tags],
+            theme=theme if isinstance(theme, str) and theme else None,
+            chapter=chapter if isinstance(chapter, int) else None,
+            source=source,
+            has_task_conditions=any(task.get("conditions") for task in tasks),
+            memory_affinity=frozenset(collect_memory_list(data.get("memory_affinity"))),
+            memory_recovery=frozenset(
+                collect_memory_list(data.get("memory_recovery") or data.get("memory_healing"))
+            ),
+        )
+
+
+EMPTY_FEATURES = LevelFeatures()
+
+
+def _bump(counter: Counter, key: str, delta: int) -> None:
+    value = counter.get(key, 0) + delta
+    if value > 0:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class TrajectoryAggregate:
+    """Running totals over one player's trajectory ring buffer.
+
+    Entries are identified by a monotonically increasing ``seq``; ``first_seq``
+    is the oldest entry still in the buffer. Evicting the entry that currently
+    provides a "last …" value marks the aggregate ``dirty`` (the caller then
+    rebuilds it from the buffer), which only happens when that value is as old
+    as the whole buffer.
+    """
+
+    def __init__(self, version: int = 0) -> None:
+        self.version = version
+        self.first_seq = 0
+        self.next_seq = 0
+        self.dirty = False
+        self.tag_counter: Counter = Counter()
+        self.tag_total = 0
+        self.theme_counter: Counter = Counter()
+        self.theme_total = 0
+        self.chapter_sum = 0
+        self.chapter_count = 0
+        self.generated_interest: Counter = Counter()
+        self.choice_levels: Counter = Counter()
+        self.choice_tags: Counter = Counter()
+        self.last_exit: _Last = None
+        self.last_exit_theme: _Last = None
+        self.last_generated: _Last = None
+
+    def __len__(self) -> int:
+        return self.next_seq - self.first_seq
+
+    @property
+    def avg_chapter(self) -> Optional[float]:
+        return self.chapter_sum / self.chapter_count if self.chapter_count else None
+
+    def push(self, canonical: Optional[str], entry: Mapping[str, Any], features: Optional[LevelFeatures], canonicalize: Callable[[Any], Optional[str]]) -> None:
+        seq = self.next_seq
+        self.next_seq += 1
+        self._apply(seq, canonical, entry, features, canonicalize, 1)
+
+    def evict(self, canonical: Optional[str], entry: Mapping[str, Any], features: Optional[LevelFeatures], canonicalize: Callable[[Any], Optional[str]]) -> None:
+        seq = self.first_seq
+        self.first_seq += 1
+        self._apply(seq, canonical, entry, features, canonicalize, -1)
+        for last in (self.last_exit, self.last_exit_theme, self.last_generated):
+            if last is not None and last[0] == seq:
+                self.dirty = True
+
+    def _apply(
+        self,
+        seq: int,
+        canonical: Optional[str],
+        entry: Mapping[str, Any],
+        features: Optional[LevelFeatures],
+        canonicalize: Callable[[Any], Optional[str]],
+        delta: int,
+    ) -> None:
+        action = entry.get("action")
+        if action == "choice":
+            meta = entry.get("meta") or {}
+            preferred = meta.get("next_level")
+            canonical_pref = canonicalize(preferred) if preferred else None
+            if canonical_pref:
+                _bump(self.choice_levels, canonical_pref, delta)
+            tags = meta.get("tags") or []
+            if isinstance(tags, str):
+                tags = [token.strip() for token in tags.split(",") if token.strip()]
+            for tag in tags:
+                if isinstance(tag, str) and tag.strip():
+                    _bump(self.choice_tags, tag.strip().lower(), delta)
+
+        if not canonical or action != "exit":
+            return
+
+        if delta > 0:
+            self.last_exit = (seq, canonical)
+        features = features or EMPTY_FEATURES
+        generated = features.source == "generated"
+        for tag in features.tags:
+            _bump(self.tag_counter, tag, delta)
+            self.tag_total += delta
+            if generated:
+                _bump(self.generated_interest, tag.lower(), delta)
+        if features.chapter is not None:
+            self.chapter_sum += delta * features.chapter
+            self.chapter_count += delta
+        if features.theme:
+            _bump(self.theme_counter, features.theme, delta)
+            self.theme_total += delta
+            if delta > 0:
+                self.last_exit_theme = (seq, features.theme)
+        if generated and delta > 0:
+            self.last_generated = (seq, canonical)
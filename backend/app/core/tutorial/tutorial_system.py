@@ -7,6 +7,8 @@ from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 from enum import Enum
 
+from app.core.events.keyword_matcher import KeywordMatcher
+
 
 class TutorialStep(Enum):
     """教学步骤枚举"""
@@ -36,6 +38,10 @@ class TutorialSystem:
     def __init__(self):
         self.player_progress: Dict[str, TutorialProgress] = {}
         self.step_configs = self._init_step_configs()
+        # 所有步骤的触发词编译进同一个自动机，一次扫描得到命中的步骤
+        self.keyword_matcher = KeywordMatcher(
+            {step: config["trigger_keywords"] for step, config in self.step_configs.items()}
+        )
     
     def _init_step_configs(self) -> Dict[TutorialStep, Dict[str, Any]]:
         """初始化每个教学步骤的配置"""
@@ -180,13 +186,9 @@ class TutorialSystem:
             return None
         
         current_step = progress.current_step
-        config = self.step_configs[current_step]
-        
+
         # 检查是否包含触发关键词
-        message_lower = message.lower()
-        keywords = config["trigger_keywords"]
-        
-        if any(kw in message_lower or kw in message for kw in keywords):
+        if current_step in self.keyword_matcher.match(message):
             # 步骤完成
             return self._complete_step(player_id, current_step)
         
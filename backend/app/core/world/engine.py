@@ -1,10 +1,24 @@
-import math
-from typing import Dict, Any
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# 每个世界实例保留的实体上限（超出按最早写入淘汰）
+MAX_ENTITIES = int(os.getenv("DRIFT_WORLD_MAX_ENTITIES", "512"))
+# 闲置多久（秒）的世界实例会被回收
+WORLD_IDLE_TTL = float(os.getenv("DRIFT_WORLD_IDLE_TTL", "1800"))
+MAX_WORLDS = int(os.getenv("DRIFT_WORLD_MAX_INSTANCES", "1024"))
+
+logger = logging.getLogger(__name__)
+
 
 class WorldEngine:
-    def __init__(self):
+    def __init__(self, max_entities: int = MAX_ENTITIES):
+        self.max_entities = max(1, int(max_entities))
         self.state = {
-            "entities": {},
+            "entities": OrderedDict(),
             "variables": {
                 "speed": 0.0,
                 "angle": 0.0,
@@ -44,7 +58,11 @@ class WorldEngine:
 
         ent_patch = patch.get("entities", {})
         if isinstance(ent_patch, dict):
-            ent.update(ent_patch)
+            for k, val in ent_patch.items():
+                ent.pop(k, None)
+                ent[k] = val
+            while len(ent) > self.max_entities:
+                ent.popitem(last=False)
 
         # mc patch 不在后端执行，只透传给前端/插件
         mc_patch = patch.get("mc")
@@ -56,13 +74,76 @@ class WorldEngine:
             **({"mc": mc_patch} if mc_patch else {})
         }
 
-    def tick(self, dt=0.05):
-        v = self.state["variables"]
 
-        v["speed"] = max(0.0, v["speed"] - v["friction"] * dt)
-        rad = math.radians(v["angle"])
-        v["vx"] = v["speed"] * math.cos(rad)
-        v["vz"] = v["speed"] * math.sin(rad)
-        v["x"] += v["vx"] * dt
-        v["z"] += v["vz"] * dt
-        return v
\ No newline at end of file
+class WorldEngineRegistry:
+    """Per-player ``WorldEngine`` instances with idle eviction.
+
+    Each player (or shared world id) gets its own variables/entities, so one
+    player's ``move`` no longer overwrites another's position.
+
+    World state is not persisted. An instance idle for ``idle_ttl`` seconds
+    (``DRIFT_WORLD_IDLE_TTL``), or pushed out by ``max_instances``, is dropped:
+    a returning player starts from a fresh ``WorldEngine``. Position comes back
+    with the next ``move`` sample, and entities/variables come back when the
+    next level patch is applied. Story progress lives in StoryEngine sessions
+    and is not affected. ``on_evict(world_id)`` lets owners of other
+    per-player state (move coalescing, pending trigger hits) drop it too.
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float = WORLD_IDLE_TTL,
+        max_instances: int = MAX_WORLDS,
+        max_entities: int = MAX_ENTITIES,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.idle_ttl = float(idle_ttl)
+        self.max_instances = max(1, int(max_instances))
+        self.max_entities = max_entities
+        self._engines: "OrderedDict[str, WorldEngine]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.on_evict = on_evict
+
+    def get(self, world_id: Optional[str]) -> WorldEngine:
+        key = str(world_id or "default")
+        now = time.monotonic()
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = WorldEngine(max_entities=self.max_entities)
+                self._engines[key] = engine
+            else:
+                self._engines.move_to_end(key)
+            self._last_seen[key] = now
+            evicted = self._evict_locked(now)
+        # 回调在锁外执行：回调方可以再访问本注册表
+        if evicted and self.on_evict is not None:
+            for evicted_key in evicted:
+                self.on_evict(evicted_key)
+        return engine
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def _evict_locked(self, now: float) -> List[str]:
+        evicted: List[str] = []
+        while len(self._engines) > self.max_instances:
+            key, _ = self._engines.popitem(last=False)
+            self._last_seen.pop(key, None)
+            evicted.append(key)
+            logger.info("world state evicted (capacity) world=%s", key)
+
+        # 闲置回收：按 LRU 顺序扫描，最多每 idle_ttl/10 秒一次
+        if self.idle_ttl <= 0 or now - self._last_sweep < self.idle_ttl / 10:
+            return evicted
+        self._last_sweep = now
+        for key in list(self._engines.keys()):
+            if now - self._last_seen.get(key, now) < self.idle_ttl:
+                break
+            self._engines.pop(key, None)
+            self._last_seen.pop(key, None)
+            evicted.append(key)
+            logger.info("world state evicted (idle) world=%s", key)
+        return evicted
@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict
 import math
 
+from app.core.player_locks import player_locked
+
 
 class MiniMap:
     """
@@ -35,28 +37,42 @@ class MiniMap:
         self.positions.clear()
         self._auto_layout_spiral()
 
+    def add_level(self, level_id: str) -> None:
+        """Append one new level at the next spiral slot; existing nodes keep their positions."""
+
+        if level_id in self.positions:
+            return
+        self.positions[level_id] = self._spiral_position(len(self.mainline))
+        # 新列表整体替换，读者不会看到无坐标的节点
+        self.mainline = self.mainline + [level_id]
+
     # -----------------------------------------------------
     # 螺旋漂移布局（中心 = 512,512）
     # -----------------------------------------------------
     def _auto_layout_spiral(self):
+        for i, lv in enumerate(self.mainline):
+            self.positions[lv] = self._spiral_position(i)
+
+    @staticmethod
+    def _spiral_position(i: int) -> Dict[str, float]:
         cx, cy = 512, 512  # 画布中心对应背景书本中央
 
         R0 = 80        # 初始半径（越小越贴近书本）
         dR = 22        # 每一关往外扩张的距离
         dTheta = 0.55  # 弧度步长（越小越紧密）
 
-        for i, lv in enumerate(self.mainline):
-            r = R0 + dR * i
-            theta = i * dTheta
+        r = R0 + dR * i
+        theta = i * dTheta
 
-            x = cx + r * math.cos(theta)
-            y = cy + r * math.sin(theta)
+        x = cx + r * math.cos(theta)
+        y = cy + r * math.sin(theta)
 
-            self.positions[lv] = {"x": x, "y": y}
+        return {"x": x, "y": y}
 
     # -----------------------------------------------------
     # 玩家进入关卡（自动解锁）
     # -----------------------------------------------------
+    @player_locked
     def enter_level(self, player_id: str, level_id: str):
         ps = self.player_state[player_id]
         ps["unlocked"].add(level_id)
@@ -66,12 +82,14 @@ class MiniMap:
     # -----------------------------------------------------
     # 玩家移动更新
     # -----------------------------------------------------
+    @player_locked
     def update_player_pos(self, player_id: str, pos: Tuple[float, float, float]):
         self.player_state[player_id]["pos"] = tuple(pos)
 
     # -----------------------------------------------------
     # 外部手动解锁
     # -----------------------------------------------------
+    @player_locked
     def mark_unlocked(self, player_id: str, level_id: str):
         self.player_state[player_id]["unlocked"].add(level_id)
 
@@ -93,6 +111,7 @@ class MiniMap:
     # -----------------------------------------------------
     # 玩家视角
     # -----------------------------------------------------
+    @player_locked
     def to_dict(self, player_id: str) -> Dict[str, Any]:
         ps = self.player_state[player_id]
 
@@ -128,10 +147,36 @@ class MiniMap:
         }
 
     # -----------------------------------------------------
+    # Session 持久化
+    # -----------------------------------------------------
+    @player_locked
+    def export_session(self, player_id: str) -> Optional[Dict[str, Any]]:
+        ps = self.player_state.get(player_id)
+        if ps is None:
+            return None
+        return {
+            "pos": list(ps["pos"]),
+            "unlocked": sorted(ps["unlocked"]),
+            "current": ps["current"],
+        }
+
+    @player_locked
+    def restore_session(self, player_id: str, data: Dict[str, Any]) -> None:
+        ps = self.player_state[player_id]
+        pos = data.get("pos")
+        if isinstance(pos, (list, tuple)) and len(pos) == 3:
+            ps["pos"] = tuple(pos)
+        ps["unlocked"].update(data.get("unlocked") or [])
+        if data.get("current"):
+            ps["current"] = data["current"]
+
+    # -----------------------------------------------------
+    @player_locked
     def reset_player(self, player_id: str):
         if player_id in self.player_state:
             del self.player_state[player_id]
 
     # -----------------------------------------------------
+    @player_locked
     def recommended_next(self, player_id: str):
         return self._recommended_next(player_id)
\ No newline at end of file
@@ -1,6 +1,17 @@
 from PIL import Image, ImageDraw, ImageFont
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import io
+import math
+import os
+import threading
+
+# 每个玩家视图渲染结果的缓存条数（按 ETag）
+MINIMAP_CACHE_SIZE = int(os.getenv("DRIFT_MINIMAP_CACHE_SIZE", "256"))
+# PNG 压缩等级：地图为大片纯色，低等级体积差别不大但编码快很多
+MINIMAP_PNG_COMPRESS = int(os.getenv("DRIFT_MINIMAP_PNG_COMPRESS", "3"))
 
 
 class MiniMapRenderer:
@@ -36,46 +47,145 @@ class MiniMapRenderer:
         except:
             self.font = ImageFont.load_default()
 
+        # 静态层（背景 + 全部节点的未解锁样式），按图谱版本缓存；
+        # 已解锁 / 当前节点所占区域在每个视图中从背景重绘，结果与逐节点整图绘制逐像素一致
+        self._lock = threading.Lock()
+        self._static_version: Optional[str] = None
+        self._static_layer: Optional[Image.Image] = None
+        # ETag → PNG bytes
+        self._png_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self.renders = 0
+        self.cache_hits = 0
+
     # ------------------------------------------------------------------
-    def render(self, nodes: list, player_pos: Tuple[float, float, float] = None, current_level: str = None):
-        canvas = self.background.copy()
-        draw = ImageDraw.Draw(canvas)
+    @staticmethod
+    def graph_version(nodes: Iterable[dict]) -> str:
+        """Hash of the node layout (level ids + positions)."""
 
-        # 绘制关卡节点
+        h = hashlib.sha1()
         for node in nodes:
             pos = node["pos"]
-            x, y = pos["x"], pos["y"]
-            unlocked = node.get("unlocked", False)
-            is_current = node["level"] == current_level
-
-            # 选择颜色
-            if is_current:
-                color = self.color_current
-                text_color = self.color_text_unlocked
-                size = 10  # 当前关卡更大
-            elif unlocked:
-                color = self.color_unlocked
-                text_color = self.color_text_unlocked
-                size = 7
-            else:
-                color = self.color_locked
-                text_color = self.color_text_locked
-                size = 5  # 未解锁更小
-
-            # 外圈光晕（已解锁/当前关卡才有）
-            if unlocked or is_current:
-                glow_size = size + 8
-                draw.ellipse((x - glow_size, y - glow_size, x + glow_size, y + glow_size),
-                             fill=(color[0], color[1], color[2], 100))
-            
-            # 实心球
-            draw.ellipse((x - size, y - size, x + size, y + size),
-                         fill=color)
-
-            # 文字标签
-            draw.text((x + 12, y - 8),
-                      node["level"],
-                      fill=text_color, font=self.font)
+            h.update(f"{node['level']}@{pos['x']:.2f},{pos['y']:.2f};".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    @staticmethod
+    def etag_for(
+        nodes: list,
+        player_pos: Tuple[float, float, float] = None,
+        current_level: str = None,
+    ) -> str:
+        """ETag of a player's view: graph version + unlock set + current + player dot.
+
+        Static so callers can answer If-None-Match without building a renderer.
+        """
+
+        unlocked = sorted(n["level"] for n in nodes if n.get("unlocked"))
+        dot = None
+        if player_pos:
+            dot = (int(round(player_pos[0])), int(round(player_pos[1])))
+        raw = f"{MiniMapRenderer.graph_version(nodes)}|{','.join(unlocked)}|{current_level}|{dot}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+    def _node_style(self, unlocked: bool, is_current: bool):
+        if is_current:
+            return self.color_current, self.color_text_unlocked, 10  # 当前关卡更大
+        if unlocked:
+            return self.color_unlocked, self.color_text_unlocked, 7
+        return self.color_locked, self.color_text_locked, 5  # 未解锁更小
+
+    def _draw_node(self, draw: ImageDraw.ImageDraw, node: dict, unlocked: bool, is_current: bool) -> None:
+        pos = node["pos"]
+        x, y = pos["x"], pos["y"]
+        color, text_color, size = self._node_style(unlocked, is_current)
+
+        # 外圈光晕（已解锁/当前关卡才有）
+        if unlocked or is_current:
+            glow_size = size + 8
+            draw.ellipse((x - glow_size, y - glow_size, x + glow_size, y + glow_size),
+                         fill=(color[0], color[1], color[2], 100))
+
+        # 实心球
+        draw.ellipse((x - size, y - size, x + size, y + size),
+                     fill=color)
+
+        # 文字标签
+        draw.text((x + 12, y - 8),
+                  node["level"],
+                  fill=text_color, font=self.font)
+
+    def _footprint(self, draw: ImageDraw.ImageDraw, size: Tuple[int, int], node: dict) -> Tuple[int, int, int, int]:
+        """Integer box covering everything ``_draw_node`` may paint for ``node`` in any style."""
+
+        pos = node["pos"]
+        x, y = pos["x"], pos["y"]
+        reach = 10 + 8 + 2  # 当前关卡光晕半径 + 抗锯齿余量
+        left, top, right, bottom = draw.textbbox((x + 12, y - 8), node["level"], font=self.font)
+        return (
+            max(0, math.floor(min(x - reach, left)) - 1),
+            max(0, math.floor(min(y - reach, top)) - 1),
+            min(size[0], math.ceil(max(x + reach, right)) + 1),
+            min(size[1], math.ceil(max(y + reach, bottom)) + 1),
+        )
+
+    def _repaint(self, canvas: Image.Image, nodes: list, boxes: list, box: Tuple[int, int, int, int], current_level: str) -> None:
+        """Redraw ``box`` from the background with every node in its final style."""
+
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return
+        ox, oy = box[0], box[1]
+        patch = self.background.crop(box)
+        draw = ImageDraw.Draw(patch)
+        for node, other in zip(nodes, boxes):
+            if other[0] >= box[2] or other[2] <= box[0] or other[1] >= box[3] or other[3] <= box[1]:
+                continue
+            # 整数平移，栅格化结果与整图绘制相同
+            shifted = {"level": node["level"], "pos": {"x": node["pos"]["x"] - ox, "y": node["pos"]["y"] - oy}}
+            self._draw_node(draw, shifted, node.get("unlocked", False), node["level"] == current_level)
+        canvas.paste(patch, box)
+
+    def _static(self, nodes: list) -> Image.Image:
+        version = self.graph_version(nodes)
+        with self._lock:
+            if self._static_layer is not None and self._static_version == version:
+                return self._static_layer
+        layer = self.background.copy()
+        draw = ImageDraw.Draw(layer)
+        for node in nodes:
+            self._draw_node(draw, node, unlocked=False, is_current=False)
+        with self._lock:
+            self._static_layer = layer
+            self._static_version = version
+            # 图谱变化后旧视图全部作废
+            self._png_cache.clear()
+        return layer
+
+    # ------------------------------------------------------------------
+    def render_bytes(
+        self,
+        nodes: list,
+        player_pos: Tuple[float, float, float] = None,
+        current_level: str = None,
+        etag: Optional[str] = None,
+    ) -> Tuple[bytes, str]:
+        """Return ``(png_bytes, etag)`` for a player's view, composited in memory."""
+
+        etag = etag or self.etag_for(nodes, player_pos, current_level)
+        with self._lock:
+            cached = self._png_cache.get(etag)
+            if cached is not None:
+                self._png_cache.move_to_end(etag)
+                self.cache_hits += 1
+                return cached, etag
+
+        canvas = self._static(nodes).copy()
+        draw = ImageDraw.Draw(canvas)
+
+        # 已解锁 / 当前关卡节点：其区域按原顺序重绘全部节点，
+        # 静态层里的未解锁样式（光晕下的文字边缘等）不会残留，前后节点的遮挡关系也不变
+        boxes = [self._footprint(draw, canvas.size, node) for node in nodes]
+        for node, box in zip(nodes, boxes):
+            if node.get("unlocked", False) or node["level"] == current_level:
+                self._repaint(canvas, nodes, boxes, box, current_level)
 
         # 玩家位置（小红点）
         if player_pos:
@@ -87,6 +197,22 @@ class MiniMapRenderer:
                 width=2
             )
 
-        # 保存
-        canvas.save(self.png_path)
-        return str(self.png_path)
\ No newline at end of file
+        buf = io.BytesIO()
+        canvas.save(buf, format="PNG", compress_level=MINIMAP_PNG_COMPRESS)
+        data = buf.getvalue()
+
+        with self._lock:
+            self.renders += 1
+            self._png_cache[etag] = data
+            while len(self._png_cache) > MINIMAP_CACHE_SIZE:
+                self._png_cache.popitem(last=False)
+        return data, etag
+
+    def render(self, nodes: list, player_pos: Tuple[float, float, float] = None, current_level: str = None):
+        """Legacy file output; written atomically so concurrent callers never see a torn file."""
+
+        data, etag = self.render_bytes(nodes, player_pos, current_level)
+        tmp_path = self.output_dir / f".minimap.{etag}.{threading.get_ident()}.tmp"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self.png_path)
+        return str(self.png_path)
@@ -0,0 +1,120 @@
+# backend/app/core/world/move_coalescer.py
+"""Coalesce high-frequency movement samples per player.
+
+The plugin reports every move. Storing the latest position is cheap, but
+trigger checks and minimap updates do not need to run for every sample:
+within ``window`` seconds only the newest sample is kept and evaluated once the
+window has elapsed. A sample with an explicit ``moving: false`` (player
+stopped) is always evaluated immediately; samples that omit the flag are
+coalesced.
+
+A held sample is normally picked up by the player's next request. When that
+request never comes (the player stopped without sending ``moving: false``),
+the flush handler set via ``set_flush_handler`` receives it once its window
+has elapsed, from a daemon thread that sleeps until the earliest deadline.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MOVE_COALESCE_WINDOW = float(os.getenv("DRIFT_MOVE_COALESCE_WINDOW", "0.2"))
+
+
+class MoveCoalescer:
+    def __init__(self, window: float = MOVE_COALESCE_WINDOW) -> None:
+        self.window = max(0.0, float(window))
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_handler: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._last_eval: Dict[str, float] = {}
+        self.received = 0
+        self.evaluated = 0
+
+    def offer(self, player_id: str, move: Dict[str, Any], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Record ``move``; return the sample to evaluate now, or ``None`` if coalesced."""
+
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.received += 1
+            last = self._last_eval.get(player_id)
+            stopped = move.get("moving") is False
+            if self.window <= 0 or stopped or last is None or now - last >= self.window:
+                self._pending.pop(player_id, None)
+                self._last_eval[player_id] = now
+                self.evaluated += 1
+                return move
+            self._pending[player_id] = move
+            if self._flush_handler is not None:
+                self._ensure_flusher()
+                self._wakeup.notify()
+            return None
+
+    def drain_due(self, now: Optional[float] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Pop pending samples whose window has elapsed."""
+
+        now = time.monotonic() if now is None else now
+        due: List[Tuple[str, Dict[str, Any]]] = []
+        with self._lock:
+            for player_id, move in list(self._pending.items()):
+                if now - self._last_eval.get(player_id, 0.0) >= self.window:
+                    del self._pending[player_id]
+                    self._last_eval[player_id] = now
+                    self.evaluated += 1
+                    due.append((player_id, move))
+        return due
+
+    def set_flush_handler(self, handler: Optional[Callable[[str, Dict[str, Any]], None]]) -> None:
+        """Call ``handler(player_id, move)`` for held samples nobody drained in time."""
+
+        with self._lock:
+            self._flush_handler = handler
+            if handler is not None and self._pending:
+                self._ensure_flusher()
+                self._wakeup.notify()
+
+    def _ensure_flusher(self) -> None:
+        # 调用方已持有 self._lock
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name="move-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending or self._flush_handler is None:
+                    self._wakeup.wait()
+                now = time.monotonic()
+                deadline = min(self._last_eval.get(player_id, 0.0) for player_id in self._pending) + self.window
+                if deadline > now:
+                    self._wakeup.wait(deadline - now)
+                    continue
+                handler = self._flush_handler
+            for player_id, move in self.drain_due():
+                try:
+                    handler(player_id, move)
+                except Exception as exc:  # noqa: BLE001 - 单个玩家出错不能停掉刷新线程
+                    print(f"[move_coalescer] flush failed for {player_id}: {exc}")
+
+    def forget(self, player_id: str) -> None:
+        with self._lock:
+            self._pending.pop(player_id, None)
+            self._last_eval.pop(player_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window": self.window,
+                "received": self.received,
+                "evaluated": self.evaluated,
+                "coalesced": self.received - self.evaluated,
+                "pending": len(self._pending),
+            }
+
+
+move_coalescer = MoveCoalescer()
@@ -0,0 +1,100 @@
+# backend/app/core/world/spatial_index.py
+"""Uniform-grid spatial index over horizontal (x, z) circles.
+
+Used by TriggerEngine and EventManager so that a movement update only looks at
+the handful of triggers whose circle overlaps the player's grid cell instead
+of scanning every registered trigger.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+Cell = Tuple[int, int]
+
+
+class UniformGrid:
+    """Buckets each circle into every cell its bounding box touches."""
+
+    def __init__(self, cell_size: float = 16.0) -> None:
+        self.cell_size = float(cell_size) if cell_size and cell_size > 0 else 16.0
+        self._cells: Dict[Cell, Set[Hashable]] = {}
+        self._items: Dict[Hashable, Tuple[float, float, float]] = {}
+        self._item_cells: Dict[Hashable, List[Cell]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def _cell(self, x: float, z: float) -> Cell:
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+
+    def _cells_for(self, x: float, z: float, radius: float) -> Iterable[Cell]:
+        x0, z0 = self._cell(x - radius, z - radius)
+        x1, z1 = self._cell(x + radius, z + radius)
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                yield (cx, cz)
+
+    def insert(self, key: Hashable, x: float, z: float, radius: float) -> None:
+        if key in self._items:
+            self.remove(key)
+        radius = max(0.0, float(radius))
+        cells = list(self._cells_for(x, z, radius))
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+        self._items[key] = (float(x), float(z), radius)
+        self._item_cells[key] = cells
+
+    def remove(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+        for cell in self._item_cells.pop(key, []):
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                continue
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._items.clear()
+        self._item_cells.clear()
+
+    def candidates(self, x: float, z: float) -> Set[Hashable]:
+        """Keys whose bounding box covers the cell containing ``(x, z)``."""
+
+        return set(self._cells.get(self._cell(x, z), ()))
+
+    def query_point(self, x: float, z: float) -> List[Hashable]:
+        """Keys whose circle contains ``(x, z)``."""
+
+        hits = []
+        for key in self._cells.get(self._cell(x, z), ()):
+            cx, cz, r = self._items[key]
+            dx = x - cx
+            dz = z - cz
+            if dx * dx + dz * dz <= r * r:
+                hits.append(key)
+        return hits
+
+    def query_radius(self, x: float, z: float, radius: float) -> List[Hashable]:
+        """Keys whose circle intersects the disc of ``radius`` around ``(x, z)``."""
+
+        seen: Set[Hashable] = set()
+        hits: List[Hashable] = []
+        for cell in self._cells_for(x, z, radius):
+            for key in self._cells.get(cell, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                cx, cz, r = self._items[key]
+                reach = r + radius
+                dx = x - cx
+                dz = z - cz
+                if dx * dx + dz * dz <= reach * reach:
+                    hits.append(key)
+        return hits
@@ -1,10 +1,18 @@
 # backend/app/core/world/trigger.py
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
-from typing import Dict, Set, List, Optional, Tuple, Any
+from typing import Dict, Iterable, Set, List, Optional, Tuple, Any
 
+from app.core.lazy import LazySingleton
+from app.core.player_locks import player_locked
 from app.core.story.story_loader import list_levels
+from app.core.world.spatial_index import UniformGrid
+
+# 空间索引网格边长（方块）；离开判定额外留出的缓冲距离（防止边界抖动反复触发）
+TRIGGER_CELL_SIZE = float(os.getenv("DRIFT_TRIGGER_CELL_SIZE", "32"))
+TRIGGER_HYSTERESIS = float(os.getenv("DRIFT_TRIGGER_HYSTERESIS", "2"))
 
 
 @dataclass
@@ -16,23 +24,66 @@ class TriggerPoint:
     - radius: 触发半径（方块数）
     - action: 动作类型：load_level / ...
     - level_id: 若 action 是 load_level，则指定要加载的 level_xx
+    - rearm: 玩家离开（半径 + 缓冲）后是否可以再次触发；默认只触发一次
     """
     id: str
     center: Tuple[float, float, float]
     radius: float
     action: str
     level_id: Optional[str] = None
+    rearm: bool = False
 
 
 class TriggerEngine:
-    def __init__(self):
-        # 全局触发点列表
-        self.triggers: List[TriggerPoint] = []
+    def __init__(self, cell_size: float = TRIGGER_CELL_SIZE, hysteresis: float = TRIGGER_HYSTERESIS):
+        # 全局触发点（按加入顺序，命中多个时先加入的优先）
+        self._points: Dict[str, TriggerPoint] = {}
+        self._order: Dict[str, int] = {}
+        self._seq = 0
+        # 水平面 (x, z) 均匀网格索引
+        self._grid = UniformGrid(cell_size)
+        self.hysteresis = max(0.0, float(hysteresis))
         # per-player 已经触发过的 trigger_id
         self.fired: Dict[str, Set[str]] = {}
+        # per-player 当前仍在范围内（含缓冲）的 trigger_id，用于离开判定
+        self.inside: Dict[str, Set[str]] = {}
 
         self._bootstrap_default()
 
+    # ------------------------------------------------------------------
+    # 触发点管理
+    # ------------------------------------------------------------------
+    @property
+    def triggers(self) -> List[TriggerPoint]:
+        return list(self._points.values())
+
+    def add_trigger(self, point: TriggerPoint) -> None:
+        if point.id not in self._points:
+            self._order[point.id] = self._seq
+            self._seq += 1
+        self._points[point.id] = point
+        self._grid.insert(point.id, point.center[0], point.center[2], point.radius)
+
+    def add_triggers(self, points: Iterable[TriggerPoint]) -> None:
+        for point in points:
+            self.add_trigger(point)
+
+    def remove_trigger(self, trigger_id: str) -> None:
+        self._points.pop(trigger_id, None)
+        self._order.pop(trigger_id, None)
+        self._grid.remove(trigger_id)
+
+    def clear(self) -> None:
+        self._points.clear()
+        self._order.clear()
+        self._grid.clear()
+
+    def query_radius(self, x: float, z: float, radius: float) -> List[TriggerPoint]:
+        """Triggers whose area intersects the horizontal disc around ``(x, z)``."""
+
+        ids = sorted(self._grid.query_radius(x, z, radius), key=self._order.__getitem__)
+        return [self._points[i] for i in ids]
+
     def _bootstrap_default(self):
         """
         先做一个默认例子：
@@ -42,7 +93,7 @@ class TriggerEngine:
         - 一关多个触发点等等
         """
         default_level = self._resolve_default_level_id()
-        self.triggers.append(
+        self.add_trigger(
             TriggerPoint(
                 id=f"start_{default_level}",
                 center=(0.0, 0.0, 0.0),   # (x, y, z)
@@ -85,10 +136,13 @@ class TriggerEngine:
 
         return "flagship_01"
 
+    @player_locked
     def reset_player(self, player_id: str):
         """清空某个玩家已经触发过的记录"""
         self.fired.pop(player_id, None)
+        self.inside.pop(player_id, None)
 
+    @player_locked
     def check(self, player_id: str, x: float, y: float, z: float) -> Optional[TriggerPoint]:
         """
         检查玩家当前位置是否命中某个触发点。
@@ -97,25 +151,37 @@ class TriggerEngine:
         - 只触发一次（存入 fired）
         - 返回对应 TriggerPoint
         """
-        if not self.triggers:
+        if not self._points:
             return None
 
         fired = self.fired.setdefault(player_id, set())
+        inside = self.inside.setdefault(player_id, set())
+
+        # 离开判定：超出 半径 + 缓冲 才算离开；可重复的触发点此时重新武装
+        if inside:
+            for trigger_id in list(inside):
+                t = self._points.get(trigger_id)
+                if t is None:
+                    inside.discard(trigger_id)
+                    continue
+                dx = x - t.center[0]
+                dz = z - t.center[2]
+                reach = t.radius + self.hysteresis
+                if dx * dx + dz * dz > reach * reach:
+                    inside.discard(trigger_id)
+                    if t.rearm:
+                        fired.discard(trigger_id)
+
+        hits = [i for i in self._grid.query_point(x, z) if i not in fired]
+        if not hits:
+            return None
 
-        for t in self.triggers:
-            if t.id in fired:
-                continue
-
-            dx = x - t.center[0]
-            dz = z - t.center[2]
-            dist2 = dx * dx + dz * dz
-
-            if dist2 <= t.radius * t.radius:
-                fired.add(t.id)
-                return t
-
-        return None
+        trigger_id = min(hits, key=self._order.__getitem__)
+        fired.add(trigger_id)
+        inside.add(trigger_id)
+        return self._points[trigger_id]
 
 
 # 全局单例
-trigger_engine = TriggerEngine()
\ No newline at end of file
+# 默认触发点需要读取关卡列表，推迟到首次使用
+trigger_engine: TriggerEngine = LazySingleton(TriggerEngine, "trigger_engine")  # type: ignore[assignment]
\ No newline at end of file
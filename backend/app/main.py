@@ -1,5 +1,9 @@
 # backend/app/main.py
 
+import os
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -18,12 +22,41 @@ from app.api.minimap_api import router as minimap_png_router
 # Core
 from app.core.story.story_loader import list_levels, load_level
 from app.core.story.story_engine import story_engine
+from app.core.lazy import warm_up
+from app.core.ai import llm_client
+
+
+# -----------------------------
+# 启动预热（可选）
+# -----------------------------
+# 剧情图、小地图、触发器等都是懒加载单例：导入本模块不会读取关卡。
+# DRIFT_PRELOAD=1 时在后台线程预热，端口立即可用，首个请求大概率已命中缓存。
+PRELOAD_ON_STARTUP = os.getenv("DRIFT_PRELOAD", "0").lower() in {"1", "true", "yes", "on"}
+
+
+def _preload() -> None:
+    try:
+        timings = warm_up()
+        summary = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items())
+        print(f">>> Preload finished: {summary}")
+    except Exception as exc:  # noqa: BLE001 - 预热失败不影响服务，首个请求会重试
+        print(f">>> Preload failed: {exc}")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if PRELOAD_ON_STARTUP:
+        threading.Thread(target=_preload, name="drift-preload", daemon=True).start()
+    yield
+    # 关闭共享的 LLM 连接池（本事件循环的 async client + 全局 sync client）
+    await llm_client.aclose()
+    llm_client.close()
 
 
 # -----------------------------
 # App 初始化
 # -----------------------------
-app = FastAPI(title="DriftSystem · Heart Levels + Story Engine")
+app = FastAPI(title="DriftSystem · Heart Levels + Story Engine", lifespan=lifespan)
 
 
 # -----------------------------
@@ -54,11 +87,9 @@ app.include_router(minimap_png_router, tags=["MiniMapPNG"])
 
 
 # -----------------------------
-# 启动日志（不再访问不存在的属性）
+# 启动日志（不触发关卡加载；关卡数量见 /levels 或 python -m app --profile-startup）
 # -----------------------------
 print(">>> DriftSystem loaded: TREE + DSL + HINT + WORLD + STORY + AI + MINIMAP + PNG")
-print(">>> Total Levels:", len(story_engine.graph.all_levels()))
-print(">>> Spiral triggers:", len(story_engine.minimap.positions))
 print(">>> Heart Universe backend ready.")
 
 
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core.executor import plugin_payload_v2
+from app.core.executor.plugin_payload_v2 import PayloadV2BuildError, build_plugin_payload_v2, build_plugin_payload_v2_with_trace
+from app.core.generation.artifact_cache import ArtifactCache, artifact_cache, artifact_key, current_lookup_stats, track_lookups
+from app.core.patch.patch_merge_v1 import merge_blocks
+from app.core.patch.world_patch import FrozenPatch, thaw
+from app.core.scene.scene_engine_v1 import _build_scene_patch, generate_scene_patch
+
+
+def _compose_result(player_block="stone"):
+    scene_blocks = [{"x": x, "y": 0, "z": z, "block": "grass_block"} for x in range(4) for z in range(4)]
+    spec_blocks = [{"x": 1, "y": 1, "z": 1, "block": player_block}, {"x": 2, "y": 1, "z": 2, "block": "npc_placeholder"}]
+    return {
+        "status": "SUCCESS",
+        "scene_spec": {"scene_type": "plain"},
+        "scene_patch": {"blocks": scene_blocks},
+        "structure_patch": {"blocks": spec_blocks},
+        "merged": merge_blocks(scene_blocks, spec_blocks),
+    }
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        artifact_cache.clear()
+
+    def test_scene_patch_hits_and_matches_uncached_build(self):
+        scene_spec = {"scene_type": "village", "time_of_day": "day", "weather": "clear", "mood": "calm"}
+        with track_lookups() as lookups:
+            first = generate_scene_patch(scene_spec)
+            self.assertEqual(lookups, {"scene": "miss"})
+            second = generate_scene_patch(scene_spec)
+            self.assertEqual(lookups, {"scene": "hit"})
+
+        self.assertIs(first, second)
+        self.assertIsInstance(second, FrozenPatch)
+        self.assertEqual(thaw(second), _build_scene_patch(first["scene_spec"]))
+        blocks = second["blocks"]
+        houses = [b for b in blocks if b["block"] != "npc_placeholder"]
+        half = len(houses) // 2
+        self.assertEqual([(b["x"] + 20, b["y"], b["z"], b["block"]) for b in houses[:half]],
+                         [(b["x"], b["y"], b["z"], b["block"]) for b in houses[half:]])
+
+    def test_payload_hit_reports_stats_and_is_identical(self):
+        self.assertIsNone(current_lookup_stats())
+        plain = build_plugin_payload_v2(_compose_result(), player_id="builder", strict_mode=False)
+        self.assertNotIn("artifact_cache", plain["stats"])
+
+        with track_lookups():
+            payload = build_plugin_payload_v2(_compose_result(), player_id="builder", strict_mode=False)
+        self.assertEqual(payload["stats"].pop("artifact_cache"), {"hits": 1, "misses": 0, "stages": {"payload": "hit"}})
+        self.assertEqual(payload, plain)
+
+        with track_lookups():
+            other = build_plugin_payload_v2(_compose_result(), player_id="someone_else", strict_mode=False)
+        self.assertEqual(other["stats"].pop("artifact_cache")["stages"], {"payload": "hit"})
+        self.assertEqual(other["player_id"], "someone_else")
+        self.assertNotEqual(other["build_id"], plain["build_id"])
+
+        disabled = ArtifactCache(enabled=False)
+        with mock.patch.object(plugin_payload_v2, "artifact_cache", disabled):
+            uncached = build_plugin_payload_v2(_compose_result(), player_id="someone_else", strict_mode=False)
+        self.assertEqual(other, uncached)
+
+    def test_build_errors_are_not_cached(self):
+        result = _compose_result()
+        result["merged"]["blocks"].append({"x": 3, "y": 1, "z": 3, "block": "npc_placeholder"})
+        result["merged"]["hash"] = "multi-npc"
+        for _ in range(2):
+            with track_lookups() as lookups:
+                with self.assertRaises(PayloadV2BuildError):
+                    build_plugin_payload_v2_with_trace(result, player_id="builder", strict_mode=True)
+            self.assertEqual(lookups, {"payload": "miss"})
+
+    def test_disk_tier_survives_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "artifacts.sqlite")
+            key = artifact_key("scene", scene_spec={"scene_type": "lake"}, engine_version="test")
+            cold = ArtifactCache(disk_path=path)
+            cold.get_or_compute("scene", key, lambda: {"blocks": [{"x": 1}]})
+            cold.close()
+
+            warm = ArtifactCache(disk_path=path)
+            value = warm.get_or_compute("scene", key, lambda: self.fail("should hit the disk tier"))
+            self.assertIsInstance(value, FrozenPatch)
+            self.assertEqual(value, {"blocks": [{"x": 1}]})
+
+            disabled = ArtifactCache(disk_path=path, enabled=False)
+            with track_lookups() as lookups:
+                self.assertEqual(disabled.get_or_compute("scene", key, lambda: "fresh"), "fresh")
+            self.assertEqual(lookups, {"scene": "disabled"})
+            warm.close()
+            disabled.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import random
+import unittest
+
+from app.core.executor.canonical_v2 import canonicalize_block_ops
+from app.core.generation.deterministic_build_engine import build_block_array, build_from_spec
+from app.core.generation.material_alias_mapper import map_role_array, map_roles_to_blocks
+from app.core.patch.block_array import BlockArray, merge_block_arrays
+from app.core.patch.patch_merge_v1 import merge_blocks
+from app.core.patch.patch_validate_v1 import validate_blocks
+
+
+HOUSE_SPEC = {
+    "structure_type": "house",
+    "width": 6,
+    "depth": 5,
+    "height": 4,
+    "material_preference": "wood",
+    "roof_type": "gable",
+    "orientation": "south",
+    "features": {"door": {"enabled": True, "side": "front"}, "windows": {"enabled": True, "count": 2}},
+}
+
+
+def _json_hash(blocks):
+    ordered = sorted(blocks, key=lambda b: (b["x"], b["y"], b["z"], b["block"]))
+    return hashlib.sha256(json.dumps(ordered, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BlockArrayTest(unittest.TestCase):
+    def test_round_trip_and_palette(self):
+        blocks = [{"x": 1, "y": 2, "z": 3, "block": "stone"}, {"x": -4, "y": 0, "z": 9, "block": "glass"}, {"x": 0, "y": 0, "z": 0, "block": "stone"}]
+        array = BlockArray.from_dicts(blocks)
+        self.assertEqual(array.palette, ["stone", "glass"])
+        self.assertEqual(array.to_dicts(), blocks)
+        self.assertEqual(array.translate(10, 64, -1).to_dicts()[0], {"x": 11, "y": 66, "z": 2, "block": "stone"})
+        with self.assertRaises(ValueError):
+            BlockArray.from_dicts([{"x": 1.5, "y": 0, "z": 0, "block": "stone"}])
+
+    def test_remap_rewrites_palette_only(self):
+        array = BlockArray()
+        array.add_box(range(2), range(2), range(2), "WALL")
+        array.append(0, 5, 0, "ROOF")
+        mapped = array.remap({"WALL": "stone", "ROOF": "stone"})
+        self.assertEqual(mapped.palette, ["stone"])
+        self.assertIs(mapped.xs, array.xs)
+        with self.assertRaises(KeyError):
+            array.remap({"WALL": "stone"})
+
+    def test_canonical_hash_matches_json_hash(self):
+        rng = random.Random(5)
+        blocks = [
+            {"x": rng.randint(-3, 3), "y": rng.randint(0, 3), "z": rng.randint(-3, 3), "block": rng.choice(["stone", "水", "air"])}
+            for _ in range(200)
+        ]
+        self.assertEqual(BlockArray.from_dicts(blocks).canonical_hash(), _json_hash(blocks))
+        self.assertEqual(canonicalize_block_ops(BlockArray.from_dicts(blocks)), canonicalize_block_ops(blocks))
+
+
+class PipelineOnBlockArrayTest(unittest.TestCase):
+    def test_build_and_map(self):
+        failure_code, roles = build_block_array(HOUSE_SPEC)
+        self.assertEqual(failure_code, "NONE")
+        self.assertEqual(roles.to_dicts("role"), build_from_spec(HOUSE_SPEC)["blocks"])
+
+        _, mapped = map_role_array(roles, "stone")
+        self.assertEqual(mapped.to_dicts(), map_roles_to_blocks(roles.to_dicts("role"), "stone")["blocks"])
+        self.assertEqual(map_role_array(roles, "marble"), ("INVALID_MATERIAL_PREFERENCE", None))
+
+    def test_merge_conflict_rules(self):
+        spec = [{"x": 0, "y": 1, "z": 0, "block": "stone"}, {"x": 1, "y": 1, "z": 0, "block": "stone"}]
+        scene = [
+            {"x": 0, "y": 1, "z": 0, "block": "air"},
+            {"x": 1, "y": 1, "z": 0, "block": " glass "},
+            {"x": 2, "y": 1, "z": 0, "block": "water"},
+        ]
+        merged = merge_blocks(scene, spec)
+        self.assertEqual(merged["conflicts_total"], 2)
+        self.assertEqual(merged["spec_dropped_total"], 1)
+        self.assertEqual([b["block"] for b in merged["blocks"]], ["stone", "glass", "water"])
+        self.assertEqual(merged["hash"], _json_hash(merged["blocks"]))
+
+        array, conflicts, dropped = merge_block_arrays(BlockArray.from_dicts(scene), BlockArray.from_dicts(spec))
+        self.assertEqual((array.to_dicts(), conflicts, dropped), (merged["blocks"], 2, 1))
+        self.assertEqual(merge_blocks(scene + [{"x": 0, "y": 0, "z": 0, "block": "  "}], spec)["failure_code"], "INVALID_BLOCK")
+
+    def test_validate_reports_first_offending_block(self):
+        blocks = [
+            {"x": 0, "y": 1, "z": 0, "block": "stone"},
+            {"x": 0, "y": 2, "z": 0, "block": "bedrock"},
+            {"x": 0, "y": 400, "z": 0, "block": "stone"},
+        ]
+        for candidate in (blocks, blocks[::-1], blocks[:1], [blocks[0]] * 3):
+            array = BlockArray.from_dicts(candidate)
+            self.assertEqual(validate_blocks(array), validate_blocks(candidate))
+            self.assertEqual(validate_blocks(array, max_blocks=2), validate_blocks(candidate, max_blocks=2))
+        self.assertEqual(validate_blocks(BlockArray())["failure_code"], "EMPTY_BLOCKS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import copy
+import json
+import unittest
+
+from fastapi.testclient import TestClient
+
+from app.core.story.history import BoundedHistory, RollingSummary
+from app.core.story.story_graph import StoryGraph
+from app.main import app
+from app.core.story.story_engine import story_engine
+
+
+class BoundedHistoryTest(unittest.TestCase):
+    def test_caps_and_pins_leading_system_messages(self):
+        summary = RollingSummary(max_chars=200)
+        history = BoundedHistory([], maxlen=3, on_evict=summary.fold)
+        history.append({"role": "system", "content": "关卡提示"})
+        for i in range(5):
+            history.append({"role": "user", "content": f"第{i}句"})
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history[0]["role"], "system")
+        self.assertEqual([m["content"] for m in history[1:]], ["第3句", "第4句"])
+        self.assertEqual(history.evicted, 3)
+        self.assertEqual(summary.turns, 3)
+        self.assertIn("玩家: 第0句", summary.text())
+        self.assertEqual(json.loads(json.dumps(history))[1]["content"], "第3句")
+        self.assertEqual(len(copy.deepcopy(history)), 3)
+
+    def test_summary_stays_within_budget(self):
+        summary = RollingSummary(max_chars=120, snippet_chars=20)
+        for i in range(1000):
+            summary.fold({"role": "assistant", "content": f"很长的剧情节点 {i} " * 5})
+        self.assertEqual(summary.turns, 1000)
+        body = summary.text().split("\n", 1)[1]
+        self.assertLessEqual(len(body), 120)
+        restored = RollingSummary.from_dict(summary.to_dict())
+        self.assertEqual(restored.text(), summary.text())
+
+    def test_trajectory_is_ring_buffered(self):
+        graph = StoryGraph("/nonexistent")
+        for i in range(2000):
+            graph.update_trajectory("p", f"level_{i}", "enter")
+        history = graph.trajectory["p"]
+        self.assertLessEqual(len(history), history.maxlen)
+        self.assertEqual(history[-1]["level"], "level_1999")
+        graph.restore_session("p", graph.export_session("p"))
+        self.assertEqual(len(graph.trajectory["p"]), len(history))
+
+
+    def test_completions_survive_trajectory_eviction(self):
+        graph = story_engine.graph
+        player = "bounded_history_completions"
+        graph.update_trajectory(player, "flagship_03", "enter")
+        graph.update_trajectory(player, "flagship_03", "exit")
+        for i in range(graph.trajectory[player].maxlen):
+            graph.update_trajectory(player, None, "memory", {"flags": [str(i)]})
+        self.assertNotIn("exit", [entry["action"] for entry in graph.trajectory[player]])
+
+        recommendations = graph.recommend_next_levels(player, "flagship_03", limit=50)
+        self.assertTrue(recommendations)
+        for item in recommendations:
+            if item["level_id"] == "flagship_03":
+                self.assertNotIn("尚未通关", item["reasons"])
+
+        restored = StoryGraph("/nonexistent")
+        restored.restore_session(player, graph.export_session(player))
+        self.assertEqual(restored.completed_levels[player], graph.completed_levels[player])
+        self.assertEqual(restored.seen_levels[player], {"flagship_03"})
+        for table in (graph.trajectory, graph.completed_levels, graph.seen_levels, graph.memory_snapshots):
+            table.pop(player, None)
+
+
+class StoryEngineHistoryTest(unittest.TestCase):
+    PLAYER = "bounded_history_tester"
+
+    def tearDown(self):
+        story_engine.players.pop(self.PLAYER, None)
+
+    def test_long_session_keeps_footprint_flat(self):
+        story_engine.load_level_for_player(self.PLAYER, "flagship_03")
+        p = story_engine.players[self.PLAYER]
+        p["messages"].insert(0, {"role": "system", "content": "prompt"})
+        for i in range(500):
+            p["messages"].append({"role": "user", "content": f"turn {i}"})
+            p["nodes"].append({"title": "n", "text": str(i)})
+        stats = story_engine.memory_stats(self.PLAYER)
+        self.assertEqual(stats["messages"]["count"], p["messages"].maxlen)
+        self.assertEqual(stats["nodes"]["count"], p["nodes"].maxlen)
+        self.assertGreater(stats["summary"]["turns"], 0)
+
+        prompt = story_engine._prompt_messages(self.PLAYER)
+        self.assertEqual(prompt[0]["content"], "prompt")
+        self.assertEqual(prompt[1]["role"], "system")
+        self.assertIn("对话摘要", prompt[1]["content"])
+        self.assertEqual(prompt[-1]["content"], "turn 499")
+
+        pending = story_engine._pending_nodes(p)
+        for i in range(pending.maxlen + 2):
+            pending.append({"title": f"未下发 {i}", "text": "节点"})
+        self.assertEqual(pending[0]["title"], "未下发 2")
+        self.assertIn("未下发 1 节点", p["history_summary"].text())
+
+        response = TestClient(app).get(f"/world/story/{self.PLAYER}/debug/memory")
+        self.assertEqual(response.json()["memory"]["messages"]["count"], p["messages"].maxlen)
+
+
+if __name__ == "__main__":
+    unittest.main()
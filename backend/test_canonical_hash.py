@@ -0,0 +1,70 @@
+import random
+import unittest
+
+from app.core.executor.canonical_v2 import (
+    CommandsHasher,
+    canonicalize_final_commands,
+    final_commands_hash_v2,
+    hash_commands,
+    stable_hash_v2,
+)
+
+
+def _commands(seed, count=300):
+    rng = random.Random(seed)
+    blocks = [
+        {"x": rng.randint(0, 4), "y": rng.randint(0, 3), "z": rng.randint(0, 4), "block": rng.choice(["stone", "玻璃", 'a"b'])}
+        for _ in range(count)
+    ]
+    fills = [{"x": 0, "y": 5, "z": 0, "x2": 3, "y2": 6, "z2": 1, "block": "oak_planks"}]
+    entities = [
+        {
+            "type": "summon",
+            "entity_type": "villager",
+            "x": 1,
+            "y": 1,
+            "z": 1,
+            "name": name,
+            "profession": "none",
+            "no_ai": True,
+            "silent": True,
+            "rotation": 90,
+        }
+        for name in ("Lake Guard", "守卫")
+    ]
+    return blocks, entities, fills
+
+
+class CommandsHashTest(unittest.TestCase):
+    def test_v2_mode_matches_stable_hash(self):
+        for seed in range(5):
+            commands = canonicalize_final_commands(*_commands(seed))
+            self.assertEqual(hash_commands(commands), stable_hash_v2(commands))
+            self.assertEqual(final_commands_hash_v2(*_commands(seed)), stable_hash_v2(commands))
+        long_run = [{"type": "setblock", "x": i, "y": 0, "z": 0, "block": "stone"} for i in range(9000)]
+        self.assertEqual(hash_commands(long_run), stable_hash_v2(long_run))
+        odd = [{"type": "setblock", "x": True, "y": 0, "z": 0, "block": "s"}, {"type": "fill"}, 7, None]
+        self.assertEqual(hash_commands(odd), stable_hash_v2(odd))
+
+    def test_tied_positions_keep_hash_order(self):
+        blocks, entities, fills = _commands(1)
+        commands = canonicalize_final_commands(blocks, entities, fills)
+        for left, right in zip(commands, commands[1:]):
+            if (left["type"], left["x"], left["y"], left["z"]) == (right["type"], right["x"], right["y"], right["z"]):
+                self.assertLessEqual(stable_hash_v2(left), stable_hash_v2(right))
+
+    def test_binary_mode_is_incremental_and_order_sensitive(self):
+        commands = canonicalize_final_commands(*_commands(2))
+        hasher = CommandsHasher("binary")
+        for command in commands:
+            hasher.update(command)
+        self.assertEqual(hasher.hexdigest(), hash_commands(commands, mode="binary"))
+        self.assertNotEqual(hash_commands(commands, mode="binary"), hash_commands(commands))
+        self.assertNotEqual(hash_commands(commands[::-1], mode="binary"), hasher.hexdigest())
+        self.assertNotEqual(hash_commands(commands[:-1], mode="binary"), hasher.hexdigest())
+        with self.assertRaises(ValueError):
+            CommandsHasher("json")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import time
+import unittest
+from unittest import mock
+
+from app.core.generation.spec_llm_v1 import generate_spec_from_text_v1
+from app.core.scene import scene_orchestrator_v2
+from app.core.scene.scene_llm_v1 import generate_scene_spec_from_text_v1
+
+PROMPT = "平静夜晚的湖边，有一座木屋，门朝南"
+
+
+def _slow(func, calls):
+    def wrapper(prompt):
+        calls.append(func.__name__)
+        time.sleep(0.2)
+        return func(prompt)
+
+    return wrapper
+
+
+class ComposeConcurrencyTest(unittest.TestCase):
+    def _compose(self, pool):
+        calls = []
+        with mock.patch.object(scene_orchestrator_v2, "_SPEC_POOL", pool), mock.patch.object(
+            scene_orchestrator_v2, "generate_scene_spec_from_text_v1", _slow(generate_scene_spec_from_text_v1, calls)
+        ), mock.patch.object(scene_orchestrator_v2, "generate_spec_from_text_v1", _slow(generate_spec_from_text_v1, calls)):
+            started = time.perf_counter()
+            result = scene_orchestrator_v2.compose_scene_and_structure_v2(PROMPT)
+            return result, time.perf_counter() - started, calls
+
+    def test_llm_stages_overlap_and_match_sequential_result(self):
+        sequential, sequential_elapsed, sequential_calls = self._compose(None)
+        concurrent, concurrent_elapsed, concurrent_calls = self._compose(scene_orchestrator_v2._SPEC_POOL)
+
+        self.assertEqual(concurrent["status"], "SUCCESS")
+        self.assertEqual(sorted(concurrent_calls), ["generate_scene_spec_from_text_v1", "generate_spec_from_text_v1"])
+        self.assertEqual(sorted(sequential_calls), sorted(concurrent_calls))
+        self.assertGreaterEqual(sequential_elapsed, 0.4)
+        self.assertLess(concurrent_elapsed, 0.35)
+
+        timings = concurrent.pop("stage_timings_ms")
+        sequential.pop("stage_timings_ms")
+        self.assertEqual(concurrent, sequential)
+        for stage in ("spec_extraction", "scene_spec", "structure_spec", "mapping", "structure_build", "merge", "validate"):
+            self.assertIn(stage, timings)
+        self.assertLess(timings["spec_extraction"], timings["scene_spec"] + timings["structure_spec"])
+
+
+if __name__ == "__main__":
+    unittest.main()
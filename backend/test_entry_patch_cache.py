@@ -0,0 +1,68 @@
+import unittest
+
+from app.core.patch.world_patch import FrozenPatch
+from app.core.story.entry_patch import EntryPatchCache
+from app.core.story.story_engine import story_engine
+
+
+class EntryPatchCacheTest(unittest.TestCase):
+    def test_builds_once_and_shares_frozen_payloads(self):
+        cache = EntryPatchCache(max_size=2)
+        calls = []
+
+        def build():
+            calls.append(1)
+            return {"mc": {"spawn": {"name": "npc"}, "tell": "hi"}}
+
+        first = cache.get_or_build(("lvl", 1), build)
+        first["mc"]["tell"] = "changed"
+        first["extra"] = True
+        with self.assertRaises(TypeError):
+            first["mc"]["spawn"]["name"] = "changed"
+        second = cache.get_or_build(("lvl", 1), build)
+        self.assertEqual(second, {"mc": {"spawn": {"name": "npc"}, "tell": "hi"}})
+        self.assertIsNot(second["mc"], first["mc"])
+        self.assertIs(second["mc"]["spawn"], first["mc"]["spawn"])
+        self.assertIsInstance(second["mc"]["spawn"], FrozenPatch)
+        self.assertEqual(len(calls), 1)
+
+        cache.get_or_build(("lvl", 2), build)
+        cache.get_or_build(("other", 1), build)
+        self.assertEqual(cache.stats()["size"], 2)
+        cache.get_or_build(None, build)
+        cache.get_or_build(None, build)
+        self.assertEqual(len(calls), 5)
+
+
+class StoryEngineEntryPatchTest(unittest.TestCase):
+    PLAYERS = ("entry_patch_a", "entry_patch_b")
+
+    def tearDown(self):
+        for player in self.PLAYERS:
+            story_engine.players.pop(player, None)
+
+    def test_second_entry_reuses_cached_patch(self):
+        story_engine.entry_patches.clear()
+        built = []
+        original = story_engine._build_entry_patch
+
+        def counting(level_id, level):
+            built.append(level_id)
+            return original(level_id, level)
+
+        story_engine._build_entry_patch = counting
+        try:
+            first = story_engine.load_level_for_player(self.PLAYERS[0], "flagship_03")
+            first["mc"]["tell"] = "mutated"
+            second = story_engine.load_level_for_player(self.PLAYERS[1], "flagship_03")
+        finally:
+            story_engine._build_entry_patch = original
+
+        self.assertEqual(built, ["flagship_03"])
+        self.assertEqual(second["mc"]["teleport"]["y"], 120)
+        self.assertNotEqual(second["mc"]["tell"], "mutated")
+        self.assertEqual(second["mc"]["_scene"]["level_id"], story_engine.players[self.PLAYERS[1]]["level"].level_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
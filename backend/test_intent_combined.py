@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.core.ai import intent_engine
+
+
+class _FakeMinimap:
+    def to_dict(self, player_id):
+        return {}
+
+
+class _FakeStoryEngine:
+    minimap = _FakeMinimap()
+
+    def __init__(self):
+        self.built = 0
+
+    def build_decision_input(self, player_id, world_state, action):
+        self.built += 1
+        return {"player_id": player_id, "player_action": action}, [{"role": "user", "content": action["say"]}]
+
+
+class IntentCombinedTest(unittest.TestCase):
+    def test_preclassify_short_commands(self):
+        self.assertEqual([it["type"] for it in intent_engine.preclassify_intents("白天")], ["SET_DAY"])
+        self.assertEqual([it["type"] for it in intent_engine.preclassify_intents("看地图")], ["SHOW_MINIMAP"])
+        self.assertIsNone(intent_engine.preclassify_intents("你好呀桃子"))
+        self.assertIsNone(intent_engine.preclassify_intents("我昨天晚上梦见自己在一片很大很大的森林里迷路了"))
+        self.assertEqual(intent_engine.preclassify_intents("请下雨！")[0]["weather"], "rain")
+        self.assertEqual(intent_engine.preclassify_intents("跳到第三关"), [{"type": "GOTO_LEVEL", "level_id": "level_03"}])
+
+    def test_dialogue_is_not_preclassified(self):
+        for line in (
+            "你在哪",
+            "周围有人吗",
+            "夜深了，我们回家吧",
+            "雨好大",
+            "写故事",
+            "我想听你讲讲你小时候的事情，然后帮我写一个关于山的故事好吗",
+        ):
+            self.assertIsNone(intent_engine.preclassify_intents(line), line)
+
+    def test_local_command_skips_llm(self):
+        engine = _FakeStoryEngine()
+        with mock.patch("app.core.ai.deepseek_agent.deepseek_decide_combined_async") as combined:
+            result = asyncio.run(
+                intent_engine.resolve_chat_async("p1", "下雨", {}, {"say": "下雨"}, engine)
+            )
+        combined.assert_not_called()
+        self.assertEqual(result["source"], "local")
+        self.assertIsNone(result["decision"])
+        self.assertEqual(result["intent_result"]["intents"][0]["world_patch"], {"mc": {"weather": "rain"}})
+
+    def test_chat_uses_single_combined_call(self):
+        engine = _FakeStoryEngine()
+
+        async def fake_combined(ctx, history, prompt):
+            return {
+                "intents": [{"type": "SAY_ONLY"}],
+                "option": 1,
+                "node": {"title": "t", "text": "x"},
+                "world_patch": {"mc": {}},
+            }
+
+        with mock.patch.object(intent_engine, "COMBINED_CHAT", True), mock.patch(
+            "app.core.ai.deepseek_agent.deepseek_decide_combined_async", side_effect=fake_combined
+        ) as combined, mock.patch.object(intent_engine, "ai_parse_multi_async") as split:
+            result = asyncio.run(
+                intent_engine.resolve_chat_async("p1", "你好呀桃子", {}, {"say": "你好呀桃子"}, engine)
+            )
+        self.assertEqual(combined.call_count, 1)
+        split.assert_not_called()
+        self.assertEqual(engine.built, 1)
+        self.assertEqual(result["source"], "combined")
+        self.assertEqual(result["intent_result"]["intents"][0]["type"], "SAY_ONLY")
+        self.assertNotIn("intents", result["decision"])
+        self.assertEqual(result["decision"]["option"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
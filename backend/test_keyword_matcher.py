@@ -0,0 +1,31 @@
+import unittest
+
+from app.core.events.keyword_matcher import KeywordMatcher
+from app.core.tutorial.tutorial_system import TutorialStep, TutorialSystem
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    def test_matches_overlapping_and_suffix_patterns(self):
+        matcher = KeywordMatcher({"b1": ["he", "she"], "b2": ["hers"], "b3": ["湖边", "lake"], "b4": ["xyz"]})
+        self.assertEqual(matcher.match("USHERS"), {"b1", "b2"})
+        self.assertEqual(matcher.match("走到湖边看 Lake"), {"b3"})
+        self.assertEqual(matcher.match(""), set())
+        self.assertEqual(len(matcher), 6)
+
+    def test_agrees_with_naive_substring_search(self):
+        words = {f"t{i}": [w] for i, w in enumerate(["ab", "abc", "bca", "c", "cab", "aaa", "光", "光芒"])}
+        matcher = KeywordMatcher(words)
+        for text in ["abcab", "aaaa", "xyz", "光芒万丈", "CABBAGE"]:
+            expected = {tag for tag, (w,) in words.items() if w.lower() in text.lower()}
+            self.assertEqual(matcher.match(text), expected, text)
+
+    def test_tutorial_uses_compiled_keywords(self):
+        tutorial = TutorialSystem()
+        tutorial.start_tutorial("kw_tester")
+        self.assertIsNone(tutorial.check_progress("kw_tester", "嗯"))
+        result = tutorial.check_progress("kw_tester", "HELLO there")
+        self.assertEqual(result["step"], TutorialStep.WELCOME.value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core import lazy
+from app.core.lazy import LazySingleton
+from app.core.story import story_loader
+from app.core.story.story_loader import LevelRepository
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+
+    def bump(self, step=1):
+        self.value += step
+        return self.value
+
+
+class LazySingletonTest(unittest.TestCase):
+    def test_builds_once_on_first_use_and_forwards(self):
+        built = []
+
+        def factory():
+            built.append(1)
+            return _Counter()
+
+        proxy = LazySingleton(factory, "test_counter")
+        self.addCleanup(lambda: lazy._registry.remove(proxy))
+        self.assertFalse(proxy.lazy_initialized)
+        self.assertEqual(built, [])
+
+        self.assertEqual(proxy.bump(2), 2)
+        proxy.value = 10
+        self.assertEqual(proxy.bump(), 11)
+        self.assertEqual(built, [1])
+        self.assertTrue(proxy.lazy_initialized)
+        self.assertIn("test_counter", lazy.init_timings)
+        self.assertIn("test_counter", lazy.warm_up(["test_counter"]))
+
+    def test_importing_app_does_not_initialise_subsystems(self):
+        script = (
+            "import app.main\n"
+            "from app.core.lazy import lazy_singletons, init_timings\n"
+            "print('STATE', sorted(s._lazy_name for s in lazy_singletons() if s.lazy_initialized), len(init_timings))\n"
+            "print('OPENAI', 'openai' in __import__('sys').modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("STATE [] 0", result.stdout)
+        self.assertIn("OPENAI False", result.stdout)
+        self.assertNotIn("[StoryGraph] Loaded", result.stdout)
+
+
+class ParallelScanTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="level-parallel-test-")
+        os.makedirs(os.path.join(self.tempdir, "generated"))
+        for i in range(24):
+            folder = "generated" if i % 3 == 0 else ""
+            with open(os.path.join(self.tempdir, folder, f"flagship_{i:02d}.json"), "w", encoding="utf-8") as fh:
+                json.dump({"id": f"flagship_{i}", "title": str(i)}, fh)
+        with open(os.path.join(self.tempdir, "broken.json"), "w", encoding="utf-8") as fh:
+            fh.write("{")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def _snapshot(self, workers):
+        with mock.patch.object(story_loader, "LEVEL_LOAD_WORKERS", workers), \
+                mock.patch.object(story_loader, "LEVEL_PARALLEL_MIN", 2):
+            repo = LevelRepository(self.tempdir, poll_interval=0.0)
+            return [(e.path, e.source, e.data, type(e.error)) for e in repo.entries()]
+
+    def test_parallel_scan_matches_serial(self):
+        serial = self._snapshot(1)
+        self.assertEqual(len(serial), 25)
+        self.assertEqual(self._snapshot(4), serial)
+
+
+if __name__ == "__main__":
+    unittest.main()
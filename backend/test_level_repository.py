@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from app.core.story.story_loader import LevelRepository
+
+
+class LevelRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="level-repo-test-")
+        os.makedirs(os.path.join(self.tempdir, "generated"))
+        self._write("flagship_01.json", {"id": "flagship_1", "title": "One"})
+        self._write(os.path.join("generated", "flagship_custom_1.json"), {"id": "custom_story", "title": "Gen"})
+        self.repo = LevelRepository(self.tempdir, poll_interval=0.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def _write(self, name, payload):
+        path = os.path.join(self.tempdir, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh)
+        return path
+
+    def test_index_by_filename(self):
+        entry = self.repo.find("flagship_custom_1.json")
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.source, "generated")
+
+    def test_misses_rescan_at_most_once_per_interval(self):
+        repo = LevelRepository(self.tempdir, poll_interval=60.0)
+        repo.refresh()
+        scans = []
+        original = repo._scan
+        repo._scan = lambda: (scans.append(1), original())[1]
+        for name in ("missing_a.json", "missing_b.json", "missing_c.json"):
+            self.assertIsNone(repo.find(name))
+        self.assertEqual(len(scans), 1)
+
+        path = self._write("flagship_03.json", {"id": "flagship_3"})
+        self.assertIsNone(repo.find("flagship_03.json"))
+        self.assertIsNotNone(repo.upsert(path))
+        self.assertIsNotNone(repo.find("flagship_03.json"))
+        self.assertEqual(len(scans), 1)
+
+    def test_levels_are_parsed_once_and_copied(self):
+        entry = self.repo.find("flagship_01.json")
+        first = self.repo.get_level(entry)
+        second = self.repo.get_level(self.repo.find("flagship_01.json"))
+        self.assertIsNot(first, second)
+        self.assertIsNot(getattr(first, "_raw_payload"), getattr(second, "_raw_payload"))
+        self.assertIs(getattr(first, "_level_extensions"), getattr(second, "_level_extensions"))
+
+    def test_mutating_a_level_does_not_leak_into_the_cache(self):
+        entry = self.repo.find("flagship_01.json")
+        first = self.repo.get_level(entry)
+        first.text.append("改过的台词")
+        first.meta["dirty"] = True
+        first.bootstrap_patch.setdefault("variables", {})["dirty"] = True
+        getattr(first, "_raw_payload")["title"] = "changed"
+
+        second = self.repo.get_level(self.repo.find("flagship_01.json"))
+        self.assertNotIn("改过的台词", second.text)
+        self.assertNotIn("dirty", second.meta)
+        self.assertNotIn("dirty", second.bootstrap_patch.get("variables", {}))
+        self.assertEqual(getattr(second, "_raw_payload")["title"], "One")
+
+    def test_modified_file_is_reparsed(self):
+        entry = self.repo.find("flagship_01.json")
+        path = self._write("flagship_01.json", {"id": "flagship_1", "title": "One (edited)"})
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, entry.mtime_ns + 1_000_000))
+        level = self.repo.get_level(self.repo.find("flagship_01.json"))
+        self.assertEqual(level.title, "One (edited)")
+
+    def test_new_and_removed_files_are_detected(self):
+        version = self.repo.version
+        self.assertIsNone(self.repo.find("flagship_02.json"))
+        path = self._write("flagship_02.json", {"id": "flagship_2"})
+        self.assertIsNotNone(self.repo.find("flagship_02.json"))
+        self.assertGreater(self.repo.version, version)
+
+        os.remove(path)
+        self.repo.refresh(force=True)
+        self.assertIsNone(self.repo.find("flagship_02.json"))
+
+    def test_broken_files_are_reported(self):
+        with open(os.path.join(self.tempdir, "broken.json"), "w", encoding="utf-8") as fh:
+            fh.write("{not json")
+        self.repo.refresh(force=True)
+        broken = [entry.summary() for entry in self.repo.entries() if entry.error is not None]
+        self.assertEqual(len(broken), 1)
+        self.assertTrue(broken[0]["title"].startswith("[BROKEN]"))
+
+
+if __name__ == "__main__":
+    unittest.main()
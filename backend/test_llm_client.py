@@ -0,0 +1,99 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+from app.core.ai import llm_client
+
+
+def _transport(statuses):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if status != 200:
+            return httpx.Response(status, json={"error": "busy"})
+        content = json.dumps({"intents": [{"type": "SAY_ONLY"}]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    return httpx.MockTransport(handler), calls
+
+
+class LLMClientTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(llm_client, "backoff_delay", return_value=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sync_retries_transient_status(self):
+        transport, calls = _transport([503, 200])
+        client = httpx.Client(base_url="http://llm.test", transport=transport)
+        with mock.patch.object(llm_client, "_get_sync_client", return_value=client):
+            result = llm_client.chat_completion_json({"model": "m"}, max_retries=2)
+        self.assertEqual(result["intents"][0]["type"], "SAY_ONLY")
+        self.assertEqual(len(calls), 2)
+
+    def test_sync_does_not_retry_client_errors(self):
+        transport, calls = _transport([400])
+        client = httpx.Client(base_url="http://llm.test", transport=transport)
+        with mock.patch.object(llm_client, "_get_sync_client", return_value=client):
+            with self.assertRaises(httpx.HTTPStatusError):
+                llm_client.chat_completion_json({"model": "m"}, max_retries=3)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_reuses_loop_client(self):
+        transport, calls = _transport([429, 200])
+
+        async def run():
+            state = llm_client._get_loop_state()
+            await state.client.aclose()
+            state.client = httpx.AsyncClient(base_url="http://llm.test", transport=transport)
+            first = await llm_client.achat_completion_json({"model": "m"}, endpoint="intent")
+            self.assertIs(llm_client._get_loop_state(), state)
+            await llm_client.aclose()
+            return first
+
+        result = asyncio.run(run())
+        self.assertEqual(result["intents"][0]["type"], "SAY_ONLY")
+        self.assertEqual(len(calls), 2)
+
+
+class AppLifecycleTest(unittest.TestCase):
+    def test_apply_runs_sync_work_off_the_event_loop(self):
+        from fastapi.testclient import TestClient
+
+        from app.api import world_api
+        from app.main import app
+
+        seen = []
+        original = world_api._apply_world_step
+
+        def spy(player_id, act):
+            try:
+                asyncio.get_running_loop()
+                seen.append("loop")
+            except RuntimeError:
+                seen.append("worker")
+            return original(player_id, act)
+
+        with mock.patch.object(world_api, "_apply_world_step", spy), TestClient(app) as client:
+            resp = client.post("/world/apply", json={"player_id": "offloop_p", "action": {"move": {"x": 1, "y": 64, "z": 1}}})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(seen, ["worker"])
+
+    def test_lifespan_closes_pooled_clients(self):
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        llm_client._get_sync_client()
+        with TestClient(app):
+            pass
+        self.assertIsNone(llm_client._sync_client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from types import SimpleNamespace
+
+from app.core.story.level_schema import (
+    EmotionalWorldPatchConfig,
+    EmotionalWorldPatchProfile,
+    MemoryCondition,
+)
+from app.core.story.memory_index import MemoryIndex
+from app.core.story.story_engine import story_engine
+
+
+class MemoryIndexTest(unittest.TestCase):
+    def test_masks_agree_with_memory_condition(self):
+        conditions = {
+            "a": MemoryCondition(require_all=["x", "y"]),
+            "b": MemoryCondition(require_any=["y", "z"]),
+            "c": MemoryCondition(require_all=["x"], require_any=["z", "w"]),
+            "d": MemoryCondition(),
+            "e": ["x"],
+            "f": " z ",
+            "g": None,
+        }
+        index = MemoryIndex.for_requirements(conditions.items())
+        for flags in [set(), {"x"}, {"x", "y"}, {"z"}, {"x", "w"}, {"x", "y", "z", "unrelated"}]:
+            mask = index.mask_of(flags)
+            for key, requirement in conditions.items():
+                if isinstance(requirement, MemoryCondition):
+                    expected = requirement.is_satisfied(flags)
+                elif isinstance(requirement, list):
+                    expected = all(flag in flags for flag in requirement)
+                elif requirement:
+                    expected = requirement.strip() in flags
+                else:
+                    expected = True
+                self.assertEqual(index.is_satisfied(key, mask), expected, (key, flags))
+
+    def test_dependents_only_reference_changed_flags(self):
+        index = MemoryIndex.for_requirements(
+            [("a", ["x"]), ("b", MemoryCondition(require_any=["y"])), ("c", ["x", "z"]), ("d", None)]
+        )
+        self.assertEqual(index.dependents(["x"]), {"a", "c"})
+        self.assertEqual(index.dependents(["y", "unknown"]), {"b"})
+        self.assertEqual(index.dependents([]), set())
+
+    def test_select_profile_matches_priority_scan(self):
+        profiles = [
+            EmotionalWorldPatchProfile(profile_id="calm", priority=1, requires_any=["rest"]),
+            EmotionalWorldPatchProfile(profile_id="brave", priority=5, requires_all=["summit", "rope"]),
+            EmotionalWorldPatchProfile(profile_id="lost", priority=5, requires_all=["fog"], requires_any=["night", "rain"]),
+            EmotionalWorldPatchProfile(profile_id="never", priority=9),
+        ]
+        config = EmotionalWorldPatchConfig(profiles=profiles)
+        for flags in [set(), {"rest"}, {"summit"}, {"summit", "rope", "rest"}, {"fog", "rain", "summit", "rope"}, {"fog"}]:
+            ordered = sorted(profiles, key=lambda item: item.priority, reverse=True)
+            expected = next((profile for profile in ordered if profile.matches(flags)), None)
+            self.assertIs(config.select_profile(flags), expected, flags)
+            self.assertIs(config.select_profile(flags), expected, flags)
+
+        config.profiles.append(EmotionalWorldPatchProfile(profile_id="late", priority=99, requires_any=["rest"]))
+        self.assertEqual(config.select_profile({"rest"}).profile_id, "late")
+
+
+class StoryEngineMemoryRetryTest(unittest.TestCase):
+    PLAYER = "memory_index_tester"
+
+    def tearDown(self):
+        story_engine.players.pop(self.PLAYER, None)
+
+    def test_retry_rechecks_only_dependent_locked_beats(self):
+        beats = {
+            "b_gate": SimpleNamespace(id="b_gate", trigger="auto", memory_required=MemoryCondition(require_all=["key"])),
+            "b_other": SimpleNamespace(id="b_other", trigger="auto", memory_required=MemoryCondition(require_all=["lamp"])),
+        }
+        story_engine.players[self.PLAYER] = {
+            "level": SimpleNamespace(level_id="memory_test"),
+            "memory_flags": {"lamp"},
+            "beat_state": {
+                "order": ["b_gate", "b_other"],
+                "by_id": beats,
+                "completed": set(),
+                # b_other 已满足但仍被锁：只要它不依赖变更的 flag 就不该被重新检查
+                "memory_locked": {"b_gate", "b_other"},
+                "memory_locked_sources": {},
+            },
+        }
+        activated = []
+        original = story_engine._activate_beat
+        story_engine._activate_beat = lambda pid, beat_id, level, **kwargs: activated.append(beat_id)
+        try:
+            story_engine._get_memory_set(self.PLAYER).add("key")
+            story_engine._retry_memory_locked_beats(self.PLAYER, ["key"])
+        finally:
+            story_engine._activate_beat = original
+
+        locked = story_engine.players[self.PLAYER]["beat_state"]["memory_locked"]
+        self.assertEqual(activated, ["b_gate"])
+        self.assertEqual(locked, {"b_other"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+from PIL import Image, ImageChops, ImageDraw
+
+from app.api import minimap_api
+from app.core.world.minimap_renderer import MiniMapRenderer
+from app.main import app
+
+
+def _nodes(unlocked=()):
+    return [
+        {"level": f"level_{i:02d}", "pos": {"x": 100.0 + i * 40, "y": 200.0}, "unlocked": f"level_{i:02d}" in unlocked}
+        for i in range(1, 6)
+    ]
+
+
+def _full_render(renderer, nodes, player_pos, current_level):
+    """Whole-canvas drawing in node order, as the renderer did before the static layer."""
+
+    canvas = renderer.background.copy()
+    draw = ImageDraw.Draw(canvas)
+    for node in nodes:
+        renderer._draw_node(draw, node, node.get("unlocked", False), node["level"] == current_level)
+    if player_pos:
+        px, py, _ = player_pos
+        draw.ellipse((px - 6, py - 6, px + 6, py + 6), fill=renderer.color_player, outline=(255, 255, 255, 255), width=2)
+    return canvas
+
+
+class MiniMapRendererTest(unittest.TestCase):
+    def test_layered_render_matches_full_render_pixel_for_pixel(self):
+        renderer = MiniMapRenderer()
+        views = [
+            (set(), None, None),
+            ({"level_01"}, (10.0, 20.0, 0.0), "level_01"),
+            ({"level_02", "level_04"}, (180.5, 201.2, 0.0), "level_03"),
+            ({f"level_{i:02d}" for i in range(1, 6)}, None, "level_05"),
+        ]
+        for unlocked, player_pos, current in views:
+            nodes = _nodes(unlocked)
+            png, _ = renderer.render_bytes(nodes, player_pos, current)
+            layered = Image.open(io.BytesIO(png)).convert("RGBA")
+            expected = _full_render(renderer, nodes, player_pos, current)
+            self.assertIsNone(ImageChops.difference(layered, expected).getbbox(), (unlocked, current))
+
+
+    def test_repeat_view_is_served_from_cache(self):
+        renderer = MiniMapRenderer()
+        png, etag = renderer.render_bytes(_nodes({"level_01"}), (10.0, 20.0, 0.0), "level_01")
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        again, etag2 = renderer.render_bytes(_nodes({"level_01"}), (10.2, 19.9, 0.0), "level_01")
+        self.assertEqual((again, etag2), (png, etag))
+        self.assertEqual((renderer.renders, renderer.cache_hits), (1, 1))
+
+    def test_unlock_changes_etag_but_reuses_static_layer(self):
+        renderer = MiniMapRenderer()
+        _, first = renderer.render_bytes(_nodes({"level_01"}), None, "level_01")
+        static = renderer._static_layer
+        _, second = renderer.render_bytes(_nodes({"level_01", "level_02"}), None, "level_02")
+        self.assertNotEqual(first, second)
+        self.assertIs(renderer._static_layer, static)
+
+    def test_png_endpoint_honours_if_none_match(self):
+        client = TestClient(app)
+        first = client.get("/minimap/png/minimap_etag_tester")
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["etag"]
+        second = client.get("/minimap/png/minimap_etag_tester", headers={"If-None-Match": etag})
+        self.assertEqual(second.status_code, 304)
+
+    def test_not_modified_skips_renderer(self):
+        client = TestClient(app)
+        etag = client.get("/minimap/png/minimap_etag_tester").headers["etag"]
+        with mock.patch.object(minimap_api, "renderer") as renderer:
+            response = client.get("/minimap/png/minimap_etag_tester", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], etag)
+        self.assertEqual(renderer.mock_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.api import world_api
+from app.core.world.move_coalescer import MoveCoalescer, move_coalescer
+from app.core.world.trigger import TriggerPoint, trigger_engine
+from app.main import app
+
+
+class MoveCoalescerTest(unittest.TestCase):
+    def test_keeps_latest_sample_within_window(self):
+        coalescer = MoveCoalescer(window=1.0)
+        self.assertIsNotNone(coalescer.offer("p", {"x": 0}, now=10.0))
+        self.assertIsNone(coalescer.offer("p", {"x": 1}, now=10.2))
+        self.assertIsNone(coalescer.offer("p", {"x": 2}, now=10.5))
+        self.assertEqual(coalescer.drain_due(now=10.6), [])
+        self.assertEqual(coalescer.drain_due(now=11.1), [("p", {"x": 2})])
+        self.assertEqual(coalescer.stats()["coalesced"], 1)
+
+    def test_stop_sample_is_evaluated_immediately(self):
+        coalescer = MoveCoalescer(window=1.0)
+        coalescer.offer("p", {"x": 0}, now=10.0)
+        self.assertEqual(coalescer.offer("p", {"x": 3, "moving": False}, now=10.1), {"x": 3, "moving": False})
+        self.assertIsNone(coalescer.offer("p", {"x": 4, "moving": True}, now=10.2))
+        self.assertIsNone(coalescer.offer("p", {"x": 5}, now=10.3))
+
+    def test_idle_flush_delivers_held_sample(self):
+        coalescer = MoveCoalescer(window=0.05)
+        flushed = []
+        done = threading.Event()
+        coalescer.set_flush_handler(lambda player_id, move: (flushed.append((player_id, move)), done.set()))
+        coalescer.offer("p", {"x": 0})
+        coalescer.offer("p", {"x": 1})
+        coalescer.offer("p", {"x": 2})
+        self.assertTrue(done.wait(2.0))
+        self.assertEqual(flushed, [("p", {"x": 2})])
+        self.assertEqual(coalescer.stats()["pending"], 0)
+
+
+class ApplyMoveCoalescingTest(unittest.TestCase):
+    def test_moves_without_flag_are_coalesced(self):
+        client = TestClient(app)
+        start = move_coalescer.stats()
+        for step in range(5):
+            resp = client.post("/world/apply", json={"player_id": "coalesce_p", "action": {"move": {"x": step, "y": 64, "z": 0}}})
+            self.assertEqual(resp.status_code, 200)
+        end = move_coalescer.stats()
+        self.assertEqual(end["received"] - start["received"], 5)
+        self.assertGreater(end["coalesced"] - start["coalesced"], 0)
+
+
+class BatchMoveEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        trigger_engine.add_trigger(TriggerPoint("batch_gate", (4000.0, 0.0, 4000.0), 3.0, "load_level", "flagship_03"))
+
+    def tearDown(self):
+        trigger_engine.remove_trigger("batch_gate")
+        trigger_engine.reset_player("batch_p1")
+
+    def test_batch_folds_samples_and_reports_triggers(self):
+        resp = self.client.post(
+            "/world/apply/moves",
+            json={
+                "samples": [
+                    {"player_id": "batch_p1", "x": 0, "y": 64, "z": 0},
+                    {"player_id": "batch_p1", "x": 4000, "y": 64, "z": 4001},
+                    {"player_id": "batch_p2", "x": 10, "y": 64, "z": 10},
+                ]
+            },
+        )
+        body = resp.json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(body["accepted"], 3)
+        self.assertEqual(body["players"], 2)
+        self.assertEqual([r["player_id"] for r in body["results"]], ["batch_p1"])
+        self.assertEqual(body["results"][0]["trigger"]["level_id"], "flagship_03")
+
+
+    def test_batch_leaves_other_players_samples_alone(self):
+        coalescer = MoveCoalescer(window=0.1)
+        started = time.monotonic() - 10.0
+        coalescer.offer("batch_other", {"x": 0, "y": 64, "z": 0}, now=started)
+        coalescer.offer("batch_other", {"x": 1, "y": 64, "z": 0}, now=started + 0.05)
+        with mock.patch.object(world_api, "move_coalescer", coalescer):
+            resp = self.client.post("/world/apply/moves", json={"samples": [{"player_id": "batch_p1", "x": 0, "y": 64, "z": 0}]})
+        self.assertEqual(resp.json()["evaluated"], 1)
+        self.assertEqual(coalescer.stats()["pending"], 1)
+        self.assertEqual(coalescer.drain_due(), [("batch_other", {"x": 1, "y": 64, "z": 0})])
+
+
+class EvictionCleanupTest(unittest.TestCase):
+    def test_evicted_world_forgets_move_state(self):
+        move_coalescer.offer("evicted_p", {"x": 0, "y": 64, "z": 0})
+        world_api._idle_hits["evicted_p"] = {"trigger": {}}
+        self.assertIs(world_api.world_engines.on_evict, world_api._forget_player)
+        world_api._forget_player("evicted_p")
+        self.assertNotIn("evicted_p", move_coalescer._last_eval)
+        self.assertNotIn("evicted_p", world_api._idle_hits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import random
+import unittest
+
+from app.core.executor.canonical_v2 import canonicalize_final_commands
+from app.core.executor.fill_regions_v1 import fill_volume, iter_fill_cells, merge_fill_regions
+from app.core.executor.plugin_payload_v1 import build_plugin_payload_v1
+from app.core.executor.plugin_payload_v2 import build_plugin_payload_v2
+from app.core.executor.replay_v2 import replay_payload_v2
+
+
+def _house(width=7, depth=5, height=4):
+    blocks = []
+    for x in range(width):
+        for z in range(depth):
+            blocks.append({"x": x, "y": 0, "z": z, "block": "oak_planks"})
+            for y in range(1, height + 1):
+                if x in (0, width - 1) or z in (0, depth - 1):
+                    blocks.append({"x": x, "y": y, "z": z, "block": "stone"})
+            blocks.append({"x": x, "y": height + 1, "z": z, "block": "oak_planks"})
+    for x in range(-10, 20):
+        for z in range(-10, 20):
+            if not (0 <= x < width and 0 <= z < depth):
+                blocks.append({"x": x, "y": 0, "z": z, "block": "water"})
+    return blocks
+
+
+def _compose_result(blocks):
+    return {"status": "SUCCESS", "merged": {"blocks": blocks, "conflicts_total": 0, "spec_dropped_total": 0}}
+
+
+def _expand(setblocks, fills):
+    world = {(op["x"], op["y"], op["z"]): op["block"] for op in setblocks}
+    for region in fills:
+        for cell in iter_fill_cells(region):
+            assert cell not in world, "regions overlap"
+            world[cell] = region["block"]
+    return world
+
+
+class FillRegionTest(unittest.TestCase):
+    def test_regions_cover_input_exactly(self):
+        rng = random.Random(3)
+        blocks = [
+            {"x": rng.randint(0, 6), "y": rng.randint(0, 4), "z": rng.randint(0, 6), "block": rng.choice(["stone", "glass"])}
+            for _ in range(300)
+        ]
+        expected = {}
+        for block in sorted(blocks, key=lambda b: (b["x"], b["y"], b["z"], b["block"])):
+            expected[(block["x"], block["y"], block["z"])] = block["block"]
+        setblocks, fills = merge_fill_regions(blocks)
+        self.assertEqual(_expand(setblocks, fills), expected)
+        self.assertEqual(merge_fill_regions(list(reversed(blocks))), (setblocks, fills))
+
+    def test_volume_cap(self):
+        floor = [{"x": x, "y": 0, "z": z, "block": "stone"} for x in range(10) for z in range(10)]
+        _, fills = merge_fill_regions(floor, max_volume=16)
+        self.assertTrue(all(fill_volume(region) <= 16 for region in fills))
+        self.assertEqual(sum(fill_volume(region) for region in fills), 100)
+
+    def test_house_payload_shrinks_and_replays_identically(self):
+        blocks = _house()
+        plain = build_plugin_payload_v2(_compose_result(blocks), player_id="builder")
+        filled = build_plugin_payload_v2(_compose_result(blocks), player_id="builder", fill_regions=True)
+        self.assertLessEqual(len(filled["commands"]) * 10, len(plain["commands"]))
+        self.assertEqual(filled["stats"]["merged_block_count"], plain["stats"]["merged_block_count"])
+        self.assertGreater(filled["stats"]["fill_command_count"], 0)
+
+        plain_replay = replay_payload_v2(plain)
+        filled_replay = replay_payload_v2(filled)
+        self.assertEqual(filled_replay["status"], "SUCCESS")
+        self.assertEqual(filled_replay["world_state_hash"], plain_replay["world_state_hash"])
+        self.assertEqual(filled_replay["final_commands_hash_v2"], filled["hash"]["final_commands"])
+
+        tampered = dict(filled, commands=[dict(cmd) for cmd in filled["commands"]])
+        fill_cmd = next(cmd for cmd in tampered["commands"] if cmd["type"] == "fill")
+        fill_cmd["x2"] += 1
+        self.assertEqual(replay_payload_v2(tampered)["failure_code"], "FINAL_COMMANDS_HASH_MISMATCH")
+
+    def test_fill_corners_are_canonical(self):
+        region = {"type": "fill", "x": 3, "y": 1, "z": 5, "x2": 0, "y2": 0, "z2": 2, "block": "stone"}
+        canonical = canonicalize_final_commands([], [], [region])
+        self.assertEqual(canonical[0]["x"], 0)
+        self.assertEqual(canonical[0]["x2"], 3)
+
+    def test_v1_payload_offsets_fill_corners(self):
+        payload = build_plugin_payload_v1(
+            _compose_result([{"x": x, "y": 0, "z": 0, "block": "stone"} for x in range(5)]),
+            player_id="builder",
+            fill_regions=True,
+        )
+        self.assertEqual(
+            payload["commands"],
+            [{"op": "fill", "x": 0, "y": 64, "z": 0, "x2": 4, "y2": 64, "z2": 0, "block": "stone"}],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import random
+import unittest
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.core.executor.payload_stream_v2 import (
+    NDJSON_MEDIA_TYPE,
+    iter_payload_ndjson,
+    iter_payload_stream,
+    verify_payload_stream,
+)
+from app.core.executor.plugin_payload_v2 import build_plugin_payload_v2
+from app.core.story.story_loader import DATA_DIR
+from app.main import app
+
+
+def _payload(seed=1, fill_regions=False):
+    rng = random.Random(seed)
+    cells = {}
+    for _ in range(600):
+        cells[(rng.randint(-40, 40), rng.randint(0, 4), rng.randint(-40, 40))] = rng.choice(["stone", "oak_planks", "water"])
+    cells[(2, 1, 2)] = "npc_placeholder"
+    blocks = [{"x": x, "y": y, "z": z, "block": block} for (x, y, z), block in cells.items()]
+    result = {"status": "SUCCESS", "merged": {"blocks": blocks, "conflicts_total": 0, "spec_dropped_total": 0}}
+    return build_plugin_payload_v2(
+        result, player_id="streamer", origin={"base_x": 100, "base_y": 64, "base_z": -20}, strict_mode=False, fill_regions=fill_regions
+    )
+
+
+class PayloadStreamTest(unittest.TestCase):
+    def test_chunks_cover_payload_in_ring_order(self):
+        for fill_regions in (False, True):
+            payload = _payload(fill_regions=fill_regions)
+            items = list(iter_payload_stream(payload))
+            header, chunks, trailer = items[0], items[1:-1], items[-1]
+            self.assertEqual(header["kind"], "header")
+            self.assertNotIn("commands", header)
+            self.assertEqual(trailer["final_commands_hash_v2"], payload["hash"]["final_commands"])
+            self.assertEqual(sum(len(chunk["commands"]) for chunk in chunks), len(payload["commands"]))
+
+            home = (100 >> 4, -20 >> 4)
+            rings = [max(abs(chunk["cx"] - home[0]), abs(chunk["cz"] - home[1])) for chunk in chunks]
+            self.assertEqual(rings, sorted(rings))
+            for chunk in chunks:
+                self.assertTrue(all((cmd["x"] >> 4, cmd["z"] >> 4) == (chunk["cx"], chunk["cz"]) for cmd in chunk["commands"]))
+
+            self.assertEqual(verify_payload_stream(iter_payload_ndjson(payload))["status"], "SUCCESS")
+            self.assertEqual(list(iter_payload_stream(payload)), items)
+
+    def test_tampered_chunk_is_detected(self):
+        items = list(iter_payload_stream(_payload(2)))
+        items[2] = dict(items[2], commands=[dict(items[2]["commands"][0], block="air")] + items[2]["commands"][1:])
+        self.assertEqual(verify_payload_stream(items)["failure_code"], "CHUNK_HASH_MISMATCH")
+        self.assertEqual(verify_payload_stream(items[:1])["failure_code"], "MISSING_TRAILER")
+        dropped = items[:2] + items[3:]
+        self.assertEqual(verify_payload_stream(dropped)["failure_code"], "CHUNK_HASH_MISMATCH")
+
+
+def test_story_inject_stream_endpoint():
+    keys = ("DRIFT_FIXED_ANCHOR_X", "DRIFT_FIXED_ANCHOR_Y", "DRIFT_FIXED_ANCHOR_Z")
+    previous = {key: os.environ.get(key) for key in keys}
+    os.environ.update({"DRIFT_FIXED_ANCHOR_X": "0", "DRIFT_FIXED_ANCHOR_Y": "64", "DRIFT_FIXED_ANCHOR_Z": "0"})
+    level_id = f"flagship_payload_stream_test_{uuid.uuid4().hex[:8]}"
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                "/story/inject/stream",
+                json={
+                    "level_id": level_id,
+                    "title": "payload stream",
+                    "text": "平静夜晚的湖边，有一座木屋，门朝南",
+                    "player_id": "payload_stream_tester",
+                },
+            )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        assert lines[0]["kind"] == "header" and lines[0]["status"] == "ok"
+        assert lines[0]["version"] == "plugin_payload_v2"
+        assert verify_payload_stream(lines)["status"] == "SUCCESS"
+    finally:
+        # 注入会把关卡写进真实关卡目录，测试结束后删掉
+        level_path = os.path.join(DATA_DIR, f"{level_id}.json")
+        if os.path.exists(level_path):
+            os.remove(level_path)
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import gc
+import threading
+import unittest
+from unittest import mock
+
+from app.core.player_locks import PlayerLockRegistry, player_locked, player_locks
+
+
+class _Counter:
+    def __init__(self):
+        self.values = {}
+
+    @player_locked
+    def bump(self, player_id):
+        current = self.values.get(player_id, 0)
+        # 放大竞争窗口
+        for _ in range(200):
+            pass
+        self.values[player_id] = current + 1
+
+    @player_locked
+    def nested(self, player_id):
+        self.bump(player_id)
+
+
+class PlayerLocksTest(unittest.TestCase):
+    def test_same_player_updates_are_serialised(self):
+        counter = _Counter()
+
+        def worker():
+            for _ in range(500):
+                counter.bump("p1")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(counter.values["p1"], 4000)
+
+    def test_lock_is_reentrant_and_per_player(self):
+        counter = _Counter()
+        counter.nested("p1")
+        counter.nested(player_id="p2")
+        self.assertEqual(counter.values, {"p1": 1, "p2": 1})
+        self.assertIs(player_locks.lock("p1"), player_locks.lock("p1"))
+        self.assertIsNot(player_locks.lock("p1"), player_locks.lock("p2"))
+
+    def test_async_lock_per_loop(self):
+        registry = PlayerLockRegistry()
+
+        async def grab():
+            lock = registry.alock("p1")
+            async with lock:
+                return lock
+
+        first = asyncio.run(grab())
+        second = asyncio.run(grab())
+        self.assertIsNot(first, second)
+
+    def test_idle_locks_are_evicted(self):
+        registry = PlayerLockRegistry()
+        held = registry.lock("kept")
+        with registry.lock("idle"):
+            self.assertIn("idle", registry._locks)
+        gc.collect()
+        self.assertNotIn("idle", registry._locks)
+        self.assertIs(registry.lock("kept"), held)
+
+        async def grab():
+            async with registry.alock("idle"):
+                pass
+            gc.collect()
+            return len(registry._async_locks[asyncio.get_running_loop()])
+
+        self.assertEqual(asyncio.run(grab()), 0)
+
+
+class AdvanceRaceTest(unittest.TestCase):
+    def test_level_change_during_llm_await_is_not_overwritten(self):
+        from app.core.story import story_engine as engine_module
+        from app.core.story.story_engine import story_engine
+
+        player_id = "advance_race_p"
+        story_engine.load_level_for_player(player_id, "flagship_03")
+
+        async def decide_while_player_enters_other_level(ai_input, messages):
+            await asyncio.to_thread(story_engine.load_level_for_player, player_id, "flagship_tutorial")
+            return {"option": "stale", "node": {"title": "stale", "text": "stale"}, "world_patch": {"mc": {"tell": "stale"}}}
+
+        with mock.patch.object(engine_module, "deepseek_decide_async", decide_while_player_enters_other_level):
+            option, node, patch = asyncio.run(
+                story_engine.advance_async(player_id, {"variables": {}}, {"say": "你好"})
+            )
+
+        self.assertEqual((option, node, patch), (None, None, {}))
+        state = story_engine.players[player_id]
+        self.assertEqual(state["level"].level_id, "flagship_tutorial")
+        self.assertNotIn({"title": "stale", "text": "stale"}, list(state["nodes"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import random
+import unittest
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.api.story_api import InjectPayload, inject_story_level
+from app.core.executor.plugin_payload_v2 import build_plugin_payload_v2
+from app.core.executor.plugin_payload_v3 import (
+    PAYLOAD_V3_MEDIA_TYPE,
+    accepts_payload_v3,
+    decode_plugin_payload_v3,
+    encode_plugin_payload_v3,
+)
+from app.core.executor.replay_v2 import replay_payload_v2
+from app.core.executor.replay_v3 import replay_payload_v3
+from app.core.story.story_loader import DATA_DIR
+from app.main import app
+
+
+def _compose_result(seed, count=400):
+    rng = random.Random(seed)
+    cells = {}
+    for _ in range(count):
+        cells[(rng.randint(-30, 30), rng.randint(0, 5), rng.randint(-30, 30))] = rng.choice(
+            ["stone", "oak_planks", "glass_pane", "water", "air"]
+        )
+    cells[(1, 1, 1)] = "npc_placeholder"
+    blocks = [{"x": x, "y": y, "z": z, "block": block} for (x, y, z), block in cells.items()]
+    return {"status": "SUCCESS", "merged": {"blocks": blocks, "conflicts_total": 0, "spec_dropped_total": 0}}
+
+
+class PluginPayloadV3Test(unittest.TestCase):
+    def test_round_trip_and_replay_parity(self):
+        for seed, fill_regions in ((1, False), (2, True)):
+            payload = build_plugin_payload_v2(
+                _compose_result(seed),
+                player_id="builder",
+                origin={"base_x": -37, "base_y": 64, "base_z": 1000},
+                strict_mode=False,
+                fill_regions=fill_regions,
+            )
+            data = encode_plugin_payload_v3(payload)
+            decoded = decode_plugin_payload_v3(data)
+            self.assertEqual(decoded.header["hash"], payload["hash"])
+            self.assertEqual(decoded.header["stats"], payload["stats"])
+
+            self.assertEqual(decoded.to_payload_v2(), payload)
+            self.assertEqual(replay_payload_v3(data), replay_payload_v2(payload))
+            self.assertLess(len(data) * 5, len(json.dumps(payload).encode("utf-8")))
+
+    def test_tampering_and_garbage_are_rejected(self):
+        payload = build_plugin_payload_v2(_compose_result(3), player_id="builder", strict_mode=False)
+        data = bytearray(encode_plugin_payload_v3(payload))
+        data[-20] ^= 0x01
+        self.assertIn(replay_payload_v3(bytes(data))["failure_code"], {"FINAL_COMMANDS_HASH_MISMATCH", "INVALID_PAYLOAD"})
+        self.assertEqual(replay_payload_v3(b"DPV3\x05{}")["failure_code"], "INVALID_PAYLOAD")
+        self.assertEqual(replay_payload_v3(b"not a payload")["failure_code"], "INVALID_PAYLOAD")
+
+    def test_accept_header(self):
+        self.assertTrue(accepts_payload_v3(PAYLOAD_V3_MEDIA_TYPE))
+        self.assertTrue(accepts_payload_v3(f"application/json, {PAYLOAD_V3_MEDIA_TYPE};q=0.5"))
+        self.assertFalse(accepts_payload_v3(f"{PAYLOAD_V3_MEDIA_TYPE};q=0"))
+        self.assertFalse(accepts_payload_v3("*/*"))
+        self.assertFalse(accepts_payload_v3(None))
+
+
+def test_story_inject_negotiates_payload_v3():
+    keys = ("DRIFT_USE_PAYLOAD_V2", "DRIFT_FIXED_ANCHOR_X", "DRIFT_FIXED_ANCHOR_Y", "DRIFT_FIXED_ANCHOR_Z")
+    previous = {key: os.environ.get(key) for key in keys}
+    os.environ.update({"DRIFT_USE_PAYLOAD_V2": "true", "DRIFT_FIXED_ANCHOR_X": "0", "DRIFT_FIXED_ANCHOR_Y": "64", "DRIFT_FIXED_ANCHOR_Z": "0"})
+    level_ids = [f"flagship_payload_v3_test_{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    try:
+        with TestClient(app) as client:
+            body = {"title": "payload_v3", "text": "平静夜晚的湖边，有一座木屋，门朝南", "player_id": "payload_v3_tester"}
+            binary = client.post(
+                "/story/inject",
+                json={**body, "level_id": level_ids[0]},
+                headers={"Accept": PAYLOAD_V3_MEDIA_TYPE},
+            )
+            plain = client.post("/story/inject", json={**body, "level_id": level_ids[1]})
+        # 进程内调用（world CREATE_STORY）没有 Accept 头，始终得到 JSON payload_v2
+        in_process = asyncio.run(
+            inject_story_level(InjectPayload(**body, level_id=level_ids[2]))
+        )
+
+        assert binary.status_code == 200
+        assert binary.headers["content-type"] == PAYLOAD_V3_MEDIA_TYPE
+        decoded = decode_plugin_payload_v3(binary.content)
+        assert decoded.header["status"] == "ok"
+        assert replay_payload_v3(binary.content)["status"] == "SUCCESS"
+
+        assert plain.status_code == 200
+        assert plain.json()["version"] == "plugin_payload_v2"
+        assert decoded.header["hash"]["final_commands"] == plain.json()["hash"]["final_commands"]
+        assert in_process["version"] == "plugin_payload_v2"
+        assert in_process["hash"]["final_commands"] == plain.json()["hash"]["final_commands"]
+    finally:
+        # 注入会把关卡写进真实关卡目录，测试结束后删掉
+        for level_id in level_ids:
+            level_path = os.path.join(DATA_DIR, f"{level_id}.json")
+            if os.path.exists(level_path):
+                os.remove(level_path)
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core.ai import deepseek_agent
+from app.core.cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = ResponseCache(max_size=2, ttl=60)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        self.assertEqual(cache.get("a"), {"v": 1})
+        cache.put("c", {"v": 3})
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(max_size=4, ttl=10)
+        with mock.patch("app.core.cache.time.time", return_value=100.0):
+            cache.put("a", {"v": 1})
+        with mock.patch("app.core.cache.time.time", return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cold = ResponseCache(max_size=4, ttl=60, disk_path=path)
+            cold.put("a", {"node": {"text": "湖"}})
+            cold.close()
+            warm = ResponseCache(max_size=4, ttl=60, disk_path=path)
+            self.assertEqual(warm.get("a"), {"node": {"text": "湖"}})
+            self.assertEqual(warm.stats()["disk_hits"], 1)
+            warm.close()
+
+    def test_disk_writes_are_batched_and_readable_before_flush(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(max_size=1, ttl=0, disk_path=os.path.join(tmp, "c.sqlite"), flush_interval=60)
+            cache.put("a", {"v": 1})
+            cache.put("b", {"v": 2})
+            self.assertEqual(cache.stats()["disk_pending"], 2)
+            # "a" 已被挤出内存层，仍可从待写队列读到
+            self.assertEqual(cache.get("a"), {"v": 1})
+            cache.flush()
+            self.assertEqual(cache.stats()["disk_pending"], 0)
+            cache.close()
+
+    def test_failed_flush_keeps_rows_queued(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(max_size=1, ttl=0, disk_path=os.path.join(tmp, "c.sqlite"), flush_interval=60)
+            cache.put("a", {"v": 1})
+            real_db = cache._db
+            cache._db = mock.MagicMock(wraps=real_db)
+            cache._db.executemany.side_effect = sqlite3.OperationalError("disk I/O error")
+            with self.assertRaises(sqlite3.Error):
+                cache.flush()
+            cache._db = real_db
+            self.assertEqual(cache.stats()["disk_pending"], 1)
+            cache.put("b", {"v": 2})
+            self.assertEqual(cache.get("a"), {"v": 1})
+            cache.flush()
+            count = real_db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            self.assertEqual(count, 2)
+            cache.close()
+
+    def test_disk_row_cap_prunes_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "c.sqlite")
+            cache = ResponseCache(max_size=1, ttl=0, disk_path=path, disk_max_rows=2, flush_interval=60)
+            with mock.patch("app.core.cache.time.time", return_value=100.0):
+                cache.put("a", {"v": 1})
+            with mock.patch("app.core.cache.time.time", return_value=101.0):
+                cache.put("b", {"v": 2})
+            cache.flush()
+            with mock.patch("app.core.cache.time.time", return_value=102.0):
+                self.assertEqual(cache.get("a"), {"v": 1})  # 磁盘命中，刷新 "a" 的访问时间
+            with mock.patch("app.core.cache.time.time", return_value=103.0):
+                cache.put("c", {"v": 3})
+            cache.flush()
+            cache.close()
+
+            warm = ResponseCache(max_size=4, ttl=0, disk_path=path, disk_max_rows=2)
+            self.assertIsNone(warm.get("b"))
+            self.assertEqual(warm.get("a"), {"v": 1})
+            self.assertEqual(warm.get("c"), {"v": 3})
+            self.assertEqual(cache.stats()["disk_evictions"], 1)
+            warm.close()
+
+    def test_semantic_key_ignores_noise(self):
+        history = [{"role": "user", "content": "你好"}]
+        base = {
+            "player_id": "p1",
+            "level_id": "level_01",
+            "beat_id": "beat_0",
+            "player_action": {"say": "你好"},
+            "world_state": {"variables": {"x": 1.2, "y": 64.0, "z": 3.9}},
+            "tree_state": {"last_option": None, "ts": 1.0},
+        }
+        other = dict(base)
+        other.update(
+            player_id="p2",
+            world_state={"variables": {"x": 1.7, "y": 64.4, "z": 3.1}},
+            tree_state={"last_option": None, "ts": 99.0},
+        )
+        key = deepseek_agent._make_cache_key(base, history)
+        self.assertEqual(key, deepseek_agent._make_cache_key(other, list(history)))
+        moved = dict(base, level_id="level_02")
+        self.assertNotEqual(key, deepseek_agent._make_cache_key(moved, history))
+        self.assertNotEqual(key, deepseek_agent._make_cache_key(base, history, "combined"))
+
+
+if __name__ == "__main__":
+    unittest.main()
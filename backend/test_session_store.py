@@ -0,0 +1,151 @@
+"""Session store round-trips: SQLite write-behind and StoryEngine restore."""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+from app.core.quest.runtime import quest_runtime
+from app.core.session import InMemorySessionStore, SessionStore, SQLiteSessionStore
+from app.main import story_engine
+
+
+def test_sqlite_store_write_behind_and_reopen():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        store = SQLiteSessionStore(path, flush_interval=60, batch_size=1000)
+        store.put("p1", "story", {"level_id": "flagship_03", "memory_flags": ["a"]})
+        # 未刷盘前也能读到（dirty map）
+        assert store.get("p1", "story")["level_id"] == "flagship_03"
+        store.close()
+
+        reopened = SQLiteSessionStore(path)
+        assert reopened.get("p1", "story") == {"level_id": "flagship_03", "memory_flags": ["a"]}
+        reopened.delete("p1")
+        assert reopened.get("p1", "story") is None
+        reopened.close()
+
+
+class _GatedDB:
+    """Wraps a connection so ``executemany`` can fail or block mid-flush."""
+
+    def __init__(self, db, error=None):
+        self._db = db
+        self.error = error
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def executemany(self, *args):
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self._db.executemany(*args)
+
+    def __enter__(self):
+        return self._db.__enter__()
+
+    def __exit__(self, *exc):
+        return self._db.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def test_session_store_is_abstract():
+    try:
+        SessionStore()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("SessionStore should not be instantiable")
+
+
+def test_sqlite_failed_flush_keeps_batch_queued():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "s.sqlite3"), flush_interval=60, batch_size=1000)
+        real_db = store._db
+        store._db = gated = _GatedDB(real_db, error=sqlite3.OperationalError("disk I/O error"))
+        store.put("p1", "story", {"v": 1})
+        store.put("p2", "story", {"v": 1})
+        gated.release.clear()
+        worker = threading.Thread(target=lambda: _swallow(store.flush))
+        worker.start()
+        assert gated.entered.wait(5)
+        # 刷盘进行中仍读到待写值，期间写入的新值不会被失败的批次覆盖
+        assert store.get("p1", "story") == {"v": 1}
+        store.put("p2", "story", {"v": 2})
+        gated.release.set()
+        worker.join(5)
+
+        store._db = real_db
+        assert store.get("p1", "story") == {"v": 1}
+        store.flush()
+        assert store._dirty == {}
+        assert store.get("p2", "story") == {"v": 2}
+        rows = real_db.execute("SELECT player_id, data FROM sessions ORDER BY player_id").fetchall()
+        assert rows == [("p1", '{"v": 1}'), ("p2", '{"v": 2}')]
+        store.close()
+
+
+def test_sqlite_player_delete_waits_for_inflight_flush():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "s.sqlite3"), flush_interval=60, batch_size=1000)
+        real_db = store._db
+        store._db = gated = _GatedDB(real_db)
+        store.put("p1", "story", {"v": 1})
+        gated.release.clear()
+        flusher = threading.Thread(target=store.flush)
+        flusher.start()
+        assert gated.entered.wait(5)
+        deleter = threading.Thread(target=store.delete, args=("p1",))
+        deleter.start()
+        deleter.join(0.1)
+        assert deleter.is_alive()
+        gated.release.set()
+        flusher.join(5)
+        deleter.join(5)
+
+        store._db = real_db
+        assert store.get("p1", "story") is None
+        assert real_db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+        store.close()
+
+
+def _swallow(fn):
+    try:
+        fn()
+    except sqlite3.Error:
+        pass
+
+
+def test_story_engine_restores_player_from_store():
+    player_id = "session_restore_tester"
+    level_id = "flagship_03"
+    previous = story_engine.session_store
+    story_engine.session_store = InMemorySessionStore()
+    try:
+        story_engine.load_level_for_player(player_id, level_id)
+        story_engine.players[player_id]["memory_flags"].add("saw_lake")
+        story_engine.players[player_id]["messages"].append({"role": "user", "content": "你好"})
+        quest_state = quest_runtime._players[player_id]
+        quest_state["tasks"][0].progress = 1
+        story_engine.save_session(player_id)
+
+        # 模拟进程重启：内存态全部丢失
+        quest_runtime.exit_level(player_id)
+        story_engine.players.pop(player_id, None)
+        story_engine._ensure_player(player_id)
+
+        restored = story_engine.players[player_id]
+        assert restored["level"].level_id == level_id
+        assert "saw_lake" in restored["memory_flags"]
+        assert restored["messages"][-1]["content"] == "你好"
+        assert quest_runtime._players[player_id]["tasks"][0].progress == 1
+    finally:
+        story_engine.session_store = previous
+        quest_runtime.exit_level(player_id)
+        story_engine.players.pop(player_id, None)
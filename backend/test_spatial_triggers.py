@@ -0,0 +1,56 @@
+import unittest
+
+from app.core.events.event_manager import EventManager
+from app.core.world.spatial_index import UniformGrid
+from app.core.world.trigger import TriggerEngine, TriggerPoint
+
+
+def _engine(**kwargs):
+    engine = TriggerEngine(**kwargs)
+    engine.clear()
+    return engine
+
+
+class SpatialTriggerTest(unittest.TestCase):
+    def test_grid_radius_query(self):
+        grid = UniformGrid(cell_size=8)
+        grid.insert("a", 0, 0, 3)
+        grid.insert("b", 100, 100, 3)
+        grid.insert("c", 20, 0, 12)
+        self.assertEqual(sorted(grid.query_radius(5, 0, 4)), ["a", "c"])
+        self.assertEqual(grid.query_point(1, 1), ["a"])
+        grid.remove("a")
+        self.assertEqual(grid.query_point(1, 1), [])
+
+    def test_check_uses_index_and_fires_once(self):
+        engine = _engine()
+        for i in range(2000):
+            engine.add_trigger(TriggerPoint(f"t{i}", (i * 50.0, 0.0, 0.0), 5.0, "load_level", f"l{i}"))
+        hit = engine.check("p", 1001.0, 64.0, 2.0)
+        self.assertEqual(hit.id, "t20")
+        self.assertIsNone(engine.check("p", 1001.0, 64.0, 2.0))
+        self.assertEqual([t.id for t in engine.query_radius(1000.0, 0.0, 60.0)], ["t19", "t20", "t21"])
+
+    def test_rearm_requires_leaving_hysteresis_band(self):
+        engine = _engine(hysteresis=2.0)
+        engine.add_trigger(TriggerPoint("gate", (0.0, 0.0, 0.0), 5.0, "load_level", "l", rearm=True))
+        self.assertIsNotNone(engine.check("p", 4.0, 0.0, 0.0))
+        # 在缓冲带内来回抖动不会重新触发
+        self.assertIsNone(engine.check("p", 6.0, 0.0, 0.0))
+        self.assertIsNone(engine.check("p", 4.0, 0.0, 0.0))
+        self.assertIsNone(engine.check("p", 8.0, 0.0, 0.0))
+        self.assertIsNotNone(engine.check("p", 4.0, 0.0, 0.0))
+
+    def test_event_manager_near_index(self):
+        manager = EventManager()
+        manager.register("p", "far", {"type": "near", "x": 500, "y": 0, "z": 500, "radius": 3})
+        manager.register("p", "close", {"type": "near", "x": 1, "y": 0, "z": 1, "radius": 3})
+        manager.register("p", "kw", {"type": "keyword", "words": ["湖"]})
+        world = {"variables": {"x": 0.0, "y": 0.0, "z": 0.0}}
+        self.assertEqual(manager.evaluate("p", {"say": "湖边"}, world), ["close", "kw"])
+        manager.unregister("p", "close")
+        self.assertEqual(manager.evaluate("p", {}, world), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
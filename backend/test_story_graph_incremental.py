@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.core.story.story_graph import StoryGraph
+from app.core.world.minimap import MiniMap
+
+
+class IncrementalStoryGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="story-graph-inc-")
+        self._write("flagship_01.json", {"id": "flagship_1", "title": "L1", "meta": {"chapter": 1}})
+        self._write("flagship_03.json", {"id": "flagship_3", "title": "L3", "meta": {"chapter": 3}})
+        self._write("flagship_05.json", {
+            "id": "flagship_5",
+            "title": "L5",
+            "meta": {"chapter": 5},
+            "continuity": {"next": "custom_story"},
+        })
+        os.makedirs(os.path.join(self.tempdir, "generated"))
+        self.graph = StoryGraph(self.tempdir)
+        self.minimap = MiniMap(self.graph)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, relpath, payload):
+        path = os.path.join(self.tempdir, relpath)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh)
+        return path
+
+    def assertMatchesFullReload(self):
+        fresh = StoryGraph(self.tempdir)
+        self.assertEqual(self.graph.levels, fresh.levels)
+        self.assertEqual(self.graph.edges, fresh.edges)
+        self.assertEqual(self.graph.alias_map, fresh.alias_map)
+        self.assertEqual(self.graph._sorted_level_ids, fresh._sorted_level_ids)
+        self.assertEqual(self.graph.all_levels(), fresh.all_levels())
+
+    def test_add_level_patches_edges_and_aliases(self):
+        snapshot_before = self.graph._snapshot
+        path = self._write(os.path.join("generated", "custom_story.json"), {
+            "id": "custom_story",
+            "title": "Custom",
+            "tags": ["craft"],
+            "meta": {"chapter": 2},
+        })
+        self.assertEqual(self.graph.add_or_update_level(path), "custom_story")
+        self.assertIsNot(self.graph._snapshot, snapshot_before)
+        self.assertNotIn("custom_story", snapshot_before.levels)
+        self.assertEqual(self.graph.neighbors("flagship_1"), ["custom_story"])
+        self.assertIn("custom_story", self.graph.neighbors("flagship_5"))
+        self.assertMatchesFullReload()
+
+        positions = dict(self.minimap.positions)
+        self.minimap.add_level("custom_story")
+        for level, pos in positions.items():
+            self.assertEqual(self.minimap.positions[level], pos)
+        expected = MiniMap(StoryGraph(self.tempdir))
+        self.assertEqual(self.minimap.mainline, expected.mainline)
+        self.assertEqual(self.minimap.positions, expected.positions)
+
+    def test_update_existing_level_moves_chapter_edges(self):
+        path = self._write("flagship_03.json", {"id": "flagship_3", "title": "L3 v2", "meta": {"chapter": 9}})
+        self.assertEqual(self.graph.add_or_update_level(path), "flagship_03")
+        self.assertEqual(self.graph.get_level("level_3")["title"], "L3 v2")
+        self.assertMatchesFullReload()
+
+    def test_unindexable_path_returns_none(self):
+        outside = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        outside.close()
+        try:
+            self.assertIsNone(self.graph.add_or_update_level(outside.name))
+        finally:
+            os.unlink(outside.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
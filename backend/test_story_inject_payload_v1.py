@@ -15,6 +15,7 @@ for candidate in (str(BACKEND_ROOT), str(PARENT_ROOT)):
         sys.path.insert(0, candidate)
 
 from app.main import app
+from app.core.story.story_loader import DATA_DIR
 
 
 def _validate_required_by_schema(value, schema):
@@ -41,6 +42,13 @@ def _validate_required_by_schema(value, schema):
                 _validate_required_by_schema(item, item_schema)
 
 
+def _remove_level_file(level_id):
+    # 注入会把关卡写进真实关卡目录，测试结束后删掉
+    level_path = os.path.join(DATA_DIR, f"{level_id}.json")
+    if os.path.exists(level_path):
+        os.remove(level_path)
+
+
 def test_story_inject_returns_plugin_payload_v1_when_flag_enabled():
     schema_path = BACKEND_ROOT / "app" / "core" / "executor" / "plugin_payload_schema_v1.json"
     schema = __import__("json").loads(schema_path.read_text(encoding="utf-8"))
@@ -81,6 +89,7 @@ def test_story_inject_returns_plugin_payload_v1_when_flag_enabled():
 
         _validate_required_by_schema(body, schema)
     finally:
+        _remove_level_file(level_id)
         for key, old in prior_values.items():
             if old is None:
                 os.environ.pop(key, None)
@@ -131,6 +140,7 @@ def test_story_inject_uses_v2_mapper_when_feature_flag_enabled():
 
         _validate_required_by_schema(body, schema)
     finally:
+        _remove_level_file(level_id)
         for key, old in prior_values.items():
             if old is None:
                 os.environ.pop(key, None)
@@ -199,6 +209,7 @@ def test_story_inject_debug_trace_response_only_when_enabled():
         assert "mapping_status" not in bootstrap
         assert "mapping_status" not in world_patch
     finally:
+        _remove_level_file(level_id)
         for key, old in prior_values.items():
             if old is None:
                 os.environ.pop(key, None)
@@ -0,0 +1,77 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import deque
+
+from app.core.story.story_graph import StoryGraph
+
+
+class IncrementalRecommendationTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="story-rec-test-")
+        themes = ["river", "mountain", None]
+        for i in range(1, 9):
+            self._write_level(f"flagship_{i:02d}.json", {
+                "id": f"flagship_{i}",
+                "title": f"Level {i}",
+                "tags": ["main", f"t{i % 3}"],
+                "storyline_theme": themes[i % 3],
+                "memory_affinity": ["lantern"] if i % 4 == 0 else [],
+                "meta": {"chapter": i},
+            })
+        os.makedirs(os.path.join(self.tempdir, "generated"))
+        self._write_level(os.path.join("generated", "custom_a.json"), {
+            "id": "custom_a",
+            "title": "Custom",
+            "tags": ["t1", "craft"],
+            "tasks": [{"id": "x", "conditions": [{"type": "kill"}]}],
+            "meta": {"chapter": 3},
+        })
+        self.graph = StoryGraph(self.tempdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_level(self, filename, payload):
+        with open(os.path.join(self.tempdir, filename), "w", encoding="utf-8") as fh:
+            json.dump(payload, fh)
+
+    def _fresh(self, player_id, current):
+        self.graph._aggregates.pop(player_id, None)
+        return self.graph.recommend_next_levels(player_id, current, limit=4)
+
+    def test_incremental_matches_rebuild_through_evictions(self):
+        rng = random.Random(7)
+        player = "rec_player"
+        self.graph.trajectory[player] = deque(maxlen=12)
+        levels = [f"flagship_{i}" for i in range(1, 9)] + ["custom_a", "level_3"]
+        for step in range(300):
+            roll = rng.random()
+            level = rng.choice(levels)
+            if roll < 0.15:
+                meta = {"next_level": rng.choice(levels), "tags": rng.choice(["T1", "craft,main", []])}
+                self.graph.update_trajectory(player, level, "choice", meta)
+            elif roll < 0.25:
+                self.graph.update_memory_flags(player, rng.choice([["lantern"], ["rope"]]), level_id=level)
+            else:
+                self.graph.update_trajectory(player, level, rng.choice(["enter", "exit"]))
+            if step % 7 == 0:
+                current = rng.choice(levels + [None])
+                incremental = self.graph.recommend_next_levels(player, current, limit=4)
+                self.assertEqual(incremental, self._fresh(player, current), step)
+        self.assertEqual(len(self.graph._aggregate_for(player)), 12)
+
+    def test_reload_rebuilds_aggregates(self):
+        player = "reload_player"
+        self.graph.update_trajectory(player, "flagship_2", "exit")
+        before = self.graph.recommend_next_levels(player, None, limit=3)
+        self.graph.reload_levels()
+        self.assertEqual(self.graph.recommend_next_levels(player, None, limit=3), before)
+        self.assertEqual(self.graph._aggregates[player].version, self.graph._levels_version)
+
+
+if __name__ == "__main__":
+    unittest.main()
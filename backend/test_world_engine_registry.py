@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+from app.core.world.engine import WorldEngine, WorldEngineRegistry
+
+
+class WorldEngineRegistryTest(unittest.TestCase):
+    def test_players_have_isolated_state(self):
+        registry = WorldEngineRegistry()
+        registry.get("a").apply({"move": {"x": 5, "y": 64, "z": 1}})
+        registry.get("b").apply({"move": {"x": -3, "y": 70, "z": 2}})
+        self.assertEqual(registry.get("a").state["variables"]["x"], 5)
+        self.assertEqual(registry.get("b").state["variables"]["x"], -3)
+        self.assertIs(registry.get("a"), registry.get("a"))
+
+    def test_entity_table_is_bounded(self):
+        engine = WorldEngine(max_entities=3)
+        for i in range(5):
+            engine.apply_patch({"entities": {f"e{i}": {"i": i}}})
+        self.assertEqual(list(engine.state["entities"]), ["e2", "e3", "e4"])
+
+    def test_idle_and_capacity_eviction(self):
+        registry = WorldEngineRegistry(idle_ttl=10, max_instances=2)
+        with mock.patch("app.core.world.engine.time.monotonic", return_value=100.0):
+            registry.get("a")
+            registry.get("b")
+            registry.get("c")
+        self.assertEqual(list(registry._engines), ["b", "c"])
+        with mock.patch("app.core.world.engine.time.monotonic", return_value=200.0):
+            with self.assertLogs("app.core.world.engine", "INFO") as logs:
+                registry.get("d")
+        self.assertEqual(list(registry._engines), ["d"])
+        self.assertEqual(len(logs.output), 2)
+
+    def test_on_evict_receives_evicted_ids(self):
+        evicted = []
+        registry = WorldEngineRegistry(idle_ttl=0, max_instances=1, on_evict=evicted.append)
+        registry.get("a")
+        registry.get("b")
+        self.assertEqual(evicted, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import copy
+import json
+import unittest
+
+from app.core.patch import world_patch
+from app.core.patch.world_patch import FrozenPatch, MC_QUEUE_KEYS, compose, freeze, merge, merge_into, thaw
+from app.core.story.level_schema import EmotionalWorldPatchConfig
+from app.core.story.scene_orchestrator import SceneOrchestrator
+from app.core.story.story_engine import StoryEngine
+
+
+class WorldPatchAlgebraTest(unittest.TestCase):
+    def test_conflict_policy(self):
+        base = {
+            "mc": {"tell": "a", "teleport": {"x": 1, "safe_platform": {"radius": 3}}, "weather": "rain"},
+            "variables": {"a": 1},
+        }
+        addition = {
+            "mc": {"teleport": {"x": 2}, "weather": None, "time": "night"},
+            "variables": {"b": 2},
+        }
+        before = copy.deepcopy(base)
+        merged = merge(base, addition)
+        self.assertEqual(base, before)
+        self.assertEqual(merged["mc"], {"tell": "a", "teleport": {"x": 2}, "weather": "rain", "time": "night"})
+        self.assertEqual(merged["variables"], {"a": 1, "b": 2})
+        # 只复制被触及的路径，指令 payload 原样共享
+        self.assertIs(merged["mc"]["teleport"], addition["mc"]["teleport"])
+        self.assertIsNot(merged["mc"], base["mc"])
+        self.assertIs(merge({"npc": base["variables"]}, {"mc": {}})["npc"], base["variables"])
+
+    def test_queue_keys_accumulate(self):
+        target = {"tell": "first", "build": [{"shape": "a"}]}
+        shared = target["build"]
+        merge_into(target, {"tell": ["second"], "build": {"shape": "b"}, "spawn": {"id": 1}}, depth=1, append_keys=MC_QUEUE_KEYS)
+        self.assertEqual(target["tell"], ["first", "second"])
+        self.assertEqual(target["build"], [{"shape": "a"}, {"shape": "b"}])
+        self.assertEqual(shared, [{"shape": "a"}])
+        self.assertEqual(target["spawn"], [{"id": 1}])
+
+    def test_compose_matches_chained_merge(self):
+        patches = [
+            {"mc": {"tell": "1", "music": {"record": "a"}}},
+            None,
+            {"mc": {"tell": "2", "title": "t"}, "flag": True},
+            {"mc": {"music": {"volume": 0.5}}, "flag": None},
+        ]
+        chained = {}
+        for patch in patches:
+            chained = merge(chained, patch)
+        self.assertEqual(compose(*patches), chained)
+        self.assertEqual(compose(*patches, append_keys={"tell"})["mc"]["tell"], ["1", "2"])
+
+    def test_frozen_patch_is_shareable_and_serialisable(self):
+        frozen = freeze({"mc": {"tell": ["x"], "music": {"record": "a"}}})
+        self.assertIsInstance(frozen, FrozenPatch)
+        with self.assertRaises(TypeError):
+            frozen["mc"]["music"]["record"] = "b"
+        with self.assertRaises(TypeError):
+            frozen["mc"]["tell"].append("y")
+        self.assertIs(copy.deepcopy(frozen), frozen)
+        self.assertEqual(json.loads(json.dumps(frozen)), thaw(frozen))
+        merged = merge(frozen, {"mc": {"time": "day"}})
+        merged["mc"]["weather"] = "clear"
+        self.assertNotIn("weather", frozen["mc"])
+        self.assertIs(merged["mc"]["music"], frozen["mc"]["music"])
+
+
+class PatchCallSitesTest(unittest.TestCase):
+    def test_story_engine_primary_wins(self):
+        merged = StoryEngine._merge_patch({"mc": {"tell": "beat"}}, {"mc": {"tell": "base", "time": "day"}})
+        self.assertEqual(merged, {"mc": {"tell": "beat", "time": "day"}})
+
+    def test_scene_orchestrator_queues(self):
+        mc = {}
+        SceneOrchestrator._merge_mc(mc, {"tell": "a", "weather": "rain"})
+        SceneOrchestrator._merge_mc(mc, {"tell": ["b"], "weather": None})
+        self.assertEqual(mc, {"tell": ["a", "b"], "weather": "rain"})
+
+    def test_emotional_patch_is_composed_once(self):
+        config = EmotionalWorldPatchConfig.from_dict({
+            "default": {"patch": {"mc": {"music": {"record": "pigstep"}, "lighting_shift": "dusk"}}},
+            "profiles": [{"id": "face", "requires": ["face"], "patch": {"mc": {"lighting_shift": "ember"}}}],
+        })
+        patch = config.compose_patch({"face"})
+        self.assertEqual(thaw(patch), {"mc": {"music": {"record": "pigstep"}, "lighting_shift": "ember"}})
+        self.assertIs(config.compose_patch(["face", "other"]), patch)
+        self.assertIs(patch["mc"]["music"], config.default_patch["mc"]["music"])
+        self.assertEqual(config.compose_patch([])["mc"]["lighting_shift"], "dusk")
+        self.assertIsInstance(patch, world_patch.FrozenPatch)
+
+
+
+class EmotionalAdvancePatchTest(unittest.TestCase):
+    PLAYER = "emotional_advance_patch"
+
+    def tearDown(self):
+        from app.core.story.story_engine import story_engine
+
+        story_engine.players.pop(self.PLAYER, None)
+
+    def test_advance_patch_is_caller_owned_down_to_mc(self):
+        from app.core.story.story_engine import story_engine
+
+        story_engine.load_level_for_player(self.PLAYER, "flagship_03")
+        decision = {"option": None, "node": {"title": "风", "text": "继续攀登"}, "world_patch": {"variables": {"wind": 1}}}
+        _option, _node, patch = story_engine.advance(self.PLAYER, {"variables": {}}, {"say": "继续"}, ai_result=decision)
+
+        profile = story_engine.players[self.PLAYER]["emotional_profile"]
+        self.assertIsInstance(profile["last_patch"], FrozenPatch)
+        music = patch["mc"]["music"]
+        self.assertIs(music, profile["last_patch"]["mc"]["music"])
+
+        # 顶层与 mc 块归调用方所有；共享的指令 payload 只读，需 merge / thaw
+        patch["mc"]["tell"] = "caller"
+        patch["extra"] = True
+        with self.assertRaises(TypeError):
+            music["volume"] = 1.0
+        patch["mc"]["music"] = merge(music, {"volume": 1.0}, depth=1)
+        self.assertEqual(profile["last_patch"]["mc"]["music"]["volume"], 0.6)
+        self.assertNotIn("tell", profile["last_patch"]["mc"])
+        self.assertEqual(json.loads(json.dumps(patch))["mc"]["music"]["volume"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
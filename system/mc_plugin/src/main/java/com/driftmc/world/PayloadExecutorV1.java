@@ -29,6 +29,7 @@ public class PayloadExecutorV1 {
 
     private static final int MAX_QUEUE = 5;
     private static final int MAX_BLOCKS = 5000;
+    private static final int MAX_FILL_VOLUME = 32768;
     private static final int MIN_BATCH_SIZE = 20;
     private static final int MAX_BATCH_SIZE = 100;
     private static final int BATCH_STEP = 10;
@@ -152,9 +153,11 @@ public class PayloadExecutorV1 {
             return;
         }
 
+        // fill 按体积计入本 tick 预算，避免一个大区域拖慢整 tick
         int budget = currentBatchSize;
-        while (budget-- > 0 && currentJob.index < currentJob.commands.size()) {
+        while (budget > 0 && currentJob.index < currentJob.commands.size()) {
             CommandEntry cmd = currentJob.commands.get(currentJob.index++);
+            budget -= cmd.volume();
             boolean ok = applyOne(world, cmd);
             if (ok) {
                 currentJob.executed++;
@@ -240,7 +243,7 @@ public class PayloadExecutorV1 {
     }
 
     private boolean applyOne(World world, CommandEntry cmd) {
-        if (!"setblock".equals(cmd.op)) {
+        if (!"setblock".equals(cmd.op) && !"fill".equals(cmd.op)) {
             plugin.getLogger().log(Level.WARNING, "[PayloadExecutorV1] unknown op={0}", cmd.op);
             return false;
         }
@@ -249,12 +252,22 @@ public class PayloadExecutorV1 {
             plugin.getLogger().log(Level.WARNING, "[PayloadExecutorV1] invalid block id={0}", cmd.block);
             return false;
         }
-        if (cmd.y < 0 || cmd.y > 320) {
+        if (cmd.y < 0 || cmd.y2 > 320) {
             return false;
         }
 
-        world.getChunkAt(cmd.x >> 4, cmd.z >> 4).load();
-        world.getBlockAt(cmd.x, cmd.y, cmd.z).setType(material, false);
+        for (int cx = cmd.x >> 4; cx <= cmd.x2 >> 4; cx++) {
+            for (int cz = cmd.z >> 4; cz <= cmd.z2 >> 4; cz++) {
+                world.getChunkAt(cx, cz).load();
+            }
+        }
+        for (int x = cmd.x; x <= cmd.x2; x++) {
+            for (int y = cmd.y; y <= cmd.y2; y++) {
+                for (int z = cmd.z; z <= cmd.z2; z++) {
+                    world.getBlockAt(x, y, z).setType(material, false);
+                }
+            }
+        }
         return true;
     }
 
@@ -308,13 +321,30 @@ public class PayloadExecutorV1 {
             if (op == null || block == null || x == null || y == null || z == null) {
                 return ValidationResult.reject("INVALID_COMMAND");
             }
-            if (y < 0 || y > 320) {
+            int x2 = x;
+            int y2 = y;
+            int z2 = z;
+            if ("fill".equals(op)) {
+                Integer toX = asInt(cmdObj.get("x2"));
+                Integer toY = asInt(cmdObj.get("y2"));
+                Integer toZ = asInt(cmdObj.get("z2"));
+                if (toX == null || toY == null || toZ == null || toX < x || toY < y || toZ < z) {
+                    return ValidationResult.reject("INVALID_COMMAND");
+                }
+                x2 = toX;
+                y2 = toY;
+                z2 = toZ;
+                if ((long) (x2 - x + 1) * (y2 - y + 1) * (z2 - z + 1) > MAX_FILL_VOLUME) {
+                    return ValidationResult.reject("TOO_MANY_BLOCKS");
+                }
+            }
+            if (y < 0 || y2 > 320) {
                 return ValidationResult.reject("INVALID_COORD");
             }
             if (resolveMaterial(block) == null) {
                 return ValidationResult.reject("INVALID_BLOCK_ID");
             }
-            commands.add(new CommandEntry(op, x, y, z, block));
+            commands.add(new CommandEntry(op, x, y, z, x2, y2, z2, block));
         }
 
         OriginEntry origin = null;
@@ -467,15 +497,25 @@ public class PayloadExecutorV1 {
         private final int x;
         private final int y;
         private final int z;
+        private final int x2;
+        private final int y2;
+        private final int z2;
         private final String block;
 
-        private CommandEntry(String op, int x, int y, int z, String block) {
+        private CommandEntry(String op, int x, int y, int z, int x2, int y2, int z2, String block) {
             this.op = op;
             this.x = x;
             this.y = y;
             this.z = z;
+            this.x2 = x2;
+            this.y2 = y2;
+            this.z2 = z2;
             this.block = block;
         }
+
+        private int volume() {
+            return (x2 - x + 1) * (y2 - y + 1) * (z2 - z + 1);
+        }
     }
 
     private static final class PayloadJob {